@@ -0,0 +1,113 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Simulation speed and trajectory deviation of the collision LODs in kubric.assets.collision_lods.
+
+Drops a pile of (partly concave) procedural objects onto a floor once per LOD and reports the
+simulated steps per second and how far the trajectories deviate from the ones of the "fine" LOD.
+
+Usage:
+  python benchmarks/collision_lods.py --num_objects 20 --frame_end 48
+"""
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+import numpy as np
+import trimesh
+
+import kubric as kb
+from kubric.assets import collision_lods
+from kubric.scripts import download_GSO
+from kubric.simulator import PyBullet
+
+
+def make_assets(asset_root: pathlib.Path):
+  """Writes procedural assets with all collision LODs; returns their FileBasedObject kwargs."""
+  meshes = {
+      "ring": trimesh.creation.annulus(r_min=0.3, r_max=0.5, height=0.3),
+      "torus": trimesh.creation.torus(major_radius=0.4, minor_radius=0.12),
+      "capsule": trimesh.creation.capsule(height=0.6, radius=0.2),
+      "box": trimesh.creation.box((0.6, 0.4, 0.3)),
+  }
+  assets = {}
+  for name, tmesh in meshes.items():
+    asset_dir = asset_root / name
+    asset_dir.mkdir(parents=True)
+    tmesh.apply_translation(-tmesh.center_mass)
+    tmesh.export(asset_dir / "visual_geometry.obj")
+    collision_lods.compute_collision_lods(asset_dir / "visual_geometry.obj", asset_dir)
+    properties = download_GSO.get_object_properties(tmesh)
+    urdf_path = asset_dir / "object.urdf"
+    urdf_path.write_text(download_GSO.URDF_TEMPLATE.format(id=name, **properties))
+    lod_urdfs = collision_lods.write_lod_urdfs(urdf_path)
+    assets[name] = {
+        "bounds": properties["bounds"],
+        "mass": properties["mass"],
+        "simulation_filename": str(urdf_path),
+        "collision_lods": {lod: str(asset_dir / f) for lod, f in lod_urdfs.items()},
+    }
+  return assets
+
+
+def simulate(assets, lod, num_objects, frame_end, seed=0):
+  """Drops `num_objects` random assets onto a floor; returns (positions [N, T, 3], seconds)."""
+  rng = np.random.default_rng(seed)
+  scene = kb.Scene(frame_end=frame_end, gravity=(0, 0, -9.81))
+  simulator = PyBullet(scene, tempfile.mkdtemp(), collision_lods={"foreground": lod})
+  scene += kb.Cube(scale=(5, 5, 0.1), position=(0, 0, -0.1), static=True)
+  objects = []
+  for i in range(num_objects):
+    name = rng.choice(sorted(assets))
+    obj = kb.FileBasedObject(asset_id=name, name=f"{name}_{i}", **assets[name])
+    obj.position = rng.uniform((-1, -1, 0.5), (1, 1, 3))
+    obj.quaternion = kb.Quaternion(rng.normal(size=4)).normalised
+    scene += obj
+    objects.append(obj)
+  start = time.perf_counter()
+  animation, _ = simulator.run()
+  seconds = time.perf_counter() - start
+  positions = np.array([animation[obj]["position"] for obj in objects])
+  return positions, seconds
+
+
+def main(num_objects=20, frame_end=48, repeats=3):
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    assets = make_assets(pathlib.Path(tmp_dir))
+    num_steps = (frame_end + 1) * 240 // 24
+    results = {}
+    for lod in collision_lods.COLLISION_LODS:
+      runs = [simulate(assets, lod, num_objects, frame_end) for _ in range(repeats)]
+      results[lod] = runs[0][0], min(seconds for _, seconds in runs)
+
+  reference, _ = results[collision_lods.DEFAULT_LOD]
+  print(f"{num_objects} objects, {num_steps} steps, best of {repeats} runs")
+  print(f"{'lod':>8} {'steps/s':>9} {'speedup':>8} {'mean dev [m]':>13} {'max dev [m]':>12} "
+        f"{'final dev [m]':>14}")
+  for lod, (positions, seconds) in results.items():
+    deviation = np.linalg.norm(positions - reference, axis=-1)
+    speedup = results[collision_lods.DEFAULT_LOD][1] / seconds
+    print(f"{lod:>8} {num_steps / seconds:9.0f} {speedup:8.2f} {deviation.mean():13.3f} "
+          f"{deviation.max():12.3f} {deviation[:, -1].mean():14.3f}")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--num_objects", type=int, default=20)
+  parser.add_argument("--frame_end", type=int, default=48)
+  parser.add_argument("--repeats", type=int, default=3)
+  FLAGS, unused = parser.parse_known_args()
+  main(num_objects=FLAGS.num_objects, frame_end=FLAGS.frame_end, repeats=FLAGS.repeats)
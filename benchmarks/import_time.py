@@ -0,0 +1,86 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Import time and RSS of kubric (and of a local-disk worker setup) in fresh processes.
+
+Also lists which of the heavy optional dependencies ended up imported.
+
+Usage:
+  python benchmarks/import_time.py --repeats 5
+"""
+
+import argparse
+import importlib
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+HEAVY_MODULES = ("tensorflow", "sklearn", "pandas", "imageio", "bpy", "pybullet")
+
+CONFIGS = {
+    "kubric": ("kubric",),
+    # a worker that builds, simulates and renders a scene from local assets
+    "worker": ("kubric", "kubric.simulator", "kubric.renderer", "kubric.assets"),
+}
+
+
+def rss_mib():
+  with open("/proc/self/status") as fp:
+    for line in fp:
+      if line.startswith("VmRSS:"):
+        return int(line.split()[1]) / 1024
+  raise RuntimeError("VmRSS not found in /proc/self/status")
+
+
+def child_main(config):
+  """Prints the import seconds, the RSS growth (MiB) and the imported heavy modules."""
+  rss_before = rss_mib()
+  start = time.perf_counter()
+  for name in CONFIGS[config]:
+    importlib.import_module(name)
+  import kubric as kb  # pylint: disable=g-import-not-at-top
+  kb.Scene(resolution=(64, 64))
+  seconds = time.perf_counter() - start
+  heavy = [name for name in HEAVY_MODULES if name in sys.modules] or ["-"]
+  print("RESULT", seconds, rss_mib() - rss_before, ",".join(heavy))
+
+
+def run_child(config):
+  output = subprocess.run([sys.executable, __file__, "--child", config],
+                          check=True, capture_output=True, text=True).stdout
+  _, seconds, rss, heavy = output.strip().splitlines()[-1].split()
+  return float(seconds), float(rss), heavy
+
+
+def main(repeats=5):
+  print(f"median of {repeats} fresh processes")
+  print(f"{'config':>8} {'import [s]':>11} {'RSS growth [MiB]':>17}  heavy modules imported")
+  for config in CONFIGS:
+    runs = [run_child(config) for _ in range(repeats)]
+    seconds = np.median([r[0] for r in runs])
+    rss = np.median([r[1] for r in runs])
+    print(f"{config:>8} {seconds:11.2f} {rss:17.0f}  {runs[-1][2]}")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--repeats", type=int, default=5)
+  parser.add_argument("--child", choices=CONFIGS, default=None, help=argparse.SUPPRESS)
+  FLAGS, unused = parser.parse_known_args()
+  if FLAGS.child:
+    child_main(FLAGS.child)
+  else:
+    main(repeats=FLAGS.repeats)
@@ -0,0 +1,165 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-frame render time with and without Cycles persistent data (Blender(persistent_data=True)).
+
+Builds a scene like the ones of fy (an HDRI world, a textured dome, a detailed static table and
+static clutter that are keyframed by the simulator like everything else, a few moving objects and
+a moving camera) and renders an animation with Cycles in a fresh process per configuration:
+
+  default     the synced scene is rebuilt for every frame
+  persistent  render.use_persistent_data
+  static      persistent data + the constant keyframes of the static objects removed
+              (blender_utils.remove_constant_animation, as done by Blender.mark_static_assets)
+
+Usage:
+  python benchmarks/persistent_data.py --resolution 256 --samples 16 --frames 12
+"""
+
+import argparse
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+MODES = ("default", "persistent", "static")
+
+
+def build_scene(nr_frames, resolution, samples, detail):
+  """An fy-like scene; returns the static objects."""
+  import bpy  # pylint: disable=g-import-not-at-top
+  bpy.ops.wm.read_factory_settings(use_empty=True)
+  scene = bpy.context.scene
+  scene.render.engine = "CYCLES"
+  scene.cycles.samples = samples
+  scene.cycles.device = "CPU"
+  scene.render.resolution_x = scene.render.resolution_y = resolution
+  scene.frame_start, scene.frame_end = 1, nr_frames
+
+  rng = np.random.default_rng(0)
+  hdri = bpy.data.images.new("hdri", 1024, 512, float_buffer=True)
+  hdri.pixels.foreach_set(rng.uniform(0, 2, size=1024 * 512 * 4).astype(np.float32))
+  scene.world = bpy.data.worlds.new("World")
+  scene.world.use_nodes = True
+  environment = scene.world.node_tree.nodes.new("ShaderNodeTexEnvironment")
+  environment.image = hdri
+  scene.world.node_tree.links.new(environment.outputs["Color"],
+                                  scene.world.node_tree.nodes["Background"].inputs["Color"])
+  texture = bpy.data.images.new("texture", 1024, 1024)
+  texture.pixels.foreach_set(rng.uniform(0, 1, size=1024 * 1024 * 4).astype(np.float32))
+  material = bpy.data.materials.new("textured")
+  material.use_nodes = True
+  image_node = material.node_tree.nodes.new("ShaderNodeTexImage")
+  image_node.image = texture
+  material.node_tree.links.new(image_node.outputs["Color"],
+                               material.node_tree.nodes["Principled BSDF"].inputs["Base Color"])
+
+  static = []
+  bpy.ops.mesh.primitive_uv_sphere_add(radius=40, segments=128, ring_count=64)  # dome
+  static.append(bpy.context.active_object)
+  bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=detail, radius=1)  # table
+  bpy.context.active_object.scale = (1.5, 1, 0.05)
+  static.append(bpy.context.active_object)
+  for i in range(8):  # static clutter on the table
+    bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=detail - 1, radius=0.1,
+                                          location=(i % 4 * 0.5 - 0.75, i // 4 * 0.5 - 0.25, 0.15))
+    static.append(bpy.context.active_object)
+  moving = []
+  for i in range(3):
+    bpy.ops.mesh.primitive_cube_add(size=0.15, location=(i * 0.3 - 0.3, 0, 1))
+    moving.append(bpy.context.active_object)
+  for obj in static + moving:
+    obj.data.materials.append(material)
+
+  camera = bpy.data.objects.new("camera", bpy.data.cameras.new("camera"))
+  scene.collection.objects.link(camera)
+  scene.camera = camera
+  for frame in range(1, nr_frames + 1):
+    # the simulator keyframes all objects, static ones included
+    for obj in static:
+      obj.keyframe_insert("location", frame=frame)
+      obj.keyframe_insert("rotation_quaternion", frame=frame)
+    for obj in moving:
+      obj.location.z = 1 - 0.8 * frame / nr_frames
+      obj.keyframe_insert("location", frame=frame)
+    angle = 0.3 * frame / nr_frames
+    camera.location = (4 * math.sin(angle), -4 * math.cos(angle), 2)
+    camera.rotation_euler = (math.radians(65), 0, angle)
+    camera.keyframe_insert("location", frame=frame)
+    camera.keyframe_insert("rotation_euler", frame=frame)
+  return static
+
+
+def child_main(mode, nr_frames, resolution, samples, detail):
+  """Prints the render seconds of every frame."""
+  import bpy  # pylint: disable=g-import-not-at-top
+  from kubric.renderer import blender_utils  # pylint: disable=g-import-not-at-top
+  static = build_scene(nr_frames, resolution, samples, detail)
+  scene = bpy.context.scene
+  scene.render.use_persistent_data = mode != "default"
+  if mode == "static":
+    assert all(blender_utils.remove_constant_animation(obj) for obj in static)
+  output_dir = tempfile.mkdtemp()
+  seconds = []
+  for frame in range(1, nr_frames + 1):
+    start = time.perf_counter()
+    scene.frame_set(frame)
+    scene.render.filepath = os.path.join(output_dir, f"frame_{frame:04d}.png")
+    bpy.ops.render.render(write_still=True)
+    seconds.append(time.perf_counter() - start)
+  print("RESULT", *seconds)
+
+
+def run_child(mode, nr_frames, resolution, samples, detail):
+  """Renders in a fresh process; returns the seconds per frame."""
+  output = subprocess.run([sys.executable, __file__, "--child", mode,
+                           "--frames", str(nr_frames), "--resolution", str(resolution),
+                           "--samples", str(samples), "--detail", str(detail)],
+                          check=True, capture_output=True, text=True).stdout
+  line = [line for line in output.splitlines() if line.startswith("RESULT")][-1]
+  return [float(s) for s in line.split()[1:]]
+
+
+def main(nr_frames=12, resolution=256, samples=16, detail=7, repeats=2):
+  print(f"{nr_frames} frames, {resolution}x{resolution}, {samples} spp, best of {repeats} runs")
+  print(f"{'mode':>10} {'first frame [s]':>16} {'later frames [s/frame]':>23} {'total [s]':>10}")
+  baseline = None
+  for mode in MODES:
+    runs = [run_child(mode, nr_frames, resolution, samples, detail) for _ in range(repeats)]
+    seconds = min(runs, key=sum)
+    later = float(np.mean(seconds[1:]))
+    baseline = later if baseline is None else baseline
+    print(f"{mode:>10} {seconds[0]:16.2f} {later:23.3f} {sum(seconds):10.2f}"
+          f"   ({later / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--frames", type=int, default=12)
+  parser.add_argument("--resolution", type=int, default=256)
+  parser.add_argument("--samples", type=int, default=16)
+  parser.add_argument("--detail", type=int, default=7,
+                      help="subdivisions of the ico spheres of the table and the static clutter")
+  parser.add_argument("--repeats", type=int, default=2)
+  parser.add_argument("--child", choices=MODES, default=None, help=argparse.SUPPRESS)
+  FLAGS, unused = parser.parse_known_args()
+  if FLAGS.child:
+    child_main(FLAGS.child, FLAGS.frames, FLAGS.resolution, FLAGS.samples, FLAGS.detail)
+  else:
+    main(nr_frames=FLAGS.frames, resolution=FLAGS.resolution, samples=FLAGS.samples,
+         detail=FLAGS.detail, repeats=FLAGS.repeats)
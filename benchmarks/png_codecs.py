@@ -0,0 +1,72 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Micro-benchmark of the PNG codecs in kubric.image_codecs on typical kubric frames.
+
+Usage:
+  python benchmarks/png_codecs.py --repeats 10
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from kubric import image_codecs
+from kubric import plotting
+
+
+def make_frames(resolution=512, seed=0):
+  """512x512 RGBA16, forward flow (2 channels padded to RGB16) and segmentation frames."""
+  rng = np.random.default_rng(seed)
+  yy, xx = np.mgrid[0:resolution, 0:resolution] / resolution
+  smooth = np.stack([xx, yy, xx * yy, np.ones_like(xx)], axis=-1)
+  rgba = (smooth * 60000 + rng.integers(0, 2000, smooth.shape)).astype(np.uint16)
+  flow = np.concatenate([smooth[..., :2], np.zeros_like(smooth[..., :1])], axis=-1)
+  flow = (flow * 65535).astype(np.uint16)
+  segmentation = (np.floor(xx * 4) + 4 * np.floor(yy * 3)).astype(np.uint8)[..., None]
+  return {
+      "rgba16": (rgba, None),
+      "flow": (flow, None),
+      "segmentation": (segmentation, plotting.hls_palette(12)),
+  }
+
+
+def timeit(fn, repeats):
+  fn()  # warm-up
+  start = time.perf_counter()
+  for _ in range(repeats):
+    result = fn()
+  return (time.perf_counter() - start) / repeats * 1000, result
+
+
+def main(resolution=512, repeats=10, compression=6):
+  print(f"{'frame':>13} {'codec':>6} {'encode [ms]':>12} {'decode [ms]':>12} {'size [kB]':>10}")
+  for frame_name, (data, palette) in make_frames(resolution).items():
+    for codec in image_codecs.PNG_CODECS.values():
+      encode_ms, buffer = timeit(
+          lambda: codec.encode(data, compression=compression, palette=palette), repeats)
+      decode_ms, (decoded, _) = timeit(lambda: codec.decode(buffer), repeats)
+      np.testing.assert_array_equal(decoded, data)
+      print(f"{frame_name:>13} {codec.name:>6} {encode_ms:12.1f} {decode_ms:12.1f} "
+            f"{len(buffer) / 1024:10.1f}")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--resolution", type=int, default=512)
+  parser.add_argument("--repeats", type=int, default=10)
+  parser.add_argument("--compression", type=int, default=6)
+  FLAGS, unused = parser.parse_known_args()
+  main(resolution=FLAGS.resolution, repeats=FLAGS.repeats, compression=FLAGS.compression)
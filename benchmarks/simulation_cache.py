@@ -0,0 +1,85 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Time of a physics simulation versus reusing it from kubric.simulator.SimulationCache.
+
+Drops a pile of random cubes and spheres onto a floor, first without a cache, then twice with the
+same initial conditions and an empty cache (a miss that stores the result, then a hit).
+
+Usage:
+  python benchmarks/simulation_cache.py --num_objects 20 --frame_end 48
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+import kubric as kb
+from kubric.simulator import PyBullet
+from kubric.simulator import SimulationCache
+
+
+def simulate(num_objects, frame_end, cache=None, seed=0):
+  """Simulates the pile of objects for `seed`; returns (positions [N, T, 3], seconds)."""
+  rng = np.random.default_rng(seed)
+  scene = kb.Scene(frame_end=frame_end, gravity=(0, 0, -9.81))
+  simulator = PyBullet(scene, tempfile.mkdtemp(), cache=cache)
+  scene += kb.Cube(scale=(5, 5, 0.1), position=(0, 0, -0.1), static=True)
+  objects = []
+  for _ in range(num_objects):
+    if rng.uniform() < 0.5:
+      obj = kb.Cube(scale=rng.uniform(0.1, 0.3, size=3))
+    else:
+      obj = kb.Sphere(scale=rng.uniform(0.1, 0.3))
+    obj.position = rng.uniform((-1, -1, 0.5), (1, 1, 3))
+    obj.quaternion = kb.Quaternion(rng.normal(size=4)).normalised
+    obj.velocity = rng.uniform((-1, -1, 0), (1, 1, 0))
+    scene += obj
+    objects.append(obj)
+  start = time.perf_counter()
+  animation, _ = simulator.run()
+  seconds = time.perf_counter() - start
+  return np.array([animation[obj]["position"] for obj in objects]), seconds
+
+
+def main(num_objects=20, frame_end=48, repeats=3):
+  results = {"no cache": [], "miss": [], "hit": []}
+  for seed in range(repeats):
+    reference, seconds = simulate(num_objects, frame_end, seed=seed)
+    results["no cache"].append(seconds)
+    with tempfile.TemporaryDirectory() as cache_dir:
+      cache = SimulationCache(cache_dir)
+      for mode in ("miss", "hit"):
+        positions, seconds = simulate(num_objects, frame_end, cache=cache, seed=seed)
+        np.testing.assert_array_equal(positions, reference)
+        results[mode].append(seconds)
+      entry_size = cache.total_size()
+
+  print(f"{num_objects} objects, {frame_end + 1} frames, median of {repeats} scenes, "
+        f"{entry_size / 1024:.0f} KiB per entry")
+  print(f"{'mode':>9} {'run [ms]':>9} {'speedup':>8}")
+  baseline = np.median(results["no cache"])
+  for mode, seconds in results.items():
+    print(f"{mode:>9} {np.median(seconds) * 1000:9.1f} {baseline / np.median(seconds):8.2f}")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--num_objects", type=int, default=20)
+  parser.add_argument("--frame_end", type=int, default=48)
+  parser.add_argument("--repeats", type=int, default=3)
+  FLAGS, unused = parser.parse_known_args()
+  main(num_objects=FLAGS.num_objects, frame_end=FLAGS.frame_end, repeats=FLAGS.repeats)
@@ -0,0 +1,162 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Load + render time and peak RSS with original images vs. the variants picked by "auto".
+
+Writes a synthetic HDRI (used as world lighting and visible background) and an object texture at
+full resolution plus their variants (kubric.assets.texture_variants), then renders one small
+frame with Cycles in a fresh process per configuration and reports its wall time and peak RSS.
+
+Usage:
+  python benchmarks/texture_variants.py --resolution 512 --hdri_size 4096 --texture_size 4096
+"""
+
+import argparse
+import math
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def write_image(path, width, height, float_buffer):
+  import bpy  # pylint: disable=g-import-not-at-top
+  image = bpy.data.images.new(path.stem, width, height, float_buffer=float_buffer)
+  rng = np.random.default_rng(0)
+  pixels = rng.uniform(0, 4 if float_buffer else 1, size=(height, width, 4)).astype(np.float32)
+  pixels[..., 3] = 1
+  image.pixels.foreach_set(pixels.reshape(-1))
+  image.filepath_raw = str(path)
+  image.file_format = "HDR" if float_buffer else "PNG"
+  image.save()
+  bpy.data.images.remove(image)
+
+
+def render(hdri_path, texture_path, resolution, samples):
+  """Builds a scene with a textured plane in front of the HDRI and renders one frame."""
+  import bpy  # pylint: disable=g-import-not-at-top
+  bpy.ops.wm.read_factory_settings(use_empty=True)
+  scene = bpy.context.scene
+  scene.render.engine = "CYCLES"
+  scene.cycles.samples = samples
+  scene.cycles.device = "CPU"
+  scene.render.resolution_x = scene.render.resolution_y = resolution
+  scene.render.filepath = os.path.join(tempfile.mkdtemp(), "frame.png")
+  scene.world = bpy.data.worlds.new("World")
+  scene.world.use_nodes = True
+  environment = scene.world.node_tree.nodes.new("ShaderNodeTexEnvironment")
+  environment.image = bpy.data.images.load(hdri_path)
+  scene.world.node_tree.links.new(environment.outputs["Color"],
+                                  scene.world.node_tree.nodes["Background"].inputs["Color"])
+
+  bpy.ops.mesh.primitive_plane_add(size=0.3, location=(0, 0, 0), rotation=(math.pi / 2, 0, 0))
+  material = bpy.data.materials.new("textured")
+  material.use_nodes = True
+  texture = material.node_tree.nodes.new("ShaderNodeTexImage")
+  texture.image = bpy.data.images.load(texture_path)
+  material.node_tree.links.new(texture.outputs["Color"],
+                               material.node_tree.nodes["Principled BSDF"].inputs["Base Color"])
+  bpy.context.active_object.data.materials.append(material)
+
+  camera_data = bpy.data.cameras.new("camera")
+  camera_data.angle = math.radians(40)
+  camera = bpy.data.objects.new("camera", camera_data)
+  camera.location = (0, -2, 0)
+  camera.rotation_euler = (math.pi / 2, 0, 0)
+  scene.collection.objects.link(camera)
+  scene.camera = camera
+  bpy.ops.render.render(write_still=True)
+
+
+def peak_rss_mib():
+  # unlike ru_maxrss, the high water mark of /proc is not inherited from the parent over exec
+  with open("/proc/self/status") as fp:
+    for line in fp:
+      if line.startswith("VmHWM:"):
+        return int(line.split()[1]) / 1024
+  raise RuntimeError("VmHWM not found in /proc/self/status")
+
+
+def child_main(hdri_path, texture_path, resolution, samples):
+  """Prints the load + render seconds and the peak RSS growth (MiB) over the bpy import."""
+  import bpy  # pylint: disable=g-import-not-at-top,unused-import
+  rss_before = peak_rss_mib()
+  start = time.perf_counter()
+  render(hdri_path, texture_path, resolution, samples)
+  seconds = time.perf_counter() - start
+  print(f"RESULT {seconds} {peak_rss_mib() - rss_before}")
+
+
+def run_child(hdri_path, texture_path, resolution, samples):
+  """Renders in a fresh process; returns (seconds, peak RSS growth in MiB)."""
+  output = subprocess.run([sys.executable, __file__, "--child", hdri_path, texture_path,
+                           "--resolution", str(resolution), "--samples", str(samples)],
+                          check=True, capture_output=True, text=True).stdout
+  _, seconds, rss = output.strip().splitlines()[-1].split()
+  return float(seconds), float(rss)
+
+
+def main(resolution=512, hdri_size=4096, texture_size=4096, samples=16, repeats=3):
+  from kubric.assets import texture_variants  # pylint: disable=g-import-not-at-top
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    asset_dir = pathlib.Path(tmp_dir)
+    hdri_path = asset_dir / "hdri.hdr"
+    texture_path = asset_dir / "texture.png"
+    write_image(hdri_path, hdri_size, hdri_size // 2, float_buffer=True)
+    write_image(texture_path, texture_size, texture_size, float_buffer=False)
+    sizes = tuple(s for s in (256, 512, 1024, 2048, 4096) if s < max(hdri_size, texture_size))
+    start = time.perf_counter()
+    texture_variants.write_texture_variants(asset_dir, sizes=sizes)
+    print(f"writing the variants took {time.perf_counter() - start:.2f}s (once per asset)")
+
+    field_of_view = math.radians(40)
+    required_hdri = texture_variants.required_environment_size(resolution, field_of_view)
+    required_texture = texture_variants.required_texture_size(resolution, field_of_view, 0.3, 2.)
+    configs = {
+        "original": (str(hdri_path), str(texture_path)),
+        "auto": (texture_variants.select_variant(hdri_path, required_hdri, sizes),
+                 texture_variants.select_variant(texture_path, required_texture, sizes)),
+        # e.g. the ambient HDRI of scenes whose background is a textured dome
+        "lighting": (texture_variants.select_variant(
+            hdri_path, texture_variants.AMBIENT_HDRI_SIZE, sizes),
+                     texture_variants.select_variant(texture_path, required_texture, sizes)),
+    }
+    print(f"{resolution}x{resolution}, {samples} spp, best of {repeats} runs")
+    print(f"{'images':>9} {'hdri':>16} {'texture':>20} {'load+render [s]':>16} "
+          f"{'peak RSS growth [MiB]':>22}")
+    for name, (hdri, texture) in configs.items():
+      runs = [run_child(hdri, texture, resolution, samples) for _ in range(repeats)]
+      seconds, rss = min(r[0] for r in runs), min(r[1] for r in runs)
+      print(f"{name:>9} {os.path.basename(hdri):>16} {os.path.basename(texture):>20} "
+            f"{seconds:16.2f} {rss:22.0f}")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--resolution", type=int, default=512)
+  parser.add_argument("--hdri_size", type=int, default=4096)
+  parser.add_argument("--texture_size", type=int, default=4096)
+  parser.add_argument("--samples", type=int, default=16)
+  parser.add_argument("--repeats", type=int, default=3)
+  parser.add_argument("--child", nargs=2, default=None, help=argparse.SUPPRESS)
+  FLAGS, unused = parser.parse_known_args()
+  if FLAGS.child:
+    child_main(*FLAGS.child, resolution=FLAGS.resolution, samples=FLAGS.samples)
+  else:
+    main(resolution=FLAGS.resolution, hdri_size=FLAGS.hdri_size,
+         texture_size=FLAGS.texture_size, samples=FLAGS.samples, repeats=FLAGS.repeats)
@@ -0,0 +1,78 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Worker start latency: a fresh Python process vs. a fork of a warmed-up kubric.zygote.Zygote.
+
+A worker counts as started once bpy and kubric are imported and Blender is reset to an empty
+scene, which is how every scene of a worker begins.
+
+Usage:
+  python benchmarks/zygote.py --workers 5
+"""
+
+import argparse
+import importlib
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+PRELOAD = ("bpy", "kubric", "kubric.renderer.blender_utils")
+
+
+def start_worker():
+  from kubric.renderer import blender_utils  # pylint: disable=g-import-not-at-top
+  blender_utils.clear_and_reset_blender_scene()
+
+
+def cold_start_seconds():
+  start = time.perf_counter()
+  subprocess.run([sys.executable, __file__, "--child"], check=True, capture_output=True)
+  return time.perf_counter() - start
+
+
+def main(nr_workers=5):
+  cold = [cold_start_seconds() for _ in range(nr_workers)]
+  start = time.perf_counter()
+  from kubric import zygote as zygote_lib  # pylint: disable=g-import-not-at-top
+  zygote = zygote_lib.Zygote(preload=PRELOAD)
+  zygote.warm_up()
+  warm_up_seconds = time.perf_counter() - start  # including the import of kubric by zygote_lib
+  forked = []
+  for _ in range(nr_workers):
+    start = time.perf_counter()
+    assert zygote.wait(zygote.fork(start_worker)) == 0
+    forked.append(time.perf_counter() - start)
+  stats = zygote.stats()
+  print(f"{nr_workers} workers (import {', '.join(PRELOAD)} + empty scene)")
+  print(f"{'':>24} {'mean [s]':>10} {'max [s]':>10}")
+  print(f"{'fresh process':>24} {np.mean(cold):10.3f} {np.max(cold):10.3f}")
+  print(f"{'zygote fork latency':>24} {stats['fork_seconds_mean']:10.4f} "
+        f"{stats['fork_seconds_max']:10.4f}")
+  print(f"{'zygote fork + run':>24} {np.mean(forked):10.3f} {np.max(forked):10.3f}")
+  print(f"zygote warm-up (once): {warm_up_seconds:.2f}s")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--workers", type=int, default=5)
+  parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+  FLAGS, unused = parser.parse_known_args()
+  if FLAGS.child:
+    for name in PRELOAD:
+      importlib.import_module(name)
+    start_worker()
+  else:
+    main(nr_workers=FLAGS.workers)
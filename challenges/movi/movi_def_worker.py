@@ -63,7 +63,12 @@ parser.add_argument("--hdri_assets", type=str,
                     default="gs://kubric-public/assets/HDRI_haven/HDRI_haven.json")
 parser.add_argument("--gso_assets", type=str,
                     default="gs://kubric-public/assets/GSO/GSO.json")
+parser.add_argument("--settle_static_objects", action="store_true",
+                    help="drop static objects and let them settle, even if the geometry index "
+                         "of the GSO assets has precomputed resting poses for them.")
 parser.add_argument("--save_state", dest="save_state", action="store_true")
+parser.add_argument("--point_tracks", type=int, default=0,
+                    help="number of ground-truth point tracks to compute (0 to disable).")
 parser.set_defaults(save_state=False, frame_end=24, frame_rate=12,
                     resolution=256)
 FLAGS = parser.parse_args()
@@ -216,6 +221,10 @@ else:
 num_static_objects = rng.randint(FLAGS.min_num_static_objects,
                                  FLAGS.max_num_static_objects+1)
 logging.info("Randomly placing %d static objects:", num_static_objects)
+# objects with precomputed resting poses are placed at rest, which makes settling unnecessary
+gso_geometry = kb.assets.GeometryIndex.from_manifest(FLAGS.gso_assets, missing_ok=True)
+needs_settling = FLAGS.settle_static_objects
+static_objects = []
 for i in range(num_static_objects):
   obj = gso.create(asset_id=rng.choice(active_split))
   assert isinstance(obj, kb.FileBasedObject)
@@ -223,16 +232,29 @@ for i in range(num_static_objects):
   obj.scale = scale / np.max(obj.bounds[1] - obj.bounds[0])
   obj.metadata["scale"] = scale
   scene += obj
-  kb.move_until_no_overlap(obj, simulator, spawn_region=STATIC_SPAWN_REGION,
-                           rng=rng)
+  if (FLAGS.settle_static_objects or gso_geometry is None
+      or not gso_geometry.has_resting_poses(obj.asset_id)):
+    kb.move_until_no_overlap(obj, simulator, spawn_region=STATIC_SPAWN_REGION,
+                             rng=rng)
+    needs_settling = True
+  else:
+    try:
+      kb.place_in_resting_pose(obj, gso_geometry, others=static_objects,
+                               spawn_region=STATIC_SPAWN_REGION, rng=rng)
+    except RuntimeError:  # no free spot among the other objects, fall back to settling
+      kb.move_until_no_overlap(obj, simulator, spawn_region=STATIC_SPAWN_REGION,
+                               rng=rng)
+      needs_settling = True
+  static_objects.append(obj)
   obj.friction = 1.0
   obj.restitution = 0.0
   obj.metadata["is_dynamic"] = False
   logging.info("    Added %s at %s", obj.asset_id, obj.position)
 
 
-logging.info("Running 100 frames of simulation to let static objects settle ...")
-_, _ = simulator.run(frame_start=-100, frame_end=0)
+if needs_settling:
+  logging.info("Running 100 frames of simulation to let static objects settle ...")
+  _, _ = simulator.run(frame_start=-100, frame_end=0)
 
 
 # stop any objects that are still moving and reset friction / restitution
@@ -316,6 +338,12 @@ kb.write_json(filename=output_dir / "metadata.json", data={
     "camera": kb.get_camera_info(scene.camera),
     "instances": kb.get_instance_info(scene, visible_foreground_assets),
 })
+if FLAGS.point_tracks > 0:
+  logging.info("Computing %d point tracks.", FLAGS.point_tracks)
+  kb.write_pkl(kb.compute_point_tracks(
+      data_stack, kb.get_camera_info(scene.camera),
+      kb.get_instance_info(scene, visible_foreground_assets),
+      tracks_to_sample=FLAGS.point_tracks, rng=rng), output_dir / "point_tracks.pkl")
 kb.write_json(filename=output_dir / "events.json", data={
     "collisions":  kb.process_collisions(
         collisions, scene, assets_subset=visible_foreground_assets),
@@ -0,0 +1,69 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures the CPU throughput (examples/s) of the point tracking loaders.
+
+Compares tracking on the fly (create_point_tracking_dataset) with reading a
+cache written by precompute_tracks.py (create_cached_point_tracking_dataset).
+
+Usage:
+  python3 benchmark.py --cache_dir=/data/movi_e_tracks --num_examples=200
+"""
+
+import argparse
+import time
+
+import dataset
+import tensorflow.compat.v1 as tf
+
+
+def measure(ds, num_examples, warmup=10):
+  """Returns examples/s after a few warmup examples (filling the pipeline)."""
+  it = iter(ds)
+  for _ in range(warmup):
+    next(it)
+  start = time.perf_counter()
+  for _ in range(num_examples):
+    next(it)
+  return num_examples / (time.perf_counter() - start)
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--cache_dir', required=True)
+  parser.add_argument('--split', default='train')
+  parser.add_argument('--num_examples', type=int, default=200)
+  parser.add_argument('--tracks_to_sample', type=int, default=256)
+  parser.add_argument('--num_parallel_calls', type=int, default=16)
+  args = parser.parse_args()
+  tf.config.set_visible_devices([], 'GPU')
+
+  on_the_fly = dataset.create_point_tracking_dataset(
+      split=args.split,
+      tracks_to_sample=args.tracks_to_sample,
+      num_parallel_point_extraction_calls=args.num_parallel_calls)
+  cached = dataset.create_cached_point_tracking_dataset(
+      args.cache_dir,
+      split=args.split,
+      tracks_to_sample=args.tracks_to_sample,
+      num_parallel_calls=args.num_parallel_calls)
+
+  before = measure(on_the_fly, args.num_examples)
+  print(f'on the fly: {before:.2f} examples/s')
+  after = measure(cached, args.num_examples)
+  print(f'cached:     {after:.2f} examples/s ({after / before:.1f}x)')
+
+
+if __name__ == '__main__':
+  main()
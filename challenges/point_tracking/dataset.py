@@ -16,6 +16,8 @@
 
 import functools
 import itertools
+import json
+import os
 
 import matplotlib.pyplot as plt
 import mediapy as media
@@ -884,6 +886,29 @@ def add_tracks(data,
   if any([s % sampling_stride != 0 for s in shp[:-1]]):
     raise ValueError('All video dims must be a multiple of sampling_stride.')
 
+  crop_window = _sample_crop_window(shp, random_crop)
+
+  query_points, target_points, occluded, relative_depth = track_points(
+      data['object_coordinates'], data['depth'],
+      data['metadata']['depth_range'], data['segmentations'],
+      data['normal'],
+      data['instances']['bboxes_3d'], data['instances']['quaternions'],
+      data['camera']['focal_length'],
+      data['camera']['positions'], data['camera']['quaternions'],
+      data['camera']['sensor_width'], crop_window, tracks_to_sample,
+      sampling_stride, max_seg_id, max_sampled_frac, snap_to_occluder)
+  query_points.set_shape([tracks_to_sample, 3])
+  target_points.set_shape([tracks_to_sample, num_frames, 2])
+  relative_depth.set_shape([tracks_to_sample, num_frames])
+  occluded.set_shape([tracks_to_sample, num_frames])
+
+  return _crop_video_and_tracks(data['video'], crop_window, query_points,
+                                target_points, occluded, relative_depth,
+                                train_size, vflip)
+
+
+def _sample_crop_window(shp, random_crop):
+  """Sample a crop window [y_min, x_min, y_max, x_max] for a video shape."""
   bbox = tf.constant([0.0, 0.0, 1.0, 1.0], dtype=tf.float32, shape=[1, 1, 4])
   min_area = 0.3
   max_area = 1.0
@@ -901,32 +926,23 @@ def add_tracks(data,
     crop_window = tf.constant([0, 0, shp[1], shp[2]],
                               dtype=tf.int32,
                               shape=[4])
+  return crop_window
 
-  query_points, target_points, occluded, relative_depth = track_points(
-      data['object_coordinates'], data['depth'],
-      data['metadata']['depth_range'], data['segmentations'],
-      data['normal'],
-      data['instances']['bboxes_3d'], data['instances']['quaternions'],
-      data['camera']['focal_length'],
-      data['camera']['positions'], data['camera']['quaternions'],
-      data['camera']['sensor_width'], crop_window, tracks_to_sample,
-      sampling_stride, max_seg_id, max_sampled_frac, snap_to_occluder)
-  video = data['video']
 
+def _crop_video_and_tracks(video, crop_window, query_points, target_points,
+                           occluded, relative_depth, train_size, vflip):
+  """Crop the video to the window of the tracks and assemble an example."""
   shp = video.shape.as_list()
-  query_points.set_shape([tracks_to_sample, 3])
-  target_points.set_shape([tracks_to_sample, num_frames, 2])
-  relative_depth.set_shape([tracks_to_sample, num_frames])
-  occluded.set_shape([tracks_to_sample, num_frames])
+  num_frames = shp[0]
 
   # Crop the video to the sampled window, in a way which matches the coordinate
   # frame produced the track_points functions.
-  crop_window = crop_window / (
+  crop_window = tf.cast(crop_window, tf.float32) / (
       np.array(shp[1:3] + shp[1:3]).astype(np.float32) - 1)
   crop_window = tf.tile(crop_window[tf.newaxis, :], [num_frames, 1])
   video = tf.image.crop_and_resize(
       video,
-      tf.cast(crop_window, tf.float32),
+      crop_window,
       tf.range(num_frames),
       train_size,
   )
@@ -1020,6 +1036,306 @@ def create_point_tracking_dataset(
   return ds
 
 
+# Name of the file describing an offline track cache (see write_track_cache).
+TRACK_CACHE_INFO = 'track_cache.json'
+
+# Fields of a cached example, in the order in which they are serialized.
+_TRACK_CACHE_FIELDS = (
+    ('video', tf.uint8),
+    ('crop_windows', tf.int32),
+    ('query_points', tf.float32),
+    ('target_points', tf.float32),
+    ('occluded', tf.bool),
+    ('relative_depth', tf.float32),
+)
+
+
+def compute_track_variants(data,
+                           num_variants=4,
+                           random_crop=True,
+                           tracks_to_sample=1024,
+                           sampling_stride=4,
+                           max_seg_id=25,
+                           max_sampled_frac=0.1,
+                           snap_to_occluder=False):
+  """Track points for several crop windows of a single Kubric video.
+
+  This runs the expensive part of add_tracks (reprojection and occlusion
+  estimation) once per crop window, so that the results can be cached offline
+  by write_track_cache.
+
+  Args:
+    data: Kubric data, including RGB/depth/object coordinate/segmentation
+      videos and camera parameters.
+    num_variants: Number of crop windows (each with its own tracks) per video.
+    random_crop: Whether to randomly crop videos
+    tracks_to_sample: Number of tracks to compute per crop window.  The loader
+      samples its (smaller or equal) number of tracks from these.
+    sampling_stride: For efficiency, query points are sampled from a random grid
+      of this stride.
+    max_seg_id: The maxium segment id in the video.
+    max_sampled_frac: The maximum fraction of points to sample from each
+      object, out of all points that lie on the sampling grid.
+    snap_to_occluder: See add_tracks.
+
+  Returns:
+    A dict with the uncropped uint8 video, the crop windows of shape
+    [num_variants, 4] and query_points, target_points, occluded and
+    relative_depth with an additional leading num_variants dimension.
+  """
+  shp = data['video'].shape.as_list()
+  num_frames = shp[0]
+  if any([s % sampling_stride != 0 for s in shp[:-1]]):
+    raise ValueError('All video dims must be a multiple of sampling_stride.')
+
+  variants = []
+  for _ in range(num_variants):
+    crop_window = _sample_crop_window(shp, random_crop)
+    variants.append((crop_window,) + track_points(
+        data['object_coordinates'], data['depth'],
+        data['metadata']['depth_range'], data['segmentations'],
+        data['normal'],
+        data['instances']['bboxes_3d'], data['instances']['quaternions'],
+        data['camera']['focal_length'],
+        data['camera']['positions'], data['camera']['quaternions'],
+        data['camera']['sensor_width'], crop_window, tracks_to_sample,
+        sampling_stride, max_seg_id, max_sampled_frac, snap_to_occluder))
+  crop_windows, query_points, target_points, occluded, relative_depth = [
+      tf.stack(x) for x in zip(*variants)]
+
+  query_points.set_shape([num_variants, tracks_to_sample, 3])
+  target_points.set_shape([num_variants, tracks_to_sample, num_frames, 2])
+  relative_depth.set_shape([num_variants, tracks_to_sample, num_frames])
+  occluded.set_shape([num_variants, tracks_to_sample, num_frames])
+  return {
+      'video': tf.cast(data['video'], tf.uint8),
+      'crop_windows': tf.cast(crop_windows, tf.int32),
+      'query_points': query_points,
+      'target_points': target_points,
+      'occluded': tf.cast(occluded, tf.bool),
+      'relative_depth': relative_depth,
+  }
+
+
+def _serialize_track_variants(example):
+  return tf.io.serialize_tensor(tf.stack([
+      tf.io.serialize_tensor(example[name]) for name, _ in _TRACK_CACHE_FIELDS
+  ]))
+
+
+def _parse_track_variants(record, info):
+  fields = tf.io.parse_tensor(record, tf.string)
+  example = {
+      name: tf.io.parse_tensor(fields[i], dtype)
+      for i, (name, dtype) in enumerate(_TRACK_CACHE_FIELDS)
+  }
+  num_variants, num_tracks = info['num_variants'], info['tracks_to_sample']
+  num_frames, height, width = info['num_frames'], info['height'], info['width']
+  example['video'].set_shape([num_frames, height, width, 3])
+  example['crop_windows'].set_shape([num_variants, 4])
+  example['query_points'].set_shape([num_variants, num_tracks, 3])
+  example['target_points'].set_shape([num_variants, num_tracks, num_frames, 2])
+  example['occluded'].set_shape([num_variants, num_tracks, num_frames])
+  example['relative_depth'].set_shape([num_variants, num_tracks, num_frames])
+  return example
+
+
+def read_track_cache_info(cache_dir):
+  with tf.io.gfile.GFile(os.path.join(cache_dir, TRACK_CACHE_INFO), 'r') as fp:
+    return json.load(fp)
+
+
+def write_track_cache(cache_dir,
+                      split='train',
+                      num_shards=64,
+                      max_examples=None,
+                      seed=0,
+                      num_variants=4,
+                      random_crop=True,
+                      tracks_to_sample=1024,
+                      sampling_stride=4,
+                      max_seg_id=25,
+                      max_sampled_frac=0.1,
+                      snap_to_occluder=False,
+                      num_parallel_point_extraction_calls=16,
+                      **kwargs):
+  """Precompute point tracks for a split of MOVi-E and write them to shards.
+
+  Every video is stored once (as uint8) together with num_variants sets of
+  tracks, each computed for its own crop window.  The shards are ZLIB
+  compressed TFRecord files named {split}-{index:05d}-of-{num_shards:05d}; the
+  parameters of every split are written to TRACK_CACHE_INFO.  See
+  create_cached_point_tracking_dataset for reading the cache.
+
+  Args:
+    cache_dir: Directory to write the shards to.
+    split: Which split to precompute.
+    num_shards: Number of shards the examples are distributed over.
+    max_examples: Int. If set, only the first max_examples videos are cached.
+    seed: Int. Random seed for the crop windows and query points.
+    num_variants: Number of crop windows (each with its own tracks) per video.
+    random_crop: Whether to randomly crop videos.
+    tracks_to_sample: Number of tracks to compute per crop window.  This is the
+      maximum number of tracks the loader can sample per example.
+    sampling_stride: See add_tracks.
+    max_seg_id: See add_tracks.
+    max_sampled_frac: See add_tracks.
+    snap_to_occluder: See add_tracks.
+    num_parallel_point_extraction_calls: Int. The num_parallel_calls for the
+      map function for point extraction.
+    **kwargs: additional args to pass to tfds.load.
+
+  Returns:
+    The number of cached examples.
+  """
+  tf.random.set_random_seed(seed)
+  ds = tfds.load(
+      'movi_e/256x256',
+      data_dir='gs://kubric-public/tfds',
+      shuffle_files=False,
+      **kwargs)[split]
+  if max_examples is not None:
+    ds = ds.take(max_examples)
+  ds = ds.map(
+      functools.partial(
+          compute_track_variants,
+          num_variants=num_variants,
+          random_crop=random_crop,
+          tracks_to_sample=tracks_to_sample,
+          sampling_stride=sampling_stride,
+          max_seg_id=max_seg_id,
+          max_sampled_frac=max_sampled_frac,
+          snap_to_occluder=snap_to_occluder),
+      num_parallel_calls=num_parallel_point_extraction_calls)
+  shapes = ds.element_spec['video'].shape.as_list()
+  ds = ds.map(_serialize_track_variants)
+
+  tf.io.gfile.makedirs(cache_dir)
+  options = tf.io.TFRecordOptions(compression_type='ZLIB')
+  writers = [
+      tf.io.TFRecordWriter(
+          os.path.join(cache_dir, f'{split}-{i:05d}-of-{num_shards:05d}'),
+          options) for i in range(num_shards)
+  ]
+  num_examples = 0
+  for record in ds:
+    writers[num_examples % num_shards].write(record.numpy())
+    num_examples += 1
+  for writer in writers:
+    writer.close()
+
+  # The parameters are stored per split, since every split can be written (and
+  # rewritten) separately with different parameters.
+  info_path = os.path.join(cache_dir, TRACK_CACHE_INFO)
+  info = read_track_cache_info(cache_dir) if tf.io.gfile.exists(info_path) else {}
+  info.setdefault('splits', {})[split] = {
+      'num_examples': num_examples,
+      'num_shards': num_shards,
+      'num_frames': shapes[0],
+      'height': shapes[1],
+      'width': shapes[2],
+      'num_variants': num_variants,
+      'tracks_to_sample': tracks_to_sample,
+      'random_crop': random_crop,
+      'sampling_stride': sampling_stride,
+      'max_seg_id': max_seg_id,
+      'max_sampled_frac': max_sampled_frac,
+      'snap_to_occluder': snap_to_occluder,
+      'seed': seed,
+  }
+  with tf.io.gfile.GFile(info_path, 'w') as fp:
+    json.dump(info, fp, indent=2)
+  return num_examples
+
+
+def _sample_cached_tracks(record, info, train_size, vflip, tracks_to_sample):
+  """Pick a crop window and a subset of its tracks from a cached example."""
+  example = _parse_track_variants(record, info)
+  variant = tf.random.uniform([], maxval=info['num_variants'], dtype=tf.int32)
+  idx = tf.random.shuffle(tf.range(info['tracks_to_sample']))[:tracks_to_sample]
+
+  def select(name):
+    return tf.gather(example[name][variant], idx)
+
+  return _crop_video_and_tracks(example['video'],
+                                example['crop_windows'][variant],
+                                select('query_points'),
+                                select('target_points'),
+                                select('occluded'),
+                                select('relative_depth'),
+                                train_size, vflip)
+
+
+def create_cached_point_tracking_dataset(
+    cache_dir,
+    train_size=(256, 256),
+    shuffle_buffer_size=256,
+    split='train',
+    batch_dims=tuple(),
+    repeat=True,
+    vflip=False,
+    tracks_to_sample=256,
+    num_parallel_calls=16):
+  """Construct a point tracking dataset from precomputed tracks.
+
+  Produces the same examples as create_point_tracking_dataset, but reads the
+  tracks from a cache written by write_track_cache, so that only sampling,
+  cropping and batching happen during training.
+
+  Args:
+    cache_dir: Directory with the cache (see write_track_cache).
+    train_size: Tuple of 2 ints. Cropped output will be at this resolution
+    shuffle_buffer_size: Int. Size of the shuffle buffer
+    split: Which split to read from the cache.
+    batch_dims: Sequence of ints. Add multiple examples into a batch of this
+      shape.
+    repeat: Bool. whether to repeat the dataset.
+    vflip: Bool. whether to vertically flip the dataset to test generalization.
+    tracks_to_sample: Int. Number of tracks to sample per video; at most the
+      number of tracks in the cache.
+    num_parallel_calls: Int. The num_parallel_calls for reading and sampling.
+
+  Returns:
+    The dataset generator.
+  """
+  info = read_track_cache_info(cache_dir).get('splits', {}).get(split)
+  if info is None:
+    raise ValueError(f'Split {split} is not in the track cache {cache_dir}.')
+  if tracks_to_sample > info['tracks_to_sample']:
+    raise ValueError(
+        f'Cannot sample {tracks_to_sample} tracks from a cache with '
+        f'{info["tracks_to_sample"]} tracks per video.')
+
+  # shards of an earlier write of the split with another num_shards are stale
+  shards = sorted(tf.io.gfile.glob(os.path.join(
+      cache_dir, f'{split}-*-of-{info["num_shards"]:05d}')))
+  ds = tf.data.Dataset.from_tensor_slices(shards)
+  if shuffle_buffer_size is not None:
+    ds = ds.shuffle(len(shards))
+  if repeat:
+    ds = ds.repeat()
+  cycle_length = min(len(shards), num_parallel_calls)
+  ds = ds.interleave(
+      lambda path: tf.data.TFRecordDataset(path, compression_type='ZLIB'),
+      cycle_length=cycle_length,
+      num_parallel_calls=cycle_length)
+  ds = ds.map(
+      functools.partial(
+          _sample_cached_tracks,
+          info=info,
+          train_size=train_size,
+          vflip=vflip,
+          tracks_to_sample=tracks_to_sample),
+      num_parallel_calls=num_parallel_calls)
+  if shuffle_buffer_size is not None:
+    ds = ds.shuffle(shuffle_buffer_size)
+
+  for bs in batch_dims[::-1]:
+    ds = ds.batch(bs)
+
+  return ds.prefetch(tf.data.experimental.AUTOTUNE)
+
+
 def plot_tracks(rgb, points, occluded, trackgroup=None):
   """Plot tracks with matplotlib."""
   disp = []
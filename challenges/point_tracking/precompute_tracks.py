@@ -0,0 +1,66 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Precompute point tracks for MOVi-E into a sharded cache.
+
+Usage:
+  python3 precompute_tracks.py --cache_dir=/data/movi_e_tracks --split=train \
+      --num_variants=4 --tracks_to_sample=1024
+"""
+
+import argparse
+import time
+
+import dataset
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--cache_dir', required=True)
+  parser.add_argument('--split', action='append',
+                      help='Split(s) to precompute (default: train and validation).')
+  parser.add_argument('--num_shards', type=int, default=64)
+  parser.add_argument('--max_examples', type=int, default=None)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--num_variants', type=int, default=4,
+                      help='Number of crop windows (with their own tracks) per video.')
+  parser.add_argument('--tracks_to_sample', type=int, default=1024,
+                      help='Number of tracks per crop window.')
+  parser.add_argument('--no_random_crop', dest='random_crop', action='store_false')
+  parser.add_argument('--sampling_stride', type=int, default=4)
+  parser.add_argument('--max_seg_id', type=int, default=25)
+  parser.add_argument('--max_sampled_frac', type=float, default=0.1)
+  parser.add_argument('--snap_to_occluder', action='store_true')
+  args = parser.parse_args()
+
+  for split in args.split or ['train', 'validation']:
+    start = time.time()
+    num_examples = dataset.write_track_cache(
+        args.cache_dir,
+        split=split,
+        num_shards=args.num_shards,
+        max_examples=args.max_examples,
+        seed=args.seed,
+        num_variants=args.num_variants,
+        random_crop=args.random_crop,
+        tracks_to_sample=args.tracks_to_sample,
+        sampling_stride=args.sampling_stride,
+        max_seg_id=args.max_seg_id,
+        max_sampled_frac=args.max_sampled_frac,
+        snap_to_occluder=args.snap_to_occluder)
+    print(f'Cached {num_examples} {split} examples in {time.time() - start:.1f}s')
+
+
+if __name__ == '__main__':
+  main()
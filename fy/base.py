@@ -2,7 +2,7 @@
 import logging
 import bpy
 import kubric as kb
-from kubric.simulator import PyBullet
+from kubric.simulator import PyBullet, SimulationCache
 from kubric.renderer import Blender
 import numpy as np
 import os
@@ -10,6 +10,7 @@ import abc
 from etils import epath
 from kubric import core
 from kubric.core import color
+from kubric import tracing
 import random
 from scipy.spatial.transform import Rotation
 from mathutils import Euler
@@ -25,10 +26,37 @@ VELOCITY_RANGE = [(-4., -4., 0.), (4., 4., 0.)]
 
 SCENE_EXCLUDE = ["wobbly_bridge"]
 
+_simulation_caches = {}
+
+
+def simulation_cache(flags):
+    """The SimulationCache selected by the flags (one per directory and process), or None."""
+    cache_dir = getattr(flags, "simulation_cache_dir", None)
+    if not cache_dir:
+        return None
+    if cache_dir not in _simulation_caches:
+        size_gb = getattr(flags, "simulation_cache_size_gb", None)
+        max_size_bytes = int(size_gb * 1024**3) if size_gb else None
+        _simulation_caches[cache_dir] = SimulationCache(cache_dir, max_size_bytes=max_size_bytes)
+    return _simulation_caches[cache_dir]
+
+
+SHAPENET_MANIFEST = "gs://kubric-unlisted/assets/ShapeNetCore.v2.json"
+GSO_MANIFEST = "gs://kubric-public/assets/GSO/GSO.json"
+
+# size classes of GSO objects by their largest extent (at scale 1), used when the hand-made
+# lists in fy/configs are missing but a geometry index exists
+GSO_SIZE_CLASSES = {
+    "super_small_object_asset_id_list": (None, 0.08),
+    "small_object_asset_id_list": (0.08, 0.18),
+    "big_object_asset_id_list": (0.18, 0.3),
+    "super_big_object_asset_id_list": (0.3, None),
+}
+
 print("loading shapenet")
-shapenet_assets = kb.AssetSource.from_manifest("gs://kubric-unlisted/assets/ShapeNetCore.v2.json")
+shapenet_assets = kb.AssetSource.from_manifest(SHAPENET_MANIFEST)
 print("loading gso")
-gso_assets = kb.AssetSource.from_manifest("gs://kubric-public/assets/GSO/GSO.json")
+gso_assets = kb.AssetSource.from_manifest(GSO_MANIFEST)
 print("loading kubasic")
 kubasic_assets = kb.AssetSource.from_manifest("gs://kubric-public/assets/KuBasic/KuBasic.json")
 print("loading hdri")
@@ -81,11 +109,15 @@ class BaseTestScene(abc.ABC):
         self.block_name = "block_kb"
 
         self.render_data = ("rgba",)
+        self.write_handles = []  # pending background writes of the rendered frames
         self.background_hdri_id = FLAGS.background_hdri_id
 
         self.render_speedup = True
 
         self.test_obj_states = {"violation": None, "non_violation": None}
+        # the scene background: an indoor .blend file, or an HDRI dome
+        self.blender_scene = None
+        self.dome = None
         self.test_obj = None
         self.default_camera_pos = [0, 0, 1]
         self.camera_look_at = [0,0,0]
@@ -94,6 +126,8 @@ class BaseTestScene(abc.ABC):
         self.kubasic = kubasic_assets # kb.AssetSource.from_manifest(FLAGS.kubasic_assets)
         self.gso = gso_assets # kb.AssetSource.from_manifest(FLAGS.gso_assets)
         self.hdri_source = hdri_assets # kb.AssetSource.from_manifest(FLAGS.hdri_assets)
+        # the names under which assets are referenced in scene specs
+        self.asset_sources = {"gso": self.gso, "shapenet": shapenet_assets, "kubasic": self.kubasic}
 
         # load background ids
         if os.path.exists("fy/configs/scene_asset_ids.txt"):
@@ -124,6 +158,17 @@ class BaseTestScene(abc.ABC):
                 self.super_small_object_asset_id_list = f.read().split("\n")
             logging.info(f"Loaded {len(self.super_small_object_asset_id_list)} allowed super small object asset ids from file.")
                 
+        # geometry indices (see kubric/scripts/build_geometry_index.py) are optional; they answer
+        # size queries without creating the assets
+        self.gso_geometry = kb.assets.GeometryIndex.from_manifest(GSO_MANIFEST, missing_ok=True)
+        self.shapenet_geometry = kb.assets.GeometryIndex.from_manifest(SHAPENET_MANIFEST,
+                                                                       missing_ok=True)
+        if self.gso_geometry is not None:
+            for attr, max_extent in GSO_SIZE_CLASSES.items():
+                if not hasattr(self, attr):
+                    setattr(self, attr, self.gso_geometry.query(max_extent=max_extent))
+                    logging.info(f"Selected {len(getattr(self, attr))} asset ids for {attr} from the geometry index.")
+
         if os.path.exists("fy/configs/gso_all_obj_asset_ids.txt"):
             with open("fy/configs/gso_all_obj_asset_ids.txt", "r") as f:
                 all_gso_ids = f.read().split("\n")
@@ -153,6 +198,9 @@ class BaseTestScene(abc.ABC):
         self.table_id = None
         self.is_add_background_static_objects = True
         self.is_add_background_dynamic_objects = True
+        # collision level of detail of background objects (see kubric.assets.collision_lods),
+        # they do not need fine contacts; None uses the default collision geometry
+        self.background_collision_lod = "coarse"
         # used to render views from different angles
         self.alternative_camera_pos = None
         self.alternative_camera_look_at = None
@@ -238,6 +286,18 @@ class BaseTestScene(abc.ABC):
     #         # Check if the object is in FoV
     #         in_view[i] = objInFOV("small_obj")           
 
+    def _table_height(self, table):
+        """Height of the table top above the floor.
+
+        The geometry index knows the supporting surface of the table, which is below the top of
+        its bounding box for tables with e.g. a raised back board.
+        """
+        if self.shapenet_geometry is not None and table.asset_id in self.shapenet_geometry:
+            geometry = self.shapenet_geometry.get(table.asset_id, scale=self.table_scale)
+            if not np.isnan(geometry["support_height"]):
+                return geometry["support_height"] - geometry["bounds_min"][2]
+        return table.aabbox[1][2] - table.aabbox[0][2]
+
     def _set_camera_path(self, path_config):
         '''
         Set the camera's circular path
@@ -327,11 +387,11 @@ class BaseTestScene(abc.ABC):
          
         # get the objects with links
         linked_objs = []
-        for obj in bpy.data.objects:
+        for obj in bpy.context.scene.objects:
             for c in obj.children:
                 linked_objs.append(c)
 
-        for obj in bpy.data.objects: 
+        for obj in bpy.context.scene.objects:
             # linked objs are not rotated
             if obj in linked_objs or obj.name == "direc_light": 
                 continue
@@ -355,11 +415,16 @@ class BaseTestScene(abc.ABC):
             self.dynamic_objs = []
             self.static_objs = []
                 
-            self._setup_everything()
-            if self._check_scene():
-                self.generate_keyframes()
+            with tracing.span("setup_scene", attempt=self.i):
+                self._setup_everything()
+            with tracing.span("check_scene", attempt=self.i):
+                is_valid = self._check_scene()
+            if is_valid:
+                with tracing.span("generate_keyframes"):
+                    self.generate_keyframes()
                 return 
             logging.warning("Current scene is invalid. Regenerating ")
+            tracing.count("scene_retries")
             # self.renderer.save_state(f"temp_scene/invalid_{self.i}.blend")
             self.i += 1
             
@@ -391,8 +456,10 @@ class BaseTestScene(abc.ABC):
             blender_scene (_type_): _description_
         """
         scene = core.scene.Scene.from_flags(self.flags)
-        simulator = PyBullet(scene, self.scratch_dir)
-        renderer = Blender(scene, self.scratch_dir,custom_scene=blender_scene)
+        simulator = PyBullet(scene, self.scratch_dir, cache=simulation_cache(self.flags))
+        renderer = Blender(scene, self.scratch_dir,custom_scene=blender_scene,
+                           texture_resolution=getattr(self.flags, "texture_resolution", None),
+                           persistent_data=getattr(self.flags, "persistent_data", False))
         self.scene = scene
         self.simulator = simulator
         self.renderer = renderer
@@ -404,8 +471,10 @@ class BaseTestScene(abc.ABC):
         # --- Common setups & resources
         scene, rng, output_dir, scratch_dir = kb.setup(self.flags)
 
-        simulator = PyBullet(scene, scratch_dir)
-        renderer = Blender(scene, scratch_dir)
+        simulator = PyBullet(scene, scratch_dir, cache=simulation_cache(self.flags))
+        renderer = Blender(scene, scratch_dir,
+                           texture_resolution=getattr(self.flags, "texture_resolution", None),
+                           persistent_data=getattr(self.flags, "persistent_data", False))
 
         # --- Populate the scene
         # background HDRI
@@ -417,27 +486,9 @@ class BaseTestScene(abc.ABC):
             hdri_id = rng.choice(all_backgrounds)
             self.background_hdri_id = hdri_id
             logging.info(f"Choosing background {hdri_id} from {len(all_backgrounds)} background HDRI images")
-        background_hdri = self.hdri_source.create(asset_id=hdri_id)
-        assert isinstance(background_hdri, kb.Texture)
-        scene.metadata["background"] = hdri_id
-        renderer._set_ambient_light_hdri(background_hdri.filename)
-
-        # Dome
-        dome = self.kubasic.create(asset_id="dome", name="dome",
-                                friction=1.0,
-                                restitution=0.0,
-                                static=True, background=True)
-        assert isinstance(dome, kb.FileBasedObject)
-
-        dome.friction = self.flags.floor_friction
-        dome.restitution = self.flags.floor_restitution
-
-        scene += dome
-        dome_blender = dome.linked_objects[renderer]
-        texture_node = dome_blender.data.materials[0].node_tree.nodes["Image Texture"]
-        texture_node.image = bpy.data.images.load(background_hdri.filename)
-
-        self.set_random_rotation(dome,z_axis=True)
+        self.dome = self._add_hdri_dome(scene, renderer, hdri_id)
+        self.blender_scene = None
+        self.set_random_rotation(self.dome, z_axis=True)
 
         print("Setting up the Camera...")
         self._add_camera(scene)
@@ -466,7 +517,7 @@ class BaseTestScene(abc.ABC):
             table.scale = [self.table_scale] * 3
             table.quaternion = kb.Quaternion(axis=[1, 0, 0], degrees=90)
             table.position = table.position - (0, 0, table.aabbox[0][2])  
-            table_h = table.aabbox[1][2] - table.aabbox[0][2]
+            table_h = self._table_height(table)
             scene.add(table)
             set_name(self.table_name)
             self.ref_h = table_h
@@ -484,7 +535,33 @@ class BaseTestScene(abc.ABC):
         self.rng = rng
         self.output_dir = output_dir
         self.scratch_dir = scratch_dir
+
+    def _add_hdri_dome(self, scene, renderer, hdri_id):
+        """Light the scene with an HDRI and add a dome textured with it as the background.
+
+        Sets `self.background_hdri` to the HDRI texture and returns the dome.
+        """
+        background_hdri = self.hdri_source.create(asset_id=hdri_id)
+        assert isinstance(background_hdri, kb.Texture)
         self.background_hdri = background_hdri
+        scene.metadata["background"] = hdri_id
+        renderer._set_ambient_light_hdri(background_hdri.filename)
+
+        # Dome
+        dome = self.kubasic.create(asset_id="dome", name="dome",
+                                friction=1.0,
+                                restitution=0.0,
+                                static=True, background=True)
+        assert isinstance(dome, kb.FileBasedObject)
+
+        dome.friction = self.flags.floor_friction
+        dome.restitution = self.flags.floor_restitution
+
+        scene += dome
+        dome_blender = dome.linked_objects[renderer]
+        texture_node = dome_blender.data.materials[0].node_tree.nodes["Image Texture"]
+        texture_node.image = bpy.data.images.load(background_hdri.filename)
+        return dome
 
     def _add_camera(self, scene):
         scene.camera = kb.PerspectiveCamera(name="camera")
@@ -504,6 +581,8 @@ class BaseTestScene(abc.ABC):
         logging.info("Loading blender scene")
         blender_scene = rng.choice(self.scenes)
         self.load_blender_scene(blender_scene)
+        self.blender_scene = blender_scene
+        self.dome = None
         self._add_camera(self.scene)
 
         # self.scene.camera.position = self.default_camera_pos
@@ -535,7 +614,7 @@ class BaseTestScene(abc.ABC):
             table.scale = [self.table_scale] * 3
             table.quaternion = kb.Quaternion(axis=[1, 0, 0], degrees=90)
             table.position = table.position - (0, 0, table.aabbox[0][2])  
-            table_h = table.aabbox[1][2] - table.aabbox[0][2]
+            table_h = self._table_height(table)
             self.scene.add(table)
             set_name(self.table_name)
             self.ref_h = table_h
@@ -688,12 +767,56 @@ class BaseTestScene(abc.ABC):
         Returns:
             _type_: _description_
         """
-        data_stack = self.renderer.render(return_layers=self.render_data)
+        return self._render_and_save(save_to_file, **kwargs)
 
-        if save_to_file:
-            kb.write_image_dict(data_stack, self.output_dir, **kwargs)
+    def _render_and_save(self, save_to_file=False, cameras=None, output_dirs=None, **kwargs):
+        """Render all frames; if requested, stream the rgba frames into a video
+        while rendering and write the per-frame images afterwards (in the
+        background unless --no_async_writes is set, see write_handles).
 
-        return data_stack
+        With `cameras`, every frame is rendered from each camera before the next frame (see
+        Blender.render) and the results of the cameras are saved to the matching `output_dirs`.
+        """
+        views = [(None, self.output_dir)] if cameras is None else list(zip(cameras, output_dirs))
+        video_writers = []
+        frame_callbacks = [None] * len(views)
+        video_codec = getattr(self.flags, "video_codec", None)
+        if save_to_file and video_codec is not None:
+            extension = kb.file_io.VIDEO_CODECS[video_codec][0]
+            for i, (_, output_dir) in enumerate(views):
+                video_writer = kb.file_io.VideoWriter(output_dir / ("rgba" + extension),
+                                                      fps=self.scene.frame_rate,
+                                                      codec=video_codec,
+                                                      crf=self.flags.video_crf)
+                video_writers.append(video_writer)
+                frame_callbacks[i] = lambda _, layers, writer=video_writer: writer.write(
+                    layers["rgba"])
+
+        try:
+            with tracing.span("render", output_dir=views[0][1], num_views=len(views)):
+                if cameras is None:
+                    data_stacks = [self.renderer.render(return_layers=self.render_data,
+                                                        frame_callback=frame_callbacks[0])]
+                else:
+                    data_stacks = self.renderer.render(return_layers=self.render_data,
+                                                       frame_callback=frame_callbacks,
+                                                       cameras=cameras)
+        finally:
+            for video_writer in video_writers:
+                video_writer.close()
+
+        if save_to_file and getattr(self.flags, "save_frames", True):
+            # the frames are written in the background while the next view or scene renders
+            wait = not getattr(self.flags, "async_writes", True)
+            for data_stack, (_, output_dir) in zip(data_stacks, views):
+                self.write_handles.append(
+                    kb.write_image_dict(data_stack, output_dir, wait=wait, **kwargs))
+
+        return data_stacks[0] if cameras is None else data_stacks
+
+    def wait_for_writes(self, timeout=None):
+        """Block until all frames written by render() are on disk."""
+        kb.file_io.WriteHandle.combine(self.write_handles).wait(timeout=timeout)
         
     def write_metadata(self):
         
@@ -734,18 +857,42 @@ class BaseTestScene(abc.ABC):
         logging.info("Output directory changed to %s", self.output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
-    def add_background_static_objects(self, n_obj:int = 1):
+    def add_background_static_objects(self, n_obj:int = 1, settle: bool = False):
         """Add some static objects as background objects
 
+        Objects with precomputed resting poses (in the GSO geometry index) are put at rest on the
+        floor directly; the others (or all of them, if `settle`) are dropped and settled by 100
+        frames of simulation.
         """
+        needs_settling = settle
+        table = getattr(self, "table", None) if self.is_add_table else None
         for _ in range(n_obj):
             # self.add_object(is_dynamic=False)
-            obj = self.add_object()
+            asset_id = self.rng.choice(self.object_asset_id_list)
+            if (settle or self.gso_geometry is None
+                    or not self.gso_geometry.has_resting_poses(asset_id)):
+                obj = self.add_object(asset_id=asset_id,
+                                      collision_lod=self.background_collision_lod)
+                needs_settling = True
+            else:
+                obj = self.add_object(asset_id=asset_id, position=(0, 0, 0),
+                                      quaternion=(1, 0, 0, 0),
+                                      collision_lod=self.background_collision_lod)
+                try:
+                    others = self.static_objs + ([table] if table is not None else [])
+                    kb.place_in_resting_pose(obj, self.gso_geometry, others=others,
+                                             spawn_region=STATIC_SPAWN_REGION, rng=self.rng)
+                    tracing.count("resting_pose_placements")
+                except RuntimeError:
+                    kb.move_until_no_overlap(obj, self.simulator,
+                                             spawn_region=STATIC_SPAWN_REGION, rng=self.rng)
+                    needs_settling = True
             self.static_objs.append(obj)
 
-            
-        logging.info("Running 100 frames of simulation to let static objects settle ...")
-        _, _ = self.simulator.run(frame_start=-100, frame_end=0)
+        if needs_settling:
+            logging.info("Running 100 frames of simulation to let static objects settle ...")
+            with tracing.span("settling_simulation", n_obj=n_obj):
+                _, _ = self.simulator.run(frame_start=-100, frame_end=0)
 
     def add_background_dynamic_objects(self, 
                                        n_obj:int = 1, 
@@ -772,7 +919,8 @@ class BaseTestScene(abc.ABC):
             obj = self.add_object(position=rand_pos,
                             velocity=rand_vel,
                             is_dynamic=True,
-                            scale=scale)
+                            scale=scale,
+                            collision_lod=self.background_collision_lod)
             self.dynamic_objs.append(obj)
 
     def _save_bg_objs_states(self):
@@ -806,7 +954,7 @@ class BaseTestScene(abc.ABC):
                                 name=self.block_name
                                 )
 
-        aligh_block_objs(self.block_obj)
+        aligh_block_objs(self.block_obj, geometry_index=self.gso_geometry)
 
         self.block_obj.position = (0, 0, self.ref_h + 0.001 - self.block_obj.aabbox[0][2])
 
@@ -927,8 +1075,147 @@ class BaseTestScene(abc.ABC):
     def load_non_violation_scene(self):
         for i, obj in enumerate(self.test_obj):
             self.set_object_keyframes(obj, self.test_obj_states["non_violation"][i])
-        
+
+    def get_scene_spec(self):
+        """Compact description of the prepared scene (see kubric.scene_spec)
+
+        Holds the assets (ids, scales, materials) and lights, the HDRI and its rotation or the
+        indoor .blend file, the camera and its path, and the keyframes of the test objects for the
+        violation and non-violation branches. `load_scene_spec` re-creates the scene from it, e.g.
+        in a rendering process, instead of loading a (packed) .blend file.
+        """
+        frames = list(range(0, self.scene.frame_end + 1))  # as in get_object_keyframes
+        test_obj = list(self.test_obj or [])
+        branches = {}
+        for branch, states in self.test_obj_states.items():
+            if states is None:
+                continue
+            branches[branch] = [
+                {"start": frames[0], **{prop: [state[prop][frame] for frame in frames]
+                                        for prop in kb.scene_spec.ANIMATED_PROPERTIES}}
+                for state in states]
+
+        camera_path = None
+        if self.is_move_camera and self.cur_camera_traj_idx is not None:
+            camera_path = {"config": self.camera_path_config[self.cur_camera_traj_idx],
+                           "focus_point": [0, 0, self.ref_h]}
+        hdri = None
+        if self.dome is not None:
+            hdri = {"asset_id": self.background_hdri_id, "rotation": self.dome.quaternion}
+        hidden = [asset.name for asset in self.scene.assets
+                  if getattr(asset.linked_objects.get(self.renderer), "hide_render", False)]
+        direc_light = bpy.data.objects.get("direc_light")
+
+        return kb.scene_spec.scene_spec(
+            self.scene, self.asset_sources, frames=frames,
+            # the dome is re-created with the HDRI, the test objects with their branches
+            exclude=test_obj + ([self.dome] if self.dome is not None else []),
+            scene_class=type(self).__name__,
+            blender_scene=self.blender_scene,
+            hdri=hdri,
+            ref_h=self.ref_h,
+            camera_path=camera_path,
+            alternative_camera={"position": self.alternative_camera_pos,
+                                "look_at": self.alternative_camera_look_at},
+            light_shadow_soft_size=direc_light.data.shadow_soft_size if direc_light else None,
+            hidden=hidden,
+            table=self.table_id,
+            test_objects=[kb.scene_spec.asset_spec(
+                obj, kb.scene_spec.source_of(obj, self.asset_sources)) for obj in test_obj],
+            branches=branches,
+        )
+
+    def write_scene_spec(self, filename="scene_spec.json.gz"):
+        kb.scene_spec.write_scene_spec(self.get_scene_spec(), self.output_dir / filename)
+
+    def load_scene_spec(self, spec):
+        """Re-create a scene from `get_scene_spec` for rendering (it is not simulated again)
+
+        Afterwards the non-violation keyframes are loaded and `load_violation_scene`,
+        `render_alternative_view` etc. work as after `prepare_scene`.
+        """
+        scene, rng, output_dir, scratch_dir = kb.setup(self.flags)
+        self.rng = rng
+        self.output_dir = output_dir
+        self.scratch_dir = scratch_dir
+        self.blender_scene = spec["blender_scene"]
+        if self.blender_scene is not None:
+            self.load_blender_scene(self.blender_scene)
+        else:
+            self.scene = scene
+            self.renderer = Blender(
+                scene, scratch_dir,
+                texture_resolution=getattr(self.flags, "texture_resolution", None),
+                persistent_data=getattr(self.flags, "persistent_data", False))
+        self._add_camera(self.scene)
+
+        self.dome = None
+        self.background_hdri = None
+        if spec["hdri"] is not None:
+            self.background_hdri_id = spec["hdri"]["asset_id"]
+            self.dome = self._add_hdri_dome(self.scene, self.renderer, self.background_hdri_id)
+            self.dome.quaternion = spec["hdri"]["rotation"]
+
+        # the path constraint resets the camera location, the camera traits are set afterwards
+        self.ref_h = spec["ref_h"]
+        if spec["camera_path"] is not None:
+            self._set_camera_path(spec["camera_path"]["config"])
+            self._set_camera_focus_point(spec["camera_path"]["focus_point"])
+
+        num_assets = len(spec["assets"])
+        _, assets = kb.scene_spec.build_scene(
+            dict(spec, assets=spec["assets"] + spec["test_objects"]), self.asset_sources,
+            scene=self.scene)
+        for asset in assets:
+            if asset.name != type(asset).__name__:
+                set_name(asset.name)
+            if isinstance(asset, kb.PhysicalObject):
+                asset.metadata.setdefault("is_dynamic", not asset.static)
+        for name in spec["hidden"]:
+            bpy.data.objects[name].hide_render = True
+            bpy.data.objects[name].hide_viewport = True
+        if spec["light_shadow_soft_size"] is not None:
+            bpy.data.objects["direc_light"].data.shadow_soft_size = spec["light_shadow_soft_size"]
+
+        self.table_id = spec["table"]
+        self.alternative_camera_pos = spec["alternative_camera"]["position"]
+        self.alternative_camera_look_at = spec["alternative_camera"]["look_at"]
+        self.test_obj = assets[num_assets:]
+        self.test_obj_states = {"violation": None, "non_violation": None}
+        for branch, keyframes in spec["branches"].items():
+            self.test_obj_states[branch] = [
+                {prop: dict(enumerate(values, start=obj_keyframes["start"]))
+                 for prop, values in obj_keyframes.items() if prop != "start"}
+                for obj_keyframes in keyframes]
+        if self.test_obj_states["non_violation"] is not None:
+            self.load_non_violation_scene()
+
     
+    def render_with_alternative_view(self, output_dirs, save_to_file=False, **kwargs):
+        """Render the non-violation scene from the scene camera and the alternative view
+
+        Both views are rendered in a single pass over the frames, so they share the scene
+        evaluation and the Cycles BVH of every frame (unlike render + render_alternative_view).
+
+        Args:
+            output_dirs: the output directories of the scene camera and the alternative view.
+
+        Returns:
+            The data stacks of both views.
+        """
+        self.load_non_violation_scene() # only used for non-violation scene
+        camera = self.scene.camera
+        alternative_camera = kb.PerspectiveCamera(name="camera_view_2",
+                                                  focal_length=camera.focal_length,
+                                                  sensor_width=camera.sensor_width,
+                                                  position=self.alternative_camera_pos,
+                                                  look_at=self.alternative_camera_look_at)
+        output_dirs = [epath.Path(output_dir) for output_dir in output_dirs]
+        for output_dir in output_dirs:
+            output_dir.mkdir(parents=True, exist_ok=True)
+        return self._render_and_save(save_to_file, cameras=[camera, alternative_camera],
+                                     output_dirs=output_dirs, **kwargs)
+
     def render_alternative_view(self, save_to_file=False, **kwargs):
         """Render the scene from an alternative camera view
 
@@ -941,10 +1228,7 @@ class BaseTestScene(abc.ABC):
         self.load_non_violation_scene() # only used for non-violation scene
         self.scene.camera.position = self.alternative_camera_pos
         self.scene.camera.look_at(self.alternative_camera_look_at)
-        data_stack = self.renderer.render(return_layers=self.render_data)
-        if save_to_file:
-            kb.write_image_dict(data_stack, self.output_dir, **kwargs)
-        return data_stack
+        return self._render_and_save(save_to_file, **kwargs)
 
     def _set_fast_rendering(self):
         # adaptive sampling
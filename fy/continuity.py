@@ -133,7 +133,7 @@ class ContinuityTestScene(PermananceTestScene):
                                 scale=0.15, 
                                 name="small_obj") 
         
-        self.test_obj_z_orn = align_can_objs(small_obj)
+        self.test_obj_z_orn = align_can_objs(small_obj, geometry_index=self.gso_geometry)
         
 
         # set the position of the can to avoid potential collision 
@@ -4,7 +4,8 @@
 import logging
 from fy.utils import get_args
 import kubric as kb
-from fy.utils import write_video
+from kubric import tracing
+from kubric.renderer import memory_manager
 
 from fy.solidity import SolidityTestScene
 from fy.collision import CollisionTestScene
@@ -14,6 +15,7 @@ from fy.support import SupportTestScene
 import os
 import time
 from fy.collision_free_fall import CollisionScene
+from fy.run_watch import RECYCLE_EXIT_CODE
 import sys
 SCENE_MAPPING = {
     "solidity": SolidityTestScene,
@@ -40,6 +42,17 @@ def main() -> None:
     num_per_cls = FLAGS.num_per_cls #1000
     max_trails = FLAGS.max_trails #1000
     test_cls_all = { name: SCENE_MAPPING[name] for name in FLAGS.test_scene_cls}
+    pending_writes = []
+    memory = memory_manager.MemoryManager(rss_budget_mib=FLAGS.memory_budget_mib,
+                                          datablock_budget=FLAGS.datablock_budget)
+    if FLAGS.trace:
+        tracing.enable()
+
+    if FLAGS.scene_spec is not None:
+        # render a scene that was sampled and simulated elsewhere
+        output_dir = str(FLAGS.job_dir).rstrip("/") + "/"
+        render_scene_spec(FLAGS, FLAGS.scene_spec, output_dir).wait()
+        return
     
     # test_cls_all = {
     #     # "solidity": SolidityTestScene,
@@ -65,51 +78,141 @@ def main() -> None:
             output_dir = f"output/{test_name}/scene_{n}/"
             FLAGS.job_dir = output_dir
             try:
-                generate_test_scene(test_cls, FLAGS, output_dir)
+                # the frames of this scene are written while the next one renders
+                pending_writes.append((output_dir, generate_test_scene(test_cls, FLAGS, output_dir)))
+                pending_writes = check_pending_writes(pending_writes)
                 n += 1
-                if n >= num_per_cls:
-                    break
             except Exception as e:
                 logging.error(f"Error rendering collision test {n}: {e}\n Skipping to the next one.")
                 # if debug is on, raise the exception
                 if FLAGS.debug:
                     raise
-                continue
-
-def generate_test_scene(test_class, FLAGS,output_dir) -> None:
+            memory.end_scene(output_dir)
+            if n >= num_per_cls:
+                break
+            if memory.over_budget:
+                # finish the pending writes and let run_watch.py restart a fresh process, which
+                # continues after the last scene in the output folder
+                logging.warning("Memory budget exceeded after %s. Recycling the worker.", output_dir)
+                check_pending_writes(pending_writes, wait=True)
+                sys.exit(RECYCLE_EXIT_CODE)
+
+    check_pending_writes(pending_writes, wait=True)
+
+
+def check_pending_writes(pending_writes, wait=False):
+    """Report failed background writes and return the ones that are still running."""
+    still_pending = []
+    for output_dir, handle in pending_writes:
+        if not wait and not handle.done():
+            still_pending.append((output_dir, handle))
+            continue
+        try:
+            handle.wait()
+        except IOError as e:
+            logging.error(f"Writing the frames of {output_dir} failed: {e}")
+        export_trace(output_dir)
+    return still_pending
+
+
+# traces of the scenes whose frames are still being written, by output_dir (see export_trace)
+_pending_traces = {}
+
+
+def _writes_to(event, output_dir):
+    filename = event.get("args", {}).get("filename")
+    return (event["name"] == "file_write" and filename is not None and
+            os.path.abspath(filename).startswith(os.path.abspath(output_dir) + os.sep))
+
+
+def generate_test_scene(test_class, FLAGS,output_dir) -> kb.file_io.WriteHandle:
+    if tracing.is_enabled():
+        handle = None
+        try:
+            with tracing.span("scene", test_class=test_class.__name__):
+                handle = _generate_test_scene(test_class, FLAGS, output_dir)
+            return handle
+        finally:
+            # the writes of earlier scenes that are still running stay with their own trace
+            _pending_traces[output_dir] = tracing.get_tracer().take(
+                lambda event: event["name"] != "file_write" or _writes_to(event, output_dir),
+                counters=True)
+            if handle is None:
+                export_trace(output_dir)
+    return _generate_test_scene(test_class, FLAGS, output_dir)
+
+
+def export_trace(output_dir):
+    """Write the trace of a scene next to its metadata.json, once its frames are written.
+
+    The frames are written in the background while the next scene renders (see pending_writes),
+    so the file_write spans of a scene are collected from the tracer when its writes are done.
+    """
+    trace = _pending_traces.pop(output_dir, None)
+    if trace is None:
+        return
+    if tracing.is_enabled():
+        tracing.get_tracer().take(lambda event: _writes_to(event, output_dir), into=trace)
+    trace.write_chrome_trace(os.path.join(output_dir, "trace.json"))
+    trace.write_summary(os.path.join(output_dir, "trace_summary.json"))
+
+
+def _generate_test_scene(test_class, FLAGS,output_dir) -> kb.file_io.WriteHandle:
 
     with test_class(FLAGS) as test_scene:
         # first prepare the scene
         logging.info("Preparing the scene")
-        test_scene.prepare_scene()
+        with tracing.span("prepare_scene"):
+            test_scene.prepare_scene()
+        # e.g. the data of objects that were replaced while setting up the scene
+        memory_manager.MemoryManager.purge()
         test_scene.write_metadata()
+        if FLAGS.save_scene_spec:
+            test_scene.write_scene_spec()
+
+        return _render_test_scene(test_scene, FLAGS, output_dir)
+
+
+def render_scene_spec(FLAGS, spec_path, output_dir) -> kb.file_io.WriteHandle:
+    """Render the scene of a scene_spec.json.gz written with --save_scene_spec."""
+    spec = kb.scene_spec.read_scene_spec(spec_path)
+    test_class = {cls.__name__: cls for cls in SCENE_MAPPING.values()}[spec["scene_class"]]
+    with test_class(FLAGS) as test_scene:
+        with tracing.span("load_scene_spec"):
+            test_scene.load_scene_spec(spec)
+        return _render_test_scene(test_scene, FLAGS, output_dir)
+
 
-        if FLAGS.render_non_violate_video:
+def _render_test_scene(test_scene, FLAGS, output_dir) -> kb.file_io.WriteHandle:
+    if FLAGS.render_non_violate_video:
+        if FLAGS.render_multiview and test_scene.alternative_camera_pos:
+            # both views are rendered frame by frame in a single pass
+            test_scene.change_output_dir( output_dir + "non_violation_view_1" )
+            logging.info("Rendering the non-violation video from both camera views")
+            start_time = time.time()
+            test_scene.render_with_alternative_view(
+                [output_dir + "non_violation_view_1", output_dir + "non_violation_view_2"],
+                save_to_file=True)
+            logging.info(f"Rendering the non-violation video from both camera views took {time.time() - start_time} seconds")
+        else:
             # test_scene.load_non_violation_scene()
             test_scene.change_output_dir( output_dir + "non_violation_view_1" )
             logging.info("Rendering the non-violation video")
             start_time = time.time()
             test_scene.render(save_to_file=True)
-            # write_video(output_dir + "non_violation/", output_dir + "non_violation.mp4")
             logging.info(f"Rendering the non-violation video took {time.time() - start_time} seconds")
 
-            if FLAGS.render_multiview and test_scene.alternative_camera_pos:
-                logging.info("Rendering the non-violation video with alternative camera positions")
-                test_scene.change_output_dir( output_dir + "non_violation_view_2" )
-                start_time = time.time()
-                test_scene.render_alternative_view(save_to_file=True)
-                # write_video(output_dir + "non_violation_multiview/", output_dir + "non_violation_multiview.mp4")
-                logging.info(f"Rendering the non-violation video with alternative camera positions took {time.time() - start_time} seconds")
-
-        if FLAGS.render_violate_video:
-            # render the violation state
-            test_scene.change_output_dir( output_dir + "violation" )
+    if FLAGS.render_violate_video:
+        # render the violation state
+        test_scene.change_output_dir( output_dir + "violation" )
+        with tracing.span("load_violation_scene"):
             test_scene.load_violation_scene()
-            logging.info("Rendering the violation video")
-            start_time = time.time()
-            test_scene.render(save_to_file=True)
-            # write_video(output_dir + "violation/", output_dir + "violation.mp4")
-            logging.info(f"Rendering the violation video took {time.time() - start_time} seconds")
+        logging.info("Rendering the violation video")
+        start_time = time.time()
+        test_scene.render(save_to_file=True)
+        logging.info(f"Rendering the violation video took {time.time() - start_time} seconds")
+
+    return kb.file_io.WriteHandle.combine(test_scene.write_handles)
 
 
 
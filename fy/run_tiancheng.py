@@ -119,8 +119,8 @@ def generate_test_scene(test_class, FLAGS, output_dir, video_dir, i) -> None:
         print("Rendering the violation state")
         # igore rendering if debug is on
         if True and not FLAGS.debug:
-            test_scene.render(save_to_file=True)
-            write_video(output_dir + "violation/", video_dir + f"violation_{i}.mp4")
+            data_stack = test_scene.render(save_to_file=True)
+            write_video(data_stack["rgba"], video_dir + f"violation_{i}.mp4", fps=FLAGS.frame_rate)
 
         # load the non-violation state and render it
         print("Loading the non-violation state")
@@ -130,8 +130,8 @@ def generate_test_scene(test_class, FLAGS, output_dir, video_dir, i) -> None:
 
         # igore rendering if debug is on
         if True and not FLAGS.debug:
-            test_scene.render(save_to_file=True)
-            write_video(output_dir + "non_violation/", video_dir + f"non_violation_{i}.mp4")
+            data_stack = test_scene.render(save_to_file=True)
+            write_video(data_stack["rgba"], video_dir + f"non_violation_{i}.mp4", fps=FLAGS.frame_rate)
         
 if __name__ == "__main__":
     main()
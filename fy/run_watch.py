@@ -3,9 +3,15 @@ import os
 import subprocess
 import argparse
 import time
+
+# exit code of fy/run.py when it stops itself because its memory budget is exceeded
+# (see --memory_budget_mib), EX_TEMPFAIL of sysexits.h
+RECYCLE_EXIT_CODE = 75
+
 def check_if_job_finished(num_per_cls: int, test_scene_cls) -> bool:
     # check if output/{test_scene} has {num_per_cls} folders
     for test_scene in test_scene_cls:
+        n = 0
         scene_output_dir = f"output/{test_scene}"
         # print(scene_output_dir)
         # print(os.getcwd())
@@ -46,7 +52,10 @@ def run_watch():
         while True:
             # first check if the job is killed
             if proc.poll() is not None:
-                print("Job is killed. Restarting the job.")
+                if proc.returncode == RECYCLE_EXIT_CODE:
+                    print("Job recycled after reaching its memory budget. Restarting the job.")
+                else:
+                    print("Job is killed. Restarting the job.")
                 break
             # read all the output since the last read
             output = proc.stdout.read(200)
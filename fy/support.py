@@ -191,7 +191,7 @@ class SupportTestScene(BaseTestScene):
                                 name="small_obj")
         
         # align the can object
-        align_can_objs(small_obj)
+        align_can_objs(small_obj, geometry_index=self.gso_geometry)
         self.initial_dist_to_table = np.random.uniform(0.5, 1)
         z = self.initial_dist_to_table + self.ref_h
         
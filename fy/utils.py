@@ -1,7 +1,6 @@
 
 import logging
 import kubric as kb
-import imageio
 import bpy
 import numpy as np 
 from tqdm import tqdm
@@ -33,6 +32,25 @@ def get_args():
   parser.add_argument("--gso_assets", type=str,
                       default="gs://kubric-public/assets/GSO/GSO.json")
   parser.add_argument("--save_state", dest="save_state", action="store_true")
+  # lower resolution texture / HDRI variants, see kubric.assets.texture_variants
+  parser.add_argument("--texture_resolution", default=None,
+                      type=lambda x: int(x) if x.isdigit() else x,
+                      help='"auto" or the minimum size of the texture variants to render with')
+  # keep the synced Cycles scene between frames, see kb.Blender(persistent_data=...)
+  parser.add_argument("--persistent_data", action="store_true", default=False,
+                      help="keep static objects, BVHs and textures on the device across frames")
+  # recycle the worker (exit, to be restarted by fy/run_watch.py) once a budget is exceeded after
+  # a scene, see kubric.renderer.memory_manager
+  parser.add_argument("--memory_budget_mib", type=float, default=None,
+                      help="RSS (MiB) after which the worker process is recycled")
+  parser.add_argument("--datablock_budget", type=int, default=None,
+                      help="number of Blender datablocks after which the worker is recycled")
+  # reuse the results of simulations with the same initial conditions (e.g. when re-rendering a
+  # scene or after a restart), see kubric.simulator.simulation_cache
+  parser.add_argument("--simulation_cache_dir", type=str, default=None,
+                      help="directory of the simulation cache (shared by all workers)")
+  parser.add_argument("--simulation_cache_size_gb", type=float, default=None,
+                      help="evict the least recently used simulations beyond this size")
 
   # 3s of animation at 12 fps
   parser.set_defaults(save_state=False, frame_end=36, frame_rate=12,
@@ -52,10 +70,20 @@ def get_args():
 
   parser.add_argument("--num_per_cls", type=int, default=1) # number of videos per class
   parser.add_argument("--max_trails", type=int, default=10000) # number of maximum trails
-  parser.add_argument("--test_scene_cls",nargs='+', required=True) # test scenes
+  parser.add_argument("--test_scene_cls",nargs='+', default=[]) # test scenes (required unless --scene_spec is given)
   parser.add_argument("--render_multiview", action="store_true", default=False) # render multi-view videos
+  parser.add_argument("--video_codec", type=str, default=None,
+                      choices=sorted(kb.file_io.VIDEO_CODECS)) # also encode rgba frames as a video while rendering
+  parser.add_argument("--video_crf", type=int, default=18) # quality of the lossy video codecs (lower is better)
+  parser.add_argument("--no_save_frames", dest="save_frames", action="store_false", default=True) # skip the per-frame pngs
+  parser.add_argument("--trace", action="store_true", default=False) # write trace.json (chrome://tracing) and trace_summary.json per scene
+  parser.add_argument("--no_async_writes", dest="async_writes", action="store_false", default=True) # wait for the frames to be written after each render
+  parser.add_argument("--save_scene_spec", action="store_true", default=False) # write scene_spec.json.gz, see kubric.scene_spec
+  parser.add_argument("--scene_spec", type=str, default=None) # only render the scene of a scene_spec.json.gz (to --job_dir)
   
   FLAGS = parser.parse_args()
+  if not FLAGS.test_scene_cls and FLAGS.scene_spec is None:
+    parser.error("--test_scene_cls is required")
 
   if FLAGS.debug:
     FLAGS.logging_level = logging.DEBUG
@@ -67,16 +95,9 @@ def get_args():
     FLAGS.logging_level = logging.INFO
   return FLAGS
 
-def write_video(source_dir, output_file):
-  # read png files
-  images = []
-  for i in range(1, 36):
-      filename = f"{source_dir}/rgba_{i:05d}.png"
-      images.append(imageio.imread(filename))
-      
-  # write to mpeg video
-  # imageio.mimsave('output/movie.gif', images, fps=12)
-  imageio.mimsave(output_file, images, fps=12, quality=10)
+def write_video(data, output_file, fps=12, codec="h264", crf=18):
+  """Encode a (T, H, W, C) frame stack (e.g. data_stack["rgba"]) directly as a video file."""
+  kb.write_video(data, output_file, fps=fps, codec=codec, crf=crf)
 
 # def set_gpu_render():
 #   # for scene in bpy.data.scenes:
@@ -342,12 +363,19 @@ def objInFOV(obj_name, th=20):
   return angle < th
 
 
-def aligh_block_objs(obj):
+def aligh_block_objs(obj, geometry_index=None):
   """Align the block object
         Args:
             obj: kubric object instance
+            geometry_index: optional kb.assets.GeometryIndex; if it contains the asset, the
+              object is stood up along its principal axes instead (thinnest along y, widest
+              along x), like the bbox based alignment below
 
   """
+  if geometry_index is not None and obj.asset_id in geometry_index:
+    obj.quaternion = geometry_index.standing_quaternion(obj.asset_id) * obj.quaternion
+    return
+
   x_size = obj.aabbox[1][0] - obj.aabbox[0][0]
   y_size = obj.aabbox[1][1] - obj.aabbox[0][1]
   z_size = obj.aabbox[1][1] - obj.aabbox[0][1]
@@ -367,12 +395,21 @@ def aligh_block_objs(obj):
   ## TODO: rotate around y to set the principal axis
 
 
-def align_can_objs(obj):
-  """Align the block object
+def align_can_objs(obj, geometry_index=None):
+  """Align the can object
         Args:
             obj: kubric object instance
+            geometry_index: optional kb.assets.GeometryIndex; if it contains the asset, the
+              object is stood upright along its principal (longest) axis instead of the bbox
+              based alignment below
+        Returns:
+            the bbox axis that was aligned (None if the geometry index was used)
 
   """
+  if geometry_index is not None and obj.asset_id in geometry_index:
+    obj.quaternion = geometry_index.upright_quaternion(obj.asset_id) * obj.quaternion
+    return None
+
   x_size = obj.aabbox[1][0] - obj.aabbox[0][0]
   y_size = obj.aabbox[1][1] - obj.aabbox[0][1]
   z_size = obj.aabbox[1][2] - obj.aabbox[0][2]
@@ -0,0 +1,60 @@
+""" Like run_watch.py, but the workers are forked from a zygote instead of started from scratch.
+
+The zygote imports bpy, kubric and the test scenes (which load the asset manifests in fy/base.py)
+once. Every worker runs fy/run.py in a process forked from it, so that (re)starting a worker costs
+a fork instead of all the imports. The zygote reports its warm-up time and the fork latency.
+
+Usage (from the repository root, with the same arguments as run_watch.py):
+    python fy/zygote.py --num_per_cls 100 --test_scene_cls solidity --scene_type hdri
+"""
+import argparse
+import logging
+import os
+import sys
+
+# fy/run.py imports from `fy.` and the scenes from `utils`
+FY_DIR = os.path.dirname(os.path.abspath(__file__))
+for path in (os.path.dirname(FY_DIR), FY_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from kubric import zygote as zygote_lib
+from fy.run_watch import check_if_job_finished, RECYCLE_EXIT_CODE
+
+# fy.run imports bpy, kubric and all test scenes (and thereby fy.base with the asset manifests)
+PRELOAD = ("bpy", "kubric", "fy.base", "fy.run")
+
+
+def run_worker(run_args):
+    sys.argv = ["fy/run.py"] + run_args
+    from fy import run
+    run.main()
+
+
+def run_zygote():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_per_cls", type=int, required=True)
+    parser.add_argument("--test_scene_cls", nargs='+', required=True) # test scenes
+    # rest of the arguments as list
+    args, other_args = parser.parse_known_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    zygote = zygote_lib.Zygote(preload=PRELOAD)
+    zygote.warm_up()
+    run_args = ["--num_per_cls", str(args.num_per_cls), "--test_scene_cls"] + args.test_scene_cls + other_args
+    while not check_if_job_finished(args.num_per_cls, args.test_scene_cls):
+        print("=============================================================")
+        print("Forking a worker with the following arguments:")
+        print(" ".join(run_args))
+        print("=============================================================")
+        exit_code = zygote.wait(zygote.fork(run_worker, run_args))
+        if exit_code == RECYCLE_EXIT_CODE:
+            print("Worker recycled after reaching its memory budget. Forking a new one.")
+        elif exit_code != 0:
+            print(f"Worker exited with code {exit_code}. Forking a new one.")
+    print("Job finished.")
+    print(f"Zygote stats: {zygote.stats()}")
+
+
+if __name__ == "__main__":
+    run_zygote()
@@ -12,82 +12,68 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Root of the kubric module."""
+"""Root of the kubric module.
 
-# --- auto-computed by setup.py, source version is always at HEAD
-__version__ = "HEAD"
-
-# --- basic kubric types
-from pyquaternion import Quaternion
-
-from kubric.core.scene import Scene
-
-from kubric.core.assets import Asset
-from kubric.core.assets import UndefinedAsset
-
-from kubric.core.cameras import Camera
-from kubric.core.cameras import UndefinedCamera
-from kubric.core.cameras import PerspectiveCamera
-from kubric.core.cameras import OrthographicCamera
-
-from kubric.core.color import Color
-from kubric.core.color import get_color
-
-from kubric.core.lights import Light
-from kubric.core.lights import UndefinedLight
-from kubric.core.lights import DirectionalLight
-from kubric.core.lights import PointLight
-from kubric.core.lights import RectAreaLight
-from kubric.core.lights import SpotLight
+The API is imported lazily (PEP 562): `import kubric` only imports this file, and `kubric.Scene`,
+`kubric.write_json`, `kubric.file_io`, ... import their modules on first access. This keeps the
+startup of processes that only need a part of kubric (e.g. the file I/O) cheap.
+"""
 
-from kubric.core.materials import Material
-from kubric.core.materials import UndefinedMaterial
-from kubric.core.materials import PrincipledBSDFMaterial
-from kubric.core.materials import FlatMaterial
-from kubric.core.materials import Texture
+import importlib
 
-from kubric.core.objects import Object3D
-from kubric.core.objects import PhysicalObject
-from kubric.core.objects import Sphere
-from kubric.core.objects import Cube
-from kubric.core.objects import FileBasedObject
-
-from kubric.kubric_typing import AddAssetFunction
-from kubric.kubric_typing import PathLike
-
-from kubric import assets
-from kubric.assets import AssetSource
-
-from kubric.randomness import random_hue_color
-from kubric.randomness import random_rotation
-from kubric.randomness import rotation_sampler
-from kubric.randomness import position_sampler
-from kubric.randomness import resample_while
-from kubric.randomness import move_until_no_overlap
-from kubric.randomness import sample_point_in_half_sphere_shell
-
-from kubric.post_processing import compute_visibility
-from kubric.post_processing import compute_bboxes
-from kubric.post_processing import adjust_segmentation_idxs
-
-from kubric.file_io import as_path
-from kubric.file_io import write_pkl
-from kubric.file_io import write_json
-from kubric.file_io import write_png
-from kubric.file_io import write_palette_png
-from kubric.file_io import write_scaled_png
-from kubric.file_io import write_tiff
-from kubric.file_io import write_image_dict
-from kubric.file_io import read_png
-from kubric.file_io import read_tiff
+# --- auto-computed by setup.py, source version is always at HEAD
+__version__ = "HEAD"
 
-from kubric.utils import ArgumentParser
-from kubric.utils import done
-from kubric.utils import get_camera_info
-from kubric.utils import get_instance_info
-from kubric.utils import get_scene_metadata
-from kubric.utils import log_my_flags
-from kubric.utils import process_collisions
-from kubric.utils import setup
-from kubric.utils import setup_directories
-from kubric.utils import setup_logging
+# --- the public API: module -> names that it exports into the kubric namespace
+_API = {
+    # --- basic kubric types
+    "pyquaternion": ("Quaternion",),
+    "kubric.core.scene": ("Scene",),
+    "kubric.core.assets": ("Asset", "UndefinedAsset"),
+    "kubric.core.cameras": ("Camera", "UndefinedCamera", "PerspectiveCamera",
+                            "OrthographicCamera"),
+    "kubric.core.color": ("Color", "get_color"),
+    "kubric.core.lights": ("Light", "UndefinedLight", "DirectionalLight", "PointLight",
+                           "RectAreaLight", "SpotLight"),
+    "kubric.core.materials": ("Material", "UndefinedMaterial", "PrincipledBSDFMaterial",
+                              "FlatMaterial", "Texture"),
+    "kubric.core.objects": ("Object3D", "PhysicalObject", "Sphere", "Cube", "FileBasedObject"),
+    "kubric.kubric_typing": ("AddAssetFunction", "PathLike"),
+    "kubric.assets": ("AssetSource",),
+
+    "kubric.randomness": ("random_hue_color", "random_rotation", "rotation_sampler",
+                          "position_sampler", "resample_while", "move_until_no_overlap",
+                          "place_in_resting_pose", "sample_point_in_half_sphere_shell"),
+    "kubric.post_processing": ("compute_visibility", "compute_bboxes", "adjust_segmentation_idxs"),
+    "kubric.point_tracking": ("compute_point_tracks",),
+    "kubric.file_io": ("as_path", "write_pkl", "write_json", "write_png", "write_palette_png",
+                       "write_scaled_png", "write_tiff", "write_image_dict", "write_video",
+                       "VideoWriter", "get_async_writer", "read_png", "read_tiff"),
+    "kubric.utils": ("ArgumentParser", "done", "get_camera_info", "get_instance_info",
+                     "get_scene_metadata", "log_my_flags", "process_collisions", "setup",
+                     "setup_directories", "setup_logging"),
+}
+_MODULE_OF = {name: module for module, names in _API.items() for name in names}
+
+__all__ = ["__version__", "assets", "scene_spec"] + list(_MODULE_OF)
+
+
+def __getattr__(name):
+  if name in _MODULE_OF:
+    value = getattr(importlib.import_module(_MODULE_OF[name]), name)
+  elif not name.startswith("__"):
+    # submodules, e.g. kubric.file_io or kubric.assets
+    try:
+      value = importlib.import_module(f"{__name__}.{name}")
+    except ModuleNotFoundError as e:
+      if e.name != f"{__name__}.{name}":
+        raise
+      raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+  else:
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+  globals()[name] = value  # later accesses do not go through __getattr__
+  return value
+
+
+def __dir__():
+  return sorted(set(globals()) | set(__all__))
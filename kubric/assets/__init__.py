@@ -12,5 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from .asset_cache import AssetCache
+from .asset_store import convert_asset_source
 from .asset_source import AssetSource, ClosableResource
+from .geometry_index import GeometryIndex
 from . import utils
@@ -0,0 +1,250 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A persistent on-disk cache of unpacked assets that is shared between processes."""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import shutil
+import tarfile
+import tempfile
+import time
+from typing import Dict, Optional
+
+from kubric import filesystem
+from kubric import tracing
+from kubric.file_io import file_lock
+from kubric.kubric_typing import PathLike
+
+logger = logging.getLogger(__name__)
+
+# Environment variables used to enable the shared cache for all AssetSources of a process.
+CACHE_DIR_ENV = "KUBRIC_ASSET_CACHE_DIR"
+CACHE_SIZE_ENV = "KUBRIC_ASSET_CACHE_SIZE_GB"
+
+_METADATA_SUFFIX = ".json"
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def unpack_asset_archive(archive_path: PathLike, asset_id: str, target_dir: PathLike):
+  """Extracts an asset `.tar.gz` such that the asset files end up directly in `target_dir`.
+
+  We support two kinds of archives:
+   1. flat archives that do not contain any directories
+   2. archives where the content is in a directory with the name of the asset
+  """
+  target_dir = pathlib.Path(target_dir)
+  with tarfile.open(archive_path, "r:gz") as tar:
+    list_of_files = tar.getnames()
+    if asset_id in list_of_files and tar.getmember(asset_id).isdir():
+      # tarfile contains directory with name object_id, so we extract next to target_dir
+      assert f"{asset_id}/data.json" in list_of_files, list_of_files
+      staging_dir = pathlib.Path(tempfile.mkdtemp(dir=target_dir.parent))
+      tar.extractall(staging_dir)
+      os.rename(staging_dir / asset_id, target_dir)
+      shutil.rmtree(staging_dir)
+    else:
+      # tarfile contains files only, so extract into target_dir
+      assert "data.json" in list_of_files, list_of_files
+      tar.extractall(target_dir)
+    logger.debug("Extracted %s", repr([m.name for m in tar.getmembers()]))
+
+
+class AssetCache:
+  """Content-addressed cache of unpacked assets, shared by all processes using the same directory.
+
+  Every asset is stored as `{cache_dir}/{asset_id}-{content_hash}/` next to a small JSON file
+  with its size and last access time. The content hash is either provided by the manifest
+  (`"sha256"` entry of an asset) or derived from the size and modification time of the remote
+  archive, so updated archives never collide with stale entries.
+
+  Entries are written into a temporary directory and moved into place with an atomic rename while
+  holding a per-entry file lock, so concurrent workers never observe partially extracted assets
+  and each archive is downloaded and unpacked only once. If `max_size_bytes` is set, the least
+  recently used entries are evicted once the cache grows beyond it.
+
+  Args:
+    cache_dir: local directory of the cache (created if missing).
+    max_size_bytes: size limit for the unpacked assets (None means unlimited).
+    eviction_grace_seconds: entries accessed more recently than this are never evicted, because
+      another process might still be loading them.
+  """
+
+  def __init__(self, cache_dir: PathLike, max_size_bytes: Optional[int] = None,
+               eviction_grace_seconds: float = 3600.):
+    self.cache_dir = pathlib.Path(cache_dir)
+    self.cache_dir.mkdir(parents=True, exist_ok=True)
+    self.max_size_bytes = max_size_bytes
+    self.eviction_grace_seconds = eviction_grace_seconds
+    self.stats = collections.Counter(hits=0, misses=0, bytes_fetched=0, bytes_unpacked=0,
+                                     evictions=0, bytes_evicted=0)
+
+  @classmethod
+  def from_environment(cls) -> Optional["AssetCache"]:
+    """Returns the cache configured by $KUBRIC_ASSET_CACHE_DIR (or None if it is not set)."""
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+      return None
+    size_gb = os.environ.get(CACHE_SIZE_ENV)
+    max_size_bytes = int(float(size_gb) * 1024**3) if size_gb else None
+    return cls(cache_dir, max_size_bytes=max_size_bytes)
+
+  @property
+  def _tmp_dir(self) -> pathlib.Path:
+    return self.cache_dir / ".tmp"
+
+  @property
+  def _lock_dir(self) -> pathlib.Path:
+    return self.cache_dir / ".locks"
+
+  @staticmethod
+  def content_hash(remote_path: PathLike) -> str:
+    """Cheap fingerprint of a remote archive based on its size and modification time."""
+    stat = filesystem.get_backend(remote_path).stat(str(remote_path))
+    fingerprint = f"{remote_path}:{stat.length}:{stat.mtime_nsec}"
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+  def entry_key(self, asset_id: str, content_hash: str) -> str:
+    return f"{asset_id}-{content_hash[:16]}"
+
+  def fetch(self, asset_id: str, remote_path: PathLike,
+            content_hash: Optional[str] = None) -> pathlib.Path:
+    """Returns the local directory of the unpacked asset, downloading it on a cache miss."""
+    if content_hash is None:
+      content_hash = self.content_hash(remote_path)
+    key = self.entry_key(asset_id, content_hash)
+    entry_dir = self.cache_dir / key
+
+    with file_lock(self._lock_dir / (key + ".lock")):
+      if entry_dir.exists():
+        self.stats["hits"] += 1
+        tracing.count("asset_cache.hit")
+        self._touch(key)
+        return entry_dir
+
+      self.stats["misses"] += 1
+      tracing.count("asset_cache.miss")
+      self._tmp_dir.mkdir(parents=True, exist_ok=True)
+      staging_dir = pathlib.Path(tempfile.mkdtemp(prefix=key, dir=self._tmp_dir))
+      try:
+        archive_path = staging_dir / (asset_id + ".tar.gz")
+        logger.debug("Copying %s to %s", str(remote_path), str(archive_path))
+        filesystem.copy(remote_path, archive_path)
+        archive_size = archive_path.stat().st_size
+        archive_hash = _sha256(archive_path)
+
+        unpacked_dir = staging_dir / key
+        unpack_asset_archive(archive_path, asset_id, unpacked_dir)
+        size = _directory_size(unpacked_dir)
+        # the metadata is written first, entries without a directory are ignored
+        self._write_metadata(key, {"asset_id": asset_id, "source": str(remote_path),
+                                   "content_hash": content_hash, "archive_sha256": archive_hash,
+                                   "archive_size": archive_size, "size": size})
+        os.rename(unpacked_dir, entry_dir)  # atomic within the same filesystem
+      finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+      self.stats["bytes_fetched"] += archive_size
+      self.stats["bytes_unpacked"] += size
+
+    if self.max_size_bytes is not None:
+      self.evict(self.max_size_bytes, keep=(key,))
+    return entry_dir
+
+  def entries(self) -> Dict[str, dict]:
+    """Metadata of all entries in the cache (including "last_access" timestamps)."""
+    entries = {}
+    for metadata_path in self.cache_dir.glob("*" + _METADATA_SUFFIX):
+      key = metadata_path.name[:-len(_METADATA_SUFFIX)]
+      if not (self.cache_dir / key).is_dir():
+        continue
+      try:
+        metadata = json.loads(metadata_path.read_text())
+        metadata["last_access"] = metadata_path.stat().st_mtime
+      except (OSError, ValueError):
+        continue  # concurrently removed or written
+      entries[key] = metadata
+    return entries
+
+  def total_size(self) -> int:
+    return sum(e.get("size", 0) for e in self.entries().values())
+
+  def evict(self, max_size_bytes: int, keep=()) -> int:
+    """Removes least recently used entries until the cache is below `max_size_bytes`.
+
+    Returns the number of bytes that were freed.
+    """
+    freed = 0
+    with file_lock(self.cache_dir / ".evict.lock", blocking=False) as acquired:
+      if not acquired:
+        return 0  # another process is already evicting
+      entries = self.entries()
+      total = sum(e.get("size", 0) for e in entries.values())
+      now = time.time()
+      for key, metadata in sorted(entries.items(), key=lambda kv: kv[1]["last_access"]):
+        if total <= max_size_bytes:
+          break
+        if key in keep or now - metadata["last_access"] < self.eviction_grace_seconds:
+          continue
+        with file_lock(self._lock_dir / (key + ".lock"), blocking=False) as entry_acquired:
+          if not entry_acquired:
+            continue  # currently being fetched
+          self._remove(key)
+        total -= metadata.get("size", 0)
+        freed += metadata.get("size", 0)
+        self.stats["evictions"] += 1
+        self.stats["bytes_evicted"] += metadata.get("size", 0)
+        logger.info("Evicted asset %s from the cache (%d bytes)", key, metadata.get("size", 0))
+    return freed
+
+  def _remove(self, key: str):
+    # move out of the way first, so that other processes never see a half-deleted entry
+    self._tmp_dir.mkdir(parents=True, exist_ok=True)
+    trash_dir = pathlib.Path(tempfile.mkdtemp(prefix=key, dir=self._tmp_dir))
+    (self.cache_dir / (key + _METADATA_SUFFIX)).unlink(missing_ok=True)
+    os.rename(self.cache_dir / key, trash_dir / key)
+    shutil.rmtree(trash_dir, ignore_errors=True)
+
+  def _write_metadata(self, key: str, metadata: dict):
+    metadata_path = self.cache_dir / (key + _METADATA_SUFFIX)
+    tmp_path = metadata_path.with_name(metadata_path.name + f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(metadata, sort_keys=True, indent=2))
+    os.replace(tmp_path, metadata_path)
+
+  def _touch(self, key: str):
+    try:
+      os.utime(self.cache_dir / (key + _METADATA_SUFFIX))
+    except FileNotFoundError:
+      pass
+
+  def log_stats(self):
+    logger.info("AssetCache '%s': %d hits, %d misses, %d bytes fetched, %d bytes evicted",
+                self.cache_dir, self.stats["hits"], self.stats["misses"],
+                self.stats["bytes_fetched"], self.stats["bytes_evicted"])
+
+
+def _sha256(path: PathLike) -> str:
+  sha = hashlib.sha256()
+  with open(path, "rb") as fp:
+    for chunk in iter(lambda: fp.read(_HASH_CHUNK_SIZE), b""):
+      sha.update(chunk)
+  return sha.hexdigest()
+
+
+def _directory_size(path: PathLike) -> int:
+  return sum(f.stat().st_size for f in pathlib.Path(path).rglob("*") if f.is_file())
@@ -15,19 +15,22 @@
 import difflib
 import functools
 import logging
+import os
 import pathlib
 import shutil
-import tarfile
 import tempfile
 
 import numpy as np
-import tensorflow as tf
 
 from typing import Optional, Dict, Any, Type
 import weakref
 
 from kubric import core
 from kubric import file_io
+from kubric import filesystem
+from kubric import tracing
+from kubric.assets import asset_cache
+from kubric.assets import asset_store
 from kubric.kubric_typing import PathLike
 
 
@@ -57,13 +60,21 @@ class ClosableResource:
 
 
 class AssetSource(ClosableResource):
-  """TODO(klausg): documentation."""
+  """A collection of assets described by a manifest, which are fetched and unpacked on demand.
+
+  By default every AssetSource unpacks its assets into a fresh temporary directory. If a `cache`
+  is given (or $KUBRIC_ASSET_CACHE_DIR is set) the assets are instead unpacked into a persistent
+  AssetCache that is shared with other processes and runs. Asset sources that were converted
+  into an uncompressed layout with `asset_store.convert_asset_source` are read without any
+  decompression.
+  """
 
   @classmethod
   def from_manifest(
       cls,
       manifest_path: PathLike,
-      scratch_dir: Optional[PathLike] = None
+      scratch_dir: Optional[PathLike] = None,
+      cache: Optional[asset_cache.AssetCache] = None,
   ) -> "AssetSource":
     if manifest_path == "gs://kubric-public/assets/ShapeNetCore.v2.json":
       raise ValueError(f"The path `{manifest_path}` is a placeholder for the real path. "
@@ -72,18 +83,20 @@ class AssetSource(ClosableResource):
                        "https://shapenet.org/download/kubric")
 
     manifest_path = file_io.as_path(manifest_path)
-    manifest = file_io.read_json(manifest_path)
+    with tracing.span("asset_manifest_load", manifest=manifest_path):
+      manifest = file_io.read_json(manifest_path)
     name = manifest.get("name", manifest_path.stem)  # default to filename
     data_dir = manifest.get("data_dir", manifest_path.parent)  # default to manifest dir
     assets = manifest["assets"]
-    return cls(name=name, data_dir=data_dir, assets=assets, scratch_dir=scratch_dir)
+    return cls(name=name, data_dir=data_dir, assets=assets, scratch_dir=scratch_dir, cache=cache)
 
   def __init__(
       self,
       name: str,
       data_dir: PathLike,
       assets: Dict[str, Any],
-      scratch_dir: Optional[PathLike] = None
+      scratch_dir: Optional[PathLike] = None,
+      cache: Optional[asset_cache.AssetCache] = None,
   ):
     super().__init__()
     self.name = name
@@ -91,16 +104,32 @@ class AssetSource(ClosableResource):
     logging.info("Created AssetSource '%s' with '%d' assets at URI='%s'",
                  name, len(assets), self.data_dir)
     self.local_dir = pathlib.Path(tempfile.mkdtemp(prefix=name, dir=scratch_dir))
+    self.cache = cache if cache is not None else asset_cache.AssetCache.from_environment()
+    self._fetched_dirs = {}
+    self._packs = {}
     self._assets = assets
 
   def close(self):
     if self.is_closed:
       return
     try:
+      if self.cache is not None:
+        self.cache.log_stats()
+      for pack in self._packs.values():
+        pack.close()
       shutil.rmtree(self.local_dir)
     finally:
       super().close()
 
+  def _after_fork(self):
+    """Gives a forked process its own scratch dir (the parent removes its dir when it closes)."""
+    old_local_dir = self.local_dir
+    self.local_dir = pathlib.Path(tempfile.mkdtemp(prefix=self.name, dir=old_local_dir.parent))
+    # dirs in the asset cache or in an uncompressed asset store stay valid
+    self._fetched_dirs = {asset_id: asset_dir for asset_id, asset_dir in self._fetched_dirs.items()
+                          if not pathlib.Path(asset_dir).is_relative_to(old_local_dir)}
+    self._packs = {}  # the file handles are shared with the parent
+
   def __enter__(self):
     return self
 
@@ -132,6 +161,9 @@ class AssetSource(ClosableResource):
   def all_asset_ids(self):
     return sorted(self._assets.keys())
 
+  def __contains__(self, asset_id: str) -> bool:
+    return asset_id in self._assets
+
   @staticmethod
   def _resolve_asset_type(asset_type: str) -> Type:
     types = {
@@ -217,28 +249,42 @@ class AssetSource(ClosableResource):
     return asset
 
   def fetch(self, asset_path, asset_id):
-    local_path = self.local_dir / (asset_id + ".tar.gz")
-    if not local_path.exists():
-      logging.debug("Copying %s to %s", str(asset_path), str(local_path))
-      local_path.parent.mkdir(parents=True, exist_ok=True)
-      tf.io.gfile.copy(asset_path, local_path)
-
-      with tarfile.open(local_path, "r:gz") as tar:
-        # We support two kinds of archives:
-        #  1. flat archives that do not contain any directories
-        #  2. archives where the content is in a directory with the name of the asset
-        list_of_files = tar.getnames()
-        if asset_id in list_of_files and tar.getmember(asset_id).isdir():
-          # tarfile contains directory with name object_id, so we can just extract
-          assert f"{asset_id}/data.json" in list_of_files, list_of_files
-          tar.extractall(self.local_dir)
-        else:
-          # tarfile contains files only, so extract into a new directory
-          assert "data.json" in list_of_files, list_of_files
-          tar.extractall(self.local_dir / asset_id)
-        logging.debug("Extracted %s", repr([m.name for m in tar.getmembers()]))
-
-    return self.local_dir / asset_id
+    if asset_id in self._fetched_dirs:
+      tracing.count("asset_fetch.memo_hit")
+      return self._fetched_dirs[asset_id]
+    with tracing.span("asset_fetch", asset_id=asset_id):
+      asset_dir = self._fetch(asset_path, asset_id)
+    self._fetched_dirs[asset_id] = asset_dir
+    return asset_dir
+
+  def _fetch(self, asset_path, asset_id):
+    asset_entry = self._assets.get(asset_id, {})
+    if asset_store.is_directory_entry(asset_entry):
+      if file_io.is_remote(asset_path):
+        asset_dir = self.local_dir / asset_id
+        asset_store.copy_directory(asset_path, asset_dir)
+      else:
+        asset_dir = asset_path  # pre-extracted, so it can be used in place
+    elif asset_store.is_pack_entry(asset_entry):
+      if str(asset_path) not in self._packs:
+        self._packs[str(asset_path)] = asset_store.AssetPack(asset_path)
+      asset_dir = self.local_dir / asset_id
+      self._packs[str(asset_path)].extract(asset_entry["files"], asset_dir)
+    elif self.cache is not None:
+      content_hash = asset_entry.get("sha256")
+      asset_dir = self.cache.fetch(asset_id, asset_path, content_hash=content_hash)
+    else:
+      asset_dir = self.local_dir / asset_id
+      if not asset_dir.exists():
+        # remote archives are read through the file_io cache, so they are downloaded only once
+        local_path = file_io.cached_local_path(asset_path)
+        if file_io.is_remote(local_path):  # file_io caching is disabled
+          local_path = self.local_dir / (asset_id + ".tar.gz")
+          logging.debug("Copying %s to %s", str(asset_path), str(local_path))
+          local_path.parent.mkdir(parents=True, exist_ok=True)
+          filesystem.copy(asset_path, local_path)
+        asset_cache.unpack_asset_archive(local_path, asset_id, asset_dir)
+    return asset_dir
 
   def get_test_split(self, fraction=0.1):
     """
@@ -256,3 +302,12 @@ class AssetSource(ClosableResource):
     test_ids = rng.choice(self.all_asset_ids, size=test_size, replace=False)
     train_ids = [i for i in self.all_asset_ids if i not in test_ids]
     return train_ids, test_ids
+
+
+def _after_fork_in_child():
+  for resource in list(ClosableResource._set_of_open_resources):  # pylint: disable=protected-access
+    if isinstance(resource, AssetSource):
+      resource._after_fork()  # pylint: disable=protected-access
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,192 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Uncompressed asset stores that can be read without gzip/tar extraction.
+
+Asset sources normally store every asset as a `{asset_id}.tar.gz` archive. The function
+`convert_asset_source` rewrites such a source into one of two uncompressed layouts:
+
+  * "directory": every asset is pre-extracted into `{target_dir}/{asset_id}/`. The manifest
+    entries point to these directories (`"path": "{asset_id}/"`), which AssetSource uses as they
+    are (local) or copies file by file (remote).
+  * "pack": all asset files are concatenated into a single uncompressed `{name}.pack` file and
+    every manifest entry gets a `"files"` index of `{relative_path: [offset, size]}`.
+    AssetSource memory-maps the pack once and materializes the files of an asset by copying
+    slices of the map (Blender and PyBullet need actual files on disk).
+"""
+
+import logging
+import mmap
+import os
+import pathlib
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence
+
+
+from kubric import file_io
+from kubric import filesystem
+from kubric.assets import asset_cache
+from kubric.assets import texture_variants
+from kubric.kubric_typing import PathLike
+
+logger = logging.getLogger(__name__)
+
+LAYOUTS = ("directory", "pack")
+PACK_SUFFIX = ".pack"
+# files in a pack start at multiples of this, so that each of them is page aligned in the map
+_PACK_ALIGNMENT = 4096
+_COPY_CHUNK_SIZE = 1 << 24
+
+
+def is_directory_entry(asset_entry: Dict[str, Any]) -> bool:
+  return asset_entry.get("path", "").endswith("/")
+
+
+def is_pack_entry(asset_entry: Dict[str, Any]) -> bool:
+  return "files" in asset_entry
+
+
+class AssetPack:
+  """Read-only, memory-mapped view of an uncompressed asset pack."""
+
+  def __init__(self, path: PathLike):
+    self.path = file_io.cached_local_path(path)
+    self._file = open(self.path, "rb")
+    self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+  def read(self, offset: int, size: int) -> memoryview:
+    return memoryview(self._map)[offset:offset + size]
+
+  def extract(self, files: Dict[str, List[int]], target_dir: PathLike):
+    """Writes the files of one asset (given by their pack index) into `target_dir`."""
+    target_dir = pathlib.Path(target_dir)
+    for relative_path, (offset, size) in files.items():
+      target_path = target_dir / relative_path
+      target_path.parent.mkdir(parents=True, exist_ok=True)
+      with open(target_path, "wb") as fp:
+        fp.write(self.read(offset, size))
+
+  def close(self):
+    self._map.close()
+    self._file.close()
+
+
+class AssetPackWriter:
+  """Appends files to an uncompressed asset pack and returns their [offset, size] index."""
+
+  def __init__(self, path: PathLike):
+    self.path = pathlib.Path(path)
+    self._file = open(self.path, "wb")
+
+  def add_directory(self, source_dir: PathLike) -> Dict[str, List[int]]:
+    source_dir = pathlib.Path(source_dir)
+    return {str(p.relative_to(source_dir)): self.add_file(p)
+            for p in sorted(source_dir.rglob("*")) if p.is_file()}
+
+  def add_file(self, path: PathLike) -> List[int]:
+    padding = -self._file.tell() % _PACK_ALIGNMENT
+    self._file.write(b"\0" * padding)
+    offset = self._file.tell()
+    with open(path, "rb") as fp:
+      shutil.copyfileobj(fp, self._file, _COPY_CHUNK_SIZE)
+    return [offset, self._file.tell() - offset]
+
+  def close(self):
+    self._file.close()
+
+
+def copy_directory(source_dir: PathLike, target_dir: PathLike):
+  """Copies a (possibly remote) pre-extracted asset directory into a local directory."""
+  source_dir = str(source_dir).rstrip("/")
+  backend = filesystem.get_backend(source_dir)
+  for dirname, _, filenames in backend.walk(source_dir):
+    relative_dir = os.path.relpath(dirname, source_dir)
+    local_dir = pathlib.Path(target_dir) / relative_dir
+    local_dir.mkdir(parents=True, exist_ok=True)
+    for filename in filenames:
+      filesystem.copy(os.path.join(dirname, filename), local_dir / filename, overwrite=True)
+
+
+def convert_asset_source(manifest_path: PathLike, target_dir: PathLike, layout: str = "directory",
+                         manifest_name: Optional[str] = None,
+                         texture_variant_sizes: Sequence[int] = ()) -> Dict[str, Any]:
+  """Converts an asset source of `.tar.gz` archives into an uncompressed layout (see above).
+
+  Args:
+    manifest_path: the manifest of the source asset source (local or remote).
+    target_dir: local directory to write the converted assets and the new manifest to.
+    layout: either "directory" or "pack".
+    manifest_name: filename of the new manifest (defaults to the name of the source manifest).
+    texture_variant_sizes: if given, downsampled variants of all images of the assets are written
+      next to them (see kubric.assets.texture_variants, requires bpy) and listed in the
+      `"texture_variants"` of their manifest entries.
+
+  Returns:
+    The rewritten manifest, which is also written to `{target_dir}/{manifest_name}`.
+  """
+  if layout not in LAYOUTS:
+    raise ValueError(f"Unknown asset store layout {layout!r}. Available: {LAYOUTS}")
+  manifest = file_io.read_json(manifest_path)
+  manifest_name = manifest_name or str(manifest_path).rsplit("/", 1)[-1]
+  name = manifest.get("name", manifest_name.rsplit(".", 1)[0])
+  data_dir = str(manifest.get("data_dir", str(manifest_path).rsplit("/", 1)[0]))
+  target_dir = pathlib.Path(target_dir)
+  target_dir.mkdir(parents=True, exist_ok=True)
+
+  pack_writer = None
+  if layout == "pack":
+    pack_writer = AssetPackWriter(target_dir / (name + PACK_SUFFIX))
+
+  assets = {}
+  with tempfile.TemporaryDirectory(dir=target_dir) as staging_dir:
+    for asset_id, asset_entry in sorted(manifest["assets"].items()):
+      asset_entry = dict(asset_entry)
+      assets[asset_id] = asset_entry
+      path = asset_entry.get("path", "")
+      if path is None:
+        continue  # asset without files (e.g. a Texture referencing a shared file)
+      archive_path = file_io.cached_local_path(f"{data_dir}/{path or asset_id + '.tar.gz'}")
+      asset_entry.pop("sha256", None)  # refers to the archive
+
+      if layout == "directory":
+        asset_dir = target_dir / asset_id
+        if asset_dir.exists():
+          shutil.rmtree(asset_dir)
+      else:
+        asset_dir = pathlib.Path(staging_dir) / asset_id
+      asset_cache.unpack_asset_archive(archive_path, asset_id, asset_dir)
+      if texture_variant_sizes:
+        variants = texture_variants.write_texture_variants(asset_dir, texture_variant_sizes)
+        if variants:
+          asset_entry["texture_variants"] = variants
+
+      if layout == "directory":
+        asset_entry["path"] = f"{asset_id}/"
+      else:
+        asset_entry["path"] = name + PACK_SUFFIX
+        asset_entry["files"] = pack_writer.add_directory(asset_dir)
+        shutil.rmtree(asset_dir)
+      logger.debug("Converted asset %s", asset_id)
+
+  if pack_writer is not None:
+    pack_writer.close()
+
+  # without a data_dir the assets are found next to the manifest, wherever the store is moved to
+  new_manifest = {key: value for key, value in manifest.items() if key != "data_dir"}
+  new_manifest["assets"] = assets
+  file_io.write_json(new_manifest, target_dir / manifest_name)
+  logger.info("Converted %d assets of '%s' into the %s layout at '%s'", len(assets),
+              manifest_path, layout, target_dir)
+  return new_manifest
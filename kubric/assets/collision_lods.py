@@ -0,0 +1,101 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Collision geometry of assets at several levels of detail (LODs).
+
+Contact generation in PyBullet scales with the number of convex pieces of the colliding bodies,
+yet many objects (e.g. background clutter) do not need a fine approximation of their shape. The
+asset pipelines therefore store one collision mesh and URDF per LOD next to each other:
+
+  hull    collision_geometry_hull.obj    object_hull.urdf    (a single simplified convex hull)
+  coarse  collision_geometry_coarse.obj  object_coarse.urdf  (few VHACD pieces)
+  fine    collision_geometry.obj         object.urdf         (the VHACD settings used so far)
+
+and record them in the manifest as `kwargs["collision_lods"] = {lod: "{asset_dir}/<urdf>"}`.
+`FileBasedObject.collision_lod` and the `collision_lods` policy of the PyBullet simulator select
+which one is loaded.
+"""
+
+import logging
+import os
+import pathlib
+import sys
+from typing import Dict, Optional, Sequence
+
+from kubric.kubric_typing import PathLike
+from kubric.redirect_io import RedirectStream
+
+with RedirectStream(stream=sys.stderr):
+  import pybullet as pb
+
+logger = logging.getLogger(__name__)
+
+# VHACD parameters per LOD; without any clipping stage VHACD returns a single simplified hull
+COLLISION_LODS = {
+    "hull": {"resolution": 10_000, "depth": 1, "concavity": 1.0, "maxNumVerticesPerCH": 32},
+    "coarse": {"resolution": 20_000, "depth": 3, "concavity": 0.05, "maxNumVerticesPerCH": 24},
+    "fine": {},  # pybullet defaults
+}
+DEFAULT_LOD = "fine"
+
+
+def collision_mesh_filename(lod: str) -> str:
+  return "collision_geometry.obj" if lod == DEFAULT_LOD else f"collision_geometry_{lod}.obj"
+
+
+def urdf_filename(lod: str) -> str:
+  return "object.urdf" if lod == DEFAULT_LOD else f"object_{lod}.urdf"
+
+
+def compute_collision_mesh(source_path: PathLike, target_path: PathLike, lod: str = DEFAULT_LOD,
+                           log_path: Optional[PathLike] = None):
+  """Writes the collision mesh of `source_path` (an .obj file) at the given LOD."""
+  if lod not in COLLISION_LODS:
+    raise KeyError(f"Unknown collision LOD {lod!r}. Available LODs: {list(COLLISION_LODS)}")
+  with RedirectStream(stream=sys.stdout):
+    pb.vhacd(str(source_path), str(target_path), str(log_path or os.devnull),
+             **COLLISION_LODS[lod])
+
+
+def compute_collision_lods(source_path: PathLike, asset_dir: PathLike,
+                           lods: Sequence[str] = tuple(COLLISION_LODS),
+                           log_path: Optional[PathLike] = None) -> Dict[str, str]:
+  """Writes the collision meshes of all `lods` into `asset_dir` and returns their filenames."""
+  asset_dir = pathlib.Path(asset_dir)
+  filenames = {}
+  for lod in lods:
+    filenames[lod] = collision_mesh_filename(lod)
+    compute_collision_mesh(source_path, asset_dir / filenames[lod], lod=lod, log_path=log_path)
+  return filenames
+
+
+def write_lod_urdfs(urdf_path: PathLike, lods: Sequence[str] = tuple(COLLISION_LODS)
+                    ) -> Dict[str, str]:
+  """Writes a copy of the (fine) URDF per LOD that references its collision mesh instead."""
+  urdf_path = pathlib.Path(urdf_path)
+  urdf = urdf_path.read_text()
+  filenames = {}
+  for lod in lods:
+    if lod == DEFAULT_LOD:
+      filenames[lod] = urdf_path.name
+      continue
+    filenames[lod] = urdf_filename(lod)
+    lod_urdf = urdf.replace(collision_mesh_filename(DEFAULT_LOD), collision_mesh_filename(lod))
+    (urdf_path.parent / filenames[lod]).write_text(lod_urdf)
+  return filenames
+
+
+def manifest_entry(urdf_filenames: Dict[str, str]) -> Dict[str, str]:
+  """The `collision_lods` kwarg of an asset in the manifest."""
+  return {lod: "{asset_dir}/" + filename for lod, filename in urdf_filenames.items()}
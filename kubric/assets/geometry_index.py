@@ -0,0 +1,411 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Offline index of the geometry of all assets in a manifest.
+
+Selecting assets by size or aligning them usually requires creating the asset (i.e. fetching it
+and importing its mesh into Blender) only to look at its bounding box. The geometry index stores
+these quantities for all assets of a manifest in a single columnar file next to it
+(`GSO.json` -> `GSO.geometry.npz`), so that scenes can query them without loading any mesh:
+
+  index = kb.assets.GeometryIndex.from_manifest("gs://kubric-public/assets/GSO/GSO.json")
+  small_ids = index.query(scale=1.5, height=(0.05, 0.15))
+  obj = gso.create(small_ids[0], scale=1.5, quaternion=index.flat_quaternion(small_ids[0]))
+
+The index also stores the most likely stable resting poses of every asset (computed from its
+convex hull, see `kubric.assets.resting_poses`), which `kb.place_in_resting_pose` uses to put
+static objects at rest without a settling simulation.
+
+All quantities are given in the (z-up) frame of the asset at scale 1. For y-up sources such as
+ShapeNet (which are rotated by 90 degrees about the x-axis when placed) the index is built with
+`up_axis="y"` and then describes the rotated asset. The index is built by
+`kubric/scripts/build_geometry_index.py`.
+"""
+
+import functools
+import io
+import logging
+import multiprocessing
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyquaternion as pyquat
+
+from kubric import file_io
+from kubric.assets import resting_poses
+from kubric.kubric_typing import PathLike
+
+logger = logging.getLogger(__name__)
+
+GEOMETRY_INDEX_VERSION = 2
+MAX_RESTING_POSES = 16
+
+# number of spatial dimensions of each column per asset
+COLUMNS = {
+    "bounds_min": 3,
+    "bounds_max": 3,
+    "extents": 3,  # (width, depth, height)
+    "volume": 1,
+    "surface_area": 1,
+    "footprint_area": 1,  # area of the convex hull of the projection onto the ground plane
+    "support_height": 1,  # z of the highest horizontal surface that can support objects, or NaN
+    "principal_axes": 9,  # rows are unit axes ordered by decreasing spread (right-handed)
+    "principal_extents": 3,  # extent of the asset along each principal axis
+    # most likely stable resting poses (see kubric.assets.resting_poses), padded with probability 0
+    "resting_quaternions": 4 * MAX_RESTING_POSES,  # rotations of the asset (not of the index frame)
+    "resting_offsets": MAX_RESTING_POSES,  # height of the origin above the supporting plane
+    "resting_probabilities": MAX_RESTING_POSES,
+}
+
+# how many powers of the scale each column scales with
+_SCALE_POWER = {"volume": 3, "surface_area": 2, "footprint_area": 2, "principal_axes": 0,
+                "resting_quaternions": 0, "resting_probabilities": 0}
+
+# quantities accepted by `GeometryIndex.query`
+_QUERY_COLUMNS = {
+    "width": ("extents", 0),
+    "depth": ("extents", 1),
+    "height": ("extents", 2),
+    "max_extent": ("principal_extents", 0),
+    "min_extent": ("principal_extents", 2),
+    "volume": ("volume", 0),
+    "surface_area": ("surface_area", 0),
+    "footprint_area": ("footprint_area", 0),
+    "support_height": ("support_height", 0),
+}
+
+_UP_ROTATIONS = {
+    "z": np.eye(3),
+    "y": pyquat.Quaternion(axis=[1, 0, 0], degrees=90).rotation_matrix,
+}
+
+# surfaces whose normal is within this angle of the z-axis count as horizontal
+_SUPPORT_MAX_TILT_DEGREES = 10.
+# horizontal surfaces that are smaller than this fraction of the footprint can not support objects
+_SUPPORT_MIN_AREA_FRACTION = 0.2
+
+
+def index_path_for(manifest_path: PathLike) -> str:
+  """The path of the geometry index that belongs to a manifest."""
+  manifest_path = str(manifest_path)
+  if manifest_path.endswith(".json"):
+    manifest_path = manifest_path[:-len(".json")]
+  return manifest_path + ".geometry.npz"
+
+
+def _convex_hull_area(points: np.ndarray) -> float:
+  """Area of the 2D convex hull of `points` [N, 2] (monotone chain)."""
+  points = np.unique(np.asarray(points, dtype=np.float64), axis=0)
+  if len(points) < 3:
+    return 0.
+
+  def cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+  def half_hull(pts):
+    hull = []
+    for p in pts:
+      while len(hull) >= 2 and cross(hull[-2], hull[-1], p) <= 0:
+        hull.pop()
+      hull.append(p)
+    return hull[:-1]
+
+  hull = np.array(half_hull(points) + half_hull(points[::-1]))
+  x, y = hull[:, 0], hull[:, 1]
+  return float(0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))))
+
+
+def _principal_axes(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+  """Principal axes of the surface (area weighted, so that tessellation does not matter)."""
+  triangles = vertices[faces]
+  areas = 0.5 * np.linalg.norm(
+      np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]), axis=-1)
+  centroids = triangles.mean(axis=1)
+  weights = areas / max(areas.sum(), 1e-12)
+  centered = centroids - weights @ centroids
+  covariance = (centered * weights[:, None]).T @ centered
+  _, eigenvectors = np.linalg.eigh(covariance)
+  axes = eigenvectors[:, ::-1].T  # rows, by decreasing variance
+  # deterministic signs: largest component positive, right-handed frame
+  for i in range(2):
+    if axes[i, np.argmax(np.abs(axes[i]))] < 0:
+      axes[i] = -axes[i]
+  axes[2] = np.cross(axes[0], axes[1])
+  return axes
+
+
+def _support_height(vertices: np.ndarray, faces: np.ndarray, footprint_area: float) -> float:
+  """Height of the highest (nearly) horizontal surface with a sizable area, or NaN."""
+  triangles = vertices[faces]
+  normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+  areas = 0.5 * np.linalg.norm(normals, axis=-1)
+  valid = areas > 0
+  cos_tilt = np.zeros_like(areas)
+  # the winding of scanned / modelled meshes is not reliable, so both orientations count
+  cos_tilt[valid] = np.abs(normals[valid, 2]) / (2 * areas[valid])
+  horizontal = cos_tilt >= np.cos(np.radians(_SUPPORT_MAX_TILT_DEGREES))
+  if not horizontal.any() or footprint_area <= 0:
+    return float("nan")
+  heights = triangles[horizontal, :, 2].mean(axis=1)
+  z_min, z_max = vertices[:, 2].min(), vertices[:, 2].max()
+  bin_size = max((z_max - z_min) / 100, 1e-6)
+  bins = np.floor(np.maximum(heights - z_min, 0) / bin_size).astype(np.int64)
+  bin_areas = np.bincount(bins, weights=areas[horizontal])
+  supporting = np.flatnonzero(bin_areas >= _SUPPORT_MIN_AREA_FRACTION * footprint_area)
+  if len(supporting) == 0:
+    return float("nan")
+  top_bin = supporting[-1]
+  in_bin = bins == top_bin
+  return float(np.average(heights[in_bin], weights=areas[horizontal][in_bin]))
+
+
+def compute_asset_geometry(mesh, up_axis: str = "z") -> Dict[str, np.ndarray]:
+  """Computes all `COLUMNS` of a single asset from a trimesh.Trimesh."""
+  up_rotation = _UP_ROTATIONS[up_axis]
+  vertices = np.asarray(mesh.vertices, dtype=np.float64) @ up_rotation.T
+  faces = np.asarray(mesh.faces, dtype=np.int64)
+  bounds_min, bounds_max = vertices.min(axis=0), vertices.max(axis=0)
+  footprint_area = _convex_hull_area(vertices[:, :2])
+  axes = _principal_axes(vertices, faces)
+  projected = vertices @ axes.T
+  # the volume of meshes that are not watertight is meaningless; use their convex hull instead
+  hull = mesh.convex_hull
+  volume = mesh.volume if mesh.is_watertight else hull.volume
+  # same center of mass as in the URDFs of the asset pipelines
+  center_mass = mesh.center_mass if mesh.is_watertight else hull.center_mass
+  transform = np.eye(4)
+  transform[:3, :3] = up_rotation
+  hull = hull.copy()
+  hull.apply_transform(transform)
+  quaternions, offsets, probabilities = resting_poses.compute_resting_poses(
+      hull, up_rotation @ center_mass, max_poses=MAX_RESTING_POSES)
+  up_quaternion = pyquat.Quaternion(matrix=up_rotation)
+  quaternions = [(pyquat.Quaternion(q) * up_quaternion).elements for q in quaternions]
+  padding = MAX_RESTING_POSES - len(offsets)
+  return {
+      "bounds_min": bounds_min,
+      "bounds_max": bounds_max,
+      "extents": bounds_max - bounds_min,
+      "volume": np.array([abs(volume)]),
+      "surface_area": np.array([mesh.area]),
+      "footprint_area": np.array([footprint_area]),
+      "support_height": np.array([_support_height(vertices, faces, footprint_area)]),
+      "principal_axes": axes.reshape(-1),
+      "principal_extents": projected.max(axis=0) - projected.min(axis=0),
+      "resting_quaternions": np.concatenate([np.reshape(quaternions, -1),
+                                             np.tile([1., 0., 0., 0.], padding)]),
+      "resting_offsets": np.pad(offsets, (0, padding)),
+      "resting_probabilities": np.pad(probabilities, (0, padding)),
+  }
+
+
+class GeometryIndex:
+  """Per-asset geometry of all assets of a manifest, stored column by column.
+
+  Each column is an array with one row per asset (see `COLUMNS`), rows are sorted by asset id.
+  """
+
+  def __init__(self, asset_ids: Sequence[str], columns: Dict[str, np.ndarray],
+               up_axis: str = "z"):
+    self.asset_ids = list(asset_ids)
+    self.columns = {k: np.asarray(v, dtype=np.float64).reshape(len(self.asset_ids), COLUMNS[k])
+                    for k, v in columns.items()}
+    self.up_axis = up_axis
+    self._rows = {asset_id: i for i, asset_id in enumerate(self.asset_ids)}
+
+  def __len__(self):
+    return len(self.asset_ids)
+
+  def __contains__(self, asset_id: str):
+    return asset_id in self._rows
+
+  @classmethod
+  def from_rows(cls, rows: Dict[str, Dict[str, np.ndarray]], up_axis: str = "z"):
+    asset_ids = sorted(rows)
+    columns = {name: np.stack([np.asarray(rows[a][name], dtype=np.float64).reshape(size)
+                               for a in asset_ids]) if asset_ids else np.zeros((0, size))
+               for name, size in COLUMNS.items()}
+    return cls(asset_ids, columns, up_axis=up_axis)
+
+  @classmethod
+  def load(cls, path: PathLike) -> "GeometryIndex":
+    with np.load(io.BytesIO(file_io.read_bytes(path)), allow_pickle=False) as data:
+      version = int(data["version"])
+      if version != GEOMETRY_INDEX_VERSION:
+        raise ValueError(f"Geometry index {path} has version {version}, "
+                         f"expected {GEOMETRY_INDEX_VERSION}. Please rebuild it.")
+      return cls(data["asset_ids"].tolist(), {name: data[name] for name in COLUMNS},
+                 up_axis=str(data["up_axis"]))
+
+  @classmethod
+  def from_manifest(cls, manifest_path: PathLike,
+                    missing_ok: bool = False) -> Optional["GeometryIndex"]:
+    """Loads the index next to a manifest; returns None if it is missing and `missing_ok`."""
+    path = index_path_for(manifest_path)
+    if missing_ok and not file_io.as_path(path).exists():
+      logger.info("No geometry index at %s", path)
+      return None
+    return cls.load(path)
+
+  def save(self, path: PathLike):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, version=np.array(GEOMETRY_INDEX_VERSION),
+                        up_axis=np.array(self.up_axis),
+                        asset_ids=np.array(self.asset_ids, dtype=str), **self.columns)
+    path = file_io.as_path(path)
+    tmp_path = path.parent / (path.name + ".tmp")
+    tmp_path.write_bytes(buffer.getvalue())
+    tmp_path.rename(path)
+
+  def get(self, asset_id: str, scale: float = 1.) -> Dict[str, Any]:
+    """All quantities of a single asset at the given (uniform) scale."""
+    row = self._rows[asset_id]
+    result = {}
+    for name, column in self.columns.items():
+      value = column[row] * scale ** _SCALE_POWER.get(name, 1)
+      result[name] = value.item() if COLUMNS[name] == 1 else value
+    result["principal_axes"] = result["principal_axes"].reshape(3, 3)
+    result["resting_quaternions"] = result["resting_quaternions"].reshape(-1, 4)
+    return result
+
+  def values(self, quantity: str, scale: float = 1.) -> np.ndarray:
+    """One value of `quantity` (see `_QUERY_COLUMNS`) per asset (in the order of asset_ids)."""
+    if quantity not in _QUERY_COLUMNS:
+      raise KeyError(f"Unknown quantity {quantity!r}. Available: {sorted(_QUERY_COLUMNS)}")
+    name, i = _QUERY_COLUMNS[quantity]
+    return self.columns[name][:, i] * scale ** _SCALE_POWER.get(name, 1)
+
+  def query(self, scale: float = 1., asset_ids: Optional[Sequence[str]] = None,
+            **ranges: Tuple[Optional[float], Optional[float]]) -> List[str]:
+    """Ids of all assets whose quantities (at `scale`) lie within the given [min, max] ranges.
+
+    Example:
+      index.query(scale=2., height=(0.1, 0.3), footprint_area=(None, 0.05))
+
+    Either bound may be None. Assets for which a quantity is NaN (e.g. the support height of a
+    ball) never match a range on that quantity. If `asset_ids` is given, only those are returned.
+    """
+    mask = np.ones(len(self), dtype=bool)
+    for quantity, (low, high) in ranges.items():
+      values = self.values(quantity, scale=scale)
+      mask &= ~np.isnan(values)
+      if low is not None:
+        mask &= values >= low
+      if high is not None:
+        mask &= values <= high
+    if asset_ids is not None:
+      rows = [self._rows[a] for a in asset_ids if a in self._rows]
+      return [self.asset_ids[r] for r in rows if mask[r]]
+    return [self.asset_ids[r] for r in np.flatnonzero(mask)]
+
+  def has_resting_poses(self, asset_id: str) -> bool:
+    return (asset_id in self._rows and
+            self.columns["resting_probabilities"][self._rows[asset_id]].sum() > 0)
+
+  def resting_poses(self, asset_id: str, scale: float = 1.
+                    ) -> List[Tuple[pyquat.Quaternion, float, float]]:
+    """The stable resting poses of an asset as (quaternion, offset, probability).
+
+    Setting the quaternion of the asset (at `scale`) and placing its origin `offset` above a
+    horizontal plane puts it at rest on that plane.
+    """
+    geometry = self.get(asset_id, scale=scale)
+    return [(pyquat.Quaternion(q), offset, probability)
+            for q, offset, probability in zip(geometry["resting_quaternions"],
+                                              geometry["resting_offsets"],
+                                              geometry["resting_probabilities"])
+            if probability > 0]
+
+  def sample_resting_pose(self, asset_id: str, rng: np.random.RandomState, scale: float = 1.
+                          ) -> Tuple[pyquat.Quaternion, float]:
+    """Samples one of the resting poses (quaternion, offset) by its probability."""
+    poses = self.resting_poses(asset_id, scale=scale)
+    if not poses:
+      raise KeyError(f"No resting poses for asset {asset_id!r} in the geometry index.")
+    probabilities = np.array([probability for _, _, probability in poses])
+    quaternion, offset, _ = poses[rng.choice(len(poses), p=probabilities / probabilities.sum())]
+    return quaternion, offset
+
+  # The rotations below are given in the frame of the index; for an index with up_axis="y" they
+  # have to be applied after the rotation of the asset into the z-up frame.
+
+  def flat_quaternion(self, asset_id: str) -> pyquat.Quaternion:
+    """Rotation that lays an asset flat: largest spread along x, smallest spread along z."""
+    axes = self.get(asset_id)["principal_axes"]
+    return pyquat.Quaternion(matrix=axes)
+
+  def standing_quaternion(self, asset_id: str) -> pyquat.Quaternion:
+    """Rotation that stands an asset on its edge: largest spread along x, smallest along y."""
+    axes = self.get(asset_id)["principal_axes"]
+    # maps the principal axes onto (x, -y, z) which keeps the frame right-handed
+    return pyquat.Quaternion(matrix=np.stack([axes[0], -axes[2], axes[1]]))
+
+  def upright_quaternion(self, asset_id: str) -> pyquat.Quaternion:
+    """Rotation that stands an asset upright: its principal (longest) axis along z."""
+    axes = self.get(asset_id)["principal_axes"]
+    # maps the principal axes onto (z, x, y) which keeps the frame right-handed
+    return pyquat.Quaternion(matrix=axes[[1, 2, 0]])
+
+
+def _asset_geometry(asset_id: str, manifest_path: str, up_axis: str):
+  """Fetches and loads a single asset (in a worker process)."""
+  import trimesh  # pylint: disable=g-import-not-at-top
+  source = _worker_source(manifest_path)
+  try:
+    asset = source.create(asset_id, add_metadata=False)
+    mesh = trimesh.load(str(asset.render_filename), force="mesh")
+    return asset_id, compute_asset_geometry(mesh, up_axis=up_axis), None
+  except Exception as e:  # pylint: disable=broad-except
+    logger.warning("Could not index asset %s: %s", asset_id, e)
+    return asset_id, None, repr(e)
+
+
+@functools.lru_cache(maxsize=None)
+def _worker_source(manifest_path: str):
+  from kubric.assets import asset_source  # pylint: disable=g-import-not-at-top
+  return asset_source.AssetSource.from_manifest(manifest_path)
+
+
+def build_geometry_index(manifest_path: PathLike, output_path: Optional[PathLike] = None,
+                         up_axis: str = "z", asset_ids: Optional[Sequence[str]] = None,
+                         num_processes: int = 1) -> GeometryIndex:
+  """Computes the geometry of all object assets of a manifest and saves the index next to it."""
+  if up_axis not in _UP_ROTATIONS:
+    raise ValueError(f"Unknown up_axis {up_axis!r}. Available: {list(_UP_ROTATIONS)}")
+  manifest_path = str(manifest_path)
+  if asset_ids is None:
+    manifest = file_io.read_json(manifest_path)
+    asset_ids = sorted(asset_id for asset_id, entry in manifest["assets"].items()
+                       if entry["asset_type"] == "FileBasedObject")
+
+  rows, failures = {}, {}
+  tasks = [(a, manifest_path, up_axis) for a in asset_ids]
+  if num_processes > 1:
+    with multiprocessing.get_context("spawn").Pool(num_processes) as pool:
+      results = list(pool.starmap(_asset_geometry, tasks, chunksize=16))
+  else:
+    results = [_asset_geometry(*task) for task in tasks]
+    if tasks:
+      _worker_source(manifest_path).close()
+      _worker_source.cache_clear()
+  for asset_id, geometry, error in results:
+    if geometry is None:
+      failures[asset_id] = error
+    else:
+      rows[asset_id] = geometry
+  logger.info("Indexed %d assets (%d failed)", len(rows), len(failures))
+
+  index = GeometryIndex.from_rows(rows, up_axis=up_axis)
+  index.save(output_path or index_path_for(manifest_path))
+  return index
@@ -0,0 +1,149 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Stable resting poses of rigid objects on a horizontal plane.
+
+A rigid object resting on a plane touches it with a facet of its convex hull, and it can only rest
+on facets for which the projection of its center of mass lies inside the facet. An object that is
+dropped in a random orientation first touches the facet that is hit by the ray from the center of
+mass downwards, and then topples over edges until it reaches such a stable facet (the quasi-static
+model of Moll & Erdmann, also used by `trimesh.poses`). The probability of a resting pose is
+therefore the solid angle of all facets that topple into it, as seen from the center of mass.
+"""
+
+from typing import Tuple
+
+import numpy as np
+import pyquaternion as pyquat
+
+_NORMAL_TOLERANCE = 1e-6
+_DISTANCE_TOLERANCE = 1e-6
+
+
+def _group_facets(normals: np.ndarray, offsets: np.ndarray, scale: float) -> np.ndarray:
+  """Facet index of each (coplanar) triangle of the hull."""
+  facet_of = np.full(len(normals), -1)
+  num_facets = 0
+  for i in range(len(normals)):
+    if facet_of[i] >= 0:
+      continue
+    same_plane = ((normals @ normals[i] > 1 - _NORMAL_TOLERANCE) &
+                  (np.abs(offsets - offsets[i]) < _DISTANCE_TOLERANCE * scale) & (facet_of < 0))
+    facet_of[same_plane] = num_facets
+    num_facets += 1
+  return facet_of
+
+
+def _solid_angles(triangles: np.ndarray, center: np.ndarray) -> np.ndarray:
+  """Solid angle of each triangle as seen from `center` (Van Oosterom & Strackee)."""
+  a, b, c = (triangles[:, i] - center for i in range(3))
+  la, lb, lc = (np.linalg.norm(v, axis=-1) for v in (a, b, c))
+  numerator = np.abs(np.einsum("ij,ij->i", a, np.cross(b, c)))
+  denominator = (la * lb * lc + np.einsum("ij,ij->i", a, b) * lc +
+                 np.einsum("ij,ij->i", a, c) * lb + np.einsum("ij,ij->i", b, c) * la)
+  return 2 * np.arctan2(numerator, denominator)
+
+
+def _rotation_onto_floor(normal: np.ndarray) -> pyquat.Quaternion:
+  """Smallest rotation that turns the (outward) facet normal downwards."""
+  down = np.array([0., 0., -1.])
+  axis = np.cross(normal, down)
+  sin_angle, cos_angle = np.linalg.norm(axis), np.dot(normal, down)
+  if sin_angle < 1e-9:
+    return pyquat.Quaternion() if cos_angle > 0 else pyquat.Quaternion(axis=[1, 0, 0], angle=np.pi)
+  return pyquat.Quaternion(axis=axis / sin_angle, angle=np.arctan2(sin_angle, cos_angle))
+
+
+def compute_resting_poses(hull, center_mass, max_poses: int = 8
+                          ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+  """Stable resting poses of an object given its convex hull (a trimesh.Trimesh).
+
+  Args:
+    hull: the convex hull of the (collision) geometry of the object.
+    center_mass: center of mass of the object (in the same frame as the hull).
+    max_poses: only the `max_poses` most likely poses are returned.
+
+  Returns:
+    (quaternions [K, 4], offsets [K], probabilities [K]) sorted by decreasing probability, where
+    rotating the object by the quaternion (w, x, y, z) and lifting its origin by the offset puts it
+    at rest on the plane z=0. Rotations about the z-axis of course keep the object at rest.
+  """
+  vertices = np.asarray(hull.vertices, dtype=np.float64)
+  faces = np.asarray(hull.faces, dtype=np.int64)
+  center_mass = np.asarray(center_mass, dtype=np.float64)
+  triangles = vertices[faces]
+  normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+  normals /= np.maximum(np.linalg.norm(normals, axis=-1, keepdims=True), 1e-12)
+  offsets = np.einsum("ij,ij->i", normals, triangles[:, 0])
+  scale = max(np.ptp(vertices, axis=0).max(), 1e-12)
+  facet_of = _group_facets(normals, offsets, scale)
+  num_facets = facet_of.max() + 1
+
+  # boundary edges of every facet, and which facet lies on the other side of each edge
+  edge_faces = {}
+  for face_index, face in enumerate(faces):
+    for k in range(3):
+      edge_faces.setdefault(tuple(sorted((face[k], face[(k + 1) % 3]))), []).append(face_index)
+  facet_edges = [[] for _ in range(num_facets)]  # (v0, v1, neighbor facet)
+  for (v0, v1), adjacent in edge_faces.items():
+    facets = {facet_of[f] for f in adjacent}
+    if len(facets) == 2:
+      f0, f1 = facets
+      facet_edges[f0].append((v0, v1, f1))
+      facet_edges[f1].append((v0, v1, f0))
+
+  facet_normals = np.zeros((num_facets, 3))
+  facet_offsets = np.zeros(num_facets)
+  facet_centroids = np.zeros((num_facets, 3))
+  for f in range(num_facets):
+    members = np.flatnonzero(facet_of == f)
+    facet_normals[f], facet_offsets[f] = normals[members[0]], offsets[members[0]]
+    facet_centroids[f] = triangles[members].reshape(-1, 3).mean(axis=0)
+  heights = facet_offsets - facet_normals @ center_mass  # of the center of mass when resting
+
+  def topple_target(f):
+    """The facet onto which an object resting on facet `f` topples (`f` if it is stable)."""
+    projection = center_mass + heights[f] * facet_normals[f]
+    worst, target = _DISTANCE_TOLERANCE * scale, f
+    for v0, v1, neighbor in facet_edges[f]:
+      edge = vertices[v1] - vertices[v0]
+      outward = np.cross(edge, facet_normals[f])
+      outward /= max(np.linalg.norm(outward), 1e-12)
+      # orient away from the (convex) facet
+      if np.dot(outward, facet_centroids[f] - vertices[v0]) > 0:
+        outward = -outward
+      violation = np.dot(outward, projection - vertices[v0])
+      if violation > worst:
+        worst, target = violation, neighbor
+    return target
+
+  next_facet = np.array([topple_target(f) for f in range(num_facets)])
+  probability = np.zeros(num_facets)
+  np.add.at(probability, facet_of, _solid_angles(triangles, center_mass) / (4 * np.pi))
+  resting_probability = np.zeros(num_facets)
+  for f in range(num_facets):
+    visited = [f]
+    while next_facet[visited[-1]] != visited[-1] and len(visited) <= num_facets:
+      if next_facet[visited[-1]] in visited:  # numerically ambiguous; rest on the lowest facet
+        break
+      visited.append(next_facet[visited[-1]])
+    resting = visited[-1] if next_facet[visited[-1]] == visited[-1] else min(
+        visited, key=lambda g: heights[g])
+    resting_probability[resting] += probability[f]
+
+  order = np.argsort(-resting_probability, kind="stable")
+  order = order[resting_probability[order] > 0][:max_poses]
+  quaternions = np.array([_rotation_onto_floor(facet_normals[f]).elements for f in order])
+  # the facet plane n.x = d ends up at z = -d, so the origin has to be lifted by d
+  return quaternions.reshape(-1, 4), facet_offsets[order], resting_probability[order]
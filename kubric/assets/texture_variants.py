@@ -0,0 +1,129 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pre-generated lower resolution variants of the textures and HDRIs of assets.
+
+Assets ship with full resolution images (e.g. 4k-8k HDRIs, 2k-4k object textures), while small
+renderings only ever sample a fraction of these texels. `write_texture_variants` stores a chain of
+downsampled copies next to every image of an asset (the levels of a mip map, as separate files):
+
+  textures/texture.png  ->  textures/texture_256px.png, textures/texture_512px.png, ...
+
+where the size is the length of the longer side. `convert_asset_source(texture_variants=...)`
+generates them when converting an asset source, and the Blender renderer (with
+`texture_resolution="auto"`) swaps each image for the smallest variant that still provides
+enough texels for the output resolution and the distance of the object to the camera.
+"""
+
+import logging
+import math
+import os
+import pathlib
+import re
+from typing import Dict, List, Sequence
+
+from kubric.kubric_typing import PathLike
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".hdr", ".exr")
+DEFAULT_SIZES = (256, 512, 1024, 2048)
+# texels per (output) pixel of the projected object; UV atlases spread the visible side of an
+# object over only part of the texture
+TEXEL_DENSITY = 2.
+# lighting only (not directly visible) HDRIs are blurry anyway
+AMBIENT_HDRI_SIZE = 1024
+
+_VARIANT_PATTERN = re.compile(r"_(\d+)px$")
+
+
+def variant_path(path: PathLike, size: int) -> str:
+  root, extension = os.path.splitext(str(path))
+  return f"{root}_{size}px{extension}"
+
+
+def is_variant(path: PathLike) -> bool:
+  return bool(_VARIANT_PATTERN.search(os.path.splitext(str(path))[0]))
+
+
+def available_variants(path: PathLike, sizes: Sequence[int] = DEFAULT_SIZES) -> Dict[int, str]:
+  """The variants of an image that exist on disk as {size: path}."""
+  return {size: variant_path(path, size) for size in sizes
+          if os.path.exists(variant_path(path, size))}
+
+
+def select_variant(path: PathLike, required_size: float, sizes: Sequence[int] = DEFAULT_SIZES
+                   ) -> str:
+  """The smallest variant with at least `required_size` texels along its longer side.
+
+  Falls back to the original image if no (large enough) variant exists.
+  """
+  for size, candidate in sorted(available_variants(path, sizes).items()):
+    if size >= required_size:
+      return candidate
+  return str(path)
+
+
+def required_environment_size(resolution_x: int, field_of_view: float) -> float:
+  """Width of an equirectangular image that provides one texel per output pixel."""
+  return resolution_x * 2 * math.pi / field_of_view
+
+
+def required_texture_size(resolution_x: int, field_of_view: float, object_size: float,
+                          distance: float) -> float:
+  """Texture size needed for an object of `object_size` seen from `distance`.
+
+  Objects that are close to (or around) the camera need at most as many texels as an environment
+  map, which covers all directions.
+  """
+  environment_size = required_environment_size(resolution_x, field_of_view)
+  if distance <= object_size / 2:
+    return environment_size
+  projected_size = resolution_x * object_size / (2 * distance * math.tan(field_of_view / 2))
+  return min(TEXEL_DENSITY * projected_size, environment_size)
+
+
+def write_texture_variants(asset_dir: PathLike, sizes: Sequence[int] = DEFAULT_SIZES
+                           ) -> Dict[str, List[int]]:
+  """Writes the downsampled variants of all images in `asset_dir` (requires bpy).
+
+  Returns:
+    The sizes that were written for each image as {relative_path: [size, ...]}. Images are never
+    upsampled, so small images have fewer (or no) variants.
+  """
+  import bpy  # pylint: disable=g-import-not-at-top
+
+  asset_dir = pathlib.Path(asset_dir)
+  written = {}
+  for path in sorted(asset_dir.rglob("*")):
+    if path.suffix.lower() not in IMAGE_EXTENSIONS or is_variant(path):
+      continue
+    image = bpy.data.images.load(str(path))
+    try:
+      width, height = image.size
+      image_sizes = []
+      for size in sorted(sizes, reverse=True):  # downsample step by step, like a mip chain
+        if max(width, height) <= size:
+          continue
+        factor = size / max(image.size)
+        image.scale(max(1, round(image.size[0] * factor)), max(1, round(image.size[1] * factor)))
+        image.filepath_raw = variant_path(path, size)
+        image.save()
+        image_sizes.append(size)
+      if image_sizes:
+        written[str(path.relative_to(asset_dir))] = sorted(image_sizes)
+    finally:
+      bpy.data.images.remove(image)
+  logger.debug("Wrote texture variants %s in %s", written, asset_dir)
+  return written
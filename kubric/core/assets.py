@@ -21,7 +21,7 @@ import munch
 import numpy as np
 import traitlets as tl
 
-from kubric.utils import next_global_count
+from kubric import utils
 
 
 class Asset(tl.HasTraits):
@@ -76,7 +76,7 @@ class Asset(tl.HasTraits):
   def _uid(self):
     # e.g. if self.name="Cube", the UIDs of the first three: {"Cube", "Cube.001", "Cube.002"}
     # Matches blender naming logic, and allows lexicographical sorting of the first 999 instances.
-    name_counter = next_global_count(self.name)
+    name_counter = utils.next_global_count(self.name)
     if name_counter == 0:
       return f"{self.name}"
     else:
@@ -279,6 +279,12 @@ class FileBasedObject(PhysicalObject):
   render_filename = tl.Unicode(allow_none=True)
   render_import_kwargs = tl.Dict(key_trait=tl.ObjectName())
 
+  # Simulation files of the collision geometry at several levels of detail (e.g. "hull", "coarse",
+  # "fine"; see kubric.assets.collision_lods). `collision_lod` selects one of them, if None the
+  # simulator picks one based on the role of the object (or falls back to simulation_filename).
+  collision_lods = tl.Dict(value_trait=tl.Unicode())
+  collision_lod = tl.Unicode(None, allow_none=True)
+
   # If true, applies the transform to all loaded nodes after loading the GLB.
   # This makes loading GLB files reproduce the expected workflow of Blender in
   # UI, minus a 90 degree X-axis rotation applied after loading.
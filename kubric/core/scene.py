@@ -17,7 +17,7 @@ from typing import Tuple, Union, List
 import traitlets as tl
 
 import kubric  # pylint: disable=unused-import
-from kubric.utils import next_global_count
+from kubric import utils
 from kubric.core import color
 from kubric.core import traits as ktl
 from kubric.core.assets import Asset  #< avoids self.assets property name clash
@@ -78,7 +78,7 @@ class Scene(tl.HasTraits):
   @tl.default("uid")
   def _uid(self):
     name = self.__class__.__name__
-    return f"{name}.{next_global_count(name):03d}"
+    return f"{name}.{utils.next_global_count(name):03d}"
 
   @tl.validate("step_rate")
   def _valid_step_rate(self, proposal):
@@ -14,7 +14,11 @@
 
 # pylint: disable=line-too-long, unexpected-keyword-arg
 """TODO(klausg): description."""
+import concurrent.futures
 import json
+import logging
+import resource
+import time
 
 import numpy as np
 import tensorflow as tf
@@ -25,7 +29,22 @@ from kubric import file_io
 DEFAULT_LAYERS = ("rgba", "segmentation", "forward_flow", "backward_flow",
                   "depth", "normal", "object_coordinates")
 
-def load_scene_directory(scene_dir, target_size, layers=DEFAULT_LAYERS):
+def load_scene_directory(scene_dir, target_size, layers=DEFAULT_LAYERS, flow_scale=1.):
+  """Loads and downsamples all layers of a rendered scene directory (e.g. for a TFDS builder).
+
+  The frames of each layer are decoded concurrently (see LOADER_THREADS) into a preallocated
+  (T, H, W, C) array, which is then downsampled to `target_size` in a single vectorized op.
+
+  Args:
+    scene_dir: directory with the outputs of a worker (metadata.json, rgba_00000.png, ...).
+    target_size: (height, width) of the returned frames (the resolution has to be a multiple).
+    layers: the layers to load.
+    flow_scale: factor by which the flow ranges are multiplied (in addition to the rescaling).
+
+  Returns:
+    The example key, the (TFDS) example and the raw metadata.
+  """
+  start_time = time.perf_counter()
   scene_dir = file_io.as_path(scene_dir)
   example_key = f"{scene_dir.name}"
 
@@ -54,7 +73,10 @@ def load_scene_directory(scene_dir, target_size, layers=DEFAULT_LAYERS):
       "events": format_events_information(events),
   }
 
-  resolution = metadata["metadata"]["resolution"]
+  if "resolution" in metadata["metadata"]:
+    resolution = metadata["metadata"]["resolution"]
+  else:
+    resolution = metadata["metadata"]["height"], metadata["metadata"]["width"]
 
   assert resolution[1] / target_size[0] == resolution[0] / target_size[1]
   scale = resolution[1] / target_size[0]
@@ -64,57 +86,89 @@ def load_scene_directory(scene_dir, target_size, layers=DEFAULT_LAYERS):
       key: [scene_dir / f"{key}_{f:05d}.png" for f in range(num_frames)]
       for key in layers if key != "depth"
   }
+  peak_buffer_bytes = 0
+
+  def load_stack(frame_paths, read_fn=file_io.read_png, channels=None, subsample_fn=None):
+    nonlocal peak_buffer_bytes
+    stack = read_frames(frame_paths, read_fn, channels)
+    peak_buffer_bytes = max(peak_buffer_bytes, stack.nbytes)
+    subsample_fn = subsample_fn or subsample_nearest_neighbor
+    # copy, so that the full resolution stack can be freed right away
+    return np.ascontiguousarray(subsample_fn(stack, target_size))
 
   if "depth" in layers:
     depth_paths = [scene_dir / f"depth_{f:05d}.tiff" for f in range(num_frames)]
-    depth_frames = np.array([
-      subsample_nearest_neighbor(file_io.read_tiff(frame_path), target_size)
-      for frame_path in depth_paths])
+    depth_frames = load_stack(depth_paths, file_io.read_tiff)
     depth_min, depth_max = np.min(depth_frames), np.max(depth_frames)
     result["depth"] = convert_float_to_uint16(depth_frames, depth_min, depth_max)
     result["metadata"]["depth_range"] = [depth_min, depth_max]
 
   if "forward_flow" in layers:
     result["metadata"]["forward_flow_range"] = [
-        data_ranges["forward_flow"]["min"] / scale,
-        data_ranges["forward_flow"]["max"] / scale]
-    result["forward_flow"] = [
-        subsample_nearest_neighbor(file_io.read_png(frame_path)[..., :2],
-                                   target_size)
-        for frame_path in paths["forward_flow"]]
+        data_ranges["forward_flow"]["min"] / scale * flow_scale,
+        data_ranges["forward_flow"]["max"] / scale * flow_scale]
+    result["forward_flow"] = load_stack(paths["forward_flow"], channels=2)
 
   if "backward_flow" in layers:
     result["metadata"]["backward_flow_range"] = [
-        data_ranges["backward_flow"]["min"] / scale,
-        data_ranges["backward_flow"]["max"] / scale]
-    result["backward_flow"] = [
-        subsample_nearest_neighbor(file_io.read_png(frame_path)[..., :2],
-                                   target_size)
-        for frame_path in paths["backward_flow"]]
+        data_ranges["backward_flow"]["min"] / scale * flow_scale,
+        data_ranges["backward_flow"]["max"] / scale * flow_scale]
+    result["backward_flow"] = load_stack(paths["backward_flow"], channels=2)
 
   for key in ["normal", "object_coordinates", "uv"]:
     if key in layers:
-      result[key] = [
-          subsample_nearest_neighbor(file_io.read_png(frame_path),
-                                     target_size)
-        for frame_path in paths[key]]
+      result[key] = load_stack(paths[key])
 
   if "segmentation" in layers:
     # somehow we ended up calling this "segmentations" in TFDS and
     # "segmentation" in kubric. So we have to treat it separately.
-    result["segmentations"] = [
-        subsample_nearest_neighbor(file_io.read_png(frame_path),
-                                   target_size)
-        for frame_path in paths["segmentation"]]
+    result["segmentations"] = load_stack(paths["segmentation"])
 
   if "rgba" in layers:
-    result["video"] = [
-        subsample_avg(file_io.read_png(frame_path), target_size)[..., :3]
-        for frame_path in paths["rgba"]]
+    result["video"] = load_stack(paths["rgba"], channels=3, subsample_fn=subsample_avg)
 
+  logging.info("Loaded scene '%s' in %.2fs (peak frame buffer %.1f MiB, peak RSS %.1f MiB)",
+               example_key, time.perf_counter() - start_time, peak_buffer_bytes / 2**20,
+               resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10)
   return example_key, result, metadata
 
 
+LOADER_THREADS = 16
+_LOADER_POOL = None
+
+
+def _get_loader_pool() -> concurrent.futures.ThreadPoolExecutor:
+  global _LOADER_POOL
+  if _LOADER_POOL is None:
+    _LOADER_POOL = concurrent.futures.ThreadPoolExecutor(LOADER_THREADS,
+                                                         thread_name_prefix="scene_loader")
+  return _LOADER_POOL
+
+
+def read_frames(frame_paths, read_fn=file_io.read_png, channels=None) -> np.ndarray:
+  """Reads a sequence of frames concurrently into a single (T, H, W, C) array.
+
+  Args:
+    frame_paths: the files of the individual frames.
+    read_fn: the function used for reading a single frame (e.g. file_io.read_png).
+    channels: if given, only the first `channels` channels are kept (e.g. 2 for flow).
+
+  Returns:
+    An array of shape (len(frame_paths), H, W, C) with the dtype of the first frame.
+  """
+  first_frame = read_fn(frame_paths[0])[..., :channels]
+  stack = np.empty((len(frame_paths),) + first_frame.shape, dtype=first_frame.dtype)
+  stack[0] = first_frame
+  del first_frame
+
+  def read_into_stack(i):
+    stack[i] = read_fn(frame_paths[i])[..., :channels]
+
+  # consume the iterator to wait for all reads (and to propagate exceptions)
+  list(_get_loader_pool().map(read_into_stack, range(1, len(frame_paths))))
+  return stack
+
+
 def get_camera_features(seq_length):
   return {
       "focal_length": tf.float32,
@@ -208,7 +262,8 @@ def format_instance_information(obj):
 
 
 def subsample_nearest_neighbor(arr, size):
-  src_height, src_width, _ = arr.shape
+  """Subsamples an image (H, W, C) or a stack of images (..., H, W, C) to size=(height, width)."""
+  src_height, src_width, _ = arr.shape[-3:]
   dst_height, dst_width = size
   height_step = src_height // dst_height
   width_step = src_width // dst_width
@@ -217,7 +272,7 @@ def subsample_nearest_neighbor(arr, size):
 
   height_offset = int(np.floor((height_step-1)/2))
   width_offset = int(np.floor((width_step-1)/2))
-  subsampled = arr[height_offset::height_step, width_offset::width_step, :]
+  subsampled = arr[..., height_offset::height_step, width_offset::width_step, :]
   return subsampled
 
 
@@ -227,13 +282,14 @@ def convert_float_to_uint16(array, min_val, max_val):
 
 
 def subsample_avg(arr, size):
-  src_height, src_width, channels = arr.shape
+  """Downsamples an image (H, W, C) or a stack of images (..., H, W, C) by averaging bins."""
+  *batch_dims, src_height, src_width, channels = arr.shape
   dst_height, dst_width = size
   height_bin = src_height // dst_height
   width_bin = src_width // dst_width
-  return np.round(arr.reshape((dst_height, height_bin,
+  return np.round(arr.reshape((*batch_dims, dst_height, height_bin,
                                dst_width, width_bin,
-                               channels)).mean(axis=(1, 3))).astype(np.uint8)
+                               channels)).mean(axis=(-4, -2))).astype(np.uint8)
 
 
 def is_complete_dir(video_dir, layers=DEFAULT_LAYERS):
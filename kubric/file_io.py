@@ -12,26 +12,49 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import atexit
 import contextlib
+import fcntl
 import functools
 import logging
 import json
-import multiprocessing
+import pathlib
 import pickle
-from typing import Any, Dict
+import queue
+import subprocess
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
 
 from etils import epath
-import imageio
 import numpy as np
-import png
-import tensorflow as tf
 import os
+import shutil
+from kubric import filesystem
+from kubric import image_codecs
 from kubric import plotting
+from kubric import tracing
 from kubric.kubric_typing import PathLike
 
 
 logger = logging.getLogger(__name__)
-CACHE_ROOT_DIR = "gcache/"
+
+# --- Read-through cache for remote files (e.g. "gs://kubric-public/assets/GSO/GSO.json" is
+# cached as "gcache/kubric-public/assets/GSO/GSO.json"). Configure with set_cache_options or the
+# corresponding environment variables.
+CACHE_ROOT_DIR = os.environ.get("KUBRIC_GCACHE_DIR", "gcache/")
+# "none": cached files are used as they are, "size": re-download if the remote size changed,
+# "etag": re-download if the remote size or modification time (GCS generation) changed.
+CACHE_VALIDATION = os.environ.get("KUBRIC_GCACHE_VALIDATION", "none")
+# In offline mode remote files are only served from the cache (and never contacted).
+CACHE_OFFLINE = os.environ.get("KUBRIC_GCACHE_OFFLINE", "0").lower() in ("1", "true", "t")
+_CACHE_VALIDATION_MODES = ("none", "size", "etag")
+
+# --- PNG encoding and decoding (see kubric.image_codecs and set_png_options)
+PNG_CODEC = os.environ.get("KUBRIC_PNG_CODEC", "numpy")
+# zlib compression level from 0 (no compression, fastest) to 9 (smallest, slowest)
+PNG_COMPRESSION = 6
+
 
 def as_path(path: PathLike) -> epath.Path:
   """Convert str or pathlike object to epath.Path.
@@ -42,40 +65,157 @@ def as_path(path: PathLike) -> epath.Path:
   return epath.Path(path)
 
 
+def set_cache_options(root_dir: Optional[str] = None, validation: Optional[str] = None,
+                      offline: Optional[bool] = None) -> None:
+  """Configures the read-through cache for remote files (None keeps the current value).
+
+  Args:
+    root_dir: local directory of the cache. An empty string disables the cache.
+    validation: one of "none", "size" or "etag" (see CACHE_VALIDATION).
+    offline: if True, remote files are only ever read from the cache.
+  """
+  global CACHE_ROOT_DIR, CACHE_VALIDATION, CACHE_OFFLINE
+  if root_dir is not None:
+    CACHE_ROOT_DIR = root_dir
+  if validation is not None:
+    if validation not in _CACHE_VALIDATION_MODES:
+      raise ValueError(f"Unknown cache validation {validation!r}. "
+                       f"Available: {_CACHE_VALIDATION_MODES}")
+    CACHE_VALIDATION = validation
+  if offline is not None:
+    CACHE_OFFLINE = offline
+
+
+def set_png_options(codec: Optional[str] = None, compression: Optional[int] = None) -> None:
+  """Selects the PNG backend (see image_codecs.PNG_CODECS) and the default compression level."""
+  global PNG_CODEC, PNG_COMPRESSION
+  if codec is not None:
+    if codec not in image_codecs.PNG_CODECS:
+      raise ValueError(f"Unknown png codec {codec!r}. "
+                       f"Available: {sorted(image_codecs.PNG_CODECS)}")
+    PNG_CODEC = codec
+  if compression is not None:
+    if not 0 <= compression <= 9:
+      raise ValueError(f"PNG compression has to be in [0, 9] but is {compression}.")
+    PNG_COMPRESSION = compression
+
+
+@contextlib.contextmanager
+def file_lock(lock_path: PathLike, shared: bool = False, blocking: bool = True):
+  """Holds an advisory flock on `lock_path` for the duration of the context.
+
+  Yields True if the lock was acquired (always the case if blocking=True).
+  """
+  lock_path = pathlib.Path(lock_path)
+  lock_path.parent.mkdir(parents=True, exist_ok=True)
+  with open(lock_path, "a") as fp:
+    flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+    if not blocking:
+      flags |= fcntl.LOCK_NB
+    try:
+      fcntl.flock(fp, flags)
+    except BlockingIOError:
+      yield False
+      return
+    try:
+      yield True
+    finally:
+      fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+def is_remote(filename: PathLike) -> bool:
+  return "://" in str(filename)
+
+
+def cache_path(filename: PathLike) -> pathlib.Path:
+  """The location of a remote file in the local cache."""
+  return pathlib.Path(CACHE_ROOT_DIR) / str(filename).split("//", 1)[-1]
+
+
+def _remote_fingerprint(filename: PathLike) -> Dict[str, int]:
+  stat = filesystem.get_backend(filename).stat(str(filename))
+  return {"size": stat.length, "mtime_nsec": stat.mtime_nsec}
+
+
+def _is_cache_entry_valid(local_path: pathlib.Path, filename: PathLike) -> bool:
+  if CACHE_OFFLINE or CACHE_VALIDATION == "none":
+    return True
+  remote = _remote_fingerprint(filename)
+  if CACHE_VALIDATION == "size":
+    return local_path.stat().st_size == remote["size"]
+  meta_path = local_path.with_name(local_path.name + ".meta")
+  try:
+    return json.loads(meta_path.read_text()) == remote
+  except (OSError, ValueError):
+    return False
+
+
+def cached_local_path(filename: PathLike) -> str:
+  """Returns a local path from which `filename` can be read.
+
+  Local files are returned as they are. Remote files are downloaded into the cache on the first
+  access (to a temporary file that is then atomically renamed, while holding a per-file lock),
+  so that concurrent workers never read partially written files.
+  """
+  if not is_remote(filename) or not CACHE_ROOT_DIR:
+    return str(filename)
+
+  local_path = cache_path(filename)
+  if local_path.exists() and _is_cache_entry_valid(local_path, filename):
+    tracing.count("gcache.hit")
+    return str(local_path)
+  tracing.count("gcache.miss")
+  if CACHE_OFFLINE:
+    raise FileNotFoundError(f"'{filename}' is not cached in '{CACHE_ROOT_DIR}' (offline mode).")
+
+  with file_lock(local_path.with_name(local_path.name + ".lock")):
+    # another process might have fetched the file while we were waiting for the lock
+    if local_path.exists() and _is_cache_entry_valid(local_path, filename):
+      return str(local_path)
+    fingerprint = _remote_fingerprint(filename)
+    tmp_path = local_path.with_name(f".{local_path.name}.{os.getpid()}.tmp")
+    logger.debug("Caching '%s' as '%s'", filename, local_path)
+    filesystem.copy(filename, tmp_path, overwrite=True)
+    local_path.with_name(local_path.name + ".meta").write_text(json.dumps(fingerprint))
+    os.replace(tmp_path, local_path)
+  return str(local_path)
+
+
+def invalidate_cache(filename: PathLike) -> None:
+  """Removes a remote file from the local cache (e.g. because it is being overwritten)."""
+  if is_remote(filename) and CACHE_ROOT_DIR:
+    local_path = cache_path(filename)
+    local_path.unlink(missing_ok=True)
+    local_path.with_name(local_path.name + ".meta").unlink(missing_ok=True)
+
+
 @contextlib.contextmanager
 def gopen(filename: PathLike, mode: str = "w"):
-  """Simple contextmanager to open a file using tf.io.gfile (and ensure the parent dir exists)."""
-
-  # first check if the file is in cache
-  file_str = str(filename)
-  f_dir = file_str.split("//")[-1]
-  f_dir = f_dir.split("/")
-  f_name = f_dir[-1]
-  f_dir = CACHE_ROOT_DIR + "/".join(f_dir[:-1])
-  f_full_path = f_dir + "/" + f_name
-  if os.path.exists(f_full_path):
-    with open(f_full_path, mode) as f:
-      yield f
-  
+  """Simple contextmanager to open a (possibly remote) file and ensure the parent dir exists.
+
+  The file is opened with the filesystem backend for its path (see kubric.filesystem). Remote
+  files opened for reading are served from the local read-through cache
+  (see `cached_local_path`).
+  """
+  if mode[0] == "r":
+    local_path = cached_local_path(filename)
+    with filesystem.get_backend(local_path).open(local_path, mode=mode) as fp:
+      yield fp
   else:
-    filename = as_path(filename)
-    if mode[0] in {"w", "a"}:  # if writing mode ...
+    filename = str(filename)
+    backend = filesystem.get_backend(filename)
+    if mode[0] in {"w", "a"} and os.path.dirname(filename):  # if writing mode ...
       # ensure directory exists
-      filename.parent.mkdir(parents=True, exist_ok=True)
+      backend.makedirs(os.path.dirname(filename))
       logging.info("Writing to '%s'", filename)
-    
-    os.makedirs(f_dir, exist_ok=True)
-    with tf.io.gfile.GFile(str(filename), mode=mode) as fp:
-      if mode[0] == "r":
-        # write to cache
-        with open(f_full_path, 'w') as f:
-          f.write(fp.read())
-        
-        with open(f_full_path, 'r') as f:
-          yield f
+    invalidate_cache(filename)
+    with backend.open(filename, mode=mode) as fp:
+      yield fp
 
-      else:
-        yield fp
+
+def read_bytes(filename: PathLike) -> bytes:
+  with gopen(filename, "rb") as fp:
+    return fp.read()
 
 
 def write_pkl(data: Any, filename: PathLike) -> None:
@@ -100,8 +240,11 @@ class _NumpyEncoder(json.JSONEncoder):
     return json.JSONEncoder.default(self, o)
 
 
-def write_png(data: np.array, filename: PathLike) -> None:
-  """Writes data as a png file (and convert datatypes if necessary)."""
+def write_png(data: np.array, filename: PathLike, compression: Optional[int] = None) -> None:
+  """Writes data as a png file (and convert datatypes if necessary).
+
+  The compression level defaults to PNG_COMPRESSION (see set_png_options).
+  """
 
   if data.dtype in [np.uint32, np.uint64]:
     max_value = np.amax(data)
@@ -122,27 +265,19 @@ def write_png(data: np.array, filename: PathLike) -> None:
   else:
     raise NotImplementedError(f"Cannot handle {data.dtype}.")
 
-  bitdepth = 8 if data.dtype == np.uint8 else 16
-
   assert data.ndim == 3, data.shape
-  height, width, channels = data.shape
-  greyscale = (channels == 1)
-  alpha = (channels == 4)
-  w = png.Writer(width=width, height=height, greyscale=greyscale, bitdepth=bitdepth, alpha=alpha)
-
-  if channels == 2:
+  if data.shape[2] == 2:
     # Pad two-channel images with a zero channel.
     data = np.concatenate([data, np.zeros_like(data[:, :, :1])], axis=-1)
 
-  # pypng expects 2d arrays
-  # see https://pypng.readthedocs.io/en/latest/ex.html#reshaping
-  data = data.reshape(height, -1)
+  codec = image_codecs.PNG_CODECS[PNG_CODEC]
+  buffer = codec.encode(data, compression=_png_compression(compression))
   with gopen(filename, "wb") as fp:
-    w.write(fp, data)
+    fp.write(buffer)
 
 
 def write_palette_png(data: np.array, filename: PathLike,
-                      palette: np.ndarray = None):
+                      palette: np.ndarray = None, compression: Optional[int] = None):
   """Writes grayscale data as pngs to path using a fixed palette (e.g. for segmentations)."""
   assert data.ndim == 3, data.shape
   height, width, channels = data.shape
@@ -162,9 +297,10 @@ def write_palette_png(data: np.array, filename: PathLike,
   if palette is None:
     palette = plotting.hls_palette(np.max(data) + 1)
 
-  w = png.Writer(width=width, height=height, palette=palette, bitdepth=8)
+  codec = image_codecs.PNG_CODECS[PNG_CODEC]
+  buffer = codec.encode(data, compression=_png_compression(compression), palette=palette)
   with gopen(filename, "wb") as fp:
-    w.write(fp, data[:, :, 0])
+    fp.write(buffer)
 
 
 def write_scaled_png(data: np.array, filename: PathLike) -> Dict[str, float]:
@@ -188,26 +324,16 @@ def write_scaled_png(data: np.array, filename: PathLike) -> Dict[str, float]:
 
 
 def read_png(filename: PathLike, rescale_range=None) -> np.ndarray:
-  filename = as_path(filename)
-  png_reader = png.Reader(bytes=filename.read_bytes())
-  width, height, pngdata, info = png_reader.read()
-  del png_reader
-
-  bitdepth = info["bitdepth"]
-  if bitdepth == 8:
-    dtype = np.uint8
-  elif bitdepth == 16:
-    dtype = np.uint16
-  else:
-    raise NotImplementedError(f"Unsupported bitdepth: {bitdepth}")
-
-  plane_count = info["planes"]
-  pngdata = np.vstack(list(map(dtype, pngdata)))
+  codec = image_codecs.PNG_CODECS[PNG_CODEC]
+  pngdata, bitdepth = codec.decode(read_bytes(filename))
   if rescale_range is not None:
     minv, maxv = rescale_range
     pngdata = pngdata / 2**bitdepth * (maxv - minv) + minv
+  return pngdata
+
 
-  return pngdata.reshape((height, width, plane_count))
+def _png_compression(compression: Optional[int]) -> int:
+  return PNG_COMPRESSION if compression is None else compression
 
 
 def write_tiff(data: np.ndarray, filename: PathLike):
@@ -215,22 +341,327 @@ def write_tiff(data: np.ndarray, filename: PathLike):
   assert data.ndim == 3, data.shape
   assert data.shape[2] in [1, 3, 4], "Must be grayscale, RGB, or RGBA"
 
+  import imageio  # pylint: disable=import-outside-toplevel
   img_as_bytes = imageio.imwrite("<bytes>", data, format="tiff")
   filename = as_path(filename)
   filename.write_bytes(img_as_bytes)
 
 
 def read_tiff(filename: PathLike) -> np.ndarray:
-  filename = as_path(filename)
-  img = imageio.imread(filename.read_bytes(), format="tiff")
+  import imageio  # pylint: disable=import-outside-toplevel
+  img = imageio.imread(read_bytes(filename), format="tiff")
   if img.ndim == 2:
     img = img[:, :, None]
   return img
 
 
+# Codec presets for VideoWriter: (file extension, ffmpeg codec, lossless, mapping from the raw
+# input pixel format to the encoded pixel format, extra ffmpeg arguments).
+VIDEO_CODECS = {
+    "h264": (".mp4", "libx264", False,
+             {"gray": "yuv420p", "rgb24": "yuv420p", "rgba": "yuv420p"},
+             ["-preset", "fast"]),
+    "ffv1": (".mkv", "ffv1", True,
+             {"gray": "gray", "gray16le": "gray16le", "rgb24": "bgr0", "rgba": "bgra",
+              "rgb48le": "gbrp16le", "rgba64le": "gbrap16le"},
+             ["-level", "3", "-g", "1"]),
+    "vp9": (".webm", "libvpx-vp9", False,
+            {"gray": "yuv420p", "rgb24": "yuv420p", "rgba": "yuva420p"},
+            ["-b:v", "0", "-row-mt", "1"]),
+}
+_RAW_PIXEL_FORMATS = {
+    (1, np.uint8): "gray", (1, np.uint16): "gray16le",
+    (3, np.uint8): "rgb24", (3, np.uint16): "rgb48le",
+    (4, np.uint8): "rgba", (4, np.uint16): "rgba64le",
+}
+
+
+class VideoWriter:
+  """Encodes frames into a video file by piping raw pixels into ffmpeg from a background thread.
+
+  Frames are queued by `write` (which only blocks once `max_queue_size` frames are pending) and
+  streamed to the ffmpeg process by a worker thread, so encoding overlaps with rendering and
+  postprocessing. Nothing is read back from disk.
+
+  Usage:
+    with VideoWriter("out/rgba.mp4", fps=12, codec="h264", crf=18) as writer:
+      for frame in frames:
+        writer.write(frame)
+
+  Args:
+    filename: target video file (can be a GCS path, in which case a local temporary file is
+      encoded first and copied at the end).
+    fps: frame rate of the video.
+    codec: one of VIDEO_CODECS ("h264" -> mp4, "ffv1" -> lossless mkv, "vp9" -> webm).
+    crf: constant rate factor for the lossy codecs (lower is better; ignored for ffv1).
+    max_queue_size: maximum number of frames waiting to be encoded.
+  """
+
+  def __init__(self, filename: PathLike, fps: float = 24, codec: str = "h264",
+               crf: Optional[int] = 18, max_queue_size: int = 8):
+    if codec not in VIDEO_CODECS:
+      raise KeyError(f"Unknown video codec {codec!r}. Available codecs: {list(VIDEO_CODECS)}")
+    self.filename = as_path(filename)
+    self.fps = fps
+    self.codec = codec
+    self.crf = crf
+    self._queue = queue.Queue(maxsize=max_queue_size)
+    self._thread = None
+    self._proc = None
+    self._error = None
+    self._tmp_dir = None
+    self._output_path = None
+    self._frame_shape = None
+    self._frame_dtype = None
+    self.nr_frames = 0
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self.close()
+
+  def _start(self, frame: np.ndarray):
+    import imageio_ffmpeg  # pylint: disable=import-outside-toplevel
+    _, ffmpeg_codec, lossless, pix_fmts, extra_args = VIDEO_CODECS[self.codec]
+    height, width, channels = frame.shape
+    input_pix_fmt = _RAW_PIXEL_FORMATS.get((channels, frame.dtype.type))
+    if input_pix_fmt not in pix_fmts:
+      raise ValueError(f"Cannot encode {channels} channel {frame.dtype} frames as "
+                       f"{self.codec} ({self.filename}).")
+
+    if "://" in str(self.filename):
+      # ffmpeg can only write to local files, so encode to scratch and copy in close()
+      self._tmp_dir = tempfile.mkdtemp()
+      output_path = os.path.join(self._tmp_dir, "video" + self.filename.suffix)
+    else:
+      self.filename.parent.mkdir(parents=True, exist_ok=True)
+      output_path = str(self.filename)
+
+    cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error",
+           "-f", "rawvideo", "-pix_fmt", input_pix_fmt, "-s", f"{width}x{height}",
+           "-r", str(self.fps), "-i", "-",
+           "-c:v", ffmpeg_codec, "-pix_fmt", pix_fmts[input_pix_fmt]] + extra_args
+    if not lossless and self.crf is not None:
+      cmd += ["-crf", str(self.crf)]
+    cmd.append(output_path)
+    logger.info("Writing video to '%s'", self.filename)
+    self._output_path = output_path
+    self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    self._thread = threading.Thread(target=self._encode_loop, daemon=True)
+    self._thread.start()
+
+  def _encode_loop(self):
+    while True:
+      frame = self._queue.get()
+      if frame is None:
+        break
+      if self._error is not None:
+        continue  # drain the queue so that write() never blocks forever
+      try:
+        self._proc.stdin.write(frame.tobytes())
+      except (BrokenPipeError, OSError) as err:
+        self._error = err
+
+  def _convert(self, frame: np.ndarray) -> np.ndarray:
+    if frame.ndim == 2:
+      frame = frame[:, :, None]
+    assert frame.ndim == 3, frame.shape
+    if frame.dtype in [np.float32, np.float64]:
+      frame = (frame.clip(0.0, 1.0) * 255).astype(np.uint8)
+    elif frame.dtype == np.uint16 and not VIDEO_CODECS[self.codec][2]:
+      frame = (frame >> 8).astype(np.uint8)  # lossy codecs are 8bit anyway
+    elif frame.dtype not in [np.uint8, np.uint16]:
+      raise NotImplementedError(f"Cannot handle {frame.dtype}.")
+    if frame.shape[-1] == 2:
+      # Pad two-channel images (e.g. flow) with a zero channel, same as write_png.
+      frame = np.concatenate([frame, np.zeros_like(frame[:, :, :1])], axis=-1)
+    return np.ascontiguousarray(frame)
+
+  def write(self, frame: np.ndarray) -> None:
+    """Queue a single (H, W, C) frame for encoding."""
+    frame = self._convert(frame)
+    if self._proc is None:
+      self._frame_shape, self._frame_dtype = frame.shape, frame.dtype
+      self._start(frame)
+    elif frame.shape != self._frame_shape or frame.dtype != self._frame_dtype:
+      raise ValueError(f"Frame {frame.shape} {frame.dtype} does not match the video format "
+                       f"{self._frame_shape} {self._frame_dtype}.")
+    if self._error is not None:
+      raise IOError(f"Failed to encode video '{self.filename}'") from self._error
+    self._queue.put(frame)
+    self.nr_frames += 1
+
+  def write_batch(self, frames: np.ndarray) -> None:
+    """Queue a batch of frames with shape (nr_frames, H, W, C)."""
+    for frame in frames:
+      self.write(frame)
+
+  def close(self) -> None:
+    """Wait until all queued frames are encoded and finalize the video file."""
+    if self._proc is None:
+      return
+    self._queue.put(None)
+    self._thread.join()
+    self._proc.stdin.close()
+    stderr = self._proc.stderr.read().decode(errors="replace")
+    return_code = self._proc.wait()
+    self._proc = None
+    if self._error is not None or return_code != 0:
+      raise IOError(f"ffmpeg failed to write '{self.filename}' (code={return_code}): {stderr}")
+    if self._tmp_dir is not None:
+      filesystem.copy(self._output_path, self.filename, overwrite=True)
+      shutil.rmtree(self._tmp_dir, ignore_errors=True)
+      self._tmp_dir = None
+    logger.info("Wrote %d frames to '%s'", self.nr_frames, self.filename)
+
+
+def write_video(data: np.ndarray, filename: PathLike, fps: float = 24, codec: str = "h264",
+                crf: Optional[int] = 18) -> None:
+  """Encodes a batch of images with shape (nr_frames, H, W, C) as a video file."""
+  assert data.ndim == 4, data.shape
+  with VideoWriter(filename, fps=fps, codec=codec, crf=crf) as writer:
+    writer.write_batch(data)
+
+
+class WriteHandle:
+  """Tracks a group of writes submitted to the AsyncWriter."""
+
+  def __init__(self, children: Iterable["WriteHandle"] = ()):
+    self._condition = threading.Condition()
+    self._pending = 0
+    self._errors = []
+    self._children = list(children)
+
+  @classmethod
+  def combine(cls, handles: Iterable["WriteHandle"]) -> "WriteHandle":
+    return cls(children=handles)
+
+  def done(self) -> bool:
+    with self._condition:
+      pending = self._pending
+    return pending == 0 and all(child.done() for child in self._children)
+
+  def wait(self, timeout: Optional[float] = None) -> None:
+    """Blocks until all writes are finished. Raises an IOError if any of them failed."""
+    with self._condition:
+      if not self._condition.wait_for(lambda: self._pending == 0, timeout=timeout):
+        raise TimeoutError(f"{self._pending} writes are still pending after {timeout}s.")
+      errors = list(self._errors)
+    for child in self._children:
+      child.wait(timeout=timeout)
+    if errors:
+      raise IOError(f"{len(errors)} background writes failed, first error: {errors[0]!r}") \
+          from errors[0]
+
+  def _add_task(self):
+    with self._condition:
+      self._pending += 1
+
+  def _task_done(self, error: Optional[Exception] = None):
+    with self._condition:
+      self._pending -= 1
+      if error is not None:
+        self._errors.append(error)
+      self._condition.notify_all()
+
+
+class AsyncWriter:
+  """Writes files in a pool of long-lived background threads.
+
+  Submitting blocks while more than `max_queue_size` writes are pending (backpressure), so that
+  rendering cannot run arbitrarily far ahead of the disk. Use `get_async_writer` to access the
+  process-wide instance, which is flushed at exit.
+
+  Args:
+    num_threads: number of writer threads.
+    max_queue_size: maximum number of queued (not yet started) writes.
+  """
+
+  def __init__(self, num_threads: int = 16, max_queue_size: int = 64):
+    self.num_threads = num_threads
+    self._queue = queue.Queue(maxsize=max_queue_size)
+    self._all_writes = WriteHandle()
+    self._lock = threading.Lock()
+    self._threads = [threading.Thread(target=self._run, daemon=True, name=f"AsyncWriter-{i}")
+                     for i in range(num_threads)]
+    for thread in self._threads:
+      thread.start()
+
+  def submit(self, write_fn: Callable[..., Any], *args,
+             handle: Optional[WriteHandle] = None, **kwargs) -> WriteHandle:
+    """Queues `write_fn(*args, **kwargs)` and returns the handle that tracks it."""
+    handle = WriteHandle() if handle is None else handle
+    with self._lock:
+      all_writes = self._all_writes
+      handle._add_task()  # pylint: disable=protected-access
+      all_writes._add_task()  # pylint: disable=protected-access
+    self._queue.put((write_fn, args, kwargs, (handle, all_writes)))
+    return handle
+
+  def flush(self, timeout: Optional[float] = None) -> None:
+    """Waits for all writes that were submitted so far (raises an IOError if any failed)."""
+    with self._lock:
+      all_writes = self._all_writes
+      self._all_writes = WriteHandle()
+    try:
+      all_writes.wait(timeout=timeout)
+    except TimeoutError:
+      with self._lock:  # writes that are still pending keep being tracked
+        self._all_writes._children.append(all_writes)  # pylint: disable=protected-access
+      raise
+
+  def _run(self):
+    while True:
+      write_fn, args, kwargs, handles = self._queue.get()
+      error = None
+      try:
+        with tracing.span("file_write", filename=args[1] if len(args) > 1 else None):
+          write_fn(*args, **kwargs)
+      except Exception as e:  # pylint: disable=broad-except
+        logger.warning("Exception while writing %s: %r", args[1:2], e)
+        error = e
+      for handle in handles:
+        handle._task_done(error)  # pylint: disable=protected-access
+
+
+ASYNC_WRITER_THREADS = 16
+ASYNC_WRITER_QUEUE_SIZE = 64
+_ASYNC_WRITER = None
+_ASYNC_WRITER_LOCK = threading.Lock()
+
+
+def get_async_writer() -> AsyncWriter:
+  """Returns the process-wide AsyncWriter (created on first use)."""
+  global _ASYNC_WRITER
+  with _ASYNC_WRITER_LOCK:
+    if _ASYNC_WRITER is None:
+      _ASYNC_WRITER = AsyncWriter(ASYNC_WRITER_THREADS, ASYNC_WRITER_QUEUE_SIZE)
+      atexit.register(_ASYNC_WRITER.flush)
+    return _ASYNC_WRITER
+
+
+def flush_async_writer(timeout: Optional[float] = None) -> None:
+  """Waits for all writes of the process-wide AsyncWriter (if it was created)."""
+  with _ASYNC_WRITER_LOCK:
+    writer = _ASYNC_WRITER
+  if writer is not None:
+    writer.flush(timeout=timeout)
+
+
+def _reset_async_writer():
+  # the writer threads are not copied into forked processes (see kubric.zygote)
+  global _ASYNC_WRITER, _ASYNC_WRITER_LOCK
+  _ASYNC_WRITER = None
+  _ASYNC_WRITER_LOCK = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_async_writer)
+
+
 def multi_write_image(data: np.ndarray, path_template: str, write_fn=write_png,
-                      max_write_threads=16, **kwargs):
-  """Write a batch of images to a series of files using a ThreadPool.
+                      max_write_threads=16, wait: bool = True, **kwargs) -> WriteHandle:
+  """Write a batch of images to a series of files using the process-wide AsyncWriter.
   Args:
     data: Batch of images to write. Shape = (batch_size, height, width, channels)
     path_template: a template for the filenames (e.g. "rgb_frame_{:05d}.png").
@@ -238,73 +669,82 @@ def multi_write_image(data: np.ndarray, path_template: str, write_fn=write_png,
     write_fn: the function used for writing the image to disk.
       Must take an image array as its first and a filename as its second argument.
       May take other keyword arguments. (Defaults to the write_png function)
-    max_write_threads: number of threads to use for writing images. (default = 16)
+    max_write_threads: unused, the number of threads is given by ASYNC_WRITER_THREADS.
+    wait: if False, return immediately and let the images be written in the background.
     **kwargs: additional kwargs to pass to the write_fn.
-  """
-  num_threads = min(data.shape[0], max_write_threads)
-  with multiprocessing.pool.ThreadPool(num_threads) as pool:
-    args = [(img, path_template.format(i)) for i, img in enumerate(data)]
-
-    def write_single_image_fn(arg):
-      write_fn(*arg, **kwargs)
-
-    for result in pool.imap_unordered(write_single_image_fn, args):
-      if isinstance(result,  Exception):
-        logger.warning("Exception while writing image %s", result)
 
-    pool.close()
-    pool.join()
-
-
-def write_rgb_batch(data, directory, file_template="rgb_{:05d}.png", max_write_threads=16):
+  Returns:
+    A WriteHandle to wait for the writes (already finished if wait=True).
+  """
+  del max_write_threads
+  writer = get_async_writer()
+  handle = WriteHandle()
+  for i, img in enumerate(data):
+    writer.submit(write_fn, img, path_template.format(i), handle=handle, **kwargs)
+  if wait:
+    handle.wait()
+  return handle
+
+
+def write_rgb_batch(data, directory, file_template="rgb_{:05d}.png",
+                    max_write_threads=16, wait=True):
   assert data.ndim == 4 and data.shape[-1] == 3, data.shape
   path_template = str(as_path(directory) / file_template)
-  multi_write_image(data, path_template, write_fn=write_png, max_write_threads=max_write_threads)
+  return multi_write_image(data, path_template, write_fn=write_png,
+                           max_write_threads=max_write_threads, wait=wait)
 
 
-def write_rgba_batch(data, directory, file_template="rgba_{:05d}.png", max_write_threads=16):
+def write_rgba_batch(data, directory, file_template="rgba_{:05d}.png",
+                     max_write_threads=16, wait=True):
   assert data.ndim == 4 and data.shape[-1] == 4, data.shape
   path_template = str(as_path(directory) / file_template)
-  multi_write_image(data, path_template, write_fn=write_png, max_write_threads=max_write_threads)
+  return multi_write_image(data, path_template, write_fn=write_png,
+                           max_write_threads=max_write_threads, wait=wait)
 
 
-def write_uv_batch(data, directory, file_template="uv_{:05d}.png", max_write_threads=16):
+def write_uv_batch(data, directory, file_template="uv_{:05d}.png", max_write_threads=16, wait=True):
   assert data.ndim == 4 and data.shape[-1] == 3, data.shape
   path_template = str(as_path(directory) / file_template)
-  multi_write_image(data, path_template, write_fn=write_png, max_write_threads=max_write_threads)
+  return multi_write_image(data, path_template, write_fn=write_png,
+                           max_write_threads=max_write_threads, wait=wait)
 
 
-def write_normal_batch(data, directory, file_template="normal_{:05d}.png", max_write_threads=16):
+def write_normal_batch(data, directory, file_template="normal_{:05d}.png",
+                       max_write_threads=16, wait=True):
   assert data.ndim == 4 and data.shape[-1] == 3, data.shape
   path_template = str(as_path(directory) / file_template)
-  multi_write_image(data, path_template, write_fn=write_png, max_write_threads=max_write_threads)
+  return multi_write_image(data, path_template, write_fn=write_png,
+                           max_write_threads=max_write_threads, wait=wait)
 
 
 def write_coordinates_batch(data, directory, file_template="object_coordinates_{:05d}.png",
-                            max_write_threads=16):
+                            max_write_threads=16, wait=True):
   assert data.ndim == 4 and data.shape[-1] == 3, data.shape
   path_template = str(as_path(directory) / file_template)
-  multi_write_image(data, path_template, write_fn=write_png, max_write_threads=max_write_threads)
+  return multi_write_image(data, path_template, write_fn=write_png,
+                           max_write_threads=max_write_threads, wait=wait)
 
 
-def write_depth_batch(data, directory, file_template="depth_{:05d}.tiff", max_write_threads=16):
+def write_depth_batch(data, directory, file_template="depth_{:05d}.tiff",
+                      max_write_threads=16, wait=True):
   assert data.ndim == 4 and data.shape[-1] == 1, data.shape
   path_template = str(as_path(directory) / file_template)
-  multi_write_image(data, path_template, write_fn=write_tiff, max_write_threads=max_write_threads)
+  return multi_write_image(data, path_template, write_fn=write_tiff,
+                           max_write_threads=max_write_threads, wait=wait)
 
 
 def write_segmentation_batch(data, directory, file_template="segmentation_{:05d}.png",
-                             max_write_threads=16):
+                             max_write_threads=16, wait=True):
   assert data.ndim == 4 and data.shape[-1] == 1, data.shape
   assert data.dtype in [np.uint8, np.uint16, np.uint32, np.uint64], data.dtype
   path_template = str(as_path(directory) / file_template)
   palette = plotting.hls_palette(np.max(data) + 1)
-  multi_write_image(data, path_template, write_fn=write_palette_png,
-                    max_write_threads=max_write_threads, palette=palette)
+  return multi_write_image(data, path_template, write_fn=write_palette_png,
+                           max_write_threads=max_write_threads, wait=wait, palette=palette)
 
 
 def write_flow_batch(data, directory, file_template="flow_{:05d}.png", name="flow",
-                     max_write_threads=16, range_file="data_ranges.json"):
+                     max_write_threads=16, range_file="data_ranges.json", wait=True):
   assert data.ndim == 4 and data.shape[-1] == 2, data.shape
   assert data.dtype in [np.float32, np.float64], data.dtype
   directory = as_path(directory)
@@ -315,8 +755,8 @@ def write_flow_batch(data, directory, file_template="flow_{:05d}.png", name="flo
   scaling = {"min": min_value.item(), "max": max_value.item()}
   data = (data - min_value) * 65535 / (max_value - min_value)
   data = data.astype(np.uint16)
-  multi_write_image(data, path_template, write_fn=write_png,
-                    max_write_threads=max_write_threads)
+  handle = multi_write_image(data, path_template, write_fn=write_png,
+                             max_write_threads=max_write_threads, wait=wait)
 
   if range_file_path.exists():
     ranges = read_json(range_file_path)
@@ -324,6 +764,7 @@ def write_flow_batch(data, directory, file_template="flow_{:05d}.png", name="flo
     ranges = {}
   ranges[name] = scaling
   write_json(ranges, range_file_path)
+  return handle
 
 
 write_forward_flow_batch = functools.partial(write_flow_batch, name="forward_flow",
@@ -346,10 +787,19 @@ DEFAULT_WRITERS = {
 
 
 def write_image_dict(data_dict: Dict[str, np.ndarray], directory: PathLike,
-                     file_templates: Dict[str, str] = (), max_write_threads=16):
+                     file_templates: Dict[str, str] = (), max_write_threads=16,
+                     wait: bool = True) -> WriteHandle:
+  """Writes all layers of a data_stack (as returned by Blender.render) into `directory`.
+
+  With wait=False the images are written in the background by the process-wide AsyncWriter and
+  the returned WriteHandle can be used to wait for them.
+  """
+  handles = []
   for key, data in data_dict.items():
     if key in file_templates:
-      DEFAULT_WRITERS[key](data, directory, file_template=file_templates[key],
-                           max_write_threads=max_write_threads)
+      handles.append(DEFAULT_WRITERS[key](data, directory, file_template=file_templates[key],
+                                          max_write_threads=max_write_threads, wait=wait))
     else:
-      DEFAULT_WRITERS[key](data, directory, max_write_threads=max_write_threads)
+      handles.append(DEFAULT_WRITERS[key](data, directory, max_write_threads=max_write_threads,
+                                          wait=wait))
+  return WriteHandle.combine(handles)
@@ -0,0 +1,201 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pluggable filesystem backends for the file I/O of kubric.
+
+Local paths (and file:// URLs) are handled with os and shutil. Remote paths (e.g. gs://...) are
+handled by the backend registered for their scheme, or else by the default remote backend:
+"gfile" (tf.io.gfile) unless $KUBRIC_REMOTE_FS or `set_remote_backend` select "epath". Backends
+are created on first use, so TensorFlow is only imported once a remote path is accessed through
+the gfile backend.
+
+  filesystem.copy("gs://bucket/scene.blend", "/tmp/scene.blend")
+  with filesystem.get_backend(path).open(path, "rb") as fp:
+    ...
+  filesystem.register_backend("s3", MyS3FileSystem())
+"""
+
+import abc
+import builtins
+import os
+import shutil
+from typing import IO, Callable, Dict, Iterator, List, NamedTuple, Tuple, Union
+
+from kubric.kubric_typing import PathLike
+
+REMOTE_BACKEND = os.environ.get("KUBRIC_REMOTE_FS", "gfile")
+
+
+class FileStat(NamedTuple):
+  length: int
+  mtime_nsec: int
+
+
+class FileSystem(abc.ABC):
+  """The operations kubric needs from a filesystem (all paths are strings)."""
+
+  @abc.abstractmethod
+  def open(self, path: str, mode: str = "r") -> IO:
+    pass  # pragma: no cover
+
+  @abc.abstractmethod
+  def exists(self, path: str) -> bool:
+    pass  # pragma: no cover
+
+  @abc.abstractmethod
+  def makedirs(self, path: str) -> None:
+    """Creates a directory and its parents (if they do not exist yet)."""
+
+  @abc.abstractmethod
+  def copy(self, src: str, dst: str, overwrite: bool = False) -> None:
+    pass  # pragma: no cover
+
+  @abc.abstractmethod
+  def stat(self, path: str) -> FileStat:
+    pass  # pragma: no cover
+
+  @abc.abstractmethod
+  def walk(self, path: str) -> Iterator[Tuple[str, List[str], List[str]]]:
+    """Like os.walk: yields (dirname, subdirectory names, file names) for each directory."""
+
+
+def _local(path: str) -> str:
+  return path[len("file://"):] if path.startswith("file://") else path
+
+
+class LocalFileSystem(FileSystem):
+  """The local disk (paths without a scheme and file:// URLs)."""
+
+  def open(self, path: str, mode: str = "r") -> IO:
+    return builtins.open(_local(path), mode)
+
+  def exists(self, path: str) -> bool:
+    return os.path.exists(_local(path))
+
+  def makedirs(self, path: str) -> None:
+    os.makedirs(_local(path), exist_ok=True)
+
+  def copy(self, src: str, dst: str, overwrite: bool = False) -> None:
+    if not overwrite and os.path.exists(_local(dst)):
+      raise FileExistsError(f"Cannot copy {src} to {dst}: the file already exists.")
+    shutil.copyfile(_local(src), _local(dst))
+
+  def stat(self, path: str) -> FileStat:
+    stat = os.stat(_local(path))
+    return FileStat(length=stat.st_size, mtime_nsec=stat.st_mtime_ns)
+
+  def walk(self, path: str) -> Iterator[Tuple[str, List[str], List[str]]]:
+    return os.walk(_local(path))
+
+
+class GFileFileSystem(FileSystem):
+  """tf.io.gfile, which supports gs:// and other schemes of TensorFlow (and local paths)."""
+
+  def __init__(self):
+    import tensorflow as tf  # pylint: disable=import-outside-toplevel
+    self._gfile = tf.io.gfile
+
+  def open(self, path: str, mode: str = "r") -> IO:
+    return self._gfile.GFile(path, mode=mode)
+
+  def exists(self, path: str) -> bool:
+    return self._gfile.exists(path)
+
+  def makedirs(self, path: str) -> None:
+    self._gfile.makedirs(path)
+
+  def copy(self, src: str, dst: str, overwrite: bool = False) -> None:
+    self._gfile.copy(src, dst, overwrite=overwrite)
+
+  def stat(self, path: str) -> FileStat:
+    stat = self._gfile.stat(path)
+    return FileStat(length=stat.length, mtime_nsec=stat.mtime_nsec)
+
+  def walk(self, path: str) -> Iterator[Tuple[str, List[str], List[str]]]:
+    return self._gfile.walk(path)
+
+
+class EPathFileSystem(FileSystem):
+  """etils.epath, which picks its own backend for remote paths (e.g. gcsfs or tf.io.gfile)."""
+
+  def __init__(self):
+    from etils import epath  # pylint: disable=import-outside-toplevel
+    self._path = epath.Path
+
+  def open(self, path: str, mode: str = "r") -> IO:
+    return self._path(path).open(mode)
+
+  def exists(self, path: str) -> bool:
+    return self._path(path).exists()
+
+  def makedirs(self, path: str) -> None:
+    self._path(path).mkdir(parents=True, exist_ok=True)
+
+  def copy(self, src: str, dst: str, overwrite: bool = False) -> None:
+    self._path(src).copy(dst, overwrite=overwrite)
+
+  def stat(self, path: str) -> FileStat:
+    stat = self._path(path).stat()
+    return FileStat(length=stat.length, mtime_nsec=int(stat.mtime * 1e9))
+
+  def walk(self, path: str) -> Iterator[Tuple[str, List[str], List[str]]]:
+    for dirname, subdirs, filenames in self._path(path).walk():
+      yield str(dirname), list(subdirs), list(filenames)
+
+
+BACKENDS: Dict[str, Callable[[], FileSystem]] = {
+    "local": LocalFileSystem,
+    "gfile": GFileFileSystem,
+    "epath": EPathFileSystem,
+}
+_scheme_backends: Dict[str, Union[str, FileSystem]] = {"": "local", "file": "local"}
+_instances: Dict[str, FileSystem] = {}
+
+
+def scheme(path: PathLike) -> str:
+  """The scheme of a path, e.g. "gs" for "gs://bucket/file" and "" for local paths."""
+  path = str(path)
+  return path.split("://", 1)[0] if "://" in path else ""
+
+
+def register_backend(path_scheme: str, backend: Union[str, FileSystem]) -> None:
+  """Handles the paths with the given scheme with a backend (a name in BACKENDS or an instance)."""
+  if isinstance(backend, str) and backend not in BACKENDS:
+    raise ValueError(f"Unknown filesystem backend {backend!r}. Available: {sorted(BACKENDS)}")
+  if not isinstance(backend, (str, FileSystem)):
+    raise TypeError(f"Expected a backend name or a FileSystem instance, got {backend!r}.")
+  _scheme_backends[path_scheme] = backend
+
+
+def set_remote_backend(backend: str) -> None:
+  """Selects the backend for all remote schemes without a registered backend."""
+  global REMOTE_BACKEND
+  if backend not in BACKENDS:
+    raise ValueError(f"Unknown filesystem backend {backend!r}. Available: {sorted(BACKENDS)}")
+  REMOTE_BACKEND = backend
+
+
+def get_backend(path: PathLike) -> FileSystem:
+  backend = _scheme_backends.get(scheme(path), REMOTE_BACKEND)
+  if isinstance(backend, FileSystem):
+    return backend
+  if backend not in _instances:
+    _instances[backend] = BACKENDS[backend]()
+  return _instances[backend]
+
+
+def copy(src: PathLike, dst: PathLike, overwrite: bool = False) -> None:
+  """Copies a file, also between local and remote paths (by the backend of the remote one)."""
+  backend = get_backend(dst) if scheme(src) in ("", "file") else get_backend(src)
+  backend.copy(str(src), str(dst), overwrite=overwrite)
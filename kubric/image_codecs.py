@@ -0,0 +1,177 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pluggable PNG codecs used by `kubric.file_io` (see `file_io.set_png_options`).
+
+Two backends are available:
+  * "numpy" (default): encodes and decodes 8/16-bit grayscale, RGB(A) and palette PNGs directly
+    from and to numpy buffers using zlib. Images with Average/Paeth filters, interlacing or
+    bitdepths below 8 are rare for kubric outputs and are decoded with pypng instead.
+  * "pypng": the pure-python pypng implementation.
+
+Both backends produce files with identical content (pixels, palette and bitdepth).
+"""
+
+import io
+import struct
+import zlib
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import png
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# maximum size of a single IDAT chunk (same as pypng)
+_CHUNK_LIMIT = 2 ** 20
+# PNG color types by number of channels (without palette)
+_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+_PLANES = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+_PALETTE_COLOR_TYPE = 3
+
+
+class PngCodec:
+  """Interface of a PNG backend."""
+
+  name = None
+
+  def encode(self, data: np.ndarray, compression: int = 6,
+             palette: Optional[np.ndarray] = None) -> bytes:
+    """Encodes an uint8/uint16 image of shape (H, W, C) (or (H, W, 1) indices with a palette)."""
+    raise NotImplementedError()
+
+  def decode(self, buffer: bytes) -> Tuple[np.ndarray, int]:
+    """Decodes a PNG into an (H, W, C) array of palette indices or values and its bitdepth."""
+    raise NotImplementedError()
+
+
+class PyPngCodec(PngCodec):
+  """Pure python codec based on pypng."""
+
+  name = "pypng"
+
+  def encode(self, data, compression=6, palette=None):
+    height, width, channels = data.shape
+    if palette is not None:
+      writer = png.Writer(width=width, height=height, palette=palette, bitdepth=8,
+                          compression=compression)
+    else:
+      writer = png.Writer(width=width, height=height, greyscale=channels in (1, 2),
+                          alpha=channels in (2, 4), bitdepth=data.dtype.itemsize * 8,
+                          compression=compression)
+    with io.BytesIO() as fp:
+      # pypng expects 2d arrays
+      writer.write(fp, data.reshape((height, width * channels)))
+      return fp.getvalue()
+
+  def decode(self, buffer):
+    width, height, pngdata, info = png.Reader(bytes=buffer).read()
+    bitdepth = info["bitdepth"]
+    if bitdepth not in (8, 16):
+      raise NotImplementedError(f"Unsupported bitdepth: {bitdepth}")
+    dtype = np.uint8 if bitdepth == 8 else np.uint16
+    data = np.vstack(list(map(dtype, pngdata)))
+    return data.reshape((height, width, info["planes"])), bitdepth
+
+
+class NumpyPngCodec(PngCodec):
+  """zlib + numpy codec that processes whole images at once instead of row by row."""
+
+  name = "numpy"
+
+  def encode(self, data, compression=6, palette=None):
+    height, width, channels = data.shape
+    if palette is not None:
+      color_type = _PALETTE_COLOR_TYPE
+    else:
+      color_type = _COLOR_TYPES[channels]
+    bitdepth = data.dtype.itemsize * 8
+    # PNG stores 16 bit values big-endian and every row starts with a filter byte (0 = None)
+    rows = np.ascontiguousarray(data, dtype=data.dtype.newbyteorder(">"))
+    rows = rows.view(np.uint8).reshape((height, -1))
+    scanlines = np.zeros((height, rows.shape[1] + 1), dtype=np.uint8)
+    scanlines[:, 1:] = rows
+
+    chunks = [_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bitdepth, color_type,
+                                          0, 0, 0))]
+    if palette is not None:
+      palette = np.asarray(palette, dtype=np.uint8)
+      chunks.append(_chunk(b"PLTE", palette[:, :3].tobytes()))
+      if palette.shape[1] == 4:
+        chunks.append(_chunk(b"tRNS", palette[:, 3].tobytes()))
+    compressed = zlib.compress(scanlines.tobytes(), compression)
+    for start in range(0, max(len(compressed), 1), _CHUNK_LIMIT):
+      chunks.append(_chunk(b"IDAT", compressed[start:start + _CHUNK_LIMIT]))
+    chunks.append(_chunk(b"IEND", b""))
+    return PNG_SIGNATURE + b"".join(chunks)
+
+  def decode(self, buffer):
+    header, idat = _read_chunks(buffer)
+    width, height, bitdepth, color_type, _, _, interlace = header
+    if bitdepth not in (8, 16) or interlace:
+      return PyPngCodec().decode(buffer)
+    planes = _PLANES[color_type]
+    bytes_per_pixel = planes * bitdepth // 8
+    scanlines = np.frombuffer(zlib.decompress(idat), dtype=np.uint8)
+    scanlines = scanlines.reshape((height, width * bytes_per_pixel + 1))
+    filters = scanlines[:, 0]
+    if np.any(filters > 2):  # Average and Paeth filters depend on the neighbouring pixels
+      return PyPngCodec().decode(buffer)
+    rows = scanlines[:, 1:]
+    if np.any(filters):
+      rows = _unfilter(rows, filters, bytes_per_pixel)
+    dtype = np.dtype(">u2") if bitdepth == 16 else np.dtype(np.uint8)
+    data = rows.view(dtype).reshape((height, width, planes))
+    return data.astype(dtype.newbyteorder("=")), bitdepth
+
+
+def _chunk(tag: bytes, payload: bytes) -> bytes:
+  crc = zlib.crc32(payload, zlib.crc32(tag))
+  return struct.pack(">I", len(payload)) + tag + payload + struct.pack(">I", crc)
+
+
+def _read_chunks(buffer: bytes) -> Tuple[tuple, bytes]:
+  if buffer[:8] != PNG_SIGNATURE:
+    raise ValueError("Not a PNG file.")
+  header, idat = None, []
+  pos = 8
+  while pos < len(buffer):
+    length, tag = struct.unpack(">I4s", buffer[pos:pos + 8])
+    payload = buffer[pos + 8:pos + 8 + length]
+    if tag == b"IHDR":
+      header = struct.unpack(">IIBBBBB", payload)
+    elif tag == b"IDAT":
+      idat.append(payload)
+    elif tag == b"IEND":
+      break
+    pos += length + 12
+  return header, b"".join(idat)
+
+
+def _unfilter(rows: np.ndarray, filters: np.ndarray, bytes_per_pixel: int) -> np.ndarray:
+  """Reverses the Sub (1) and Up (2) filters (arithmetic is modulo 256)."""
+  rows = rows.copy()
+  height = rows.shape[0]
+  for y in range(height):
+    if filters[y] == 1:
+      pixels = rows[y].reshape((-1, bytes_per_pixel))
+      np.cumsum(pixels, axis=0, dtype=np.uint8, out=pixels)
+    elif filters[y] == 2 and y > 0:
+      rows[y] += rows[y - 1]
+  return rows
+
+
+PNG_CODECS: Dict[str, PngCodec] = {
+    NumpyPngCodec.name: NumpyPngCodec(),
+    PyPngCodec.name: PyPngCodec(),
+}
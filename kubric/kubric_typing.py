@@ -14,12 +14,13 @@
 
 """Kubric type annotations."""
 
-from typing import Any, Callable, Union, Sequence
+from typing import TYPE_CHECKING, Any, Callable, Union, Sequence
 from etils import epath
 import numpy as np
 import pyquaternion as pyquat
 
-from kubric import core  # pylint: disable=unused-import
+if TYPE_CHECKING:
+  from kubric import core  # pylint: disable=unused-import
 
 AddAssetFunction = Callable[["core.View", "core.Asset"], Any]
 
@@ -0,0 +1,430 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Ground-truth point tracks computed directly from the outputs of `Blender.render`.
+
+This is a numpy port of the TensorFlow implementation in `challenges/point_tracking/dataset.py`
+that workers can call while the rendered frames are still in memory:
+
+  data_stack = renderer.render()
+  data_stack["segmentation"] = kb.adjust_segmentation_idxs(data_stack["segmentation"],
+                                                           scene.assets, instances)
+  tracks = kb.compute_point_tracks(data_stack, kb.get_camera_info(scene.camera),
+                                   kb.get_instance_info(scene, instances))
+
+Query points are sampled (on a strided grid, balanced across objects) from the rendered frames.
+Foreground points are tracked through the object coordinates and the 3D bounding boxes of the
+instances, background points are unprojected with the depth map (the background is static).
+A point is marked as occluded in a frame if it is behind the camera, outside the window, hidden
+according to the depth and segmentation maps or on a surface facing away from the camera.
+"""
+
+import itertools
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+
+from kubric.kubric_typing import ArrayLike
+
+# corners of the unit cube in the order of `Object3D.bbox_3d` (used to recover the object pose)
+_UNIT_BOX = np.array(list(itertools.product([-.5, .5], [-.5, .5], [-.5, .5])))
+
+
+def quaternions_to_rotation_matrices(quaternions: ArrayLike) -> np.ndarray:
+  """Converts (N, 4) quaternions in kubric (w, x, y, z) convention to (N, 3, 3) matrices."""
+  quaternions = np.asarray(quaternions, dtype=np.float64)
+  quaternions = quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)
+  w, x, y, z = np.moveaxis(quaternions, -1, 0)
+  return np.stack([
+      np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=-1),
+      np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=-1),
+      np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=-1),
+  ], axis=-2)
+
+
+def get_camera_matrices(focal_length: float, sensor_width: float, positions: ArrayLike,
+                        quaternions: ArrayLike, input_size: Sequence[int]):
+  """Returns per-frame intrinsics (T, 3, 3) and camera-to-world matrices (T, 4, 4).
+
+  The intrinsics map to normalized image coordinates in [0, 1] (like `Camera.intrinsics`, but
+  independent of the resolution).
+
+  Args:
+    focal_length: focal length of the camera (in mm).
+    sensor_width: sensor width of the camera (in mm).
+    positions: camera position for each frame, shape (T, 3).
+    quaternions: camera orientation for each frame, shape (T, 4).
+    input_size: (height, width) of the rendered frames.
+  """
+  positions = np.asarray(positions, dtype=np.float64)
+  num_frames = positions.shape[0]
+  height, width = input_size
+  f_x = focal_length / sensor_width
+  f_y = focal_length / sensor_width * width / height
+  intrinsics = np.array([[f_x, 0., -0.5],
+                         [0., -f_y, -0.5],
+                         [0., 0., -1.]])
+  matrix_world = np.tile(np.eye(4), (num_frames, 1, 1))
+  matrix_world[:, :3, :3] = quaternions_to_rotation_matrices(quaternions)
+  matrix_world[:, :3, 3] = positions
+  return np.tile(intrinsics, (num_frames, 1, 1)), matrix_world
+
+
+def project_points(intrinsics: np.ndarray, matrix_world: np.ndarray,
+                   points_3d: np.ndarray) -> np.ndarray:
+  """Projects world points of shape (T, N, 3) into normalized image coordinates.
+
+  Returns:
+    An array of shape (T, N, 3) with the (x, y) image coordinates in [0, 1] and, as last
+    coordinate, the sign of the depth (negative for points behind the camera).
+  """
+  points_4d = np.concatenate([points_3d, np.ones_like(points_3d[..., :1])], axis=-1)
+  camera_coords = np.einsum("tij,tnj->tni", np.linalg.inv(matrix_world), points_4d)
+  projected = np.einsum("tij,tnj->tni", intrinsics, camera_coords[..., :3])
+  with np.errstate(divide="ignore", invalid="ignore"):
+    image_coords = projected[..., :2] / projected[..., 2:3]
+  return np.concatenate([image_coords, np.sign(projected[..., 2:3])], axis=-1)
+
+
+def unproject(coords: np.ndarray, input_size: Sequence[int], intrinsics: np.ndarray,
+              matrix_world: np.ndarray, depth: np.ndarray) -> np.ndarray:
+  """Unprojects pixels into world coordinates.
+
+  Args:
+    coords: integer pixel coordinates in (y, x) order, shape (N, 2).
+    input_size: (height, width) of the frames.
+    intrinsics: the intrinsics for each point, shape (N, 3, 3).
+    matrix_world: the camera-to-world matrix for each point, shape (N, 4, 4).
+    depth: distance of each point to the camera center (as rendered by Blender), shape (N,).
+
+  Returns:
+    The world coordinates of the points, shape (N, 3).
+  """
+  # convert from pixel to raster coordinates
+  projected = (coords[:, ::-1] + 0.5) / np.array(input_size[::-1])
+  projected = np.concatenate([projected, np.ones_like(projected[:, :1])], axis=-1)
+  camera_plane = np.einsum("nij,nj->ni", np.linalg.inv(intrinsics), projected)
+  camera_ball = camera_plane / np.linalg.norm(camera_plane, axis=-1, keepdims=True)
+  camera_ball = camera_ball * depth[:, np.newaxis]
+  camera_ball = np.concatenate([camera_ball, np.ones_like(camera_ball[:, :1])], axis=-1)
+  points_3d = np.einsum("nij,nj->ni", matrix_world, camera_ball)
+  return points_3d[:, :3] / points_3d[:, 3:]
+
+
+def reproject(coords: np.ndarray, intrinsics: np.ndarray, matrix_world: np.ndarray,
+              camera_positions: np.ndarray, bbox_3d: Optional[np.ndarray] = None):
+  """Moves points through the video and projects them into every frame.
+
+  Args:
+    coords: points of shape (N, 3). If bbox_3d is given, these are in the local box coordinates
+      of the object (in [-0.5, 0.5]), otherwise they are static world coordinates.
+    intrinsics: camera intrinsics of shape (T, 3, 3).
+    matrix_world: camera-to-world matrices of shape (T, 4, 4).
+    camera_positions: camera positions of shape (T, 3).
+    bbox_3d: the corners of the bounding box of the object for each frame, shape (T, 8, 3).
+
+  Returns:
+    The projections of shape (N, T, 3) (see `project_points`), the distance of each point to the
+    camera of shape (N, T) and the world coordinates of shape (N, T, 3).
+  """
+  num_frames = matrix_world.shape[0]
+  if bbox_3d is not None:
+    # the affine transformation that maps the unit box onto the bounding box of each frame
+    unit_box = np.concatenate([_UNIT_BOX, np.ones((8, 1))], axis=1)
+    bbox_homo = np.concatenate([bbox_3d, np.ones_like(bbox_3d[..., :1])], axis=-1)
+    local_to_world = np.linalg.pinv(unit_box)[np.newaxis] @ bbox_homo
+    coords_4d = np.concatenate([coords, np.ones_like(coords[:, :1])], axis=-1)
+    world_coords = coords_4d[np.newaxis] @ local_to_world
+    world_coords = world_coords[..., :3] / world_coords[..., 3:]
+  else:
+    world_coords = np.tile(coords[np.newaxis], (num_frames, 1, 1))
+
+  depths = np.linalg.norm(world_coords - camera_positions[:, np.newaxis, :], axis=-1)
+  projections = project_points(intrinsics, matrix_world, world_coords)
+  return (np.transpose(projections, (1, 0, 2)), depths.T,
+          np.transpose(world_coords, (1, 0, 2)))
+
+
+def estimate_occlusion_by_depth_and_segment(depth_map: np.ndarray, segmentation: np.ndarray,
+                                            x: np.ndarray, y: np.ndarray, thresh: np.ndarray,
+                                            seg_id: int) -> np.ndarray:
+  """Whether points at raster positions x, y (N, T) are hidden in the depth/segmentation maps.
+
+  The depth is overestimated by taking the maximum over the 4 neighbouring pixels. A point is
+  occluded if that depth is below `thresh` (N, T) or if none of the 4 pixels belongs to `seg_id`.
+  """
+  num_frames, height, width = depth_map.shape
+  # convert from raster to pixel coordinates
+  x = x - 0.5
+  y = y - 0.5
+  with np.errstate(invalid="ignore"):
+    x0 = np.clip(np.nan_to_num(np.floor(x)), 0, width - 1).astype(np.int64)
+    y0 = np.clip(np.nan_to_num(np.floor(y)), 0, height - 1).astype(np.int64)
+  x1 = np.minimum(x0 + 1, width - 1)
+  y1 = np.minimum(y0 + 1, height - 1)
+  frames = np.arange(num_frames)[np.newaxis, :]
+
+  depth = np.zeros(x.shape, dtype=depth_map.dtype)
+  seg_occluded = np.ones(x.shape, dtype=bool)
+  for yy, xx in [(y0, x0), (y1, x0), (y0, x1), (y1, x1)]:
+    depth = np.maximum(depth, depth_map[frames, yy, xx])
+    seg_occluded &= segmentation[frames, yy, xx] != seg_id
+  return (depth < thresh) | seg_occluded
+
+
+def rotate_surface_normals(world_frame_normals: np.ndarray, points_3d: np.ndarray,
+                           camera_positions: np.ndarray, obj_rot_mats: np.ndarray,
+                           frame_for_query: np.ndarray) -> np.ndarray:
+  """Points (N, T) are occluded if their surface normal points away from the camera."""
+  query_rot_mats = obj_rot_mats[frame_for_query]
+  obj_frame_normals = np.einsum("noi,ni->no", np.linalg.inv(query_rot_mats),
+                                world_frame_normals)
+  world_frame_normals_frames = np.einsum("foi,ni->nfo", obj_rot_mats, obj_frame_normals)
+  cam_to_pt = points_3d - camera_positions[np.newaxis, :, :]
+  faces_away = np.sum(world_frame_normals_frames * cam_to_pt, axis=-1) > 0
+  # If the query point also faces away, it's probably a bug in the meshes, so ignore the test.
+  faces_away_query = faces_away[np.arange(faces_away.shape[0]), frame_for_query]
+  return faces_away & ~faces_away_query[:, np.newaxis]
+
+
+def get_num_to_sample(counts: np.ndarray, max_sampled_frac: float,
+                      tracks_to_sample: int) -> np.ndarray:
+  """Distributes tracks_to_sample over the objects, sampling at most max_sampled_frac of each.
+
+  Objects with fewer available points are handled first, so that the points they cannot provide
+  are distributed evenly over the larger objects.
+  """
+  num_to_sample = np.zeros(len(counts), dtype=np.int64)
+  remaining_needed = tracks_to_sample
+  order = np.argsort(counts, kind="stable")
+  for index, seg in enumerate(order):
+    want_to_sample = int(np.round(remaining_needed / (len(order) - index)))
+    max_to_sample = int(np.round(counts[seg] * max_sampled_frac))
+    num_to_sample[seg] = min(want_to_sample, max_to_sample)
+    remaining_needed -= num_to_sample[seg]
+  return num_to_sample
+
+
+def _erode_segmentation(segmentation: np.ndarray, depth_map: np.ndarray) -> np.ndarray:
+  """Masks out (-1) pixels next to a depth discontinuity (i.e. close to being occluded)."""
+  _, height, width = depth_map.shape
+  pad_depth = np.pad(depth_map, [(0, 0), (1, 1), (1, 1)], mode="symmetric")
+  invalid = np.zeros(depth_map.shape, dtype=bool)
+  for x in range(3):
+    for y in range(3):
+      if x == 1 and y == 1:
+        continue
+      invalid |= pad_depth[:, y:y + height, x:x + width] < depth_map * 0.95
+  return np.where(invalid, -1, segmentation)
+
+
+def _trustworthy_normals(surface_normals: np.ndarray) -> np.ndarray:
+  """Rough normals usually come from a normal map rather than the mesh and are not trusted."""
+  _, height, width, _ = surface_normals.shape
+  padded = np.pad(surface_normals, [(0, 0), (1, 1), (1, 1), (0, 0)])
+  num_different = np.zeros(surface_normals.shape[:3], dtype=np.int64)
+  for i in [0, 2]:
+    for j in [0, 2]:
+      diff = padded[:, i:i + height, j:j + width, :] - surface_normals
+      num_different += np.sum(np.square(diff), axis=-1) > 0.05 * 0.05
+  return num_different <= 2
+
+
+def track_points(object_coordinates: ArrayLike,
+                 depth: ArrayLike,
+                 segmentation: ArrayLike,
+                 surface_normals: ArrayLike,
+                 bboxes_3d: ArrayLike,
+                 obj_quaternions: ArrayLike,
+                 cam_focal_length: float,
+                 cam_sensor_width: float,
+                 cam_positions: ArrayLike,
+                 cam_quaternions: ArrayLike,
+                 window: Optional[Sequence[int]] = None,
+                 tracks_to_sample: int = 256,
+                 sampling_stride: int = 4,
+                 max_seg_id: Optional[int] = None,
+                 max_sampled_frac: float = 0.1,
+                 snap_to_occluder: bool = False,
+                 rng: Union[np.random.Generator, np.random.RandomState, None] = None
+                 ) -> Dict[str, np.ndarray]:
+  """Samples query points in a rendered video and tracks them through all frames.
+
+  Args:
+    object_coordinates: (T, H, W, 3) uint16 object coordinates (as rendered by Blender).
+    depth: (T, H, W, 1) distance to the camera (as rendered by Blender).
+    segmentation: (T, H, W, 1) segmentation, where 0 is the background and i > 0 corresponds to
+      the (i-1)-th entry of bboxes_3d and obj_quaternions (see `adjust_segmentation_idxs`).
+    surface_normals: (T, H, W, 3) uint16 surface normals (as rendered by Blender).
+    bboxes_3d: the 3D bounding box of every instance for every frame, shape (K, T, 8, 3).
+    obj_quaternions: the orientation of every instance for every frame, shape (K, T, 4).
+    cam_focal_length: focal length of the camera.
+    cam_sensor_width: sensor width of the camera.
+    cam_positions: camera position for every frame, shape (T, 3).
+    cam_quaternions: camera orientation for every frame, shape (T, 4).
+    window: [y_min, x_min, y_max, x_max] pixel window inside which points are sampled (and
+      outside of which they count as occluded). Defaults to the full frame.
+    tracks_to_sample: total number of tracks to sample.
+    sampling_stride: query points are sampled from a randomly offset grid with this stride.
+    max_seg_id: if given, only segments with smaller ids are sampled from.
+    max_sampled_frac: maximum fraction of the grid points of each object to sample.
+    snap_to_occluder: if True, query points next to an occlusion boundary are randomly moved
+      onto the occluded surface, so that they track the occluder.
+    rng: random number generator, e.g. the RandomState of `kb.setup` (defaults to a new,
+      unseeded one).
+
+  Returns:
+    A dict with
+      "query_points": (N, 3) float32 [t, y, x] in frame/raster coordinates of the window,
+      "target_points": (N, T, 2) float32 [x, y] raster coordinates of the window (scaled to the
+        full frame size),
+      "occluded": (N, T) bool occlusion flags,
+      "relative_depth": (N, T) float32 distance to the camera relative to the query point.
+  """
+  if isinstance(rng, np.random.RandomState):
+    rng = np.random.default_rng(rng.randint(2**32, dtype=np.uint64))
+  rng = np.random.default_rng() if rng is None else rng
+  object_coordinates = np.asarray(object_coordinates)
+  num_frames, height, width = object_coordinates.shape[:3]
+  depth_map = np.asarray(depth, dtype=np.float64)[..., 0]
+  segmentation = np.asarray(segmentation).astype(np.int64)[..., 0]
+  surface_normals = np.asarray(surface_normals) / 65535 * 2. - 1.
+  bboxes_3d = np.asarray(bboxes_3d, dtype=np.float64)
+  obj_quaternions = np.asarray(obj_quaternions, dtype=np.float64)
+  cam_positions = np.asarray(cam_positions, dtype=np.float64)
+  window = np.array([0, 0, height, width] if window is None else window)
+
+  # Query points are sampled on a grid with a random offset inside the window.
+  start = rng.integers(0, sampling_stride, size=3) + np.array([0, window[0], window[1]])
+  grid = [slice(start[0], num_frames, sampling_stride),
+          slice(start[1], window[2], sampling_stride),
+          slice(start[2], window[3], sampling_stride)]
+  pix_coords = np.stack(np.meshgrid(*[np.arange(s.start, s.stop, s.step) for s in grid],
+                                    indexing="ij"), axis=-1).reshape((-1, 3))
+
+  sample_segmentation = segmentation
+  if snap_to_occluder:
+    sample_segmentation = _erode_segmentation(segmentation, depth_map)
+  segmentation_grid = sample_segmentation[tuple(grid)].reshape(-1)
+  object_coordinates_grid = object_coordinates[tuple(grid)].reshape((-1, 3))
+  normals_grid = surface_normals[tuple(grid)].reshape((-1, 3))
+  trust_normals_grid = _trustworthy_normals(surface_normals)[tuple(grid)].reshape(-1)
+
+  counts = np.bincount(segmentation_grid[segmentation_grid >= 0])
+  num_segments = len(counts) if max_seg_id is None else min(len(counts), max_seg_id)
+  num_segments = min(num_segments, len(bboxes_3d) + 1)
+  num_to_sample = get_num_to_sample(counts[:num_segments], max_sampled_frac, tracks_to_sample)
+
+  intrinsics, matrix_world = get_camera_matrices(cam_focal_length, cam_sensor_width,
+                                                 cam_positions, cam_quaternions,
+                                                 (height, width))
+  all_query, all_reproj, all_occ, all_query_depth, all_reproj_depth = [], [], [], [], []
+  for seg_id in range(num_segments):
+    mask = segmentation_grid == seg_id
+    if num_to_sample[seg_id] == 0 or not np.any(mask):
+      continue
+    # sample (with replacement) points of this segment on the grid
+    idx = rng.integers(0, np.sum(mask), size=num_to_sample[seg_id])
+    query = pix_coords[mask][idx]  # pixel coordinates (t, y, x)
+    frames = query[:, 0]
+    query_depth = depth_map[frames, query[:, 1], query[:, 2]]
+
+    if seg_id == 0:
+      # The background has no bounding box, but it is static, so we unproject the points with
+      # the depth map of their frame and use these positions throughout the video.
+      points = unproject(query[:, 1:], (height, width), intrinsics[frames],
+                         matrix_world[frames], query_depth)
+      bbox_3d = None
+    else:
+      points = object_coordinates_grid[mask][idx] / np.iinfo(np.uint16).max - .5
+      bbox_3d = bboxes_3d[seg_id - 1]
+
+    reproj, reproj_depth, world_pos = reproject(points, intrinsics, matrix_world,
+                                                cam_positions, bbox_3d=bbox_3d)
+    occluded = reproj[:, :, 2] < 0
+    reproj = reproj[:, :, :2] * np.array([width, height])
+    occluded |= estimate_occlusion_by_depth_and_segment(
+        depth_map, segmentation, reproj[:, :, 0], reproj[:, :, 1], reproj_depth * .99, seg_id)
+    occluded |= ((reproj[:, :, 1] < window[0]) | (reproj[:, :, 0] < window[1]) |
+                 (reproj[:, :, 1] > window[2]) | (reproj[:, :, 0] > window[3]))
+    if seg_id > 0:
+      faces_away = rotate_surface_normals(
+          normals_grid[mask][idx], world_pos, cam_positions,
+          quaternions_to_rotation_matrices(obj_quaternions[seg_id - 1]), frames)
+      occluded |= faces_away & trust_normals_grid[mask][idx][:, np.newaxis]
+    # (the background is convex and can't face away from the camera)
+
+    all_query.append(query)
+    all_reproj.append(reproj)
+    all_occ.append(occluded)
+    all_query_depth.append(query_depth)
+    all_reproj_depth.append(reproj_depth)
+
+  if not all_query:
+    return {"query_points": np.zeros((0, 3), np.float32),
+            "target_points": np.zeros((0, num_frames, 2), np.float32),
+            "occluded": np.zeros((0, num_frames), bool),
+            "relative_depth": np.zeros((0, num_frames), np.float32)}
+  query = np.concatenate(all_query)
+  reproj = np.concatenate(all_reproj)
+  occluded = np.concatenate(all_occ)
+  query_depth = np.concatenate(all_query_depth)
+  reproj_depth = np.concatenate(all_reproj_depth)
+
+  if snap_to_occluder:
+    # Occasionally jitter query points next to an occlusion boundary onto the occluded object.
+    perturbed = query[:, 1:] + rng.integers(-1, 2, size=(len(query), 2))
+    perturbed = np.clip(perturbed, 0, np.array([height - 1, width - 1]))
+    perturbed_depth = depth_map[query[:, 0], perturbed[:, 0], perturbed[:, 1]]
+    swap = (query_depth < perturbed_depth * 0.95) & (rng.random(len(query)) < 0.5)
+    query[swap, 1:] = perturbed[swap]
+
+  # Convert from pixel coordinates of the full frame to coordinates within the window, rescaled
+  # to the full frame size (i.e. the coordinates after cropping and resizing the window).
+  window_top_left = np.array([window[1], window[0]])
+  window_size = np.array([window[3] - window[1], window[2] - window[0]])
+  target_points = (reproj - window_top_left) / window_size * np.array([width, height])
+  query_points = query + np.array([0., 0.5, 0.5])  # pixel to raster coordinates
+  query_points = ((query_points - np.array([0, window[0], window[1]])) /
+                  np.array([num_frames, window[2] - window[0], window[3] - window[1]]) *
+                  np.array([num_frames, height, width]))
+  return {
+      "query_points": query_points.astype(np.float32),
+      "target_points": target_points.astype(np.float32),
+      "occluded": occluded,
+      "relative_depth": (reproj_depth / query_depth[:, np.newaxis]).astype(np.float32),
+  }
+
+
+def compute_point_tracks(data_stack: Dict[str, np.ndarray], camera_info: Dict[str, Any],
+                         instance_info: Sequence[Dict[str, Any]], **kwargs):
+  """Computes point tracks for the outputs of `Blender.render` (see `track_points`).
+
+  Args:
+    data_stack: the rendered layers; needs "object_coordinates", "depth", "segmentation" and
+      "normal". The segmentation has to be adjusted to the order of `instance_info` with
+      `adjust_segmentation_idxs`.
+    camera_info: camera information as returned by `get_camera_info`.
+    instance_info: instance information as returned by `get_instance_info`.
+    **kwargs: passed on to `track_points` (e.g. tracks_to_sample or rng).
+  """
+  num_frames = data_stack["depth"].shape[0]
+  bboxes_3d = np.array([info["bboxes_3d"] for info in instance_info]).reshape(
+      (-1, num_frames, 8, 3))
+  quaternions = np.array([info["quaternions"] for info in instance_info]).reshape(
+      (-1, num_frames, 4))
+  return track_points(data_stack["object_coordinates"], data_stack["depth"],
+                      data_stack["segmentation"], data_stack["normal"], bboxes_3d, quaternions,
+                      camera_info["focal_length"], camera_info["sensor_width"],
+                      camera_info["positions"], camera_info["quaternions"], **kwargs)
@@ -125,6 +125,61 @@ def move_until_no_overlap(asset, simulator, spawn_region=((-1, -1, -1), (1, 1, 1
                         rng=rng)
 
 
+def resting_pose_sampler(geometry_index, region, support_height: float = 0.):
+  """Sample stable resting poses on the plane z=support_height within the XY extent of a region.
+
+  The resting poses are looked up in a `kubric.assets.GeometryIndex` (by the asset_id of the
+  object), so objects placed like this are at rest without any settling simulation. The poses
+  assume a uniform scale of the object.
+  """
+  region = np.array(region, dtype=np.float32)
+
+  def _sampler(obj: objects.FileBasedObject, rng):
+    scale = float(np.max(obj.scale))
+    quaternion, offset = geometry_index.sample_resting_pose(obj.asset_id, rng=rng, scale=scale)
+    # the pose stays at rest under any rotation around the Z axis
+    obj.quaternion = pyquat.Quaternion(random_rotation(axis="Z", rng=rng)) * quaternion
+    obj.position = (0, 0, 0)  # reset position to origin
+    effective_region = region[:, :2] - obj.aabbox[:, :2]
+    x, y = rng.uniform(*effective_region)
+    obj.position = (x, y, support_height + offset)
+
+  return _sampler
+
+
+def footprints_overlap(asset, others, margin: float = 0.) -> bool:
+  """Whether the XY footprint (of the bounding box) of `asset` overlaps with any of `others`."""
+  (x_min, y_min, _), (x_max, y_max, _) = asset.aabbox
+  for other in others:
+    if other is asset:
+      continue
+    (o_x_min, o_y_min, _), (o_x_max, o_y_max, _) = other.aabbox
+    if (x_min < o_x_max + margin and o_x_min < x_max + margin and
+        y_min < o_y_max + margin and o_y_min < y_max + margin):
+      return True
+  return False
+
+
+def place_in_resting_pose(asset, geometry_index, others=(), spawn_region=((-1, -1, 0), (1, 1, 1)),
+                          support_height: Optional[float] = None, margin: float = 0.,
+                          max_trials=100, rng=default_rng()):
+  """Place an asset at rest on a support plane (e.g. the floor or a table top) next to `others`.
+
+  This replaces `move_until_no_overlap` followed by a settling simulation for static objects:
+  the asset is put into one of its precomputed resting poses (see `resting_pose_sampler`) at a
+  position whose footprint does not overlap the footprints of `others`. The support plane defaults
+  to the bottom of the spawn region.
+  """
+  if support_height is None:
+    support_height = spawn_region[0][2]
+  return resample_while(asset,
+                        samplers=[resting_pose_sampler(geometry_index, spawn_region,
+                                                       support_height=support_height)],
+                        condition=lambda obj: footprints_overlap(obj, others, margin=margin),
+                        max_trials=max_trials,
+                        rng=rng)
+
+
 def sample_color(
     strategy: str,
     rng: np.random.RandomState = default_rng()
@@ -22,22 +22,35 @@ import logging
 import os
 import sys
 import tempfile
-from typing import Any, Dict, Optional, Sequence, Union
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
 
 import kubric as kb
 from kubric import core
 from kubric import file_io
+from kubric import filesystem
+from kubric import tracing
+from kubric.assets import texture_variants
 from kubric.core.assets import UndefinedAsset
 from kubric.file_io import PathLike
 from kubric.redirect_io import RedirectStream
 from kubric.renderer import blender_utils
 from kubric.safeimport.bpy import bpy
 import numpy as np
-import tensorflow as tf
 
 logger = logging.getLogger(__name__)
 
 
+_MESH_CACHE = None
+
+
+def get_mesh_cache() -> blender_utils.MeshCache:
+  """Returns the process-wide mesh cache (shared by all Blender instances)."""
+  global _MESH_CACHE
+  if _MESH_CACHE is None:
+    _MESH_CACHE = blender_utils.MeshCache()
+  return _MESH_CACHE
+
+
 # noinspection PyUnresolvedReferences
 class Blender(core.View):
   """ An implementation of a rendering backend in Blender/Cycles."""
@@ -52,6 +65,9 @@ class Blender(core.View):
                verbose: bool = False,
                custom_scene: Optional[str] = None,
                motion_blur: Optional[float] = None,
+               use_mesh_cache: bool = True,
+               texture_resolution: Union[None, int, str] = None,
+               persistent_data: bool = False,
                ):
     """
     Args:
@@ -73,6 +89,19 @@ class Blender(core.View):
         If this argument is set to the path for a `.blend` file, then that scene is loaded instead.
         Note that this scene only affects the rendering output. It is not accessible from Kubric and
         not taken into account by the simulator.
+      use_mesh_cache: Import each render file of a FileBasedObject only once per process and
+        create all further instances as linked duplicates (see blender_utils.MeshCache). The
+        cache is shared by all Blender instances of the process and survives scene resets.
+      texture_resolution: Render with pre-generated lower resolution variants of the textures and
+        HDRIs (see kubric.assets.texture_variants) where they exist. None uses the original
+        images, an int the smallest variant with at least that many pixels, and "auto" picks a
+        variant for every image from the output resolution and the distance of the objects
+        using it to the camera.
+      persistent_data: Keep the synced scene of Cycles (geometry, BVHs, textures) between the
+        rendered frames, and drop the constant keyframes of static objects before rendering
+        (see `mark_static_assets`), so that only the moving objects are synced on every frame.
+        (see https://docs.blender.org/manual/en/latest/render/cycles/render_settings/
+        performance.html)
     """
     self.scratch_dir = tempfile.mkdtemp() if scratch_dir is None else scratch_dir
     self.ambient_node = None
@@ -82,6 +111,8 @@ class Blender(core.View):
     self.bg_hdri_node = None
     self.bg_mapping_node = None
     self.verbose = verbose
+    self.mesh_cache = get_mesh_cache() if use_mesh_cache else None
+    self.texture_resolution = texture_resolution
 
     # blender has a default scene on load, so we clear everything first
     self.clear_and_reset_blender_scene(self.verbose, custom_scene=custom_scene)
@@ -99,6 +130,7 @@ class Blender(core.View):
     self.use_denoising = use_denoising  # improves the output quality
     self.samples_per_pixel = samples_per_pixel
     self.background_transparency = background_transparency
+    self.persistent_data = persistent_data
 
     self.exr_output_node = blender_utils.set_up_exr_output_node(motion_blur=motion_blur)
 
@@ -149,6 +181,14 @@ class Blender(core.View):
   def adaptive_sampling(self, value: bool):
     self.blender_scene.cycles.use_adaptive_sampling = value
 
+  @property
+  def persistent_data(self) -> bool:
+    return self.blender_scene.render.use_persistent_data
+
+  @persistent_data.setter
+  def persistent_data(self, value: bool):
+    self.blender_scene.render.use_persistent_data = value
+
   @property
   def use_denoising(self) -> bool:
     return self.blender_scene.cycles.use_denoising
@@ -253,7 +293,7 @@ class Blender(core.View):
     path = kb.as_path(path)
     path.parent.mkdir(parents=True, exist_ok=True)  # ensure directory exists
     logger.info("Saving '%s'", path)
-    tf.io.gfile.copy(tmp_path, path, overwrite=True)
+    filesystem.copy(tmp_path, path, overwrite=True)
 
   def render(self,
              frames: Optional[Sequence[int]] = None,
@@ -262,7 +302,10 @@ class Blender(core.View):
                                              "forward_flow", "depth",
                                              "normal", "object_coordinates",
                                              "segmentation"),
-             ) -> Dict[str, np.ndarray]:
+             frame_callback: Union[None, Callable[[int, Dict[str, np.ndarray]], None],
+                                   Sequence[Optional[Callable]]] = None,
+             cameras: Optional[Sequence[core.Camera]] = None,
+             ) -> Union[Dict[str, np.ndarray], List[Dict[str, np.ndarray]]]:
     """Renders all frames (or a subset) of the animation and returns images as a dict of arrays.
 
     Args:
@@ -272,9 +315,17 @@ class Blender(core.View):
       return_layers: list of layers to return. For possible values refer to
         the Blender.post_processors dict. Defaults to ("backward_flow",
         "forward_flow", "depth", "normal", "object_coordinates", "segmentation").
+      frame_callback: optional function that is called as frame_callback(frame_idx, layers)
+        for every frame as soon as it has been post-processed (e.g. VideoWriter.write). If
+        `cameras` are given, a list with one callback (or None) per camera.
+      cameras: render every frame from each of these cameras before advancing to the next frame
+        (instead of from scene.camera). The scene is evaluated once per frame, and Cycles keeps
+        the synced scene and its BVH between the views of a frame (persistent data), which is
+        cheaper than rendering the whole animation once per camera.
 
     Returns:
-      A dictionary with one entry for each return layer. By default:
+      A dictionary with one entry for each return layer (or a list with one such dictionary per
+      camera if `cameras` are given). By default:
         - "rgba": shape = (nr_frames, height, width, 4)
         - "segmentation": shape = (nr_frames, height, width, 1) (int)
         - "backward_flow": shape = (nr_frames, height, width, 2)
@@ -284,24 +335,144 @@ class Blender(core.View):
         - "normal": shape = (nr_frames, height, width, 3) (uint16)
     """
     logger.info("Using scratch rendering folder: '%s'", self.scratch_dir)
+    if cameras is None:
+      views = [(self.scene.camera, self.scratch_dir)]
+    else:
+      scene_camera = self.scene.camera
+      for camera in cameras:
+        if camera not in self.scene.assets:
+          self.scene.add(camera)
+      self.scene.camera = scene_camera  # adding a camera to a scene makes it the scene camera
+      views = [(camera, self.scratch_dir / f"view_{i}") for i, camera in enumerate(cameras)]
+    if self.texture_resolution is not None:
+      with tracing.span("texture_variants"):
+        self.select_texture_variants(frames, cameras=[camera for camera, _ in views])
     if not ignore_missing_textures:
       self._check_missing_textures()
-    self.set_exr_output_path(self.scratch_dir / "exr" / "frame_")
+    if self.persistent_data:
+      self.mark_static_assets()
     # --- starts rendering
     if frames is None:
       frames = range(self.scene.frame_start, self.scene.frame_end + 1)
-    with RedirectStream(stream=sys.stdout, disabled=self.verbose):
-      for frame_nr in frames:
-        bpy.context.scene.frame_set(frame_nr)
-        # When writing still images Blender doesn't append the frame number to the png path.
-        # (but for exr it does, so we only adjust the png path)
-        bpy.context.scene.render.filepath = str(
-            self.scratch_dir / "images" / f"frame_{frame_nr:04d}.png")
-        bpy.ops.render.render(animation=False, write_still=True)
-        logger.info("Rendered frame '%s'", bpy.context.scene.render.filepath)
+    render_settings = bpy.context.scene.render
+    scene_camera = bpy.context.scene.camera
+    use_persistent_data = render_settings.use_persistent_data
+    try:
+      if len(views) > 1:
+        render_settings.use_persistent_data = True
+      with RedirectStream(stream=sys.stdout, disabled=self.verbose):
+        for frame_nr in frames:
+          bpy.context.scene.frame_set(frame_nr)
+          for view_idx, (camera, view_dir) in enumerate(views):
+            if cameras is not None:
+              bpy.context.scene.camera = self._convert_to_blender_object(camera)
+            self.set_exr_output_path(view_dir / "exr" / "frame_")
+            # When writing still images Blender doesn't append the frame number to the png path.
+            # (but for exr it does, so we only adjust the png path)
+            render_settings.filepath = str(view_dir / "images" / f"frame_{frame_nr:04d}.png")
+            with tracing.span("cycles_render", frame=frame_nr, view=view_idx):
+              bpy.ops.render.render(animation=False, write_still=True)
+            logger.info("Rendered frame '%s'", render_settings.filepath)
+    finally:
+      render_settings.use_persistent_data = use_persistent_data
+      bpy.context.scene.camera = scene_camera
 
     # --- post process the rendered frames
-    return self.postprocess(self.scratch_dir, return_layers=return_layers)
+    if cameras is None:
+      return self.postprocess(self.scratch_dir, return_layers=return_layers,
+                              frame_callback=frame_callback)
+    frame_callbacks = [None] * len(views) if frame_callback is None else list(frame_callback)
+    if len(frame_callbacks) != len(views):
+      raise ValueError(f"Expected one frame_callback per camera ({len(views)}), "
+                       f"got {len(frame_callbacks)}.")
+    data_stacks = []
+    scene_camera = self.scene.camera
+    try:
+      for (camera, view_dir), callback in zip(views, frame_callbacks):
+        self.scene.camera = camera  # e.g. for the conversion of the depth
+        data_stacks.append(self.postprocess(view_dir, return_layers=return_layers,
+                                            frame_callback=callback))
+    finally:
+      self.scene.camera = scene_camera
+    return data_stacks
+
+  def select_texture_variants(self, frames: Optional[Sequence[int]] = None,
+                              cameras: Optional[Sequence[core.Camera]] = None):
+    """Swaps all images of the scene for their smallest sufficient variant (if it exists).
+
+    See the `texture_resolution` argument of the constructor. The variants are sufficient for all
+    `cameras` (default: the scene camera). The original path of a swapped image is kept, so that
+    a later call (e.g. for closer camera views) can pick a larger variant.
+    """
+    required = {}
+
+    def require(image, size):
+      if image is not None and image.source == "FILE" and image.filepath:
+        required[image] = max(required.get(image, 0), size)
+
+    resolution_x = self.scene.resolution[0]
+    if self.ambient_hdri_node is not None:
+      require(self.ambient_hdri_node.image, texture_variants.AMBIENT_HDRI_SIZE)
+
+    object_images = []
+    for asset in self.scene.assets:
+      blender_obj = asset.linked_objects.get(self)
+      if not isinstance(asset, core.PhysicalObject) or blender_obj is None:
+        continue
+      images = [node.image for slot in blender_obj.material_slots
+                if slot.material is not None and slot.material.node_tree is not None
+                for node in slot.material.node_tree.nodes if hasattr(node, "image")]
+      if images:
+        object_images.append((asset, images))
+
+    for camera in [self.scene.camera] if cameras is None else cameras:
+      field_of_view = getattr(camera, "field_of_view", np.pi / 2)
+      environment_size = texture_variants.required_environment_size(resolution_x, field_of_view)
+      if self.bg_hdri_node is not None:
+        require(self.bg_hdri_node.image, environment_size)
+      camera_positions = (camera.get_values_over_time("position", frames=frames)
+                          if isinstance(camera, core.Camera) else np.zeros((1, 3)))
+      for asset, images in object_images:
+        object_size = float(np.max(np.ptp(asset.aabbox, axis=0)))
+        distance = np.min(np.linalg.norm(
+            asset.get_values_over_time("position", frames=frames) - camera_positions, axis=-1))
+        size = texture_variants.required_texture_size(resolution_x, field_of_view, object_size,
+                                                      distance)
+        for image in images:
+          require(image, size)
+
+    for image, size in required.items():
+      if isinstance(self.texture_resolution, int):
+        size = self.texture_resolution
+      original = image.get("kubric_original_filepath", image.filepath)
+      selected = texture_variants.select_variant(bpy.path.abspath(original), size)
+      if selected != bpy.path.abspath(image.filepath):
+        logger.debug("Using texture variant %s (%d texels required)", selected, size)
+        image["kubric_original_filepath"] = original
+        image.filepath = selected
+        tracing.count("texture_variant_swaps")
+
+  def mark_static_assets(self) -> int:
+    """Removes the constant keyframes of all static objects of the scene from Blender.
+
+    Static objects (`static=True` or metadata["is_dynamic"] == False) are keyframed by the
+    simulator like any other object. Without animation data they are not re-evaluated on frame
+    changes, and with persistent data Cycles keeps their geometry and textures on the device
+    between frames. Static objects whose keyframes do change (e.g. moved by hand) are kept as they
+    are. The keyframes of the kubric assets are not affected.
+
+    Returns:
+      The number of objects whose animation was removed.
+    """
+    nr_marked = 0
+    for asset in self.scene.assets:
+      blender_obj = asset.linked_objects.get(self)
+      if not isinstance(asset, core.PhysicalObject) or blender_obj is None:
+        continue
+      if asset.static or asset.metadata.get("is_dynamic", True) is False:
+        nr_marked += blender_utils.remove_constant_animation(blender_obj)
+    tracing.count("static_assets_marked", nr_marked)
+    return nr_marked
 
   def _check_missing_textures(self):
     missing_textures = sorted({img.filepath for img in bpy.data.images
@@ -346,7 +517,8 @@ class Blender(core.View):
   def postprocess(
       self,
       from_dir: PathLike,
-      return_layers: Sequence[str]):
+      return_layers: Sequence[str],
+      frame_callback: Optional[Callable[[int, Dict[str, np.ndarray]], None]] = None):
 
     from_dir = kb.as_path(from_dir)
     # --- collect all layers for all frames
@@ -355,14 +527,18 @@ class Blender(core.View):
     png_frames = [from_dir / "images" / (exr_filename.stem + ".png")
                   for exr_filename in exr_frames]
 
-    for exr_filename, png_filename in zip(exr_frames, png_frames):
-      source_layers = blender_utils.get_render_layers_from_exr(exr_filename)
-      # Use the contrast-normalized PNG instead of the EXR for RGBA.
-      source_layers["rgba"] = file_io.read_png(png_filename)
+    for frame_idx, (exr_filename, png_filename) in enumerate(zip(exr_frames, png_frames)):
+      with tracing.span("exr_postprocess", frame=frame_idx):
+        source_layers = blender_utils.get_render_layers_from_exr(exr_filename)
+        # Use the contrast-normalized PNG instead of the EXR for RGBA.
+        source_layers["rgba"] = file_io.read_png(png_filename)
 
-      for key in return_layers:
-        post_processor = self.post_processors[key]
-        data_stack[key].append(post_processor(source_layers, self.scene))
+        for key in return_layers:
+          post_processor = self.post_processors[key]
+          data_stack[key].append(post_processor(source_layers, self.scene))
+
+      if frame_callback is not None:
+        frame_callback(frame_idx, {key: data_stack[key][-1] for key in return_layers})
 
     return {key: np.stack(data_stack[key], axis=0)
             for key in data_stack}
@@ -370,6 +546,8 @@ class Blender(core.View):
   @staticmethod
   def clear_and_reset_blender_scene(verbose: bool = False, custom_scene: str = None):
     """ Resets Blender to an entirely empty scene (or a custom one)."""
+    # frees the scene Cycles kept on the device if persistent data was used
+    bpy.context.scene.render.use_persistent_data = False
     with RedirectStream(stream=sys.stdout, disabled=verbose):
       bpy.ops.wm.read_factory_settings(use_empty=True)
       if custom_scene is None:
@@ -427,6 +605,28 @@ class Blender(core.View):
   def _add_asset(self, obj: core.FileBasedObject):
     if obj.render_filename is None:
       return None  # if there is no render file, then ignore this object
+    with tracing.span("blender_import", asset_id=obj.asset_id):
+      if self.mesh_cache is None:
+        blender_obj = self._import_render_file(obj)
+      else:
+        key = self.mesh_cache.cache_key(
+            obj.render_filename, obj.render_import_kwargs,
+            glb_do_transform_apply_after_import=obj.glb_do_transform_apply_after_import)
+        blender_obj = self.mesh_cache.instantiate(key, lambda: self._import_render_file(obj))
+
+    # deactivate auto_smooth because for some reason it lead to no smoothing at all
+    # TODO: make smoothing configurable
+    blender_obj.data.use_auto_smooth = False
+
+    register_object3d_setters(obj, blender_obj)
+    obj.observe(AttributeSetter(blender_obj, "active_material",
+                                converter=self._convert_to_blender_object), "material")
+    obj.observe(AttributeSetter(blender_obj, "scale"), "scale")
+    obj.observe(KeyframeSetter(blender_obj, "scale"), "scale", type="keyframe")
+    return blender_obj
+
+  def _import_render_file(self, obj: core.FileBasedObject):
+    """Imports the render file of `obj` and returns the resulting (single) Blender object."""
     _, _, extension = obj.render_filename.rpartition(".")
     with RedirectStream(stream=sys.stdout, disabled=self.verbose):  # reduce the logging noise
       with io.StringIO() as fstdout:  # < scratch stdout buffer
@@ -493,18 +693,7 @@ class Blender(core.View):
             raise ValueError(f"Unknown file-type: '{extension}' for {obj}")
 
     assert len(bpy.context.selected_objects) == 1
-    blender_obj = bpy.context.selected_objects[0]
-
-    # deactivate auto_smooth because for some reason it lead to no smoothing at all
-    # TODO: make smoothing configurable
-    blender_obj.data.use_auto_smooth = False
-
-    register_object3d_setters(obj, blender_obj)
-    obj.observe(AttributeSetter(blender_obj, "active_material",
-                                converter=self._convert_to_blender_object), "material")
-    obj.observe(AttributeSetter(blender_obj, "scale"), "scale")
-    obj.observe(KeyframeSetter(blender_obj, "scale"), "scale", type="keyframe")
-    return blender_obj
+    return bpy.context.selected_objects[0]
 
   @add_asset.register(core.DirectionalLight)
   @blender_utils.prepare_blender_object
@@ -12,23 +12,30 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
 import contextlib
 import copy
 import functools
+import json
+import logging
+import pathlib
 import sys
-from typing import Dict, Sequence, Tuple, Union
+import tempfile
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import OpenEXR
 import Imath
-import sklearn.utils
 import trimesh
 
 from kubric import core
+from kubric import tracing
 from kubric.kubric_typing import AddAssetFunction, ArrayLike
 from kubric.redirect_io import RedirectStream
 from kubric.safeimport.bpy import bpy
 
+logger = logging.getLogger(__name__)
+
 
 def clear_and_reset_blender_scene(verbose=False):
   """ Resets Blender to an entirely empty scene."""
@@ -64,6 +71,97 @@ def prepare_blender_object(func: AddAssetFunction) -> AddAssetFunction:
   return _func
 
 
+class MeshCache:
+  """Per-process cache of imported render meshes, so that each file is imported only once.
+
+  The first import of a file is kept as a hidden template object (not linked to any scene and
+  protected by a fake user). Every instance is a linked duplicate of the template, i.e. it shares
+  the mesh and material data and only has its own object-level transform and material slots.
+
+  Templates are also written to a small `.blend` library, so that after a scene reset
+  (`read_factory_settings`) they can be appended from there, which is much faster than
+  re-running the importers. Note that textures are referenced by their absolute paths, so the
+  asset files have to outlive the cache (as is the case for AssetSource and AssetCache dirs).
+  """
+
+  KEY_PROPERTY = "kubric_mesh_cache_key"
+
+  def __init__(self, library_dir: Optional[str] = None):
+    self.library_dir = pathlib.Path(library_dir or tempfile.mkdtemp(prefix="kubric_mesh_cache_"))
+    self.library_dir.mkdir(parents=True, exist_ok=True)
+    self._template_names = {}  # cache key -> name of the template in bpy.data.objects
+    self._libraries = {}  # cache key -> path of the .blend library that contains the template
+    self.stats = collections.Counter(hits=0, misses=0, reloads=0)
+
+  @staticmethod
+  def cache_key(filename: str, import_kwargs: Dict[str, Any], **options) -> str:
+    return json.dumps([str(filename), import_kwargs, options], sort_keys=True, default=str)
+
+  def instantiate(self, key: str, import_fn: Callable[[], bpy.types.Object]) -> bpy.types.Object:
+    """Returns a new linked duplicate of the template for `key` (calling `import_fn` on a miss).
+
+    `import_fn` has to import the file and return the single resulting Blender object.
+    """
+    template = self._get_template(key)
+    if template is not None:
+      self.stats["hits"] += 1
+      tracing.count("mesh_cache.hit")
+    elif key in self._libraries:
+      self.stats["reloads"] += 1
+      tracing.count("mesh_cache.reload")
+      template = self._load_template(key)
+    else:
+      self.stats["misses"] += 1
+      tracing.count("mesh_cache.miss")
+      template = self._store_template(key, import_fn())
+
+    instance = template.copy()
+    del instance[self.KEY_PROPERTY]
+    # link the materials to the object, so that changing the material of one instance does not
+    # change the material of all instances (which would happen via the shared mesh)
+    for slot in instance.material_slots:
+      material = slot.material
+      slot.link = "OBJECT"
+      slot.material = material
+    return instance
+
+  def clear(self):
+    for key in list(self._template_names):
+      template = self._get_template(key)
+      if template is not None:
+        bpy.data.objects.remove(template, do_unlink=True)
+    self._template_names.clear()
+
+  def _get_template(self, key: str) -> Optional[bpy.types.Object]:
+    template = bpy.data.objects.get(self._template_names.get(key, ""))
+    if template is None or template.get(self.KEY_PROPERTY) != key:
+      return None  # e.g. removed by a scene reset
+    return template
+
+  def _store_template(self, key: str, template: bpy.types.Object) -> bpy.types.Object:
+    for collection in list(template.users_collection):
+      collection.objects.unlink(template)
+    template.name = f"mesh_cache_template.{len(self._libraries):05d}"
+    template[self.KEY_PROPERTY] = key
+    template.use_fake_user = True
+    self._template_names[key] = template.name
+
+    library_path = self.library_dir / f"{len(self._libraries):05d}.blend"
+    bpy.data.libraries.write(str(library_path), {template}, fake_user=True,
+                             path_remap="ABSOLUTE")
+    self._libraries[key] = library_path
+    return template
+
+  def _load_template(self, key: str) -> bpy.types.Object:
+    with bpy.data.libraries.load(str(self._libraries[key]), link=False) as (data_from, data_to):
+      data_to.objects = list(data_from.objects)
+    template = data_to.objects[0]
+    template.use_fake_user = True
+    self._template_names[key] = template.name  # might have been renamed on a name clash
+    logger.debug("Reloaded mesh cache template for %s", key)
+    return template
+
+
 def set_up_exr_output_node(default_layers=("Image", "Depth"),
                            aux_layers=("UV", "Normal", "CryptoObject00", "ObjectCoordinates"),
                            motion_blur=None):
@@ -293,11 +391,41 @@ def replace_cryptomatte_hashes_by_asset_index(
   return new_segmentation_ids
 
 
+def murmurhash3_32(data: bytes, seed: int = 0) -> int:
+  """The unsigned 32 bit MurmurHash3 (x86) of some bytes.
+
+  Same as sklearn.utils.murmurhash3_32(data, seed, positive=True), without importing sklearn.
+  """
+  c1, c2, mask = 0xcc9e2d51, 0x1b873593, 0xffffffff
+
+  def mix(k):
+    k = (k * c1) & mask
+    k = ((k << 15) | (k >> 17)) & mask
+    return (k * c2) & mask
+
+  h = seed & mask
+  nr_blocks = len(data) // 4
+  for i in range(nr_blocks):
+    h ^= mix(int.from_bytes(data[4 * i:4 * i + 4], "little"))
+    h = ((h << 13) | (h >> 19)) & mask
+    h = (h * 5 + 0xe6546b64) & mask
+  tail = data[4 * nr_blocks:]
+  if tail:
+    h ^= mix(int.from_bytes(tail, "little"))
+  h ^= len(data)
+  h ^= h >> 16
+  h = (h * 0x85ebca6b) & mask
+  h ^= h >> 13
+  h = (h * 0xc2b2ae35) & mask
+  h ^= h >> 16
+  return h
+
+
 def mm3hash(name):
   """ Compute the uint32 hash that Blenders Cryptomatte uses.
   https://github.com/Psyop/Cryptomatte/blob/master/specification/cryptomatte_specification.pdf
   """
-  hash_32 = sklearn.utils.murmurhash3_32(name, positive=True)
+  hash_32 = murmurhash3_32(name.encode("utf-8"))
   exp = hash_32 >> 23 & 255
   if exp in (0, 255):
     hash_32 ^= 1 << 23
@@ -367,6 +495,41 @@ def apply_transformations(
     bpy.ops.object.transform_apply(location=position, rotation=rotation, scale=scale)
 
 
+def remove_constant_animation(blender_obj: bpy.types.Object, atol: float = 1e-6) -> bool:
+  """Replaces the animation of an object by its values if none of its F-curves change.
+
+  Objects without animation data are not re-evaluated by Blender when the frame changes, so with
+  persistent data Cycles keeps their synced geometry and textures across frames.
+
+  Args:
+    blender_obj: the object.
+    atol: keyframe values that differ by at most this much count as constant.
+
+  Returns:
+    True if the object had a constant animation that was removed.
+  """
+  animation_data = blender_obj.animation_data
+  if animation_data is None or animation_data.action is None or animation_data.drivers:
+    return False
+  values = []
+  for fcurve in animation_data.action.fcurves:
+    keys = [keyframe.co[1] for keyframe in fcurve.keyframe_points]
+    if not keys or np.ptp(keys) > atol:
+      return False
+    values.append((fcurve.data_path, fcurve.array_index, keys[0]))
+
+  for data_path, index, value in values:
+    owner_path, _, attribute = data_path.rpartition(".")
+    owner = blender_obj.path_resolve(owner_path) if owner_path else blender_obj
+    current = getattr(owner, attribute)
+    if hasattr(current, "__len__"):
+      current[index] = value
+    else:
+      setattr(owner, attribute, value)
+  blender_obj.animation_data_clear()
+  return True
+
+
 def get_vertices_and_faces(obj: bpy.types.Object) -> Tuple[np.ndarray, np.ndarray]:
   """ Get arrays of vertices and faces for a given blender mesh object.
 
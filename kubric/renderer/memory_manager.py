@@ -0,0 +1,127 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Bounded memory for long-running Blender processes that render scene after scene.
+
+Removing an object from a scene (or replacing a curve, an empty or a material) leaves its data
+behind as orphan datablocks without users, which stay in memory until Blender is reset. The
+MemoryManager purges them between scenes and records the RSS and the number of datablocks after
+every scene. Once a budget is exceeded, `over_budget` tells the caller to recycle the process
+(e.g. finish its pending writes and exit, so that a supervisor starts a fresh one) instead of
+waiting for the OOM killer.
+
+Datablocks with a fake user, such as the templates of the blender_utils.MeshCache, are never
+purged. `MemoryManager.keep` gives other datablocks (e.g. images that are reused by every scene)
+a fake user for the same effect.
+"""
+
+import collections
+import logging
+import resource
+from typing import Any, Dict, List, Optional, Sequence
+
+from kubric import tracing
+from kubric.safeimport.bpy import bpy
+
+logger = logging.getLogger(__name__)
+
+# the bpy.data collections that are purged and counted
+DATABLOCK_TYPES = ("objects", "collections", "meshes", "curves", "materials", "node_groups",
+                   "textures", "images", "actions", "cameras", "lights", "worlds")
+
+
+def rss_mib() -> float:
+  """The resident set size of this process in MiB (the peak RSS where /proc is unavailable)."""
+  try:
+    with open("/proc/self/status") as fp:
+      for line in fp:
+        if line.startswith("VmRSS:"):
+          return int(line.split()[1]) / 1024
+  except OSError:
+    pass
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def datablock_counts(types: Sequence[str] = DATABLOCK_TYPES) -> Dict[str, int]:
+  return {name: len(getattr(bpy.data, name)) for name in types}
+
+
+def purge_orphans(types: Sequence[str] = DATABLOCK_TYPES) -> Dict[str, int]:
+  """Removes all datablocks without users, including the ones only used by removed datablocks.
+
+  Returns:
+    The number of removed datablocks by type (types without removals are omitted).
+  """
+  removed = collections.Counter()
+  while True:
+    orphans = [(name, block) for name in types for block in getattr(bpy.data, name)
+               if block.users == 0]
+    if not orphans:
+      break
+    for name, block in orphans:
+      getattr(bpy.data, name).remove(block)
+      removed[name] += 1
+  return dict(removed)
+
+
+class MemoryManager:
+  """Purges orphan datablocks between scenes and tracks the memory used after each scene.
+
+  Args:
+    rss_budget_mib: recycle the process once its RSS after a scene exceeds this many MiB.
+    datablock_budget: recycle the process once more than this many datablocks (of the
+      DATABLOCK_TYPES) remain after a scene.
+  """
+
+  def __init__(self, rss_budget_mib: Optional[float] = None,
+               datablock_budget: Optional[int] = None):
+    self.rss_budget_mib = rss_budget_mib
+    self.datablock_budget = datablock_budget
+    self.history: List[Dict[str, Any]] = []
+
+  @staticmethod
+  def keep(*datablocks):
+    """Protects datablocks that are intentionally cached across scenes from being purged."""
+    for block in datablocks:
+      block.use_fake_user = True
+
+  @staticmethod
+  def purge() -> Dict[str, int]:
+    with tracing.span("purge_orphans"):
+      removed = purge_orphans()
+    tracing.count("orphans_purged", sum(removed.values()))
+    if removed:
+      logger.debug("Purged orphan datablocks: %s", removed)
+    return removed
+
+  def end_scene(self, name: Optional[str] = None) -> Dict[str, Any]:
+    """Purges the orphans of a finished scene and records the memory used afterwards."""
+    purged = self.purge()
+    stats = {"scene": name, "rss_mib": rss_mib(), "datablocks": datablock_counts(),
+             "purged": purged}
+    self.history.append(stats)
+    logger.info("Memory after scene %s: %.0f MiB RSS, %d datablocks (purged %d orphans)",
+                name, stats["rss_mib"], sum(stats["datablocks"].values()), sum(purged.values()))
+    return stats
+
+  @property
+  def over_budget(self) -> bool:
+    """Whether the memory after the last scene exceeds one of the budgets."""
+    if not self.history:
+      return False
+    stats = self.history[-1]
+    if self.rss_budget_mib is not None and stats["rss_mib"] > self.rss_budget_mib:
+      return True
+    nr_datablocks = sum(stats["datablocks"].values())
+    return self.datablock_budget is not None and nr_datablocks > self.datablock_budget
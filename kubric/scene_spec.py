@@ -0,0 +1,262 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compact, deterministic descriptions of scenes that can be re-created in another process.
+
+A scene spec is a plain (JSON) dict with the settings of a scene, its camera and its assets. Assets
+from an AssetSource are stored by (source name, asset id) plus the traits that were set on them,
+materials of primitives by their traits, and animations as dense per-frame arrays:
+
+  {"version": 1,
+   "scene": {"frame_start": 1, "frame_end": 24, "resolution": [512, 512], ...},
+   "camera": {"type": "PerspectiveCamera", "position": [...], "focal_length": 35., ...},
+   "assets": [{"type": "FileBasedObject", "source": "gso", "asset_id": "...", "scale": [...],
+               "keyframes": {"start": 0, "position": [[x, y, z], ...], ...}, ...}, ...]}
+
+Sampling and simulation can thus run in one process, and rendering (`build_scene`) in another
+one, from a few kilobytes instead of a packed `.blend` file. Specs are written with sorted keys and
+rounded floats, so the same scene always results in the same bytes.
+"""
+
+import gzip
+import json
+import logging
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence
+
+import numpy as np
+
+from kubric import file_io
+from kubric.core import assets as core_assets
+from kubric.core import cameras
+from kubric.core import lights
+from kubric.core import materials
+from kubric.core import objects
+from kubric.core import scene as core_scene
+from kubric.kubric_typing import PathLike
+
+logger = logging.getLogger(__name__)
+
+SCENE_SPEC_VERSION = 1
+# a micrometer for positions, ~1e-6 rad for quaternions
+DECIMALS = 6
+# the properties that are needed to render an animation
+ANIMATED_PROPERTIES = ("position", "quaternion")
+SCENE_TRAITS = ("frame_start", "frame_end", "frame_rate", "step_rate", "resolution", "gravity",
+                "ambient_illumination", "background")
+
+ASSET_TYPES = {cls.__name__: cls for cls in (
+    objects.Cube, objects.Sphere, objects.FileBasedObject,
+    cameras.PerspectiveCamera, cameras.OrthographicCamera,
+    lights.DirectionalLight, lights.PointLight, lights.RectAreaLight, lights.SpotLight,
+    materials.PrincipledBSDFMaterial, materials.FlatMaterial,
+)}
+
+_SKIPPED_TRAITS = ("uid", "name", "metadata", "material")
+# provided by the asset source (and machine dependent in the case of paths)
+_SOURCE_TRAITS = ("asset_id", "bounds", "simulation_filename", "render_filename",
+                  "render_import_kwargs", "collision_lods", "glb_do_transform_apply_after_import")
+
+
+def _to_builtin(value):
+  """Converts (nested) traits values into JSON types with rounded floats."""
+  if isinstance(value, dict):
+    return {str(k): _to_builtin(v) for k, v in value.items()}
+  if isinstance(value, (list, tuple, np.ndarray)):
+    return [_to_builtin(v) for v in value]
+  if isinstance(value, (bool, np.bool_)):
+    return bool(value)
+  if isinstance(value, (int, np.integer)):
+    return int(value)
+  if isinstance(value, (float, np.floating)):
+    return round(float(value), DECIMALS) + 0.  # + 0. turns -0. into 0.
+  return value
+
+
+def keyframe_arrays(asset: core_assets.Asset, frames: Sequence[int],
+                    properties: Iterable[str] = ANIMATED_PROPERTIES) -> Dict[str, np.ndarray]:
+  """The values of the animated `properties` of an asset at `frames` as {property: [F, ...]}."""
+  return {prop: asset.get_values_over_time(prop, frames) for prop in properties
+          if asset.keyframes.get(prop)}
+
+
+def insert_keyframes(asset: core_assets.Asset, keyframes: Mapping[str, Any]):
+  """Inverse of `keyframe_arrays` (with the first frame in `keyframes["start"]`)."""
+  start = keyframes.get("start", 0)
+  for prop, values in keyframes.items():
+    if prop == "start":
+      continue
+    for frame, value in enumerate(values, start=start):
+      setattr(asset, prop, value)
+      asset.keyframe_insert(prop, frame)
+
+
+def asset_spec(asset: core_assets.Asset, source: Optional[str] = None,
+               frames: Optional[Sequence[int]] = None,
+               properties: Iterable[str] = ANIMATED_PROPERTIES) -> Dict[str, Any]:
+  """Describes an asset by its type and traits.
+
+  Args:
+    asset: a camera, light, material or object (see ASSET_TYPES).
+    source: name of the AssetSource the asset was created from. Only the asset id of such assets is
+      stored, their files, bounds and metadata come from the source.
+    frames: store the values of the animated `properties` at these frames (if None, only the
+      current values are stored).
+    properties: the animated properties to store.
+  """
+  asset_type = type(asset).__name__
+  if asset_type not in ASSET_TYPES:
+    raise TypeError(f"Cannot describe assets of type {asset_type!r} in a scene spec.")
+  skipped = _SKIPPED_TRAITS + (_SOURCE_TRAITS if source is not None else ())
+  spec = {name: getattr(asset, name) for name in asset.trait_names() if name not in skipped}
+  spec["type"] = asset_type
+  spec["name"] = asset.name
+  if source is not None:
+    spec["source"] = source
+    spec["asset_id"] = asset.asset_id
+  elif asset.metadata:
+    spec["metadata"] = dict(asset.metadata)
+  material = getattr(asset, "material", None)
+  if material is not None and not isinstance(material, core_assets.UndefinedAsset):
+    spec["material"] = asset_spec(material)
+  if frames is not None:
+    keyframes = keyframe_arrays(asset, frames, properties)
+    if keyframes:
+      spec["keyframes"] = {"start": frames[0], **keyframes}
+  return _to_builtin(spec)
+
+
+def create_asset(spec: Mapping[str, Any],
+                 asset_sources: Optional[Mapping[str, Any]] = None) -> core_assets.Asset:
+  """Creates an asset (with its keyframes) from its `asset_spec`.
+
+  Args:
+    spec: the description of the asset.
+    asset_sources: the AssetSources by the names used when the spec was written.
+  """
+  kwargs = {k: v for k, v in spec.items()
+            if k not in ("type", "source", "asset_id", "material", "keyframes")}
+  if "material" in spec:
+    kwargs["material"] = create_asset(spec["material"])
+  if "source" in spec:
+    if asset_sources is None or spec["source"] not in asset_sources:
+      raise KeyError(f"Unknown asset source {spec['source']!r} of {spec['asset_id']!r}.")
+    asset = asset_sources[spec["source"]].create(asset_id=spec["asset_id"], **kwargs)
+  else:
+    asset = ASSET_TYPES[spec["type"]](**kwargs)
+  if "keyframes" in spec:
+    insert_keyframes(asset, spec["keyframes"])
+  return asset
+
+
+def source_of(asset: core_assets.Asset, asset_sources: Mapping[str, Any]) -> Optional[str]:
+  """Name of the first AssetSource that contains the asset id of `asset` (or None)."""
+  asset_id = getattr(asset, "asset_id", None)
+  if not asset_id:
+    return None
+  return next((name for name, source in asset_sources.items() if asset_id in source), None)
+
+
+def scene_spec(scene: core_scene.Scene, asset_sources: Optional[Mapping[str, Any]] = None,
+               frames: Optional[Sequence[int]] = None,
+               exclude: Iterable[core_assets.Asset] = (), **extra) -> Dict[str, Any]:
+  """Describes a scene, its camera and its objects and lights.
+
+  Args:
+    scene: the scene.
+    asset_sources: the AssetSources (by name) that assets may have been created from.
+    frames: the frames at which animations are stored (default: all frames of the scene).
+    exclude: assets that are not stored (e.g. because they are re-created differently).
+    **extra: additional (JSON serializable) entries of the spec.
+  """
+  asset_sources = asset_sources or {}
+  frames = list(range(scene.frame_start, scene.frame_end + 1)) if frames is None else list(frames)
+  exclude = set(exclude)
+  spec = {
+      "version": SCENE_SPEC_VERSION,
+      "scene": _to_builtin({name: getattr(scene, name) for name in SCENE_TRAITS}),
+      "camera": asset_spec(scene.camera, frames=frames) if scene.camera is not None else None,
+      "assets": [asset_spec(asset, source=source_of(asset, asset_sources), frames=frames)
+                 for asset in scene.assets
+                 if isinstance(asset, (objects.PhysicalObject, lights.Light))
+                 and asset not in exclude],
+  }
+  spec.update(_to_builtin(extra))
+  return spec
+
+
+def build_scene(spec: Mapping[str, Any], asset_sources: Optional[Mapping[str, Any]] = None,
+                scene: Optional[core_scene.Scene] = None):
+  """Applies the settings and camera of a scene spec and adds its assets to the scene.
+
+  Args:
+    spec: the scene spec.
+    asset_sources: the AssetSources by the names used when the spec was written.
+    scene: the scene to populate (e.g. one that is already linked to a renderer). If its camera is
+      set, the camera is updated in place.
+
+  Returns:
+    (scene, [the created assets in the order of spec["assets"]])
+  """
+  if spec.get("version") != SCENE_SPEC_VERSION:
+    raise ValueError(f"Unsupported scene spec version {spec.get('version')!r} "
+                     f"(expected {SCENE_SPEC_VERSION}).")
+  settings = {k: tuple(v) if isinstance(v, list) else v for k, v in spec["scene"].items()}
+  if scene is None:
+    scene = core_scene.Scene(**settings)
+  else:
+    # frame_rate and step_rate are validated against each other once both are set
+    with scene.hold_trait_notifications():
+      for name, value in settings.items():
+        setattr(scene, name, value)
+
+  camera_spec = spec.get("camera")
+  if camera_spec is not None:
+    if scene.camera is not None and type(scene.camera).__name__ == camera_spec["type"]:
+      for name, value in camera_spec.items():
+        if name not in ("type", "name", "metadata", "keyframes"):
+          setattr(scene.camera, name, value)
+      if "keyframes" in camera_spec:
+        insert_keyframes(scene.camera, camera_spec["keyframes"])
+    else:
+      scene.camera = create_asset(camera_spec)
+
+  created = []
+  for entry in spec["assets"]:
+    asset = create_asset(entry, asset_sources)
+    scene += asset
+    created.append(asset)
+  return scene, created
+
+
+def dumps(spec: Mapping[str, Any]) -> bytes:
+  """Serializes a scene spec deterministically (sorted keys, rounded floats, no whitespace)."""
+  return json.dumps(_to_builtin(spec), sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def write_scene_spec(spec: Mapping[str, Any], filename: PathLike):
+  """Writes a scene spec as JSON (gzip compressed if `filename` ends with .gz)."""
+  data = dumps(spec)
+  filename = file_io.as_path(filename)
+  if filename.suffix == ".gz":
+    data = gzip.compress(data, mtime=0)  # no timestamp, for reproducible bytes
+  filename.write_bytes(data)
+  logger.info("Wrote scene spec (%d bytes) to %s", len(data), filename)
+
+
+def read_scene_spec(filename: PathLike) -> Dict[str, Any]:
+  filename = file_io.as_path(filename)
+  data = filename.read_bytes()
+  if filename.suffix == ".gz":
+    data = gzip.decompress(data)
+  return json.loads(data)
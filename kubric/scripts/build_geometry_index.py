@@ -0,0 +1,43 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Builds the geometry index of an asset source (see kubric.assets.geometry_index).
+
+Example:
+  python kubric/scripts/build_geometry_index.py \
+    --manifest gs://kubric-public/assets/GSO/GSO.json --output GSO.geometry.npz
+  python kubric/scripts/build_geometry_index.py \
+    --manifest ShapeNetCore.v2.json --up_axis y --num_processes 16
+
+Without --output, the index is written next to the manifest, where
+`kb.assets.GeometryIndex.from_manifest` finds it.
+"""
+
+import argparse
+import logging
+
+from kubric.assets import geometry_index
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--manifest", type=str, required=True)
+  parser.add_argument("--output", type=str, default=None)
+  parser.add_argument("--up_axis", choices=["z", "y"], default="z")
+  parser.add_argument("--num_processes", type=int, default=1)
+  FLAGS, unused = parser.parse_known_args()
+  logging.basicConfig(level="INFO")
+  geometry_index.build_geometry_index(FLAGS.manifest, FLAGS.output, up_axis=FLAGS.up_axis,
+                                      num_processes=FLAGS.num_processes)
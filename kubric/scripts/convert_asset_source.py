@@ -0,0 +1,45 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Converts an asset source into an uncompressed layout, so assets load without gzip/tar.
+
+Example:
+  python kubric/scripts/convert_asset_source.py \
+    --manifest gs://kubric-public/assets/GSO/GSO.json --target_dir GSO_unpacked --layout pack
+
+With --texture_variants 256,512,1024 downsampled copies of all textures and HDRIs are stored next
+to the originals (for Blender(texture_resolution="auto"); this step needs bpy).
+
+The converted source is used like any other one:
+  kb.AssetSource.from_manifest("GSO_unpacked/GSO.json")
+"""
+
+import argparse
+import logging
+
+from kubric.assets import asset_store
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--manifest", type=str, required=True)
+  parser.add_argument("--target_dir", type=str, required=True)
+  parser.add_argument("--layout", choices=asset_store.LAYOUTS, default="directory")
+  parser.add_argument("--texture_variants", type=str, default="",
+                      help="comma separated sizes of the downsampled texture variants")
+  FLAGS, unused = parser.parse_known_args()
+  logging.basicConfig(level="INFO")
+  asset_store.convert_asset_source(
+      FLAGS.manifest, FLAGS.target_dir, layout=FLAGS.layout,
+      texture_variant_sizes=[int(s) for s in FLAGS.texture_variants.split(",") if s])
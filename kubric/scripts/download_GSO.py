@@ -22,20 +22,18 @@ import pathlib
 import re
 import shutil
 import ssl
-import sys
 import tarfile
 import urllib
 import urllib.request
 import urllib.error
 import zipfile
 
-import pybullet as pb
 import tqdm
 import trimesh as tm
 import trimesh.exchange.obj as tri_obj
 
 from kubric import file_io
-from kubric import redirect_io
+from kubric.assets import collision_lods
 from kubric.kubric_typing import PathLike
 
 
@@ -196,13 +194,16 @@ def kubricify(asset, source_dir, target_dir):
   shutil.move(mat_source_path, mat_path)
   shutil.move(texture_source_path, tex_path)
 
-  with redirect_io.RedirectStream(stream=sys.stdout):
-    pb.vhacd(str(vis_path), str(coll_path), str(asset_tmp_dir / "pybullet.log"))
+  # collision geometry at all levels of detail (the fine one is coll_path)
+  collision_lods.compute_collision_lods(vis_path, target_asset_dir,
+                                        log_path=asset_tmp_dir / "pybullet.log")
+  assert coll_path.exists(), coll_path
 
   properties = get_object_properties(tmesh)
 
   with open(urdf_path, "w") as f:
     f.write(URDF_TEMPLATE.format(id=asset["name"], **properties))
+  lod_urdfs = collision_lods.write_lod_urdfs(urdf_path)
 
   asset_entry = {
       "id": asset["name"],
@@ -212,6 +213,7 @@ def kubricify(asset, source_dir, target_dir):
           "mass": properties["mass"],
           "render_filename": "{asset_dir}/" + vis_path.name,
           "simulation_filename": "{asset_dir}/" + urdf_path.name,
+          "collision_lods": collision_lods.manifest_entry(lod_urdfs),
       },
       "license": "CC BY-SA 4.0",
       "metadata": {
@@ -13,3 +13,4 @@
 # limitations under the License.
 
 from kubric.simulator.pybullet import PyBullet
+from kubric.simulator.simulation_cache import SimulationCache
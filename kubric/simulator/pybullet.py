@@ -22,9 +22,13 @@ import sys
 import tempfile
 from typing import Dict, List, Optional, Tuple, Union
 
+import numpy as np
+
 from kubric import core
+from kubric import filesystem
+from kubric import tracing
 from kubric.redirect_io import RedirectStream
-import tensorflow as tf
+from kubric.simulator.simulation_cache import SimulationCache
 
 # --- hides the "pybullet build time: May 26 2021 18:52:36" message on import
 with RedirectStream(stream=sys.stderr):
@@ -37,6 +41,8 @@ class _BulletClient:
 
   def __init__(self, connection_mode: int):
     self._client = pb.connect(connection_mode)
+    # whether changes of the assets are applied to the simulation (see register_..._setters)
+    self.sync_assets = True
 
   @property
   def client(self):
@@ -57,10 +63,28 @@ class _BulletClient:
 
 
 class PyBullet(core.View):
-  """Adds physics simulation on top of kb.Scene using PyBullet."""
-
-  def __init__(self, scene: core.Scene, scratch_dir=tempfile.mkdtemp()):
+  """Adds physics simulation on top of kb.Scene using PyBullet.
+
+  Args:
+    scene: The scene to simulate.
+    scratch_dir: Directory for temporary files (e.g. the saved simulation state).
+    collision_lods: Which collision level of detail (see kubric.assets.collision_lods) to load
+      for FileBasedObjects by role, e.g. `{"background": "hull", "foreground": "fine"}`. The role
+      of an object is "background" if `obj.background` is set and "foreground" otherwise. An
+      explicit `obj.collision_lod` takes precedence, and objects without the requested LOD fall
+      back to their `simulation_filename`.
+    cache: Reuses the results of simulations with the same initial conditions (see
+      kubric.simulator.simulation_cache). Defaults to the cache configured by
+      $KUBRIC_SIMULATION_CACHE_DIR, if any.
+  """
+
+  def __init__(self, scene: core.Scene, scratch_dir=tempfile.mkdtemp(),
+               collision_lods: Optional[Dict[str, str]] = None,
+               cache: Optional[SimulationCache] = None):
     self.scratch_dir = scratch_dir
+    self.collision_lods = dict(collision_lods or {})
+    self.cache = cache if cache is not None else SimulationCache.from_environment()
+    self._collision_files = {}  # obj_idx -> the simulation file loaded for the object
     self._physics_client = _BulletClient(pb.DIRECT)  # pb.GUI
 
     # --- Set some parameters to fix the sticky-walls problem; see
@@ -154,9 +178,10 @@ class PyBullet(core.View):
   @add_asset.register(core.FileBasedObject)
   def _add_object(self, obj: core.FileBasedObject) -> Optional[int]:
     # TODO: support other file-formats
-    if obj.simulation_filename is None:
+    simulation_filename = self.simulation_filename(obj)
+    if simulation_filename is None:
       return None  # if there is no simulation file, then ignore this object
-    path = pathlib.Path(obj.simulation_filename).resolve()
+    path = pathlib.Path(simulation_filename).resolve()
     logger.debug("Loading '%s' in the simulator", path)
 
     if not path.exists():
@@ -184,9 +209,23 @@ class PyBullet(core.View):
     self._physics_client.changeDynamics(
         obj_idx, -1, contactProcessingThreshold=0)
 
+    self._collision_files[obj_idx] = str(path)
     register_physical_object_setters(obj, obj_idx, self._physics_client)
     return obj_idx
 
+  def simulation_filename(self, obj: core.FileBasedObject) -> Optional[str]:
+    """The simulation file of the collision LOD selected for `obj` (see `collision_lods`)."""
+    role = "background" if obj.background else "foreground"
+    lod = obj.collision_lod or self.collision_lods.get(role)
+    if lod is None:
+      return obj.simulation_filename
+    if lod not in obj.collision_lods:
+      logger.debug("%s has no collision LOD %r, using %s", obj, lod, obj.simulation_filename)
+      tracing.count("collision_lod.fallback")
+      return obj.simulation_filename
+    tracing.count(f"collision_lod.{lod}")
+    return obj.collision_lods[lod]
+
   def check_overlap(self, obj: core.PhysicalObject) -> bool:
     obj_idx = obj.linked_objects[self]
 
@@ -216,7 +255,7 @@ class PyBullet(core.View):
     assert self.scratch_dir is not None
     # first store in a temporary file and then copy, to support remote paths
     self._physics_client.saveBullet(str(self.scratch_dir / "scene.bullet"))
-    tf.io.gfile.copy(self.scratch_dir / "scene.bullet", path, overwrite=True)
+    filesystem.copy(self.scratch_dir / "scene.bullet", path, overwrite=True)
 
   def run(
       self,
@@ -227,7 +266,8 @@ class PyBullet(core.View):
     Run the physics simulation.
 
     The resulting animation is saved directly as keyframes in the assets,
-    and also returned (together with the collision events).
+    and also returned (together with the collision events). With a `cache`, the result of a
+    simulation with the same initial conditions is reused instead of simulating again.
 
     Args:
       frame_start: The first frame from which to start the simulation (inclusive).
@@ -238,8 +278,28 @@ class PyBullet(core.View):
     Returns:
       A dict of all animations and a list of all collision events.
     """
-
     frame_end = self.scene.frame_end if frame_end is None else frame_end
+    with tracing.span("physics_simulation", frame_start=frame_start, frame_end=frame_end):
+      if self.cache is None:
+        return self._run(frame_start, frame_end)
+
+      bodies = self._simulated_bodies()
+      key = self.cache.key(
+          self.scene,
+          [(obj, self._collision_files.get(obj.linked_objects[self])) for obj in bodies],
+          frame_start, frame_end, engine_version=pb.getAPIVersion())
+      cached = self.cache.get(key)
+      if cached is not None:
+        logger.debug("Reusing the cached simulation %s", key)
+        animation, collisions = self._from_cache_entry(bodies, *cached)
+        self._write_keyframes(animation, frame_start, frame_end)
+        return animation, collisions
+
+      animation, collisions = self._run(frame_start, frame_end)
+      self.cache.put(key, *self._to_cache_entry(bodies, animation, collisions))
+      return animation, collisions
+
+  def _run(self, frame_start: int, frame_end: int):
     steps_per_frame = self.scene.step_rate // self.scene.frame_rate
     max_step = (frame_end - frame_start + 1) * steps_per_frame
 
@@ -289,19 +349,64 @@ class PyBullet(core.View):
 
     animation = {asset: animation[asset.linked_objects[self]] for asset in self.scene.assets
                  if asset.linked_objects.get(self) in obj_idxs}
+    self._write_keyframes(animation, frame_start, frame_end)
+    return animation, collisions
 
-    # --- Transfer simulation to renderer keyframes
+  def _write_keyframes(self, animation, frame_start: int, frame_end: int):
+    """Transfers the simulation to renderer keyframes."""
+    # the bodies are only set to their state in the last frame (instead of once per frame)
+    self._physics_client.sync_assets = False
+    try:
+      for obj in animation.keys():
+        for frame_id in range(frame_end - frame_start + 1):
+          obj.position = animation[obj]["position"][frame_id]
+          obj.quaternion = animation[obj]["quaternion"][frame_id]
+          obj.velocity = animation[obj]["velocity"][frame_id]
+          obj.angular_velocity = animation[obj]["angular_velocity"][frame_id]
+          obj.keyframe_insert("position", frame_id + frame_start)
+          obj.keyframe_insert("quaternion", frame_id + frame_start)
+          obj.keyframe_insert("velocity", frame_id + frame_start)
+          obj.keyframe_insert("angular_velocity", frame_id + frame_start)
+    finally:
+      self._physics_client.sync_assets = True
     for obj in animation.keys():
-      for frame_id in range(frame_end - frame_start + 1):
-        obj.position = animation[obj]["position"][frame_id]
-        obj.quaternion = animation[obj]["quaternion"][frame_id]
-        obj.velocity = animation[obj]["velocity"][frame_id]
-        obj.angular_velocity = animation[obj]["angular_velocity"][frame_id]
-        obj.keyframe_insert("position", frame_id + frame_start)
-        obj.keyframe_insert("quaternion", frame_id + frame_start)
-        obj.keyframe_insert("velocity", frame_id + frame_start)
-        obj.keyframe_insert("angular_velocity", frame_id + frame_start)
-
+      obj_idx = obj.linked_objects[self]
+      self._physics_client.resetBasePositionAndOrientation(obj_idx, obj.position,
+                                                           wxyz2xyzw(obj.quaternion))
+      self._physics_client.resetBaseVelocity(obj_idx, obj.velocity, obj.angular_velocity)
+
+  def _simulated_bodies(self) -> List[core.PhysicalObject]:
+    """The assets that are simulated, in the order of the scene (and of the animation)."""
+    return [asset for asset in self.scene.assets if asset.linked_objects.get(self) is not None]
+
+  @staticmethod
+  def _to_cache_entry(bodies, animation, collisions):
+    """Replaces the assets in a simulation result by their index in `bodies` (-1 for None)."""
+    body_index = {obj: i for i, obj in enumerate(bodies)}
+    instances = [[body_index.get(obj, -1) for obj in c["instances"]] for c in collisions]
+    cached_collisions = {
+        "instances": np.array(instances, dtype=np.int32).reshape((-1, 2)),
+        "position": np.array([c["position"] for c in collisions]).reshape((-1, 3)),
+        "contact_normal": np.array([c["contact_normal"] for c in collisions]).reshape((-1, 3)),
+        "frame": np.array([c["frame"] for c in collisions], dtype=np.float64),
+        "force": np.array([c["force"] for c in collisions], dtype=np.float64),
+    }
+    return [animation[obj] for obj in bodies], cached_collisions
+
+  @staticmethod
+  def _from_cache_entry(bodies, animation, collisions):
+    """Inverse of _to_cache_entry, with the same types as the result of a simulation."""
+    animation = {obj: {name: [tuple(value) for value in values.tolist()]
+                       for name, values in body_animation.items()}
+                 for obj, body_animation in zip(bodies, animation)}
+    assets = list(bodies) + [None]  # index -1 is None
+    collisions = [
+        {"instances": (assets[a], assets[b]), "position": tuple(position),
+         "contact_normal": tuple(normal), "frame": frame, "force": force}
+        for (a, b), position, normal, frame, force in zip(
+            collisions["instances"].tolist(), collisions["position"].tolist(),
+            collisions["contact_normal"].tolist(), collisions["frame"].tolist(),
+            collisions["force"].tolist())]
     return animation, collisions
 
   def _obj_idx_to_asset(self, idx):
@@ -332,7 +437,8 @@ def register_physical_object_setters(obj: core.PhysicalObject, obj_idx,
 
   def setter(object_idx, func):
     def _callable(change):
-      return func(object_idx, change.new, change.owner, physics_client)
+      if physics_client.sync_assets:
+        return func(object_idx, change.new, change.owner, physics_client)
     return _callable
 
   obj.observe(setter(obj_idx, set_position), "position")
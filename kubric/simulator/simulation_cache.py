@@ -0,0 +1,249 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A persistent on-disk cache of physics simulation results, keyed by the initial conditions.
+
+The same physical setup is often simulated more than once, e.g. when a scene is re-rendered with
+another background or camera path, or when a worker restarts. The key of a simulation is a hash
+of everything that determines its result:
+ - every simulated body in the order of the scene: its type, asset id, the content hash of its
+   collision file (and the meshes referenced by it), scale, static, mass, friction, restitution
+   and its initial pose and velocities
+ - the gravity, step rate and frame rate of the scene and the simulated frame range
+ - the PyBullet API version
+
+Entries store the animation arrays of the bodies and the collision events as arrays, which
+reference the bodies by their index. A cached result is only valid if the state of PyBullet
+follows the traits of the assets (i.e. it was not changed through the physics client directly).
+"""
+
+import collections
+import hashlib
+import io
+import json
+import logging
+import os
+import pathlib
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from kubric import core
+from kubric import tracing
+from kubric.file_io import file_lock
+from kubric.kubric_typing import PathLike
+
+logger = logging.getLogger(__name__)
+
+# Environment variables used to enable the cache for all simulators of a process.
+CACHE_DIR_ENV = "KUBRIC_SIMULATION_CACHE_DIR"
+CACHE_SIZE_ENV = "KUBRIC_SIMULATION_CACHE_SIZE_GB"
+
+# increase when the format of the entries or the meaning of the key changes
+CACHE_FORMAT_VERSION = 1
+ANIMATION_KEYS = ("position", "quaternion", "velocity", "angular_velocity")
+COLLISION_KEYS = ("instances", "position", "contact_normal", "frame", "force")
+
+_ENTRY_SUFFIX = ".npz"
+_HASH_CHUNK_SIZE = 1 << 20
+_URDF_MESH_PATTERN = re.compile(r'filename\s*=\s*"([^"]+)"')
+
+
+class SimulationCache:
+  """Cache of simulation results, shared by all processes using the same directory.
+
+  Every entry is a single `{cache_dir}/{key}.npz` file that is written to a temporary file and
+  renamed into place, so concurrent workers never read partial entries. The modification time of
+  an entry is its last access. If `max_size_bytes` is set, the least recently used entries are
+  evicted once the cache grows beyond it.
+
+  Args:
+    cache_dir: local directory of the cache (created if missing).
+    max_size_bytes: size limit for the entries (None means unlimited).
+  """
+
+  def __init__(self, cache_dir: PathLike, max_size_bytes: Optional[int] = None):
+    self.cache_dir = pathlib.Path(cache_dir)
+    self.cache_dir.mkdir(parents=True, exist_ok=True)
+    self.max_size_bytes = max_size_bytes
+    self.stats = collections.Counter(hits=0, misses=0, evictions=0, bytes_evicted=0)
+    self._file_hashes = {}  # (path, size, mtime) -> content hash
+
+  @classmethod
+  def from_environment(cls) -> Optional["SimulationCache"]:
+    """Returns the cache configured by $KUBRIC_SIMULATION_CACHE_DIR (or None if it is not set)."""
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+      return None
+    size_gb = os.environ.get(CACHE_SIZE_ENV)
+    max_size_bytes = int(float(size_gb) * 1024**3) if size_gb else None
+    return cls(cache_dir, max_size_bytes=max_size_bytes)
+
+  def key(self, scene: core.Scene, bodies: Sequence[Tuple[core.PhysicalObject, Optional[str]]],
+          frame_start: int, frame_end: int, engine_version: Any = None) -> str:
+    """The canonical hash of a simulation.
+
+    Args:
+      scene: the simulated scene (for gravity, step_rate and frame_rate).
+      bodies: the simulated objects in the order of the simulation, each with its collision file
+        (None for primitives).
+      frame_start: first simulated frame.
+      frame_end: last simulated frame (inclusive).
+      engine_version: the version of the physics engine.
+    """
+    description = {
+        "version": CACHE_FORMAT_VERSION,
+        "engine_version": engine_version,
+        "gravity": _floats(scene.gravity),
+        "step_rate": scene.step_rate,
+        "frame_rate": scene.frame_rate,
+        "frame_range": [frame_start, frame_end],
+        "bodies": [self._describe_body(obj, filename) for obj, filename in bodies],
+    }
+    canonical = json.dumps(description, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+  def get(self, key: str
+          ) -> Optional[Tuple[List[Dict[str, np.ndarray]], Dict[str, np.ndarray]]]:
+    """Returns the animation arrays of the bodies (by index) and the collision arrays, or None."""
+    path = self._entry_path(key)
+    try:
+      with path.open("rb") as fp:
+        data = dict(np.load(fp, allow_pickle=False))
+    except FileNotFoundError:
+      self.stats["misses"] += 1
+      tracing.count("simulation_cache.miss")
+      return None
+    self.stats["hits"] += 1
+    tracing.count("simulation_cache.hit")
+    _touch(path)
+
+    nr_bodies = int(data["nr_bodies"])
+    animation = [{name: data[f"{i}/{name}"] for name in ANIMATION_KEYS} for i in range(nr_bodies)]
+    collisions = {name: data[f"collisions/{name}"] for name in COLLISION_KEYS}
+    return animation, collisions
+
+  def put(self, key: str, animation: Sequence[Dict[str, Any]], collisions: Dict[str, Any]):
+    """Stores the animation arrays of the bodies (by index) and the arrays of their collisions.
+
+    The collision "instances" are pairs of body indices (-1 for objects that are not simulated).
+    """
+    arrays = {f"{i}/{name}": np.asarray(body[name], dtype=np.float64)
+              for i, body in enumerate(animation) for name in ANIMATION_KEYS}
+    arrays.update({f"collisions/{name}": np.asarray(collisions[name])
+                   for name in COLLISION_KEYS})
+    arrays["nr_bodies"] = np.asarray(len(animation))
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+
+    path = self._entry_path(key)
+    tmp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(buffer.getvalue())
+    os.replace(tmp_path, path)
+    if self.max_size_bytes is not None:
+      self.evict(self.max_size_bytes, keep=(key,))
+
+  def entries(self) -> Dict[str, os.stat_result]:
+    entries = {}
+    for path in self.cache_dir.glob("*" + _ENTRY_SUFFIX):
+      try:
+        entries[path.name[:-len(_ENTRY_SUFFIX)]] = path.stat()
+      except FileNotFoundError:
+        continue  # concurrently evicted
+    return entries
+
+  def total_size(self) -> int:
+    return sum(stat.st_size for stat in self.entries().values())
+
+  def evict(self, max_size_bytes: int, keep=()) -> int:
+    """Removes least recently used entries until the cache is below `max_size_bytes`.
+
+    Returns the number of bytes that were freed.
+    """
+    freed = 0
+    with file_lock(self.cache_dir / ".evict.lock", blocking=False) as acquired:
+      if not acquired:
+        return 0  # another process is already evicting
+      entries = self.entries()
+      total = sum(stat.st_size for stat in entries.values())
+      for key, stat in sorted(entries.items(), key=lambda kv: kv[1].st_mtime):
+        if total <= max_size_bytes:
+          break
+        if key in keep:
+          continue
+        self._entry_path(key).unlink(missing_ok=True)
+        total -= stat.st_size
+        freed += stat.st_size
+        self.stats["evictions"] += 1
+        self.stats["bytes_evicted"] += stat.st_size
+        logger.debug("Evicted simulation %s from the cache (%d bytes)", key, stat.st_size)
+    return freed
+
+  def log_stats(self):
+    logger.info("SimulationCache '%s': %d hits, %d misses, %d evictions", self.cache_dir,
+                self.stats["hits"], self.stats["misses"], self.stats["evictions"])
+
+  def _entry_path(self, key: str) -> pathlib.Path:
+    return self.cache_dir / (key + _ENTRY_SUFFIX)
+
+  def _describe_body(self, obj: core.PhysicalObject, collision_filename: Optional[str]) -> dict:
+    return {
+        "type": type(obj).__name__,
+        "asset_id": getattr(obj, "asset_id", None),
+        "collision_file": self.file_hash(collision_filename) if collision_filename else None,
+        "scale": _floats(obj.scale),
+        "static": bool(obj.static),
+        "mass": float(obj.mass),
+        "friction": float(obj.friction),
+        "restitution": float(obj.restitution),
+        "position": _floats(obj.position),
+        "quaternion": _floats(obj.quaternion),
+        "velocity": _floats(obj.velocity),
+        "angular_velocity": _floats(obj.angular_velocity),
+    }
+
+  def file_hash(self, filename: PathLike) -> str:
+    """Content hash of a collision file and, for URDFs, of the meshes it references."""
+    path = pathlib.Path(filename).resolve()
+    stat = path.stat()
+    memo_key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in self._file_hashes:
+      sha = hashlib.sha256()
+      _update_hash(sha, path)
+      if path.suffix == ".urdf":
+        for mesh_filename in _URDF_MESH_PATTERN.findall(path.read_text()):
+          mesh_path = path.parent / mesh_filename
+          if mesh_path.is_file():
+            sha.update(mesh_filename.encode("utf-8"))
+            _update_hash(sha, mesh_path)
+      self._file_hashes[memo_key] = sha.hexdigest()
+    return self._file_hashes[memo_key]
+
+
+def _floats(values) -> List[float]:
+  return [float(v) for v in values]
+
+
+def _update_hash(sha, path: pathlib.Path):
+  with path.open("rb") as fp:
+    for chunk in iter(lambda: fp.read(_HASH_CHUNK_SIZE), b""):
+      sha.update(chunk)
+
+
+def _touch(path: pathlib.Path):
+  try:
+    os.utime(path)
+  except FileNotFoundError:
+    pass
@@ -19,16 +19,22 @@ from __future__ import annotations
 import abc
 import collections
 import dataclasses
+import functools
 import itertools
 import tempfile
 from typing import Any, Dict, Iterator, List, Optional, TypeVar, Union
 
-import apache_beam as beam
 from etils import edc
 from etils import epath
 import kubric as kb
+from kubric.sunds import local_runner
 import tensorflow_datasets as tfds
 
+try:
+  import apache_beam as beam  # pylint: disable=g-import-not-at-top
+except ImportError:  # Beam is not needed by `KubricBuilder.prepare_locally`
+  beam = None
+
 _T = TypeVar('_T')
 
 # Mapping <split-name> -> _T
@@ -156,6 +162,63 @@ class KubricBuilder(tfds.core.GeneratorBasedBuilder):
     # Returns the mapping <split_name> -> <PCollection>
     return split_to_exs
 
+  def prepare_locally(
+      self,
+      num_workers: int = 4,
+      work_dir: Optional[epath.PathLike] = None,
+      max_retries: int = 2,
+      download_config: Optional[tfds.download.DownloadConfig] = None,
+  ) -> None:
+    """Like `download_and_prepare`, but generates the scenes without Beam.
+
+    Scenes are generated by `num_workers` long-lived local processes (see
+    `local_runner.LocalSceneRunner`) and the examples are written to the TFDS
+    shards as soon as their scene is finished. Finished scenes are kept in
+    `work_dir` (default: `{data_dir}/kubric_scenes/{name}/{version}`), so that
+    calling `prepare_locally` again after a crash only generates the missing
+    scenes.
+
+    Args:
+      num_workers: Number of worker processes.
+      work_dir: Directory for the finished scenes.
+      max_retries: How often a scene is retried after it crashed its worker.
+      download_config: Passed to `download_and_prepare`.
+    """
+    runner = local_runner.make_runner(
+        self, num_workers, work_dir=work_dir, max_retries=max_retries)
+    # TFDS only creates a Beam pipeline if `_split_generators` asks for one.
+    self._split_generators = functools.partial(
+        self._split_generators_locally, runner=runner)
+    try:
+      self.download_and_prepare(download_config=download_config)
+    finally:
+      del self._split_generators
+      runner.close()
+
+  def _split_generators_locally(
+      self,
+      dl_manager: tfds.download.DownloadManager,
+      *,
+      runner: local_runner.LocalSceneRunner,
+  ) -> SplitDict[Iterator[tuple[tfds.typing.Key, ExDict]]]:
+    """Returns one example generator per split, fed by the local runner."""
+    del dl_manager
+
+    split_to_scenes = SplitScenesMapping(self.split_to_scene_configs())
+    scene_indices = local_runner.scene_indices(split_to_scenes.all_scene_configs)
+    runner.start({
+        scene_indices[scene_id]: (
+            scene_config, split_to_scenes.scene_id_to_split_names[scene_id])
+        for scene_id, scene_config in
+        split_to_scenes.scene_id_to_scene_config.items()
+    })
+    return {
+        split_name: runner.iter_examples(
+            split_name, [scene_indices[scene_id] for scene_id in scene_ids])
+        for split_name, scene_ids in
+        split_to_scenes.split_name_to_scene_ids.items()
+    }
+
   def _generate_single_scene(
       self,
       id_and_config: tuple[int, SceneConfig],
@@ -171,21 +234,17 @@ class KubricBuilder(tfds.core.GeneratorBasedBuilder):
       scene_output = self.generate_scene(scene_config)
       scene_output = self._normalize_scene_output(
           scene_output=scene_output,
-          scene_id=scene_id,
-          split_to_scenes=split_to_scenes,
+          expected_splits=split_to_scenes.scene_id_to_split_names[scene_id],
       )
       return scene_id, scene_output
 
   def _normalize_scene_output(
       self,
       *,
-      scene_id: int,
       scene_output: SceneOutput,
-      split_to_scenes: SplitScenesMapping,
+      expected_splits: list[str],
   ) -> SplitToSceneExs:
     """Validate and normalize the scene outputs."""
-    expected_splits = split_to_scenes.scene_id_to_split_names[scene_id]
-
     # 2 cases:
     # * User returned `SceneExs` directly
     # * User returned `SplitDict[SceneExs]` mapping split to examples
@@ -0,0 +1,229 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Generates the scenes of a `KubricBuilder` with local worker processes."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import tempfile
+import traceback
+from typing import Any, Dict, Iterator, List, Optional, Type
+
+from etils import epath
+import tensorflow_datasets as tfds
+
+logger = logging.getLogger(__name__)
+
+_POLL_INTERVAL_SECONDS = 5.
+
+
+class LocalSceneRunner:
+  """Generates scenes with a pool of long-lived worker processes.
+
+  Every worker creates its own instance of the builder once and then calls `generate_scene` for
+  one scene after the other, so that the import of Blender (and everything else a builder sets up
+  lazily) is only paid once per worker. Finished scenes are pickled into
+  `{work_dir}/{scene_index}-{config_hash}.pkl` and streamed to the TFDS split writers as soon as
+  they are done. When the generation is restarted after a crash, scenes with an existing file are
+  not generated again.
+
+  Usage:
+    builder.prepare_locally(num_workers=8)  # see `KubricBuilder.prepare_locally`
+  """
+
+  def __init__(
+      self,
+      builder_cls: Type[Any],
+      builder_kwargs: Dict[str, Any],
+      work_dir: epath.PathLike,
+      num_workers: int = 4,
+      max_retries: int = 2,
+  ):
+    self.builder_cls = builder_cls
+    self.builder_kwargs = builder_kwargs
+    self.work_dir = epath.Path(work_dir)
+    self.num_workers = num_workers
+    self.max_retries = max_retries
+    self._ctx = multiprocessing.get_context('spawn')
+    self._task_queue = None
+    self._result_queue = None
+    self._workers = {}  # worker index -> process
+    self._in_flight = {}  # worker index -> scene index
+    self._retries = {}
+    self._scene_paths = {}  # scene index -> path
+    self._done = set()
+    self._tasks = {}  # scene index -> (scene_config, split names)
+
+  def start(self, tasks: Dict[int, tuple[Any, List[str]]]):
+    """Starts generating all scenes `{scene_index: (scene_config, split_names)}`."""
+    self.work_dir.mkdir(parents=True, exist_ok=True)
+    self._tasks = dict(tasks)
+    self._task_queue = self._ctx.Queue()
+    self._result_queue = self._ctx.Queue()
+    pending = []
+    for scene_index, (scene_config, _) in sorted(self._tasks.items()):
+      path = self.work_dir / f'{scene_index:06d}-{_config_hash(scene_config)}.pkl'
+      self._scene_paths[scene_index] = path
+      if path.exists():
+        self._done.add(scene_index)
+      else:
+        pending.append(scene_index)
+    logger.info('Generating %d scenes with %d local workers (%d finished scenes reused)',
+                len(pending), self.num_workers, len(self._done))
+    for scene_index in pending:
+      self._submit(scene_index)
+    for worker_index in range(min(self.num_workers, len(pending))):
+      self._start_worker(worker_index)
+
+  def iter_examples(self, split_name: str, scene_indices: List[int]) -> Iterator[
+      tuple[tfds.typing.Key, Dict[str, Any]]]:
+    """Yields the `(key, example)` of a split as soon as the scenes are finished."""
+    remaining = list(scene_indices)
+    while remaining:
+      finished = [i for i in remaining if i in self._done]
+      if not finished:
+        self._wait_for_result()
+        continue
+      for scene_index in finished:
+        remaining.remove(scene_index)
+        with self._scene_paths[scene_index].open('rb') as fp:
+          split_to_exs = pickle.load(fp)
+        for i, ex in enumerate(split_to_exs[split_name]):
+          yield f'{scene_index}_{i}', ex
+    if len(self._done) == len(self._tasks):
+      self.close()
+
+  def close(self):
+    """Stops all workers."""
+    for _ in self._workers:
+      self._task_queue.put(None)
+    for process in self._workers.values():
+      process.join(timeout=_POLL_INTERVAL_SECONDS)
+      if process.is_alive():
+        process.terminate()
+    self._workers = {}
+
+  def _submit(self, scene_index: int):
+    scene_config, split_names = self._tasks[scene_index]
+    self._task_queue.put(
+        (scene_index, scene_config, split_names, os.fspath(self._scene_paths[scene_index])))
+
+  def _start_worker(self, worker_index: int):
+    process = self._ctx.Process(
+        target=_worker_main,
+        args=(worker_index, self.builder_cls, self.builder_kwargs, self._task_queue,
+              self._result_queue),
+        name=f'kubric_scene_worker_{worker_index}',
+        daemon=True,
+    )
+    process.start()
+    self._workers[worker_index] = process
+
+  def _wait_for_result(self):
+    """Blocks until a worker reports progress, restarting workers that died."""
+    try:
+      message = self._result_queue.get(timeout=_POLL_INTERVAL_SECONDS)
+    except queue.Empty:
+      self._restart_dead_workers()
+      return
+    kind, worker_index, scene_index, error = message
+    if kind == 'started':
+      self._in_flight[worker_index] = scene_index
+    elif error is not None:
+      self.close()
+      raise RuntimeError(f'Generating scene {scene_index} failed:\n{error}')
+    else:
+      self._in_flight.pop(worker_index, None)
+      self._done.add(scene_index)
+
+  def _restart_dead_workers(self):
+    for worker_index, process in list(self._workers.items()):
+      if process.is_alive():
+        continue
+      scene_index = self._in_flight.pop(worker_index, None)
+      if scene_index is None:  # e.g. the builder cannot be created
+        scene_index_key = f'worker_{worker_index}'
+        self._retries[scene_index_key] = self._retries.get(scene_index_key, 0) + 1
+        if self._retries[scene_index_key] > self.max_retries:
+          self.close()
+          raise RuntimeError(f'Worker {worker_index} keeps dying (exit code {process.exitcode}).')
+      logger.warning('Worker %d died (exit code %s) while generating scene %s; restarting it.',
+                     worker_index, process.exitcode, scene_index)
+      if scene_index is not None:
+        self._retries[scene_index] = self._retries.get(scene_index, 0) + 1
+        if self._retries[scene_index] > self.max_retries:
+          self.close()
+          raise RuntimeError(f'Scene {scene_index} crashed {self._retries[scene_index]} workers.')
+        self._submit(scene_index)
+      self._start_worker(worker_index)
+
+
+def _worker_main(worker_index, builder_cls, builder_kwargs, task_queue, result_queue):
+  """Main loop of a worker process."""
+  builder = builder_cls(**builder_kwargs)
+  while True:
+    task = task_queue.get()
+    if task is None:
+      return
+    scene_index, scene_config, split_names, path = task
+    result_queue.put(('started', worker_index, scene_index, None))
+    try:
+      with tempfile.TemporaryDirectory() as tmp_dir:
+        scene_output = builder.generate_scene(scene_config.replace(scratch_dir=tmp_dir))
+        split_to_exs = builder._normalize_scene_output(  # pylint: disable=protected-access
+            scene_output=scene_output, expected_splits=split_names)
+      # write atomically, so that a crash never leaves a partial scene behind
+      tmp_path = f'{path}.tmp{os.getpid()}'
+      with open(tmp_path, 'wb') as fp:
+        pickle.dump(split_to_exs, fp, protocol=pickle.HIGHEST_PROTOCOL)
+      os.replace(tmp_path, path)
+      result_queue.put(('done', worker_index, scene_index, None))
+    except Exception:  # pylint: disable=broad-except
+      result_queue.put(('done', worker_index, scene_index, traceback.format_exc()))
+
+
+def _config_hash(scene_config) -> str:
+  """Hash of a scene config (without the scratch_dir), to detect stale scenes in the work_dir."""
+  return hashlib.sha256(repr(scene_config.replace(scratch_dir=None)).encode()).hexdigest()[:12]
+
+
+def default_work_dir(builder: tfds.core.DatasetBuilder) -> epath.Path:
+  # pylint: disable=protected-access
+  return (epath.Path(builder._data_dir_root) / 'kubric_scenes' / builder.name /
+          str(builder.version))
+
+
+def scene_indices(all_scene_configs: List[Any]) -> Dict[int, int]:
+  """Stable index of every scene config (`id(config)` differs between runs)."""
+  indices = {}
+  for scene_config in all_scene_configs:
+    indices.setdefault(id(scene_config), len(indices))
+  return indices
+
+
+def make_runner(builder, num_workers: int, work_dir: Optional[epath.PathLike] = None,
+                max_retries: int = 2) -> LocalSceneRunner:
+  return LocalSceneRunner(
+      type(builder),
+      builder._original_state,  # pylint: disable=protected-access
+      work_dir or default_work_dir(builder),
+      num_workers=num_workers,
+      max_retries=max_retries,
+  )
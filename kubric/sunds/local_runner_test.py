@@ -0,0 +1,77 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for local_runner."""
+
+from __future__ import annotations
+
+import os
+
+import kubric as kb
+import kubric.sunds  # pylint: disable=g-import-not-at-top,unused-import
+import numpy as np
+import tensorflow_datasets as tfds
+
+
+class CountingBuilder(kb.sunds.KubricBuilder):
+  """Builder whose scenes only contain their seed (no rendering)."""
+
+  VERSION = tfds.core.Version("1.0.0")
+  RELEASE_NOTES = {
+      "1.0.0": "Initial version",
+  }
+
+  def _info(self) -> tfds.core.DatasetInfo:
+    return tfds.core.DatasetInfo(
+        builder=self,
+        features=tfds.features.FeaturesDict({
+            "seed": np.int64,
+            "frame": np.int64,
+        }),
+    )
+
+  def split_to_scene_configs(self) -> dict[str, list[kb.sunds.SceneConfig]]:
+    shared = kb.sunds.SceneConfig(seed=100)
+    return {
+        "train": [kb.sunds.SceneConfig(seed=i) for i in range(5)] + [shared],
+        "test": [shared],
+    }
+
+  def generate_scene(self, scene_config: kb.sunds.SceneConfig):
+    if os.environ.get("KUBRIC_TEST_FAIL_SCENES"):
+      raise AssertionError("Scenes should have been reused.")
+    exs = [{"seed": scene_config.seed, "frame": i} for i in range(2)]
+    if scene_config.seed == 100:
+      return {"train": exs[:1], "test": exs[1:]}
+    return exs
+
+
+def _seeds(builder, split):
+  return sorted((int(ex["seed"]), int(ex["frame"]))
+                for ex in tfds.as_numpy(builder.as_dataset(split=split)))
+
+
+def test_prepare_locally(tmp_path, monkeypatch):
+  builder = CountingBuilder(data_dir=tmp_path / "data")
+  builder.prepare_locally(num_workers=2)
+  assert _seeds(builder, "train") == [(i, f) for i in range(5) for f in range(2)] + [(100, 0)]
+  assert _seeds(builder, "test") == [(100, 1)]
+
+  # after a crash, finished scenes are reused instead of generated again
+  scene_dir = tmp_path / "data" / "kubric_scenes" / "counting_builder" / "1.0.0"
+  assert len(list(scene_dir.glob("*.pkl"))) == 6
+  monkeypatch.setenv("KUBRIC_TEST_FAIL_SCENES", "1")
+  rebuilt = CountingBuilder(data_dir=tmp_path / "rebuilt")
+  rebuilt.prepare_locally(num_workers=2, work_dir=scene_dir)
+  assert _seeds(rebuilt, "test") == [(100, 1)]
@@ -0,0 +1,181 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Lightweight tracing of where the time of a scene goes.
+
+Usage:
+  tracing.enable()  # or set KUBRIC_TRACE=1
+  with tracing.span("render", frames=24):
+    ...
+  tracing.count("asset_cache.hit")
+  tracing.get_tracer().write_chrome_trace("trace.json")  # open in chrome://tracing or Perfetto
+
+While tracing is disabled (the default) `span` returns a shared no-op context manager and `count`
+returns immediately, so instrumented code does not pay for it.
+"""
+
+import collections
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from kubric.kubric_typing import PathLike
+
+_NULL_SPAN = contextlib.nullcontext()
+_TRACER = None
+
+
+class Tracer:
+  """Collects spans (as Chrome trace "complete" events) and counters."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._events = []
+    self.counters = collections.Counter()
+    self._start_ns = time.perf_counter_ns()
+
+  @contextlib.contextmanager
+  def span(self, name: str, category: str = "kubric", **args):
+    start_ns = time.perf_counter_ns()
+    try:
+      yield
+    finally:
+      end_ns = time.perf_counter_ns()
+      event = {"name": name, "cat": category, "ph": "X",
+               "ts": (start_ns - self._start_ns) / 1000, "dur": (end_ns - start_ns) / 1000,
+               "pid": os.getpid(), "tid": threading.get_ident()}
+      if args:
+        event["args"] = {k: _to_json(v) for k, v in args.items()}
+      with self._lock:
+        self._events.append(event)
+
+  def count(self, name: str, value: int = 1):
+    with self._lock:
+      self.counters[name] += value
+
+  def reset(self):
+    with self._lock:
+      self._events = []
+      self.counters = collections.Counter()
+
+  def take(self, predicate: Callable[[dict], bool], counters: bool = False,
+           into: Optional["Tracer"] = None) -> "Tracer":
+    """Moves the events matching `predicate` (and optionally the counters) to another tracer.
+
+    This splits the trace of overlapping work, e.g. of the background writes of a scene that
+    finish while the next scene renders.
+    """
+    if into is None:
+      into = Tracer()
+      into._start_ns = self._start_ns  # pylint: disable=protected-access
+    taken, kept = [], []
+    taken_counters = collections.Counter()
+    with self._lock:
+      for event in self._events:
+        (taken if predicate(event) else kept).append(event)
+      self._events = kept
+      if counters:
+        taken_counters, self.counters = self.counters, collections.Counter()
+    with into._lock:  # pylint: disable=protected-access
+      into._events.extend(taken)  # pylint: disable=protected-access
+      into.counters.update(taken_counters)
+    return into
+
+  def summary(self) -> Dict[str, Any]:
+    """Number of calls, total and max duration (in seconds) per span name and all counters."""
+    spans = {}
+    with self._lock:
+      events = list(self._events)
+      counters = dict(self.counters)
+    for event in events:
+      stats = spans.setdefault(event["name"], {"count": 0, "total_s": 0., "max_s": 0.})
+      stats["count"] += 1
+      stats["total_s"] += event["dur"] / 1e6
+      stats["max_s"] = max(stats["max_s"], event["dur"] / 1e6)
+    spans = dict(sorted(spans.items(), key=lambda kv: -kv[1]["total_s"]))
+    return {"spans": spans, "counters": counters}
+
+  def write_chrome_trace(self, filename: PathLike):
+    from kubric import file_io  # pylint: disable=import-outside-toplevel
+    with self._lock:
+      events = list(self._events)
+    counter_events = [{"name": name, "ph": "C", "ts": events[-1]["ts"] if events else 0,
+                       "pid": os.getpid(), "args": {name: value}}
+                      for name, value in self.counters.items()]
+    file_io.write_json({"traceEvents": events + counter_events, "displayTimeUnit": "ms"},
+                       filename)
+
+  def write_summary(self, filename: PathLike):
+    from kubric import file_io  # pylint: disable=import-outside-toplevel
+    file_io.write_json(self.summary(), filename)
+
+
+def enable() -> Tracer:
+  global _TRACER
+  if _TRACER is None:
+    _TRACER = Tracer()
+  return _TRACER
+
+
+def disable():
+  global _TRACER
+  _TRACER = None
+
+
+def is_enabled() -> bool:
+  return _TRACER is not None
+
+
+def get_tracer() -> Optional[Tracer]:
+  return _TRACER
+
+
+def span(name: str, category: str = "kubric", **args):
+  """Context manager that records the duration of its body (a no-op when tracing is disabled)."""
+  if _TRACER is None:
+    return _NULL_SPAN
+  return _TRACER.span(name, category, **args)
+
+
+def count(name: str, value: int = 1):
+  """Increments a counter (e.g. retries or cache hits)."""
+  if _TRACER is not None:
+    _TRACER.count(name, value)
+
+
+def traced(name: Optional[str] = None, category: str = "kubric"):
+  """Decorator that wraps every call of a function in a span."""
+  def decorator(func):
+    span_name = name or func.__qualname__
+
+    @functools.wraps(func)
+    def _func(*args, **kwargs):
+      if _TRACER is None:
+        return func(*args, **kwargs)
+      with _TRACER.span(span_name, category):
+        return func(*args, **kwargs)
+    return _func
+  return decorator
+
+
+def _to_json(value):
+  return value if isinstance(value, (int, float, str, bool, type(None))) else str(value)
+
+
+if os.environ.get("KUBRIC_TRACE", "0").lower() in ("1", "true", "t"):
+  enable()
@@ -0,0 +1,137 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A fork server that imports bpy and kubric once and forks workers from the warmed-up process.
+
+Starting a worker process from scratch means importing bpy, kubric (with tensorflow, pandas, ...)
+and loading the asset manifests, which takes seconds. A Zygote does all of this once (`warm_up`)
+and then forks every worker from the warmed-up process. Starting a worker thus only costs a fork,
+and the imported modules and read-only data are shared with the zygote copy-on-write.
+
+Only import modules and load read-only data while warming up. Threads are not copied into forked
+processes, so the zygote must not render (which starts the Cycles threads) or write files
+asynchronously (the AsyncWriter of file_io and the scratch dirs of asset sources are re-created
+in every worker).
+
+  zygote = Zygote(preload=("bpy", "kubric", "my_project.scenes"))
+  zygote.warm_up()
+  pid = zygote.fork(render_scene, seed=1)
+  exit_code = zygote.wait(pid)
+"""
+
+import importlib
+import logging
+import os
+import sys
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from kubric import file_io
+from kubric import tracing
+
+logger = logging.getLogger(__name__)
+
+
+class Zygote:
+  """Forks workers from a process in which the expensive imports are already done.
+
+  Args:
+    preload: the modules to import while warming up.
+    warm_up_fn: called after the imports while warming up, e.g. to load asset manifests.
+  """
+
+  def __init__(self, preload: Sequence[str] = ("bpy", "kubric"),
+               warm_up_fn: Optional[Callable[[], Any]] = None):
+    self.preload = tuple(preload)
+    self.warm_up_fn = warm_up_fn
+    self.warm_up_seconds: Optional[float] = None
+    self.fork_seconds: List[float] = []
+
+  def warm_up(self) -> float:
+    """Imports the preloaded modules and calls warm_up_fn; returns the seconds this took."""
+    start = time.perf_counter()
+    with tracing.span("zygote_warm_up"):
+      for name in self.preload:
+        importlib.import_module(name)
+      if self.warm_up_fn is not None:
+        self.warm_up_fn()
+    self.warm_up_seconds = time.perf_counter() - start
+    logger.info("Zygote warmed up in %.2fs (preloaded %s)", self.warm_up_seconds,
+                ", ".join(self.preload))
+    return self.warm_up_seconds
+
+  def fork(self, target: Callable[..., Any], *args, **kwargs) -> int:
+    """Runs target(*args, **kwargs) in a forked worker and returns the pid of the worker.
+
+    The exit code of the worker is the return value of `target` if it is an int (else 0), the
+    code of a SystemExit, or 1 if `target` raised an exception. The fork latency (until the
+    worker runs) is recorded in `fork_seconds`.
+    """
+    if self.warm_up_seconds is None:
+      self.warm_up()
+    sys.stdout.flush()  # or the buffered output would be written by both processes
+    sys.stderr.flush()
+    ready_fd, ready_write_fd = os.pipe()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:  # the worker
+      os.close(ready_fd)
+      os.write(ready_write_fd, b"\0")
+      os.close(ready_write_fd)
+      os._exit(_run_worker(target, args, kwargs))  # pylint: disable=protected-access
+    os.close(ready_write_fd)
+    os.read(ready_fd, 1)
+    os.close(ready_fd)
+    seconds = time.perf_counter() - start
+    self.fork_seconds.append(seconds)
+    logger.info("Forked worker %d in %.1fms", pid, seconds * 1000)
+    return pid
+
+  @staticmethod
+  def wait(pid: int) -> int:
+    """Waits for a worker and returns its exit code (-signal if it was killed)."""
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status)
+
+  def stats(self) -> Dict[str, Any]:
+    return {
+        "warm_up_seconds": self.warm_up_seconds,
+        "nr_forks": len(self.fork_seconds),
+        "fork_seconds_mean": float(np.mean(self.fork_seconds)) if self.fork_seconds else None,
+        "fork_seconds_max": max(self.fork_seconds, default=None),
+    }
+
+
+def _run_worker(target: Callable[..., Any], args, kwargs) -> int:
+  """Runs the target of a worker and returns its exit code."""
+  try:
+    result = target(*args, **kwargs)
+    exit_code = result if isinstance(result, int) else 0
+  except SystemExit as e:
+    exit_code = e.code if isinstance(e.code, int) else int(e.code is not None)
+  except BaseException:  # pylint: disable=broad-except
+    traceback.print_exc()
+    exit_code = 1
+  # the worker exits without running the atexit handlers (which belong to the zygote)
+  try:
+    file_io.flush_async_writer()
+  except IOError:
+    traceback.print_exc()
+    exit_code = exit_code or 1
+  sys.stdout.flush()
+  sys.stderr.flush()
+  return exit_code
@@ -24,12 +24,15 @@ import subprocess
 import sys
 import tarfile
 from typing import Tuple
+from xml.etree import ElementTree
 
 import trimesh
 
 from shapenet_synsets import CATEGORY_NAMES
 from trimesh_utils import get_object_properties
 import trimesh_utils
+from pybullet_vhacd import COLLISION_LODS
+from pybullet_vhacd import lod_path
 from urdf_template import URDF_TEMPLATE
 
 _DEFAULT_LOGGER = logging.getLogger(__name__)
@@ -101,13 +104,15 @@ def stage1(object_folder: Path, logger=_DEFAULT_LOGGER):
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
     
-def stage2(object_folder: Path, logger=_DEFAULT_LOGGER):
+def stage2(object_folder: Path, logger=_DEFAULT_LOGGER, in_process: bool = False):
   source_path = object_folder / 'kubric' / 'model_watertight.obj'
   target_path = object_folder / 'kubric' / 'collision_geometry.obj'
   log_path = object_folder / 'kubric' / 'stage2_logs.txt'
   stdout_path = str(object_folder / 'kubric' / 'stage2_stdout.txt')
 
-  if target_path.is_file():
+  # --- every level of detail, outputs of runs predating the hull/coarse LODs are incomplete
+  target_paths = [lod_path(target_path, lod) for lod in COLLISION_LODS]
+  if all(path.is_file() for path in target_paths):
     logger.debug(f'skipping stage2 on "{object_folder}"')
     return  # stage already completed; skipping
 
@@ -117,6 +122,17 @@ def stage2(object_folder: Path, logger=_DEFAULT_LOGGER):
 
   # --- body
   logger.debug(f'stage2 running on "{object_folder}"')
+  if in_process:
+    # --- resident pybullet (see scheduler.py), avoids one interpreter start per object
+    import pybullet_vhacd  # pylint: disable=g-import-not-at-top
+    pybullet_vhacd.compute_collision_lods(source_path=str(source_path),
+                                          target_path=str(target_path),
+                                          stdout_path=stdout_path)
+    for path in target_paths:
+      if not path.is_file():
+        logger.error(f'stage2 post-condition failed, file does not exist "{path}"')
+    return
+
   # TODO: how to monitor errors? should we move to "raw" VHCD?
   command_string = f"python pybullet_vhacd.py " \
                    f"--source_path={source_path} --target_path={target_path} " \
@@ -127,15 +143,16 @@ def stage2(object_folder: Path, logger=_DEFAULT_LOGGER):
     logger.error(f'stage2 failed with return code {retobj.returncode}')
 
   # --- post-condition
-  if not target_path.is_file():
-    logger.error(f'stage2 post-condition failed, file does not exist "{target_path}"')
+  for path in target_paths:
+    if not path.is_file():
+      logger.error(f'stage2 post-condition failed, file does not exist "{path}"')
 
 
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 
-def stage3(object_folder: Path, logger=_DEFAULT_LOGGER):
+def stage3(object_folder: Path, logger=_DEFAULT_LOGGER, in_process: bool = False):
   source_path = object_folder / 'kubric' / 'visual_geometry_pre.glb'
   log_path = object_folder / 'kubric' / 'stage3_logs.txt'
   target_path = object_folder / 'kubric' / 'visual_geometry.glb'
@@ -147,6 +164,15 @@ def stage3(object_folder: Path, logger=_DEFAULT_LOGGER):
 
   asset_id = str(object_folder.relative_to(object_folder.parent.parent))
 
+  if in_process:
+    # --- resident Blender (see scheduler.py), cleanup_mesh starts from factory settings
+    import bpy_clean_mesh  # pylint: disable=g-import-not-at-top
+    bpy_clean_mesh.cleanup_mesh(asset_id=asset_id, source_path=str(source_path),
+                                target_path=str(target_path))
+    if not target_path.is_file():
+      logger.error(f'stage3 post-condition failed, file does not exist "{target_path}"')
+    return
+
   command_string = f"python bpy_clean_mesh.py " \
                    f"--source_path={source_path} --target_path={target_path} " \
                    f"--asset_id={asset_id} > {log_path}"
@@ -196,6 +222,28 @@ def get_visual_properties(obj_path:Path, logger=_DEFAULT_LOGGER):
 
 
 
+def read_object_properties(object_folder: Path):
+  """Reads back the properties computed by stage4 from its outputs (data.json and object.urdf)."""
+  with open(object_folder / 'kubric' / 'data.json', 'r') as fd:
+    asset_entry = json.load(fd)
+  inertial = ElementTree.parse(object_folder / 'kubric' / 'object.urdf').find('link/inertial')
+  inertia = {key: float(value) for key, value in inertial.find('inertia').attrib.items()}
+  metadata = asset_entry['metadata']
+  return {
+      'id': asset_entry['id'],
+      'bounds': asset_entry['kwargs']['bounds'],
+      'mass': asset_entry['kwargs']['mass'],
+      'center_mass': [float(x) for x in inertial.find('origin').attrib['xyz'].split()],
+      'inertia': [[inertia['ixx'], inertia['ixy'], inertia['ixz']],
+                  [inertia['ixy'], inertia['iyy'], inertia['iyz']],
+                  [inertia['ixz'], inertia['iyz'], inertia['izz']]],
+      'volume': metadata['volume'],
+      'surface_area': metadata['surface_area'],
+      'nr_vertices': metadata['nr_vertices'],
+      'nr_faces': metadata['nr_faces'],
+  }
+
+
 def stage4(object_folder: Path, logger=_DEFAULT_LOGGER):
   # TODO: we should probably use a mixture of model_normalized and model_wateright here?
   source_path = object_folder / 'kubric' / 'collision_geometry.obj'
@@ -204,8 +252,10 @@ def stage4(object_folder: Path, logger=_DEFAULT_LOGGER):
   target_urdf_path = object_folder / 'kubric' / 'object.urdf'
   target_json_path = object_folder / 'kubric' / 'data.json'
 
-  if target_urdf_path.is_file() and target_json_path.is_file():
-    return
+  target_urdf_paths = [lod_path(target_urdf_path, lod) for lod in COLLISION_LODS]
+  if all(path.is_file() for path in target_urdf_paths) and target_json_path.is_file():
+    logger.debug(f'skipping stage4 on "{object_folder}"')
+    return read_object_properties(object_folder)  # stage already completed
 
   # --- pre-condition
   if not source_path.is_file():
@@ -229,6 +279,14 @@ def stage4(object_folder: Path, logger=_DEFAULT_LOGGER):
   with open(target_urdf_path, 'w') as fd:
     fd.write(urdf_str)
 
+  # --- one urdf per collision level of detail (see pybullet_vhacd.py)
+  lod_urdfs = {}
+  for lod in COLLISION_LODS:
+    lod_urdf_path = lod_path(target_urdf_path, lod)
+    lod_urdfs[lod] = lod_urdf_path.name
+    if lod_urdf_path != target_urdf_path:
+      lod_urdf_path.write_text(urdf_str.replace(source_path.name, lod_path(source_path, lod).name))
+
   # --- body2: data.json file
   asset_entry = {
       "id": asset_id,
@@ -238,6 +296,7 @@ def stage4(object_folder: Path, logger=_DEFAULT_LOGGER):
           "mass": properties["mass"],
           "render_filename": "visual_geometry.glb",
           "simulation_filename": "object.urdf",
+          "collision_lods": lod_urdfs,
       },
       "license": "https://shapenet.org/terms",
       "metadata": {
@@ -279,12 +338,13 @@ def stage5(object_folder: Path, logger=_DEFAULT_LOGGER):
   with tarfile.open(target_path, 'w:gz') as tar:
     tar.add(object_folder / 'kubric' / 'visual_geometry.glb',
             arcname='visual_geometry.glb')
-    tar.add(object_folder / 'kubric' / 'collision_geometry.obj',
-            arcname='collision_geometry.obj')
+    for lod in COLLISION_LODS:
+      collision_path = lod_path(object_folder / 'kubric' / 'collision_geometry.obj', lod)
+      tar.add(collision_path, arcname=collision_path.name)
+      urdf_path = lod_path(object_folder / 'kubric' / 'object.urdf', lod)
+      tar.add(urdf_path, arcname=urdf_path.name)
     tar.add(object_folder / 'kubric' / 'model_watertight.obj',
             arcname='model_watertight.obj')
-    tar.add(object_folder / 'kubric' / 'object.urdf',
-            arcname='object.urdf')
     tar.add(object_folder / 'kubric' / 'data.json',
             arcname='data.json')
 
@@ -14,9 +14,11 @@
 
 # pylint: disable=logging-fstring-interpolation
 import argparse
+import dataclasses
 from pathlib import Path
 import multiprocessing
 import logging
+import os
 import sys
 import tqdm
 import json
@@ -31,6 +33,8 @@ from convert import stage3
 from convert import stage4
 from convert import stage5
 from convert import stage6
+from convert import read_object_properties
+import scheduler
 
 # --- python3.7 needed by subprocess 'capture output'
 assert sys.version_info.major >= 3 and sys.version_info.minor >= 7
@@ -99,25 +103,129 @@ def shapenet_objects_dirs(datadir: str):
 # ------------------------------------------------------------------------------
 
 
-def parfor(collection, functor, num_processes, manifest_path):
+def object_key(object_folder) -> str:
+  """Identifies an object in the manifest log, e.g. "02933112/718f8fe82bc186a086d53ab0fe94e911"."""
+  object_folder = Path(object_folder)
+  return f'{object_folder.parent.name}/{object_folder.name}'
+
+
+class ManifestLog(object):
+  """Durable line-oriented log of the per-object results of a parfor run.
+
+  Every finished object appends one json line, flushed to disk right away, so that neither a crash
+  nor a bad object loses the results of the objects that were already processed:
+    {"object": "<category>/<id>", "properties": {...}}  # stage4 properties
+    {"object": "<category>/<id>", "error": "..."}       # the pipeline failed on the object
+  Only runs that include stage4 write to the log. An object without properties and without an
+  error is recorded as an error, so that it shows up in the failure report instead of silently
+  missing from the manifest.
+  When an object shows up more than once (e.g. it failed, then succeeded on a re-run), the last
+  line wins. A line truncated by a crash is ignored.
+  """
+
+  def __init__(self, log_path):
+    self.log_path = Path(log_path)
+    self.fp = None
+
+  def read(self):
+    """Returns the latest record of every object in the log."""
+    records = dict()
+    if not self.log_path.is_file():
+      return records
+    with open(self.log_path, 'r') as fp:
+      for line in fp:
+        try:
+          record = json.loads(line)
+        except json.JSONDecodeError:
+          logger.warning(f'ignoring truncated line in "{self.log_path}"')
+          continue
+        records[record['object']] = record
+    return records
+
+  def completed(self):
+    """Objects whose properties are in the log (these are not scheduled again)."""
+    return {key for key, record in self.read().items() if record.get('properties') is not None}
+
+  def append(self, object_folder, properties=None, error=None):
+    if self.fp is None:
+      self.fp = open(self.log_path, 'a+')
+      # --- terminates a line truncated by a crash, so that it does not swallow the next record
+      if self.fp.tell() > 0:
+        self.fp.seek(self.fp.tell() - 1)
+        if self.fp.read(1) != '\n':
+          self.fp.write('\n')
+    record = {'object': object_key(object_folder)}
+    if error is None and properties is None:
+      error = 'no stage4 properties'
+    if error is not None:
+      record['error'] = error
+    else:
+      record['properties'] = properties
+    self.fp.write(json.dumps(record, sort_keys=True) + '\n')
+    self.fp.flush()
+    os.fsync(self.fp.fileno())
+
+  def close(self):
+    if self.fp is not None:
+      self.fp.close()
+      self.fp = None
+
+
+def _write_json_atomically(data, path):
+  tmp_path = Path(f'{path}.tmp')
+  with open(tmp_path, 'w') as fp:
+    json.dump(data, fp, indent=4, sort_keys=True)
+  os.replace(tmp_path, path)
+
+
+def compact_manifest(manifest_log, manifest_path, failures_path):
+  """Builds the manifest (sorted by object) from the log, failures go to a separate report."""
+  records = manifest_log.read()
+  dataset_properties = [records[key]['properties'] for key in sorted(records)
+                        if records[key].get('properties') is not None]
+  failures = {key: records[key]['error'] for key in sorted(records) if 'error' in records[key]}
+  logger.info(f"Dumping aggregated information of {len(dataset_properties)} objects "
+              f"to {manifest_path}")
+  _write_json_atomically(dataset_properties, manifest_path)
+  _write_json_atomically(failures, failures_path)
+  if failures:
+    logger.error(f'{len(failures)} objects failed, see "{failures_path}"')
+  return dataset_properties, failures
+
+
+def _log_results(results, total, manifest_log):
+  with tqdm.tqdm(total=total) as pbar:
+    for counter, (object_folder, properties, error) in enumerate(results):
+      logger.debug(f"Processed {counter}/{total}")
+      if manifest_log is not None:
+        manifest_log.append(object_folder, properties=properties, error=error)
+      pbar.update(1)
+
+
+def parfor(collection, functor, num_processes, manifest_log):
   # --- launches jobs in parallel
-  dataset_properties = list()
-  with tqdm.tqdm(total=len(collection)) as pbar:
-    with multiprocessing.Pool(num_processes, maxtasksperchild=1) as pool:
-      for counter, properties in enumerate(pool.imap_unordered(functor, collection)):
-        logger.debug(f"Processed {counter}/{len(collection)}")
-        dataset_properties.append(properties)
-        pbar.update(1)
-
-  # --- writes cumulative properties to the manifest
-  invalid_manifest = any([properties is None for properties in dataset_properties])
-  if invalid_manifest:
-    logger.error(f'Cannot compile manifest from invalid properties')
-    logger.debug(f'properties dump: \n {dataset_properties}')
-  else:
-    logger.info(f"Dumping aggregated information to {manifest_path}")
-    with open(manifest_path, 'w') as fp:
-      json.dump(dataset_properties, fp, indent=4, sort_keys=True)
+  with multiprocessing.Pool(num_processes, maxtasksperchild=1) as pool:
+    _log_results(pool.imap_unordered(functor, collection), len(collection), manifest_log)
+
+
+def parfor_dag(collection, stages, pools, manifest_log, adopt_existing=False):
+  # --- schedules every stage on the pool of its resource class (see scheduler.py)
+  stage_scheduler = scheduler.StageScheduler(scheduler.SHAPENET_STAGES, pools,
+                                             requested=stages, adopt_existing=adopt_existing,
+                                             logger=logger)
+
+  def results():
+    for object_folder, properties in stage_scheduler.run(collection):
+      error = stage_scheduler.failures.get(object_folder)
+      if properties is None and error is None and 4 in stage_scheduler.requested:
+        # --- adopted stage4 outputs (--adopt_existing) have no result in their stamps
+        try:
+          properties = read_object_properties(object_folder)
+        except Exception as e:  # pylint: disable=broad-except
+          error = f'stage4: reading properties: {e}'
+      yield object_folder, properties, error
+
+  _log_results(results(), len(collection), manifest_log)
 
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
@@ -145,13 +253,14 @@ class Functor(object):
       if 4 in stages: properties = stage4(object_folder, logger)
       if 5 in stages: stage5(object_folder, logger)
       if 6 in stages: stage6(object_folder, logger)
-      return properties
+      return object_folder, properties, None
 
     except Exception as e:
       import traceback
 
       logger.error(f'Pipeline exception on "{object_folder}"')
       logger.error(f'Exception details: {str(e)} {traceback.format_tb(e.__traceback__)}')
+      return object_folder, None, str(e)
 
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
@@ -164,8 +273,29 @@ if __name__ == '__main__':
   parser.add_argument('--num_processes', default=48, type=int)
   parser.add_argument('--stop_after', default=0, type=int)
   parser.add_argument('--stages', nargs='+', default=["0", "1", "2", "3", "4", "5", "6"])
+  parser.add_argument('--scheduler', choices=['dag', 'pool'], default='dag',
+                      help='dag: per-stage pools with resident workers (see scheduler.py); '
+                           'pool: all stages of one object in a single pool task')
+  parser.add_argument('--concurrency', nargs='*', default=[],
+                      help='per-pool limits overriding the split of --num_processes, '
+                           'e.g. "vhacd=32 blender=6"')
+  parser.add_argument('--adopt_existing', action='store_true',
+                      help='treat outputs of runs without stage stamps as up-to-date')
+  parser.add_argument('--compact_only', action='store_true',
+                      help='only rebuild manifest.json from the manifest log')
   args = parser.parse_args()
 
+  # --- worker pools of the dag scheduler, with the --concurrency overrides
+  pools = scheduler.default_pools(args.num_processes)
+  for override in args.concurrency:
+    pool_name, _, max_workers = override.partition('=')
+    if pool_name not in pools:
+      parser.error(f'--concurrency: unknown pool in "{override}", '
+                   f'expected one of {", ".join(sorted(pools))}')
+    if not max_workers.isdigit() or int(max_workers) < 1:
+      parser.error(f'--concurrency: expected "{pool_name}=<positive int>", got "{override}"')
+    pools[pool_name] = dataclasses.replace(pools[pool_name], max_workers=int(max_workers))
+
   # --- specify and communicate logging policy
   setup_logging(args.datadir)
   logging.getLogger("trimesh").setLevel(logging.ERROR)
@@ -177,6 +307,22 @@ if __name__ == '__main__':
   # --- collect folders over which parfor will be executed
   collection = shapenet_objects_dirs(args.datadir)
   manifest_path = Path(args.datadir) / 'manifest.json'
+  failures_path = Path(args.datadir) / 'manifest_failures.json'
+  manifest_log = ManifestLog(Path(args.datadir) / 'manifest_log.jsonl')
+
+  # --- the manifest is made of the stage4 properties; runs without stage4 leave it untouched
+  if 4 not in stages and not args.compact_only:
+    manifest_log = None
+
+  # --- objects with properties in the log (e.g. from a crashed run) are not scheduled again;
+  #     partial re-runs leave staleness to the stage functions (or the stage keys of the dag)
+  if manifest_log is not None:
+    completed = manifest_log.completed()
+    if completed:
+      logger.warning(f'{len(completed)} objects already completed according to the manifest log')
+    collection = [folder for folder in collection if object_key(folder) not in completed]
+  if args.compact_only:
+    collection = []
   
   # --- trim the parfor collection (for quick dry-run)
   if args.stop_after != 0: 
@@ -184,4 +330,12 @@ if __name__ == '__main__':
   
   # --- launch
   logger.info(f'starting parfor on {args.datadir} at {str(datetime.now())}')
-  parfor(collection, functor_with_stages, args.num_processes, manifest_path)
+  if not collection:
+    logger.info('no objects left to process')
+  elif args.scheduler == 'pool':
+    parfor(collection, functor_with_stages, args.num_processes, manifest_log)
+  else:
+    parfor_dag(collection, stages, pools, manifest_log, adopt_existing=args.adopt_existing)
+  if manifest_log is not None:
+    manifest_log.close()
+    compact_manifest(manifest_log, manifest_path, failures_path)
@@ -14,11 +14,34 @@
 
 
 import argparse
+from pathlib import Path
 import pybullet as pb
 
+# --- collision levels of detail (keep in sync with kubric/assets/collision_lods.py)
+# VHACD parameters per LOD (hull: a single simplified convex hull); "fine" goes to target_path
+COLLISION_LODS = {
+    'hull': {'resolution': 10_000, 'depth': 1, 'concavity': 1.0, 'maxNumVerticesPerCH': 32},
+    'coarse': {'resolution': 20_000, 'depth': 3, 'concavity': 0.05, 'maxNumVerticesPerCH': 24},
+    'fine': {},
+}
 
-def compute_collision_mesh(source_path: str, target_path: str, stdout_path: str):
-  pb.vhacd(source_path, target_path, stdout_path)
+
+def lod_path(target_path: str, lod: str) -> Path:
+  """collision_geometry.obj (fine) -> collision_geometry_{lod}.obj"""
+  target_path = Path(target_path)
+  if lod == 'fine':
+    return target_path
+  return target_path.with_name(f'{target_path.stem}_{lod}{target_path.suffix}')
+
+
+def compute_collision_mesh(source_path: str, target_path: str, stdout_path: str,
+                           lod: str = 'fine'):
+  pb.vhacd(source_path, str(target_path), stdout_path, **COLLISION_LODS[lod])
+
+
+def compute_collision_lods(source_path: str, target_path: str, stdout_path: str):
+  for lod in COLLISION_LODS:
+    compute_collision_mesh(source_path, lod_path(target_path, lod), stdout_path, lod=lod)
 
 
 if __name__ == '__main__':
@@ -28,6 +51,6 @@ if __name__ == '__main__':
   parser.add_argument('--stdout_path', type=str)
   args = parser.parse_args()
 
-  compute_collision_mesh(stdout_path=args.stdout_path,
+  compute_collision_lods(stdout_path=args.stdout_path,
                          source_path=args.source_path,
                          target_path=args.target_path)
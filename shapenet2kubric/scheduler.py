@@ -0,0 +1,400 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Schedules the conversion stages of many objects as a DAG over per-stage worker pools.
+
+Instead of running stages 0-6 of one object back to back inside a single pool task, every stage
+is submitted to the pool of its resource class as soon as the stages it depends on are done:
+
+  stage0 (obj2gltf) ──> stage3 (blender) ──┐
+  stage1 (manifold) ──> stage2 (vhacd) ────┴─> stage4 (properties) ──> stage5 ──> stage6
+
+- External binaries (obj2gltf, manifold) run on thread pools, since the threads only wait on
+  their subprocess.
+- VHACD and the Blender cleanup run on process pools whose workers import pybullet / bpy once
+  and then stay resident, instead of cold-starting an interpreter (and Blender) per object.
+- Work is skipped based on content hashes: the key of a stage hashes the files it reads from the
+  ShapeNet source folder and the keys of the stages it depends on. Keys of completed stages are
+  recorded in `{object_folder}/kubric/stages.json`; a stage whose key is unchanged and whose
+  outputs exist (or were already consumed by an up-to-date downstream stage) is not run again.
+"""
+# pylint: disable=logging-fstring-interpolation
+
+import concurrent.futures
+import concurrent.futures.process
+import dataclasses
+import functools
+import hashlib
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+from pathlib import Path
+import sys
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import convert
+import pybullet_vhacd
+
+STAMP_FILENAME = 'stages.json'
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+
+@dataclasses.dataclass(frozen=True)
+class Stage:
+  """A node of the conversion DAG.
+
+  Attributes:
+    fn: `fn(object_folder, logger)`, must be picklable when `pool` is a process pool.
+    pool: name of the worker pool (see `PoolSpec`) the stage runs on.
+    outputs: files written by the stage, given the object folder.
+    deps: stages whose outputs this stage reads.
+    sources: files of the ShapeNet object folder read by the stage (hashed into its key).
+    version: bump to invalidate previously completed runs of this stage.
+  """
+  fn: Callable[..., Optional[dict]]
+  pool: str
+  outputs: Callable[[Path], List[Path]]
+  deps: Tuple[int, ...] = ()
+  sources: Callable[[Path], List[Path]] = lambda object_folder: []
+  version: int = 1
+
+
+@dataclasses.dataclass(frozen=True)
+class PoolSpec:
+  """A worker pool shared by all stages with the same `Stage.pool`."""
+  max_workers: int
+  processes: bool = False
+  preload: Tuple[str, ...] = ()  # modules imported once by every worker process
+  max_tasks_per_child: Optional[int] = None  # recycles resident workers (python>=3.11)
+
+
+def _model_files(object_folder: Path) -> List[Path]:
+  # obj2gltf reads the .obj, .mtl and the textures
+  return sorted(p for p in (object_folder / 'models').rglob('*') if p.is_file())
+
+
+def _kubric_files(*names) -> Callable[[Path], List[Path]]:
+  return lambda object_folder: [object_folder / 'kubric' / name for name in names]
+
+
+def _lod_files(name) -> Callable[[Path], List[Path]]:
+  # one file per collision level of detail (see pybullet_vhacd.py)
+  return lambda object_folder: [pybullet_vhacd.lod_path(object_folder / 'kubric' / name, lod)
+                                for lod in pybullet_vhacd.COLLISION_LODS]
+
+
+def _stage6_outputs(object_folder: Path) -> List[Path]:
+  asset_id, category_id, _ = convert.get_asset_id_and_category(object_folder)
+  return [object_folder.parent.parent / 'kubric' / f'{category_id}_{asset_id}.tar.gz']
+
+
+SHAPENET_STAGES = {
+    0: Stage(convert.stage0, 'obj2gltf', _kubric_files('visual_geometry_pre.glb'),
+             sources=_model_files),
+    1: Stage(convert.stage1, 'manifold', _kubric_files('model_watertight.obj'),
+             sources=lambda object_folder: [object_folder / 'models' / 'model_normalized.obj']),
+    2: Stage(functools.partial(convert.stage2, in_process=True), 'vhacd',
+             _lod_files('collision_geometry.obj'), deps=(1,), version=2),
+    3: Stage(functools.partial(convert.stage3, in_process=True), 'blender',
+             _kubric_files('visual_geometry.glb'), deps=(0,)),
+    4: Stage(convert.stage4, 'properties',
+             lambda object_folder: (_lod_files('object.urdf')(object_folder) +
+                                    _kubric_files('data.json')(object_folder)),
+             deps=(1, 2, 3), version=2),
+    5: Stage(convert.stage5, 'io', lambda object_folder: [object_folder / 'kubric.tar.gz'],
+             deps=(4,)),
+    6: Stage(convert.stage6, 'io', _stage6_outputs, deps=(5,)),
+}
+
+
+def default_pools(num_processes: int) -> Dict[str, PoolSpec]:
+  """Splits `num_processes` between the resource classes of `SHAPENET_STAGES`."""
+  share = lambda fraction: max(1, int(num_processes * fraction))
+  return {
+      'obj2gltf': PoolSpec(share(1 / 4)),
+      'manifold': PoolSpec(share(1 / 4)),
+      'vhacd': PoolSpec(share(1 / 2), processes=True, preload=('pybullet_vhacd',)),
+      # --- Blender is memory hungry; workers are recycled to bound leaks across imports
+      'blender': PoolSpec(share(1 / 8), processes=True, preload=('bpy_clean_mesh',),
+                          max_tasks_per_child=200),
+      'properties': PoolSpec(share(1 / 4), processes=True),
+      'io': PoolSpec(4),
+  }
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+
+def _hash_files(paths: Iterable[Path], root: Path) -> str:
+  digest = hashlib.sha256()
+  for path in paths:
+    digest.update(str(path.relative_to(root)).encode())
+    with open(path, 'rb') as fp:
+      for chunk in iter(lambda: fp.read(1 << 20), b''):
+        digest.update(chunk)
+  return digest.hexdigest()
+
+
+def stage_keys(stages: Dict[int, Stage], object_folder: Path) -> Dict[int, str]:
+  """Content-based keys of all stages of one object (in topological order of `stages`)."""
+  keys = {}
+  for stage_id in sorted(stages):
+    stage = stages[stage_id]
+    source_digest = _hash_files(stage.sources(object_folder), object_folder)
+    payload = [stage_id, stage.version, source_digest, [keys[dep] for dep in stage.deps]]
+    keys[stage_id] = hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+  return keys
+
+
+def read_stamps(object_folder: Path) -> Dict[int, dict]:
+  path = object_folder / 'kubric' / STAMP_FILENAME
+  if not path.is_file():
+    return {}
+  with open(path, 'r') as fp:
+    return {int(stage_id): stamp for stage_id, stamp in json.load(fp).items()}
+
+
+def write_stamps(object_folder: Path, stamps: Dict[int, dict]):
+  path = object_folder / 'kubric' / STAMP_FILENAME
+  path.parent.mkdir(exist_ok=True)
+  tmp_path = path.with_suffix(f'.tmp{os.getpid()}')
+  with open(tmp_path, 'w') as fp:
+    json.dump({str(stage_id): stamp for stage_id, stamp in stamps.items()}, fp, indent=2)
+  os.replace(tmp_path, path)
+
+
+def _init_worker(log_queue, level: int, preload: Sequence[str]):
+  """Forwards the logs of a worker process to the parent, and imports resident modules."""
+  logger = multiprocessing.get_logger()
+  logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+  logger.setLevel(level)
+  for module in preload:
+    __import__(module)
+
+
+def _run_stage(fn, object_folder: Path):
+  return fn(object_folder, multiprocessing.get_logger())
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+
+@dataclasses.dataclass
+class _Job:
+  """State of one object moving through the DAG."""
+  object_folder: Path
+  keys: Dict[int, str]
+  stamps: Dict[int, dict]
+  todo: set
+  running: set = dataclasses.field(default_factory=set)
+  retried: set = dataclasses.field(default_factory=set)
+  failed: bool = False
+
+
+class StageScheduler:
+  """Runs the requested stages of many objects, respecting per-pool concurrency limits.
+
+  Usage:
+    scheduler = StageScheduler(SHAPENET_STAGES, default_pools(48))
+    for object_folder, properties in scheduler.run(object_folders):
+      ...  # properties are the result of stage4 (None if the object failed)
+  """
+
+  def __init__(self, stages: Dict[int, Stage], pools: Dict[str, PoolSpec],
+               requested: Optional[Iterable[int]] = None, result_stage: int = 4,
+               max_objects_in_flight: int = None, adopt_existing: bool = False, logger=None):
+    self.stages = stages
+    self.pools = pools
+    self.requested = set(stages if requested is None else requested)
+    self.result_stage = result_stage
+    self.max_objects_in_flight = (max_objects_in_flight or
+                                  2 * sum(pool.max_workers for pool in pools.values()))
+    # --- records outputs of runs predating the stamps as up-to-date instead of redoing them
+    self.adopt_existing = adopt_existing
+    self.logger = logger or multiprocessing.get_logger()
+    self.dependents = {stage_id: [other for other, stage in stages.items()
+                                  if stage_id in stage.deps] for stage_id in stages}
+    self.stats = {stage_id: {'run': 0, 'skipped': 0, 'failed': 0, 'seconds': 0.}
+                  for stage_id in stages}
+    self.failures = {}  # object folder -> reason
+
+  def run(self, object_folders: Iterable[Path]) -> Iterator[Tuple[Path, Optional[dict]]]:
+    """Yields `(object_folder, properties)` as soon as an object went through all stages."""
+    log_queue = multiprocessing.get_context('spawn').Queue()
+    listener = logging.handlers.QueueListener(log_queue, *self.logger.handlers,
+                                              respect_handler_level=True)
+    listener.start()
+    executors = {name: self._make_executor(spec, log_queue) for name, spec in self.pools.items()}
+    futures = {}  # future -> (job, stage_id, executor, start time)
+    object_folders = iter(object_folders)
+    num_in_flight = 0
+    exhausted = False
+    try:
+      while True:
+        # --- admit new objects (bounded, so that early stages do not run ahead unboundedly)
+        while not exhausted and num_in_flight < self.max_objects_in_flight:
+          object_folder = next(object_folders, None)
+          if object_folder is None:
+            exhausted = True
+            break
+          job = self._admit(Path(object_folder))
+          if job is None:
+            yield Path(object_folder), None
+            continue
+          num_in_flight += 1
+          self._submit_ready(job, executors, futures)
+          if not job.running:
+            num_in_flight -= 1
+            yield job.object_folder, self._result(job)
+        if not futures:
+          if exhausted:
+            break
+          continue
+
+        done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+          job, stage_id, executor, start = futures.pop(future)
+          job.running.discard(stage_id)
+          self.stats[stage_id]['seconds'] += time.time() - start
+          if isinstance(future.exception(), concurrent.futures.process.BrokenProcessPool):
+            # --- a worker died (e.g. Blender segfault), which takes down the whole pool
+            pool = self.stages[stage_id].pool
+            if executors[pool] is executor:
+              self.logger.warning(f'worker pool "{pool}" broke, restarting it')
+              executor.shutdown(wait=False)
+              executors[pool] = self._make_executor(self.pools[pool], log_queue)
+            if stage_id not in job.retried:  # innocent bystanders get a second chance
+              job.retried.add(stage_id)
+              job.todo.add(stage_id)
+              self._submit_ready(job, executors, futures)
+              continue
+          self._complete(job, stage_id, future)
+          if not job.failed:
+            self._submit_ready(job, executors, futures)
+          if not job.running and (job.failed or not job.todo):
+            num_in_flight -= 1
+            yield job.object_folder, None if job.failed else self._result(job)
+    finally:
+      for executor in executors.values():
+        executor.shutdown(wait=True, cancel_futures=True)
+      listener.stop()
+      self._log_stats()
+
+  def _make_executor(self, spec: PoolSpec, log_queue) -> concurrent.futures.Executor:
+    if not spec.processes:
+      return concurrent.futures.ThreadPoolExecutor(spec.max_workers)
+    # --- spawn: safe next to the thread pools; sys.path is forwarded to the workers
+    kwargs = {}
+    if spec.max_tasks_per_child and sys.version_info >= (3, 11):
+      kwargs['max_tasks_per_child'] = spec.max_tasks_per_child
+    return concurrent.futures.ProcessPoolExecutor(
+        spec.max_workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker, initargs=(log_queue, self.logger.level, spec.preload),
+        **kwargs)
+
+  def _admit(self, object_folder: Path) -> Optional[_Job]:
+    """Computes the content keys of an object and which of the requested stages are stale."""
+    try:
+      keys = stage_keys(self.stages, object_folder)
+      stamps = read_stamps(object_folder)
+    except Exception as e:  # pylint: disable=broad-except
+      self.logger.error(f'Cannot hash the sources of "{object_folder}": {e}')
+      self.failures[object_folder] = f'hashing sources: {e}'
+      return None
+    (object_folder / 'kubric').mkdir(exist_ok=True)
+
+    if self.adopt_existing:
+      adopted = {stage_id: {'key': keys[stage_id]} for stage_id in self.stages
+                 if stage_id not in stamps and self._outputs_exist(stage_id, object_folder)}
+      if adopted:
+        stamps.update(adopted)
+        write_stamps(object_folder, stamps)
+
+    up_to_date = {}
+    for stage_id in sorted(self.stages, reverse=True):  # dependents first
+      dependents = self.dependents[stage_id]
+      up_to_date[stage_id] = (
+          stamps.get(stage_id, {}).get('key') == keys[stage_id] and
+          (self._outputs_exist(stage_id, object_folder) or
+           (bool(dependents) and all(up_to_date[d] for d in dependents))))
+
+    todo = set()
+    for stage_id in self.requested:
+      if up_to_date[stage_id]:
+        self.logger.debug(f'skipping stage{stage_id} on "{object_folder}" (up to date)')
+        self.stats[stage_id]['skipped'] += 1
+      else:
+        todo.add(stage_id)
+    return _Job(object_folder, keys, stamps, todo)
+
+  def _submit_ready(self, job: _Job, executors, futures):
+    for stage_id in sorted(job.todo):
+      if any(dep in job.todo or dep in job.running for dep in self.stages[stage_id].deps):
+        continue
+      stage = self.stages[stage_id]
+      # --- the stage functions skip on existing outputs, stale outputs need to go first
+      for path in stage.outputs(job.object_folder):
+        if path.is_file():
+          path.unlink()
+      job.todo.discard(stage_id)
+      job.running.add(stage_id)
+      future = executors[stage.pool].submit(_run_stage, stage.fn, job.object_folder)
+      futures[future] = (job, stage_id, executors[stage.pool], time.time())
+
+  def _complete(self, job: _Job, stage_id: int, future: concurrent.futures.Future):
+    try:
+      result = future.result()
+    except Exception as e:  # pylint: disable=broad-except
+      self.logger.error(f'stage{stage_id} exception on "{job.object_folder}": {e}')
+      self.failures[job.object_folder] = f'stage{stage_id}: {e}'
+      result = None
+      job.failed = True
+    else:
+      if not self._outputs_exist(stage_id, job.object_folder):
+        # the stage already logged why
+        self.failures[job.object_folder] = f'stage{stage_id}: outputs missing'
+        job.failed = True
+
+    if job.failed:
+      self.stats[stage_id]['failed'] += 1
+      job.todo.clear()
+      return
+    self.stats[stage_id]['run'] += 1
+    job.stamps[stage_id] = {'key': job.keys[stage_id]}
+    if result is not None:
+      job.stamps[stage_id]['result'] = result
+    write_stamps(job.object_folder, job.stamps)
+
+  def _outputs_exist(self, stage_id: int, object_folder: Path) -> bool:
+    return all(path.is_file() for path in self.stages[stage_id].outputs(object_folder))
+
+  def _result(self, job: _Job) -> Optional[dict]:
+    if self.result_stage not in self.requested:
+      return None
+    return job.stamps.get(self.result_stage, {}).get('result')
+
+  def _log_stats(self):
+    for stage_id, stats in sorted(self.stats.items()):
+      if stage_id in self.requested:
+        self.logger.info(f'stage{stage_id} ({self.stages[stage_id].pool}): '
+                         f'{stats["run"]} run, {stats["skipped"]} skipped, '
+                         f'{stats["failed"]} failed, {stats["seconds"]:.1f}s from submit to done')
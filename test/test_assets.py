@@ -0,0 +1,222 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Testing for `kubric.assets` module."""
+
+import json
+import pathlib
+import tarfile
+
+import numpy as np
+import pytest
+
+import kubric as kb
+from kubric.assets import asset_cache
+from kubric.assets import geometry_index
+from kubric.assets import resting_poses
+from kubric.assets import texture_variants
+from kubric.assets import asset_store
+
+
+def _make_asset_archive(data_dir, asset_id, payload_size=1000, nested=False):
+  src_dir = pathlib.Path(data_dir) / "src" / asset_id
+  src_dir.mkdir(parents=True)
+  (src_dir / "data.json").write_text(json.dumps({"id": asset_id}))
+  (src_dir / "texture.png").write_bytes(b"x" * payload_size)
+  archive_path = pathlib.Path(data_dir) / f"{asset_id}.tar.gz"
+  with tarfile.open(archive_path, "w:gz") as tar:
+    if nested:
+      tar.add(src_dir, arcname=asset_id)
+    else:
+      for f in src_dir.iterdir():
+        tar.add(f, arcname=f.name)
+  return archive_path
+
+
+def test_asset_cache_is_shared_between_instances(tmpdir):
+  archive = _make_asset_archive(tmpdir / "remote", "cube")
+  cache = asset_cache.AssetCache(tmpdir / "cache")
+  asset_dir = cache.fetch("cube", archive)
+  assert (asset_dir / "data.json").exists()
+  assert cache.stats["misses"] == 1 and cache.stats["hits"] == 0
+
+  # a second cache on the same directory (e.g. another worker) does not fetch again
+  other_cache = asset_cache.AssetCache(tmpdir / "cache")
+  assert other_cache.fetch("cube", archive) == asset_dir
+  assert other_cache.stats["hits"] == 1 and other_cache.stats["misses"] == 0
+  assert other_cache.stats["bytes_fetched"] == 0
+
+
+def test_asset_cache_supports_nested_archives(tmpdir):
+  archive = _make_asset_archive(tmpdir / "remote", "sphere", nested=True)
+  cache = asset_cache.AssetCache(tmpdir / "cache")
+  asset_dir = cache.fetch("sphere", archive, content_hash="abc")
+  assert (asset_dir / "data.json").exists()
+  assert asset_dir.name == "sphere-abc"
+
+
+def test_asset_cache_evicts_least_recently_used(tmpdir):
+  cache = asset_cache.AssetCache(tmpdir / "cache", eviction_grace_seconds=0)
+  archives = {asset_id: _make_asset_archive(tmpdir / "remote", asset_id, payload_size=1000)
+              for asset_id in ["a", "b", "c"]}
+  cache.fetch("a", archives["a"], content_hash="0")
+  cache.fetch("b", archives["b"], content_hash="0")
+  cache.fetch("a", archives["a"], content_hash="0")  # "b" is now least recently used
+  cache.max_size_bytes = 2500
+  cache.fetch("c", archives["c"], content_hash="0")
+
+  assert sorted(e["asset_id"] for e in cache.entries().values()) == ["a", "c"]
+  assert cache.stats["evictions"] == 1
+  assert cache.total_size() <= 2500
+
+
+def test_asset_source_uses_cache(tmpdir):
+  _make_asset_archive(tmpdir / "remote", "wood")
+  manifest = {"assets": {"wood": {"asset_type": "Texture",
+                                  "kwargs": {"filename": "{asset_dir}/texture.png"}}}}
+  cache = asset_cache.AssetCache(tmpdir / "cache")
+  with kb.AssetSource(name="test", data_dir=tmpdir / "remote", assets=manifest["assets"],
+                      cache=cache) as source:
+    texture = source.create("wood")
+    source.create("wood")
+  assert pathlib.Path(texture.filename).exists()  # still available after closing the source
+  assert cache.stats["misses"] == 1
+
+
+@pytest.mark.parametrize("layout", ["directory", "pack"])
+def test_converted_asset_source(tmpdir, layout):
+  _make_asset_archive(tmpdir / "remote", "wood", payload_size=5000)
+  _make_asset_archive(tmpdir / "remote", "cube", nested=True)
+  assets = {asset_id: {"asset_type": "Texture", "sha256": "abc",
+                       "kwargs": {"filename": "{asset_dir}/texture.png"}}
+            for asset_id in ["wood", "cube"]}
+  kb.write_json({"name": "test", "data_dir": str(tmpdir / "remote"), "assets": assets},
+                tmpdir / "remote" / "test.json")
+
+  manifest = asset_store.convert_asset_source(tmpdir / "remote" / "test.json",
+                                              tmpdir / "converted", layout=layout)
+  assert "sha256" not in manifest["assets"]["wood"]
+  assert "data_dir" not in manifest
+  # the converted store is self-contained and can be moved (or uploaded)
+  (tmpdir / "converted").move(tmpdir / "moved")
+  with kb.AssetSource.from_manifest(tmpdir / "moved" / "test.json") as source:
+    for asset_id in ["wood", "cube"]:
+      texture = source.create(asset_id)
+      original = tmpdir / "remote" / "src" / asset_id / "texture.png"
+      assert pathlib.Path(texture.filename).read_bytes() == original.read_binary()
+
+
+def _table_mesh():
+  import trimesh  # pylint: disable=g-import-not-at-top
+  top = trimesh.creation.box((1.2, 0.6, 0.05))
+  top.apply_translation((0, 0, 0.725))
+  legs = []
+  for x in (-0.55, 0.55):
+    for y in (-0.25, 0.25):
+      leg = trimesh.creation.box((0.05, 0.05, 0.7))
+      leg.apply_translation((x, y, 0.35))
+      legs.append(leg)
+  return trimesh.util.concatenate([top] + legs)
+
+
+def test_asset_geometry_of_a_table():
+  geometry = geometry_index.compute_asset_geometry(_table_mesh())
+  np.testing.assert_allclose(geometry["extents"], (1.2, 0.6, 0.75), atol=1e-6)
+  np.testing.assert_allclose(geometry["footprint_area"], 1.2 * 0.6, atol=1e-6)
+  np.testing.assert_allclose(geometry["support_height"], 0.75, atol=0.01)
+  np.testing.assert_allclose(np.abs(geometry["principal_axes"][:3]), (1, 0, 0), atol=1e-6)
+  np.testing.assert_allclose(geometry["principal_extents"], (1.2, 0.75, 0.6), atol=1e-6)
+
+
+def test_geometry_index(tmpdir):
+  import trimesh  # pylint: disable=g-import-not-at-top
+  meshes = {"table": _table_mesh(),
+            "can": trimesh.creation.cylinder(radius=0.05, height=0.3),
+            "ball": trimesh.creation.icosphere(radius=0.1)}
+  assets = {}
+  for asset_id, mesh in meshes.items():
+    src_dir = pathlib.Path(tmpdir) / "src" / asset_id
+    src_dir.mkdir(parents=True)
+    mesh.export(src_dir / "visual_geometry.obj")
+    (src_dir / "data.json").write_text(json.dumps({"id": asset_id}))
+    with tarfile.open(pathlib.Path(tmpdir) / f"{asset_id}.tar.gz", "w:gz") as tar:
+      for f in src_dir.iterdir():
+        tar.add(f, arcname=f.name)
+    assets[asset_id] = {"asset_type": "FileBasedObject", "kwargs": {
+        "render_filename": "{asset_dir}/visual_geometry.obj"}, "metadata": {}}
+  kb.write_json({"name": "test", "assets": assets}, tmpdir / "test.json")
+
+  geometry_index.build_geometry_index(tmpdir / "test.json")
+  index = kb.assets.GeometryIndex.from_manifest(tmpdir / "test.json")
+  assert index.asset_ids == ["ball", "can", "table"]
+  assert index.query(height=(0.25, 0.5)) == ["can"]
+  assert index.query(scale=2., height=(0.25, 0.5)) == ["ball"]
+  assert index.query(support_height=(0.5, None)) == ["table"]
+  assert index.get("can", scale=2.)["volume"] == pytest.approx(
+      meshes["can"].volume * 8, rel=1e-3)
+
+  # the upright rotation stands the can on its (longest) axis, the flat one lays it down
+  can_axis = index.get("can")["principal_axes"][0]
+  np.testing.assert_allclose(np.abs(index.upright_quaternion("can").rotate(can_axis)), (0, 0, 1),
+                             atol=1e-6)
+  np.testing.assert_allclose(np.abs(index.flat_quaternion("can").rotate(can_axis)), (1, 0, 0),
+                             atol=1e-6)
+  # the standing rotation keeps the longest axis of the table horizontal and its thinnest along y
+  table_axes = index.get("table")["principal_axes"]
+  standing = index.standing_quaternion("table")
+  np.testing.assert_allclose(np.abs(standing.rotate(table_axes[0])), (1, 0, 0), atol=1e-6)
+  np.testing.assert_allclose(np.abs(standing.rotate(table_axes[2])), (0, 1, 0), atol=1e-6)
+  assert kb.assets.GeometryIndex.from_manifest(tmpdir / "other.json", missing_ok=True) is None
+
+
+def test_resting_poses_of_a_brick():
+  import trimesh  # pylint: disable=g-import-not-at-top
+  brick = trimesh.creation.box((0.6, 0.4, 0.2))
+  quaternions, offsets, probabilities = resting_poses.compute_resting_poses(
+      brick.convex_hull, brick.center_mass)
+  assert len(offsets) == 6
+  np.testing.assert_allclose(probabilities.sum(), 1.)
+  # lying on one of the two largest faces is the most likely pose
+  np.testing.assert_allclose(offsets[:2], 0.1)
+  assert probabilities[0] == pytest.approx(probabilities[1]) and probabilities[1] > probabilities[2]
+  for quaternion, offset in zip(quaternions, offsets):
+    rotated = np.array([kb.Quaternion(quaternion).rotate(v) for v in brick.vertices])
+    np.testing.assert_allclose(rotated[:, 2].min() + offset, 0., atol=1e-9)
+
+
+def test_texture_variants(tmpdir):
+  bpy = pytest.importorskip("bpy")
+  asset_dir = pathlib.Path(tmpdir) / "asset"
+  (asset_dir / "textures").mkdir(parents=True)
+  image = bpy.data.images.new("texture", 1024, 512)
+  image.filepath_raw = str(asset_dir / "textures" / "texture.png")
+  image.file_format = "PNG"
+  image.save()
+  bpy.data.images.remove(image)
+
+  written = texture_variants.write_texture_variants(asset_dir, sizes=(256, 512, 1024, 2048))
+  assert written == {"textures/texture.png": [256, 512]}
+  path = asset_dir / "textures" / "texture.png"
+  variant = bpy.data.images.load(texture_variants.variant_path(path, 256))
+  assert tuple(variant.size) == (256, 128)
+  assert texture_variants.is_variant(texture_variants.variant_path(path, 256))
+
+  assert texture_variants.select_variant(path, 100) == texture_variants.variant_path(path, 256)
+  assert texture_variants.select_variant(path, 300) == texture_variants.variant_path(path, 512)
+  assert texture_variants.select_variant(path, 600) == str(path)
+  # a far away object needs fewer texels than a close one, but never more than a panorama
+  far = texture_variants.required_texture_size(512, np.pi / 4, object_size=0.3, distance=5.)
+  near = texture_variants.required_texture_size(512, np.pi / 4, object_size=0.3, distance=0.5)
+  assert far < near
+  assert texture_variants.required_texture_size(512, np.pi / 4, 50., 1.) == pytest.approx(4096)
@@ -141,3 +141,60 @@ def test_blender_samples_per_pixel_init(tmp_path):
   renderer = blender.Blender(core.Scene(), tmp_path, samples_per_pixel=256)
   assert renderer.samples_per_pixel == 256
   assert renderer.blender_scene.cycles.samples == 256
+
+
+def test_mesh_cache_creates_linked_duplicates(tmp_path):
+  mesh_cache = blender_utils.MeshCache(library_dir=tmp_path)
+  nr_imports = []
+
+  def import_cube():
+    nr_imports.append(1)
+    bpy.ops.mesh.primitive_cube_add()
+    cube = bpy.context.active_object
+    cube.data.materials.append(bpy.data.materials.new("cube_material"))
+    return cube
+
+  key = mesh_cache.cache_key("cube.obj", {"axis_forward": "Y"})
+  first = mesh_cache.instantiate(key, import_cube)
+  second = mesh_cache.instantiate(key, import_cube)
+  assert len(nr_imports) == 1
+  assert first.data == second.data
+  assert first not in bpy.context.scene.collection.objects.values()  # not linked yet
+  second.active_material = bpy.data.materials.new("other_material")
+  assert first.active_material.name == "cube_material"
+
+  # templates survive a scene reset by being reloaded from the library
+  blender_utils.clear_and_reset_blender_scene()
+  third = mesh_cache.instantiate(key, import_cube)
+  assert len(nr_imports) == 1
+  assert mesh_cache.stats == {"hits": 1, "misses": 1, "reloads": 1}
+  assert len(third.data.vertices) == 8
+
+
+def test_remove_constant_animation():
+  blender_utils.clear_and_reset_blender_scene()
+  bpy.ops.mesh.primitive_cube_add()
+  static_cube = bpy.context.active_object
+  bpy.ops.mesh.primitive_cube_add()
+  moving_cube = bpy.context.active_object
+  for frame in range(3):
+    static_cube.location = (1, 2, 3)
+    static_cube.keyframe_insert("location", frame=frame)
+    moving_cube.location = (frame, 0, 0)
+    moving_cube.keyframe_insert("location", frame=frame)
+
+  assert blender_utils.remove_constant_animation(static_cube)
+  assert static_cube.animation_data is None
+  assert tuple(static_cube.location) == (1, 2, 3)
+  assert not blender_utils.remove_constant_animation(moving_cube)
+  assert moving_cube.animation_data is not None
+  assert not blender_utils.remove_constant_animation(static_cube)  # nothing left to remove
+
+
+def test_murmurhash3_32():
+  # reference values of sklearn.utils.murmurhash3_32(..., positive=True)
+  assert blender_utils.murmurhash3_32(b"") == 0
+  assert blender_utils.murmurhash3_32(b"a") == 1009084850
+  assert blender_utils.murmurhash3_32(b"abcd") == 1139631978
+  assert blender_utils.murmurhash3_32(b"cube_0") == 3821178693
+  assert blender_utils.murmurhash3_32(b"kubric.Object3D", seed=42) == 2782951703
@@ -0,0 +1,65 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Testing for `kubric.datasets.utils` module."""
+
+import numpy as np
+
+from kubric import file_io
+from kubric.datasets import utils
+
+
+def _make_scene_dir(scene_dir, num_frames=3, resolution=(8, 8)):
+  rng = np.random.default_rng(0)
+  frames = {
+      "rgba": rng.integers(0, 256, (num_frames, *resolution, 4), dtype=np.uint8),
+      "segmentation": rng.integers(0, 5, (num_frames, *resolution, 1), dtype=np.uint8),
+      "forward_flow": rng.integers(0, 2**16, (num_frames, *resolution, 3), dtype=np.uint16),
+      "depth": rng.uniform(1., 10., (num_frames, *resolution, 1)).astype(np.float32),
+  }
+  for f in range(num_frames):
+    for key in ["rgba", "segmentation", "forward_flow"]:
+      file_io.write_png(frames[key][f], scene_dir / f"{key}_{f:05d}.png")
+    file_io.write_tiff(frames["depth"][f], scene_dir / f"depth_{f:05d}.tiff")
+
+  camera = {"focal_length": 35., "sensor_width": 32., "field_of_view": 0.8,
+            "positions": [[0., 0., 1.]] * num_frames,
+            "quaternions": [[1., 0., 0., 0.]] * num_frames}
+  file_io.write_json({"metadata": {"num_frames": num_frames, "num_instances": 0,
+                                   "resolution": list(resolution)},
+                      "camera": camera, "instances": []}, scene_dir / "metadata.json")
+  file_io.write_json({"collisions": []}, scene_dir / "events.json")
+  file_io.write_json({"forward_flow": {"min": -4., "max": 4.}}, scene_dir / "data_ranges.json")
+  return frames
+
+
+def test_load_scene_directory(tmpdir):
+  frames = _make_scene_dir(tmpdir)
+  layers = ("rgba", "segmentation", "forward_flow", "depth")
+  key, result, _ = utils.load_scene_directory(tmpdir, (4, 4), layers, flow_scale=2.)
+
+  assert key == tmpdir.basename
+  # same results as downsampling every frame individually
+  np.testing.assert_array_equal(
+      result["video"], [utils.subsample_avg(f, (4, 4))[..., :3] for f in frames["rgba"]])
+  np.testing.assert_array_equal(
+      result["segmentations"],
+      [utils.subsample_nearest_neighbor(f, (4, 4)) for f in frames["segmentation"]])
+  np.testing.assert_array_equal(
+      result["forward_flow"],
+      [utils.subsample_nearest_neighbor(f[..., :2], (4, 4)) for f in frames["forward_flow"]])
+  assert result["metadata"]["forward_flow_range"] == [-4., 4.]
+  depth = np.array([utils.subsample_nearest_neighbor(f, (4, 4)) for f in frames["depth"]])
+  np.testing.assert_allclose(result["metadata"]["depth_range"], [depth.min(), depth.max()])
+  assert result["depth"].shape == (3, 4, 4, 1) and result["depth"].dtype == np.uint16
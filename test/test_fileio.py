@@ -12,10 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import struct
+import zlib
+
+import imageio
 import numpy as np
 import pytest
 
 from kubric import file_io
+from kubric import image_codecs
 
 
 def test_write_read_grayscale_uint8_png(tmpdir):
@@ -146,3 +151,135 @@ def test_write_image_dict(tmpdir):
 
       assert img.shape == img_recovered.shape
       np.testing.assert_allclose(img_recovered, img, rtol=1e-4, atol=1e-4)
+
+
+def test_write_video_ffv1_is_lossless(tmpdir):
+  filename = tmpdir / "video.mkv"
+  frames = np.arange(5*16*16*3, dtype=np.uint64).reshape((5, 16, 16, 3)) % 256
+  frames = frames.astype(np.uint8)
+  file_io.write_video(frames, filename, fps=12, codec="ffv1")
+  frames_recovered = np.stack(imageio.mimread(str(filename), format="ffmpeg"))
+  np.testing.assert_array_equal(frames_recovered, frames)
+
+
+def test_video_writer_streams_rgba_frames(tmpdir):
+  filename = tmpdir / "rgba.mp4"
+  with file_io.VideoWriter(filename, fps=12, codec="h264", crf=30) as writer:
+    for i in range(4):
+      writer.write(np.full((16, 16, 4), i * 0.25, dtype=np.float32))
+  assert writer.nr_frames == 4
+  assert filename.exists() and filename.size() > 0
+  with pytest.raises(KeyError):
+    file_io.VideoWriter(tmpdir / "video.avi", codec="mjpeg")
+
+
+@pytest.fixture
+def remote_cache(tmpdir, monkeypatch):
+  monkeypatch.setattr(file_io, "CACHE_ROOT_DIR", str(tmpdir / "gcache"))
+  monkeypatch.setattr(file_io, "CACHE_VALIDATION", "none")
+  monkeypatch.setattr(file_io, "CACHE_OFFLINE", False)
+  return tmpdir / "gcache"
+
+
+def test_gopen_caches_remote_binary_files(remote_cache):
+  remote_path = "ram://kubric-test/images/img.png"
+  img_data = np.arange(256, dtype=np.uint8).reshape((16, 16, 1))
+  file_io.write_png(img_data, remote_path)
+
+  np.testing.assert_array_equal(file_io.read_png(remote_path), img_data)
+  cached = remote_cache / "kubric-test" / "images" / "img.png"
+  assert cached.exists()
+  assert file_io.read_bytes(remote_path) == cached.read_binary()
+
+  # offline mode serves cached files and refuses to fetch missing ones
+  file_io.set_cache_options(offline=True)
+  np.testing.assert_array_equal(file_io.read_png(remote_path), img_data)
+  with pytest.raises(FileNotFoundError):
+    file_io.read_bytes("ram://kubric-test/images/missing.png")
+
+
+def test_gopen_cache_validation(remote_cache):
+  remote_path = "ram://kubric-test/data.json"
+  file_io.write_json({"version": 1}, remote_path)
+  assert file_io.read_json(remote_path) == {"version": 1}
+
+  # overwrite the remote file behind the back of the cache
+  import tensorflow as tf  # pylint: disable=g-import-not-at-top
+  tf.io.gfile.remove(remote_path)
+  with tf.io.gfile.GFile(remote_path, "w") as fp:
+    fp.write('{"version": 123}')
+  assert file_io.read_json(remote_path) == {"version": 1}  # stale, no validation
+
+  file_io.set_cache_options(validation="size")
+  assert file_io.read_json(remote_path) == {"version": 123}
+  with pytest.raises(ValueError):
+    file_io.set_cache_options(validation="md5")
+
+
+@pytest.mark.parametrize("dtype,channels", [(np.uint8, 1), (np.uint8, 3), (np.uint16, 3),
+                                            (np.uint16, 4)])
+def test_png_codecs_are_interchangeable(dtype, channels):
+  rng = np.random.default_rng(42)
+  img_data = rng.integers(0, np.iinfo(dtype).max, (17, 23, channels)).astype(dtype)
+  for encoder in image_codecs.PNG_CODECS.values():
+    for decoder in image_codecs.PNG_CODECS.values():
+      img_recovered, bitdepth = decoder.decode(encoder.encode(img_data))
+      assert bitdepth == 8 * np.dtype(dtype).itemsize
+      np.testing.assert_array_equal(img_recovered, img_data)
+
+
+def test_png_codecs_write_identical_palette_pngs(tmpdir):
+  segmentation = np.arange(64, dtype=np.uint8).reshape((8, 8, 1)) % 5
+  for codec in image_codecs.PNG_CODECS:
+    file_io.set_png_options(codec=codec, compression=9)
+    file_io.write_palette_png(segmentation, tmpdir / f"{codec}.png")
+  file_io.set_png_options(codec="numpy", compression=6)
+  assert (tmpdir / "numpy.png").read_binary() == (tmpdir / "pypng.png").read_binary()
+  np.testing.assert_array_equal(file_io.read_png(tmpdir / "numpy.png"), segmentation)
+  with pytest.raises(ValueError):
+    file_io.set_png_options(codec="libpng")
+
+
+def test_numpy_png_codec_decodes_sub_and_up_filters():
+  img_data = np.arange(6 * 5 * 3, dtype=np.uint8).reshape((6, 5, 3)) * 7
+  rows = img_data.reshape((6, 15)).astype(np.int16)
+  sub = rows.copy()
+  sub[:, 3:] -= rows[:, :-3]
+  up = rows.copy()
+  up[1:] -= rows[:-1]
+  filters = np.array([1, 2, 0, 1, 2, 2])[:, None]
+  filtered = np.where(filters == 1, sub, np.where(filters == 2, up, rows)) % 256
+  scanlines = np.concatenate([filters, filtered], axis=1).astype(np.uint8)
+  header = struct.pack(">IIBBBBB", 5, 6, 8, 2, 0, 0, 0)
+  buffer = (image_codecs.PNG_SIGNATURE + image_codecs._chunk(b"IHDR", header) +
+            image_codecs._chunk(b"IDAT", zlib.compress(scanlines.tobytes())) +
+            image_codecs._chunk(b"IEND", b""))
+  img_recovered, _ = image_codecs.NumpyPngCodec().decode(buffer)
+  np.testing.assert_array_equal(img_recovered, img_data)
+
+
+def test_write_image_dict_in_background(tmpdir):
+  img_dict = {
+      "rgba": np.arange(4*8*8*4, dtype=np.uint64).reshape((4, 8, 8, 4)).astype(np.uint8),
+      "segmentation": np.ones((4, 8, 8, 1), dtype=np.uint8),
+  }
+  handle = file_io.write_image_dict(img_dict, tmpdir, wait=False)
+  handle.wait(timeout=60)
+  assert handle.done()
+  for i, img in enumerate(img_dict["rgba"]):
+    np.testing.assert_array_equal(file_io.read_png(tmpdir / f"rgba_{i:05d}.png"), img)
+
+
+def test_async_writer_reports_errors_and_applies_backpressure(tmpdir):
+  writer = file_io.AsyncWriter(num_threads=1, max_queue_size=1)
+  handle = file_io.WriteHandle()
+  for i in range(3):  # blocks until there is room in the queue
+    writer.submit(file_io.write_json, {"i": i}, tmpdir / f"{i}.json", handle=handle)
+  failing = writer.submit(file_io.write_png, np.zeros((2, 2, 5), np.uint8), tmpdir / "bad.png")
+  with pytest.raises(IOError):
+    failing.wait(timeout=60)
+  handle.wait(timeout=60)
+  assert file_io.read_json(tmpdir / "2.json") == {"i": 2}
+  with pytest.raises(IOError):
+    writer.flush(timeout=60)
+  writer.flush(timeout=60)  # errors are only reported once
@@ -0,0 +1,76 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import subprocess
+import sys
+
+import pytest
+
+from kubric import filesystem
+
+
+def test_local_paths_use_the_local_backend(tmp_path):
+  assert filesystem.scheme(tmp_path) == ""
+  assert filesystem.scheme("gs://bucket/file") == "gs"
+  assert isinstance(filesystem.get_backend(tmp_path), filesystem.LocalFileSystem)
+  assert isinstance(filesystem.get_backend(f"file://{tmp_path}"), filesystem.LocalFileSystem)
+
+
+def test_local_copy_makedirs_and_stat(tmp_path):
+  backend = filesystem.get_backend(tmp_path)
+  backend.makedirs(str(tmp_path / "a" / "b"))
+  src, dst = tmp_path / "a" / "b" / "src.txt", tmp_path / "dst.txt"
+  with backend.open(str(src), "w") as fp:
+    fp.write("kubric")
+
+  filesystem.copy(src, f"file://{dst}")
+  assert dst.read_text() == "kubric"
+  assert backend.stat(str(dst)).length == 6
+  with pytest.raises(FileExistsError):
+    filesystem.copy(src, dst)
+  filesystem.copy(src, dst, overwrite=True)
+  assert [filenames for _, _, filenames in backend.walk(str(tmp_path / "a"))] == [[], ["src.txt"]]
+
+
+def test_register_backend(tmp_path, monkeypatch):
+  monkeypatch.setattr(filesystem, "_scheme_backends", dict(filesystem._scheme_backends))
+  local = filesystem.LocalFileSystem()
+  filesystem.register_backend("mem", local)
+  assert filesystem.get_backend("mem://bucket/file") is local
+  with pytest.raises(ValueError):
+    filesystem.register_backend("mem", "unknown")
+  with pytest.raises(TypeError):
+    filesystem.register_backend("mem", filesystem.LocalFileSystem)
+
+
+def test_incomplete_backend_fails_on_construction():
+  class ReadOnlyFileSystem(filesystem.FileSystem):
+
+    def open(self, path, mode="r"):
+      return open(path, mode)
+
+    def exists(self, path):
+      return True
+
+  with pytest.raises(TypeError):
+    ReadOnlyFileSystem()
+
+
+def test_import_kubric_does_not_import_tensorflow():
+  code = ("import sys, kubric\n"
+          "from kubric import file_io, filesystem\n"
+          "kubric.Scene, kubric.write_json\n"
+          "assert 'tensorflow' not in sys.modules\n")
+  # in a fresh process, as other tests might have imported tensorflow already
+  subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,177 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the scene setup of the test scenes in fy/base.py (with a small local asset source)."""
+
+import json
+import os
+import pathlib
+import sys
+import threading
+
+import numpy as np
+import PIL.Image
+import pytest
+import trimesh
+
+import kubric as kb
+
+REPO_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+
+def _write_assets(data_dir: pathlib.Path) -> pathlib.Path:
+  """Writes an uncompressed asset store with an HDRI and a textured dome; returns its manifest."""
+  (data_dir / "hdri").mkdir(parents=True)
+  (data_dir / "dome").mkdir()
+  texture = np.full((8, 16, 3), 128, dtype=np.uint8)
+  PIL.Image.fromarray(texture).save(data_dir / "hdri" / "hdri.png")
+
+  dome = trimesh.creation.icosphere(subdivisions=1, radius=10.)
+  uv = np.stack([dome.vertices[:, 0], dome.vertices[:, 1]], axis=-1) / 20. + 0.5
+  material = trimesh.visual.material.SimpleMaterial(image=PIL.Image.fromarray(texture))
+  dome.visual = trimesh.visual.TextureVisuals(uv=uv, material=material)
+  dome.export(data_dir / "dome" / "dome.glb")
+
+  manifest = {
+      "name": "fy_test_assets",
+      "assets": {
+          "hdri": {"asset_type": "Texture", "path": "hdri/",
+                   "kwargs": {"filename": "{asset_dir}/hdri.png"}},
+          "dome": {"asset_type": "FileBasedObject", "path": "dome/",
+                   "kwargs": {"render_filename": "{asset_dir}/dome.glb",
+                              "simulation_filename": None}},
+      },
+  }
+  manifest_path = data_dir / "manifest.json"
+  manifest_path.write_text(json.dumps(manifest))
+  return manifest_path
+
+
+@pytest.fixture
+def fy_base(tmp_path_factory, monkeypatch):
+  """Imports fy/base.py with all of its asset sources replaced by the local test assets."""
+  manifest_path = _write_assets(tmp_path_factory.mktemp("assets"))
+  from_manifest = kb.AssetSource.from_manifest
+  monkeypatch.setattr(kb.AssetSource, "from_manifest",
+                      lambda path, **kwargs: from_manifest(manifest_path, **kwargs))
+  for path in (REPO_DIR, REPO_DIR / "fy"):  # fy imports from `fy.` and from `utils`
+    monkeypatch.syspath_prepend(str(path))
+  import fy.base  # pylint: disable=import-outside-toplevel
+  monkeypatch.setattr(fy.base, "GSO_MANIFEST", str(manifest_path))
+  monkeypatch.setattr(fy.base, "SHAPENET_MANIFEST", str(manifest_path))
+  return fy.base
+
+
+def _make_test_scene(fy_base, tmp_path, monkeypatch):
+  class HDRITestScene(fy_base.BaseTestScene):
+
+    def add_test_objects(self):
+      pass
+
+    def generate_keyframes(self):
+      pass
+
+  monkeypatch.chdir(tmp_path)  # without the id lists of fy/configs
+  monkeypatch.setattr(sys, "argv", ["fy/run.py", "--test_scene_cls", "solidity",
+                                    "--scene_type", "hdri", "--background_hdri_id", "hdri",
+                                    "--job-dir", str(tmp_path / "output"), "--seed", "1",
+                                    "--scratch_dir", str(tmp_path / "scratch")])
+  test_scene = HDRITestScene(fy_base.get_args())
+  test_scene.is_add_table = False
+  return test_scene
+
+
+def test_setup_hdri_scene(fy_base, tmp_path, monkeypatch):
+  test_scene = _make_test_scene(fy_base, tmp_path, monkeypatch)
+  test_scene._setup_hdri_scene()  # pylint: disable=protected-access
+
+  assert isinstance(test_scene.background_hdri, kb.Texture)
+  assert test_scene.background_hdri.filename.endswith("hdri.png")
+  assert test_scene.dome in test_scene.scene.assets
+  assert test_scene.scene.metadata["background"] == "hdri"
+  assert test_scene.simulator is not None and test_scene.renderer is not None
+
+
+def test_aligned_block_stands_upright(tmp_path, monkeypatch):
+  for path in (REPO_DIR, REPO_DIR / "fy"):
+    monkeypatch.syspath_prepend(str(path))
+  from fy import utils as fy_utils  # pylint: disable=import-outside-toplevel
+  board = trimesh.creation.box((0.4, 0.05, 0.3))
+  board.apply_transform(trimesh.transformations.random_rotation_matrix(
+      np.random.default_rng(0).uniform(size=3)))
+  geometry = kb.assets.geometry_index.compute_asset_geometry(board)
+  index = kb.assets.GeometryIndex(["board"], {k: v[None] for k, v in geometry.items()})
+
+  block = kb.FileBasedObject(asset_id="board")
+  fy_utils.aligh_block_objs(block, geometry_index=index)
+  vertices = board.vertices @ kb.Quaternion(block.quaternion).rotation_matrix.T
+  extents = vertices.max(axis=0) - vertices.min(axis=0)
+  np.testing.assert_allclose(extents, (0.4, 0.05, 0.3), atol=1e-6)
+
+
+def test_aligned_can_stands_upright(tmp_path, monkeypatch):
+  for path in (REPO_DIR, REPO_DIR / "fy"):
+    monkeypatch.syspath_prepend(str(path))
+  from fy import utils as fy_utils  # pylint: disable=import-outside-toplevel
+  can = trimesh.creation.cylinder(radius=0.05, height=0.3, sections=64)
+  can.apply_transform(trimesh.transformations.random_rotation_matrix(
+      np.random.default_rng(0).uniform(size=3)))
+  geometry = kb.assets.geometry_index.compute_asset_geometry(can)
+  index = kb.assets.GeometryIndex(["can"], {k: v[None] for k, v in geometry.items()})
+
+  obj = kb.FileBasedObject(asset_id="can")
+  assert fy_utils.align_can_objs(obj, geometry_index=index) is None
+  vertices = can.vertices @ kb.Quaternion(obj.quaternion).rotation_matrix.T
+  extents = vertices.max(axis=0) - vertices.min(axis=0)
+  np.testing.assert_allclose(extents, (0.1, 0.1, 0.3), atol=1e-3)
+
+
+def test_trace_includes_background_writes(fy_base, tmp_path, monkeypatch):
+  import fy.run  # pylint: disable=import-outside-toplevel
+  release = threading.Event()
+
+  def slow_write(data, filename):
+    release.wait(timeout=10)
+    kb.write_json(data, filename)
+
+  def generate(test_class, flags, output_dir):
+    del test_class, flags
+    with kb.tracing.span("render"):
+      pass
+    return kb.file_io.get_async_writer().submit(slow_write, {"frame": 0},
+                                                os.path.join(output_dir, "frame.json"))
+
+  monkeypatch.setattr(fy.run, "_generate_test_scene", generate)
+  scene_dirs = [str(tmp_path / f"scene_{i}") + "/" for i in range(2)]
+  for scene_dir in scene_dirs:
+    os.makedirs(scene_dir)
+  kb.tracing.enable()
+  try:
+    # --- the frames of the first scene are still being written while the second one renders
+    pending_writes = [(scene_dirs[0], fy.run.generate_test_scene(object, None, scene_dirs[0]))]
+    pending_writes = fy.run.check_pending_writes(pending_writes)
+    assert len(pending_writes) == 1 and not os.path.exists(scene_dirs[0] + "trace.json")
+    pending_writes.append((scene_dirs[1], fy.run.generate_test_scene(object, None, scene_dirs[1])))
+    release.set()
+    assert fy.run.check_pending_writes(pending_writes, wait=True) == []
+  finally:
+    kb.tracing.disable()
+
+  for scene_dir in scene_dirs:
+    summary = json.loads(pathlib.Path(scene_dir, "trace_summary.json").read_text())
+    assert summary["spans"]["file_write"]["count"] == 1
+    assert summary["spans"]["render"]["count"] == summary["spans"]["scene"]["count"] == 1
+    trace = json.loads(pathlib.Path(scene_dir, "trace.json").read_text())
+    writes = [event for event in trace["traceEvents"] if event["name"] == "file_write"]
+    assert [event["args"]["filename"] for event in writes] == [scene_dir + "frame.json"]
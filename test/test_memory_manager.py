@@ -0,0 +1,58 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from kubric.safeimport.bpy import bpy
+from kubric.renderer import blender_utils
+from kubric.renderer import memory_manager
+
+
+def add_cube(material_name):
+  bpy.ops.mesh.primitive_cube_add()
+  cube = bpy.context.active_object
+  cube.data.materials.append(bpy.data.materials.new(material_name))
+  return cube
+
+
+def test_purge_orphans_removes_data_of_removed_objects():
+  blender_utils.clear_and_reset_blender_scene()
+  kept = add_cube("kept_material")
+  removed = add_cube("removed_material")
+  bpy.ops.curve.primitive_bezier_circle_add()
+  circle = bpy.context.active_object
+  bpy.data.objects.remove(removed, do_unlink=True)
+  bpy.data.objects.remove(circle, do_unlink=True)
+  cached = bpy.data.images.new("cached", 4, 4)
+  memory_manager.MemoryManager.keep(cached)
+  bpy.data.images.new("orphan", 4, 4)
+
+  removed = memory_manager.purge_orphans()
+  # the material was only used by the mesh, so it is purged with it
+  assert removed == {"meshes": 1, "curves": 1, "materials": 1, "images": 1}
+  assert kept.name in bpy.data.objects and "kept_material" in bpy.data.materials
+  assert "cached" in bpy.data.images
+  assert memory_manager.purge_orphans() == {}
+
+
+def test_memory_manager_budget():
+  blender_utils.clear_and_reset_blender_scene()
+  add_cube("material")  # + the world = 4 datablocks
+  manager = memory_manager.MemoryManager(datablock_budget=4)
+  assert not manager.over_budget
+  stats = manager.end_scene("first")
+  assert stats["datablocks"]["objects"] == 1 and stats["rss_mib"] > 0
+  assert not manager.over_budget
+  add_cube("other_material")
+  manager.end_scene("second")
+  assert manager.over_budget
+  assert [stats["scene"] for stats in manager.history] == ["first", "second"]
@@ -0,0 +1,101 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Testing for `kubric.point_tracking` module."""
+
+import numpy as np
+
+from kubric import point_tracking
+
+
+def _render_floor(num_frames=4, size=(16, 16), camera_height=5.):
+  """Fake render outputs of a camera looking straight down onto the floor (z = 0)."""
+  height, width = size
+  camera = {"focal_length": 35., "sensor_width": 32.,
+            "positions": np.tile([0., 0., camera_height], (num_frames, 1)),
+            "quaternions": np.tile([1., 0., 0., 0.], (num_frames, 1))}
+  intrinsics, _ = point_tracking.get_camera_matrices(
+      camera["focal_length"], camera["sensor_width"], camera["positions"],
+      camera["quaternions"], size)
+  yy, xx = np.mgrid[0:height, 0:width]
+  raster = np.stack([(xx + .5) / width, (yy + .5) / height, np.ones_like(xx)], axis=-1)
+  rays = raster @ np.linalg.inv(intrinsics[0]).T
+  rays /= np.linalg.norm(rays, axis=-1, keepdims=True)
+  distance = camera_height / -rays[..., 2]
+  normal = np.round((np.array([0., 0., 1.]) + 1) / 2 * 65535).astype(np.uint16)
+  data_stack = {
+      "depth": np.tile(distance[None, ..., None], (num_frames, 1, 1, 1)).astype(np.float32),
+      "segmentation": np.zeros((num_frames, height, width, 1), dtype=np.uint32),
+      "object_coordinates": np.zeros((num_frames, height, width, 3), dtype=np.uint16),
+      "normal": np.tile(normal, (num_frames, height, width, 1)),
+  }
+  # a flat 2x2 tile lying on the floor (instance 1)
+  world = camera["positions"][0] + rays * distance[..., None]
+  on_tile = np.all(np.abs(world[..., :2]) < 1, axis=-1)
+  local = world / np.array([2., 2., 1.])
+  data_stack["segmentation"][:, on_tile] = 1
+  data_stack["object_coordinates"][:, on_tile] = np.round((local[on_tile] + .5) * 65535)
+  tile = {"bboxes_3d": np.tile(point_tracking._UNIT_BOX * [2., 2., 1.], (num_frames, 1, 1)),
+          "quaternions": np.tile([1., 0., 0., 0.], (num_frames, 1))}
+  return data_stack, camera, tile
+
+
+def test_unproject_project_roundtrip():
+  intrinsics, matrix_world = point_tracking.get_camera_matrices(
+      35., 32., [[1., 2., 3.]], [[0.9, 0.1, 0.3, 0.2]], (12, 16))
+  coords = np.array([[0, 0], [5, 7], [11, 15]])
+  points = point_tracking.unproject(coords, (12, 16), intrinsics[[0, 0, 0]],
+                                    matrix_world[[0, 0, 0]], np.array([1., 2., 3.]))
+  projected = point_tracking.project_points(intrinsics, matrix_world, points[None])[0]
+  np.testing.assert_allclose(projected[:, :2] * [16, 12], coords[:, ::-1] + .5)
+  assert np.all(projected[:, 2] > 0)
+
+
+def test_get_num_to_sample():
+  num_to_sample = point_tracking.get_num_to_sample(np.array([100, 10, 1000]), 0.1, 60)
+  np.testing.assert_array_equal(num_to_sample, [10, 1, 49])
+
+
+def test_static_scene_tracks():
+  data_stack, camera, tile = _render_floor()
+  tracks = point_tracking.compute_point_tracks(
+      data_stack, camera, [tile], tracks_to_sample=20, sampling_stride=2, max_sampled_frac=0.5,
+      rng=np.random.default_rng(0))
+
+  assert tracks["query_points"].shape == (20, 3)
+  assert tracks["target_points"].shape == (20, 4, 2)
+  # static camera and scene: every point stays at its query position and is always visible
+  np.testing.assert_allclose(
+      tracks["target_points"],
+      np.tile(tracks["query_points"][:, None, :0:-1], (1, 4, 1)), atol=1e-3)
+  assert not np.any(tracks["occluded"])
+  np.testing.assert_allclose(tracks["relative_depth"], 1., atol=1e-4)
+  # points were sampled from both the background and the tile
+  query = tracks["query_points"].astype(int)
+  segments = data_stack["segmentation"][query[:, 0], query[:, 1], query[:, 2], 0]
+  assert set(segments) == {0, 1}
+
+
+def test_tracks_leaving_the_window_are_occluded():
+  data_stack, camera, _ = _render_floor()
+  camera["positions"][:, 0] = np.linspace(0, 4, 4)  # camera moves to the right
+  tracks = point_tracking.compute_point_tracks(
+      data_stack, camera, [], tracks_to_sample=20, sampling_stride=2, max_sampled_frac=0.5,
+      rng=np.random.default_rng(0))
+  query_frames = tracks["query_points"][:, 0].astype(int)
+  query_x = tracks["target_points"][np.arange(20), query_frames, 0]
+  np.testing.assert_allclose(query_x, tracks["query_points"][:, 2], atol=1e-3)
+  # the floor moves to the left in the image and points leave the frame
+  assert np.all(np.diff(tracks["target_points"][..., 0], axis=1) < 0)
+  assert np.all(tracks["occluded"][tracks["target_points"][..., 0] < 0])
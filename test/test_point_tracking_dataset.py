@@ -0,0 +1,100 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Testing for the track cache of the point tracking challenge (challenges/point_tracking)."""
+
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+# the challenge is not a package
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent / "challenges" / "point_tracking"))
+dataset = pytest.importorskip("dataset")
+tf = dataset.tf
+
+NUM_FRAMES, SIZE = 4, 8
+
+
+def _fake_movi(monkeypatch, num_videos=3):
+  """Replaces MOVi-E by random videos and the tracking by tracks that encode their index."""
+  videos = np.random.default_rng(0).integers(0, 256, (num_videos, NUM_FRAMES, SIZE, SIZE, 3),
+                                             dtype=np.uint8)
+
+  def load(name, data_dir, shuffle_files, **kwargs):
+    del name, data_dir, shuffle_files, kwargs
+    ds = tf.data.Dataset.from_tensor_slices({"video": videos})
+    return {"train": ds, "validation": ds}
+
+  def compute_track_variants(data, num_variants, tracks_to_sample, **kwargs):
+    del kwargs
+    variant, track = np.meshgrid(np.arange(num_variants), np.arange(tracks_to_sample),
+                                 indexing="ij")
+    query_points = np.stack([variant, track, np.zeros_like(track)], axis=-1)
+    tracks_shape = [num_variants, tracks_to_sample, NUM_FRAMES]
+    return {
+        "video": data["video"],
+        "crop_windows": tf.constant([[0, 0, SIZE - 1, SIZE - 1]] * num_variants, tf.int32),
+        "query_points": tf.constant(query_points, tf.float32),
+        "target_points": tf.zeros(tracks_shape + [2], tf.float32),
+        "occluded": tf.zeros(tracks_shape, tf.bool),
+        "relative_depth": tf.zeros(tracks_shape, tf.float32),
+    }
+
+  monkeypatch.setattr(dataset.tfds, "load", load)
+  monkeypatch.setattr(dataset, "compute_track_variants", compute_track_variants)
+  return videos
+
+
+def _read(cache_dir, split, tracks_to_sample):
+  ds = dataset.create_cached_point_tracking_dataset(
+      str(cache_dir), train_size=(SIZE, SIZE), shuffle_buffer_size=None, split=split,
+      repeat=False, tracks_to_sample=tracks_to_sample, num_parallel_calls=2)
+  return list(ds.as_numpy_iterator())
+
+
+def test_track_cache_roundtrip(tmp_path, monkeypatch):
+  videos = _fake_movi(monkeypatch)
+  assert dataset.write_track_cache(str(tmp_path), split="train", num_shards=2, num_variants=2,
+                                   tracks_to_sample=8) == 3
+  assert dataset.write_track_cache(str(tmp_path), split="validation", num_shards=1,
+                                   num_variants=3, tracks_to_sample=4, random_crop=False) == 3
+
+  # --- the parameters of every split are kept apart
+  info = dataset.read_track_cache_info(str(tmp_path))["splits"]
+  assert (info["train"]["num_variants"], info["train"]["tracks_to_sample"]) == (2, 8)
+  assert (info["validation"]["num_variants"], info["validation"]["tracks_to_sample"]) == (3, 4)
+  assert info["train"]["random_crop"] and not info["validation"]["random_crop"]
+
+  examples = _read(tmp_path, "train", tracks_to_sample=5)
+  assert len(examples) == 3
+  expected_videos = videos / (255. / 2.) - 1.
+  for example in examples:
+    assert any(np.allclose(example["video"], video, atol=1e-5) for video in expected_videos)
+    query_points = example["query_points"]
+    assert query_points.shape == (5, 3) and len(set(query_points[:, 1])) == 5
+    assert len(set(query_points[:, 0])) == 1 and query_points[0, 0] in (0, 1)
+    assert example["target_points"].shape == (5, NUM_FRAMES, 2)
+
+  assert len(_read(tmp_path, "validation", tracks_to_sample=4)) == 3
+  with pytest.raises(ValueError):
+    _read(tmp_path, "validation", tracks_to_sample=5)
+  with pytest.raises(ValueError):
+    _read(tmp_path, "test", tracks_to_sample=4)
+
+  # --- rewriting a split with fewer shards does not read the stale ones
+  dataset.write_track_cache(str(tmp_path), split="train", num_shards=1, num_variants=2,
+                            tracks_to_sample=8)
+  assert len(_read(tmp_path, "train", tracks_to_sample=8)) == 3
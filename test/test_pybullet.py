@@ -14,9 +14,15 @@
 
 """Testing for `kubric.simulator.pybullet` module."""
 
+import os
+
 import kubric as kb
+from kubric.assets import collision_lods
+from kubric.assets import geometry_index
+from kubric.scripts import download_GSO
 from kubric.simulator.pybullet import PyBullet as KubricSimulator
 import numpy as np
+import trimesh
 
 
 def test_basic_simulator():
@@ -50,3 +56,124 @@ def test_simulator_in_loop():
     scene.add(cube)
     simulator.run()
     np.testing.assert_allclose(cube.position[1], -0.5 * 10, atol=0.1)
+
+
+def _make_lod_asset(asset_dir):
+  tmesh = trimesh.creation.box((1., 1., 1.))
+  tmesh.export(asset_dir / "visual_geometry.obj")
+  lods = collision_lods.compute_collision_lods(asset_dir / "visual_geometry.obj", asset_dir,
+                                               lods=("hull",))
+  tmesh.export(asset_dir / "collision_geometry.obj")  # no need for VHACD on the fine LOD
+  urdf_path = asset_dir / "object.urdf"
+  urdf_path.write_text(download_GSO.URDF_TEMPLATE.format(
+      id="box", **download_GSO.get_object_properties(tmesh)))
+  urdfs = collision_lods.write_lod_urdfs(urdf_path, lods=("hull", "fine"))
+  assert lods == {"hull": "collision_geometry_hull.obj"}
+  assert "collision_geometry_hull.obj" in (asset_dir / urdfs["hull"]).read_text()
+  return {"simulation_filename": str(urdf_path),
+          "collision_lods": {lod: str(asset_dir / f) for lod, f in urdfs.items()}}
+
+
+def test_collision_lod_selection(tmp_path):
+  asset_kwargs = _make_lod_asset(tmp_path)
+  scene = kb.Scene(frame_end=24, gravity=(0, 0, -10))
+  simulator = KubricSimulator(scene,
+                              collision_lods={"background": "hull", "foreground": "coarse"})
+
+  clutter = kb.FileBasedObject(name="clutter", background=True, **asset_kwargs)
+  test_obj = kb.FileBasedObject(name="test_obj", position=(3, 0, 0), **asset_kwargs)
+  explicit = kb.FileBasedObject(name="explicit", position=(6, 0, 0), collision_lod="fine",
+                                **asset_kwargs)
+  assert simulator.simulation_filename(clutter) == asset_kwargs["collision_lods"]["hull"]
+  # the asset has no "coarse" LOD, so the default simulation file is used
+  assert simulator.simulation_filename(test_obj) == asset_kwargs["simulation_filename"]
+  assert simulator.simulation_filename(explicit) == asset_kwargs["collision_lods"]["fine"]
+
+  scene.add([clutter, test_obj, explicit])
+  simulator.run()
+  for obj in (clutter, test_obj, explicit):
+    np.testing.assert_allclose(obj.position[2], -0.5 * 10, atol=0.1)
+
+
+def test_objects_placed_in_resting_poses_stay_at_rest(tmp_path):
+  index_rows, asset_kwargs = {}, {}
+  meshes = {"brick": trimesh.creation.box((0.6, 0.4, 0.2)),
+            "can": trimesh.creation.cylinder(radius=0.1, height=0.4, sections=16)}
+  for name, tmesh in meshes.items():
+    asset_dir = tmp_path / name
+    asset_dir.mkdir()
+    tmesh.export(asset_dir / "visual_geometry.obj")
+    tmesh.export(asset_dir / "collision_geometry.obj")
+    properties = download_GSO.get_object_properties(tmesh)
+    (asset_dir / "object.urdf").write_text(
+        download_GSO.URDF_TEMPLATE.format(id=name, **properties))
+    asset_kwargs[name] = {"simulation_filename": str(asset_dir / "object.urdf"),
+                          "bounds": properties["bounds"]}
+    index_rows[name] = geometry_index.compute_asset_geometry(tmesh)
+  index = geometry_index.GeometryIndex.from_rows(index_rows)
+
+  scene = kb.Scene(frame_end=24, gravity=(0, 0, -10))
+  simulator = KubricSimulator(scene)
+  scene += kb.Cube(scale=(5, 5, 0.1), position=(0, 0, -0.1), static=True)
+  rng = np.random.RandomState(0)
+  placed = []
+  for i in range(6):
+    name = ["brick", "can"][i % 2]
+    obj = kb.FileBasedObject(asset_id=name, name=f"{name}_{i}", **asset_kwargs[name])
+    kb.place_in_resting_pose(obj, index, others=placed, spawn_region=((-3, -3, 0), (3, 3, 1)),
+                             rng=rng)
+    assert not kb.randomness.footprints_overlap(obj, placed)
+    scene += obj
+    placed.append(obj)
+
+  initial = [np.array(obj.position) for obj in placed]
+  animation, _ = simulator.run()
+  for obj, position in zip(placed, initial):
+    np.testing.assert_allclose(animation[obj]["position"][-1], position, atol=0.01)
+
+
+def _simulate_with_cache(cache, asset_kwargs, position=(0, 0, 1)):
+  scene = kb.Scene(frame_end=12, gravity=(0, 0, -10))
+  simulator = KubricSimulator(scene, cache=cache)
+  scene += kb.Cube(name="floor", scale=(5, 5, 0.1), position=(0, 0, -0.1), static=True)
+  box = kb.FileBasedObject(name="box", asset_id="box", position=position, **asset_kwargs)
+  scene += box
+  animation, collisions = simulator.run()
+  return box, animation, collisions
+
+
+def test_simulation_cache_reuses_results(tmp_path):
+  asset_kwargs = _make_lod_asset(tmp_path)
+  cache = kb.simulator.SimulationCache(tmp_path / "cache")
+  box, animation, collisions = _simulate_with_cache(cache, asset_kwargs)
+  assert cache.stats["misses"] == 1 and collisions
+
+  cached_box, cached_animation, cached_collisions = _simulate_with_cache(cache, asset_kwargs)
+  assert cache.stats["hits"] == 1
+  assert cached_animation[cached_box] == animation[box]
+  assert cached_box.keyframes["position"].keys() == box.keyframes["position"].keys()
+  np.testing.assert_array_equal(list(cached_box.keyframes["position"].values()),
+                                list(box.keyframes["position"].values()))
+  assert [c["instances"][1].name for c in cached_collisions] == \
+      [c["instances"][1].name for c in collisions]
+  assert [c["force"] for c in cached_collisions] == [c["force"] for c in collisions]
+
+  # other initial conditions are simulated again
+  _simulate_with_cache(cache, asset_kwargs, position=(0, 0, 2))
+  assert cache.stats["misses"] == 2
+  assert len(cache.entries()) == 2
+
+
+def test_simulation_cache_evicts_least_recently_used(tmp_path):
+  cache = kb.simulator.SimulationCache(tmp_path)
+  animation = [{name: np.zeros((10, 4)) for name in ("position", "quaternion", "velocity",
+                                                     "angular_velocity")}]
+  collisions = {"instances": np.zeros((0, 2)), "position": np.zeros((0, 3)),
+                "contact_normal": np.zeros((0, 3)), "frame": np.zeros(0), "force": np.zeros(0)}
+  for key in ("a", "b", "c"):
+    cache.put(key, animation, collisions)
+  entry_size = cache.total_size() // 3
+  os.utime(tmp_path / "a.npz", (0, 0))  # the least recently used entry
+  cache.get("b")
+  assert cache.evict(2 * entry_size + 1) > 0
+  assert sorted(cache.entries()) == ["b", "c"]
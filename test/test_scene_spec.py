@@ -0,0 +1,100 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+import kubric as kb
+from kubric import scene_spec
+
+
+@pytest.fixture
+def asset_source(tmp_path):
+  assets = {"box": {"asset_type": "FileBasedObject", "path": None,
+                    "kwargs": {"bounds": [[-1, -1, -1], [1, 1, 1]], "mass": 2.,
+                               "render_filename": "/assets/box/box.obj"},
+                    "metadata": {"category": "box"}}}
+  with kb.AssetSource("source", tmp_path, assets, scratch_dir=tmp_path) as source:
+    yield source
+
+
+def make_scene(asset_source):
+  scene = kb.Scene(frame_start=1, frame_end=4, frame_rate=12, step_rate=120, resolution=(64, 48))
+  scene.camera = kb.PerspectiveCamera(position=(0, -3, 1), focal_length=30)
+  scene += kb.SpotLight(name="light", position=(1, 2, 3), intensity=200.)
+  scene += kb.Cube(name="floor", scale=(5, 5, 0.1), static=True,
+                   material=kb.PrincipledBSDFMaterial(color=kb.get_color("red"), roughness=0.2))
+  box = asset_source.create("box", name="box", scale=0.5, friction=0.3)
+  scene += box
+  for frame in range(0, 5):
+    box.position = (0.1 * frame, 0, 1 - 0.2 * frame)
+    box.quaternion = kb.Quaternion(axis=[0, 0, 1], angle=0.3 * frame)
+    box.keyframe_insert("position", frame)
+    box.keyframe_insert("quaternion", frame)
+  return scene, box
+
+
+def test_scene_spec_round_trip(asset_source, tmp_path):
+  scene, box = make_scene(asset_source)
+  spec = scene_spec.scene_spec(scene, {"gso": asset_source}, frames=range(0, 5), note="test")
+  assert spec["note"] == "test"
+  box_spec = spec["assets"][-1]
+  assert box_spec["source"] == "gso" and box_spec["asset_id"] == "box"
+  # files, bounds and metadata come from the asset source
+  assert "render_filename" not in box_spec and "metadata" not in box_spec
+  assert np.array(box_spec["keyframes"]["position"]).shape == (5, 3)
+
+  scene_spec.write_scene_spec(spec, tmp_path / "spec.json.gz")
+  loaded = scene_spec.read_scene_spec(tmp_path / "spec.json.gz")
+  assert loaded == spec
+
+  new_scene, assets = scene_spec.build_scene(loaded, {"gso": asset_source})
+  assert new_scene.resolution == (64, 48) and new_scene.step_rate == 120
+  assert new_scene.camera.focal_length == 30
+  np.testing.assert_allclose(new_scene.camera.position, (0, -3, 1))
+  light, floor, new_box = assets
+  assert isinstance(light, kb.SpotLight) and light.intensity == 200.
+  assert floor.static and floor.material.roughness == pytest.approx(0.2)
+  assert new_box.mass == 2. and new_box.friction == pytest.approx(0.3)
+  assert new_box.metadata["category"] == "box"
+  np.testing.assert_allclose(new_box.scale, (0.5, 0.5, 0.5))
+  for frame in range(0, 5):
+    np.testing.assert_allclose(new_box.get_value_at("position", frame),
+                               box.get_value_at("position", frame), atol=1e-6)
+    np.testing.assert_allclose(new_box.get_value_at("quaternion", frame),
+                               box.get_value_at("quaternion", frame), atol=1e-6)
+
+
+def test_scene_spec_is_deterministic(asset_source, tmp_path):
+  scene, _ = make_scene(asset_source)
+  spec = scene_spec.scene_spec(scene, {"gso": asset_source})
+  scene_spec.write_scene_spec(spec, tmp_path / "a.json.gz")
+  scene_spec.write_scene_spec(scene_spec.read_scene_spec(tmp_path / "a.json.gz"),
+                              tmp_path / "b.json.gz")
+  assert (tmp_path / "a.json.gz").read_bytes() == (tmp_path / "b.json.gz").read_bytes()
+
+
+def test_build_scene_into_existing_scene(asset_source):
+  scene, _ = make_scene(asset_source)
+  spec = scene_spec.scene_spec(scene, {"gso": asset_source})
+  target = kb.Scene(frame_rate=24, step_rate=240)
+  camera = kb.PerspectiveCamera()
+  target.camera = camera
+  scene_spec.build_scene(spec, {"gso": asset_source}, scene=target)
+  assert target.camera is camera and camera.focal_length == 30
+  assert (target.frame_rate, target.step_rate) == (12, 120)
+
+  spec["version"] = 0
+  with pytest.raises(ValueError):
+    scene_spec.build_scene(spec, {"gso": asset_source})
@@ -0,0 +1,176 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import dataclasses
+import json
+import pathlib
+import sys
+
+import pytest
+import trimesh
+
+# the conversion scripts are not a package, they import each other by module name
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent / "shapenet2kubric"))
+parfor = pytest.importorskip("parfor")
+convert = pytest.importorskip("convert")
+pybullet_vhacd = pytest.importorskip("pybullet_vhacd")
+scheduler = pytest.importorskip("scheduler")
+
+
+def test_manifest_log_reports_objects_without_properties(tmp_path):
+  manifest_log = parfor.ManifestLog(tmp_path / "manifest_log.jsonl")
+  manifest_log.append(tmp_path / "02933112" / "done", properties={"id": "done"})
+  manifest_log.append(tmp_path / "02933112" / "broken", error="stage2: boom")
+  manifest_log.append(tmp_path / "02933112" / "skipped", properties=None)
+  manifest_log.close()
+
+  assert manifest_log.completed() == {"02933112/done"}
+  properties, failures = parfor.compact_manifest(manifest_log, tmp_path / "manifest.json",
+                                                 tmp_path / "manifest_failures.json")
+  assert properties == [{"id": "done"}]
+  assert failures == {"02933112/broken": "stage2: boom",
+                      "02933112/skipped": "no stage4 properties"}
+  assert json.loads((tmp_path / "manifest_failures.json").read_text()) == failures
+
+
+def test_stage4_skip_returns_existing_properties(tmp_path):
+  object_folder = tmp_path / "02933112" / "718f8fe82bc186a086d53ab0fe94e911"
+  (object_folder / "kubric").mkdir(parents=True)
+  box = trimesh.creation.box((0.4, 0.2, 0.1))
+  for name in ["model_watertight.obj", "visual_geometry.glb"] + [
+      convert.lod_path("collision_geometry.obj", lod).name for lod in convert.COLLISION_LODS]:
+    box.export(object_folder / "kubric" / name)
+
+  properties = convert.stage4(object_folder)
+  # --- the outputs exist, a re-run reads the same properties back instead of returning None
+  assert convert.stage4(object_folder) == json.loads(json.dumps(properties))
+
+
+def test_stages_complete_missing_collision_lods(tmp_path, monkeypatch):
+  # --- converted before the hull/coarse LODs: only the fine collision geometry and urdf exist
+  object_folder = tmp_path / "02933112" / "718f8fe82bc186a086d53ab0fe94e911"
+  (object_folder / "kubric").mkdir(parents=True)
+  box = trimesh.creation.box((0.4, 0.2, 0.1))
+  for name in ["model_watertight.obj", "visual_geometry.glb", "collision_geometry.obj"]:
+    box.export(object_folder / "kubric" / name)
+  (object_folder / "kubric" / "object.urdf").write_text("<robot/>")
+  (object_folder / "kubric" / "data.json").write_text("{}")
+
+  def compute_collision_lods(source_path, target_path, stdout_path):
+    del source_path, stdout_path
+    for lod in convert.COLLISION_LODS:
+      box.export(convert.lod_path(target_path, lod))
+
+  monkeypatch.setattr(pybullet_vhacd, "compute_collision_lods", compute_collision_lods)
+  convert.stage2(object_folder, in_process=True)
+  convert.stage4(object_folder)
+  for lod in convert.COLLISION_LODS:
+    assert convert.lod_path(object_folder / "kubric" / "collision_geometry.obj", lod).is_file()
+    assert convert.lod_path(object_folder / "kubric" / "object.urdf", lod).is_file()
+  assert json.loads((object_folder / "kubric" / "data.json").read_text())["kwargs"]["mass"] > 0
+
+
+def _make_object(root, name):
+  object_folder = root / "02933112" / name
+  (object_folder / "models").mkdir(parents=True)
+  (object_folder / "models" / "model.obj").write_text("v 0 0 0")
+  return object_folder
+
+
+def _stub_stages(calls):
+  """Two stages on thread pools: "mesh" reads the source, "props" depends on it."""
+
+  def mesh(object_folder, logger):
+    del logger
+    calls.append(("mesh", object_folder.name))
+    if object_folder.name == "bad":
+      raise ValueError("bad mesh")
+    (object_folder / "kubric" / "mesh.obj").write_text("mesh")
+
+  def props(object_folder, logger):
+    del logger
+    calls.append(("props", object_folder.name))
+    (object_folder / "kubric" / "data.json").write_text("{}")
+    return {"id": object_folder.name}
+
+  return {
+      1: scheduler.Stage(mesh, "cpu", lambda folder: [folder / "kubric" / "mesh.obj"],
+                         sources=lambda folder: [folder / "models" / "model.obj"]),
+      2: scheduler.Stage(props, "io", lambda folder: [folder / "kubric" / "data.json"],
+                         deps=(1,)),
+  }
+
+
+def test_stage_keys(tmp_path):
+  stages = _stub_stages([])
+  object_folder = _make_object(tmp_path, "a")
+  keys = scheduler.stage_keys(stages, object_folder)
+  assert keys == scheduler.stage_keys(stages, _make_object(tmp_path / "copy", "a"))
+
+  # --- a changed source invalidates the stage and everything downstream of it
+  (object_folder / "models" / "model.obj").write_text("v 1 0 0")
+  changed = scheduler.stage_keys(stages, object_folder)
+  assert changed[1] != keys[1] and changed[2] != keys[2]
+
+  stages[2] = dataclasses.replace(stages[2], version=2)
+  bumped = scheduler.stage_keys(stages, object_folder)
+  assert bumped[1] == changed[1] and bumped[2] != changed[2]
+
+
+def test_admit_detects_up_to_date_stages(tmp_path):
+  stages = _stub_stages([])
+  pools = {"cpu": scheduler.PoolSpec(1), "io": scheduler.PoolSpec(1)}
+  object_folder = _make_object(tmp_path, "a")
+  stage_scheduler = scheduler.StageScheduler(stages, pools, result_stage=2)
+  assert stage_scheduler._admit(object_folder).todo == {1, 2}  # pylint: disable=protected-access
+
+  keys = scheduler.stage_keys(stages, object_folder)
+  scheduler.write_stamps(object_folder, {i: {"key": keys[i]} for i in stages})
+  (object_folder / "kubric" / "mesh.obj").write_text("mesh")
+  (object_folder / "kubric" / "data.json").write_text("{}")
+  assert stage_scheduler._admit(object_folder).todo == set()  # pylint: disable=protected-access
+
+  # --- intermediate outputs consumed by an up-to-date stage need not be kept around
+  (object_folder / "kubric" / "mesh.obj").unlink()
+  assert stage_scheduler._admit(object_folder).todo == set()  # pylint: disable=protected-access
+  (object_folder / "kubric" / "data.json").unlink()
+  assert stage_scheduler._admit(object_folder).todo == {1, 2}  # pylint: disable=protected-access
+
+  (object_folder / "kubric" / "mesh.obj").write_text("mesh")
+  (object_folder / "kubric" / "data.json").write_text("{}")
+  (object_folder / "models" / "model.obj").write_text("v 1 0 0")
+  assert stage_scheduler._admit(object_folder).todo == {1, 2}  # pylint: disable=protected-access
+
+
+def test_scheduler_run(tmp_path):
+  calls = []
+  stages = _stub_stages(calls)
+  pools = {"cpu": scheduler.PoolSpec(2), "io": scheduler.PoolSpec(1)}
+  object_folders = [_make_object(tmp_path, name) for name in ["a", "bad", "b"]]
+
+  stage_scheduler = scheduler.StageScheduler(stages, pools, result_stage=2)
+  results = dict(stage_scheduler.run(object_folders))
+  assert results == {object_folders[0]: {"id": "a"}, object_folders[1]: None,
+                     object_folders[2]: {"id": "b"}}
+  assert stage_scheduler.failures == {object_folders[1]: "stage1: bad mesh"}
+  assert sorted(calls) == [("mesh", "a"), ("mesh", "b"), ("mesh", "bad"),
+                           ("props", "a"), ("props", "b")]
+
+  # --- a second run only retries the failed object, results come from the stamps
+  calls.clear()
+  stage_scheduler = scheduler.StageScheduler(stages, pools, result_stage=2)
+  results = dict(stage_scheduler.run(object_folders))
+  assert results[object_folders[0]] == {"id": "a"} and results[object_folders[1]] is None
+  assert calls == [("mesh", "bad")]
+  assert stage_scheduler.stats[2]["skipped"] == 2
@@ -0,0 +1,81 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import pytest
+
+from kubric import tracing
+
+
+@pytest.fixture
+def tracer():
+  tracer = tracing.enable()
+  tracer.reset()
+  yield tracer
+  tracing.disable()
+
+
+def test_disabled_tracing_is_a_noop():
+  tracing.disable()
+  assert tracing.span("render") is tracing.span("simulate")
+  tracing.count("retries")
+  assert tracing.get_tracer() is None
+
+
+def test_spans_and_counters_are_summarized(tracer):
+  @tracing.traced("decorated")
+  def decorated(x):
+    return 2 * x
+
+  for frame in range(3):
+    with tracing.span("render", frame=frame):
+      assert decorated(frame) == 2 * frame
+  tracing.count("asset_cache.hit", 2)
+  tracing.count("asset_cache.hit")
+
+  summary = tracer.summary()
+  assert summary["spans"]["render"]["count"] == 3
+  assert summary["spans"]["decorated"]["count"] == 3
+  assert summary["spans"]["render"]["total_s"] >= summary["spans"]["decorated"]["total_s"]
+  assert summary["counters"] == {"asset_cache.hit": 3}
+
+
+def test_write_chrome_trace(tracer, tmpdir):
+  with pytest.raises(ValueError):
+    with tracing.span("failing", reason=ValueError):
+      raise ValueError()
+  tracing.count("retries")
+  tracer.write_chrome_trace(tmpdir / "trace.json")
+
+  trace = json.loads((tmpdir / "trace.json").read_text("utf-8"))
+  span_event, counter_event = trace["traceEvents"]
+  assert span_event["name"] == "failing" and span_event["ph"] == "X"
+  assert span_event["args"] == {"reason": str(ValueError)}
+  assert counter_event["ph"] == "C" and counter_event["args"] == {"retries": 1}
+
+
+def test_take_splits_the_trace(tracer):
+  with tracing.span("render"):
+    pass
+  with tracing.span("file_write", filename="scene_1/rgba.png"):
+    pass
+  tracing.count("retries")
+
+  scene = tracer.take(lambda event: event["name"] == "render", counters=True)
+  assert list(scene.summary()["spans"]) == ["render"]
+  assert scene.counters == {"retries": 1} and not tracer.counters
+  tracer.take(lambda event: event["args"]["filename"].startswith("scene_1/"), into=scene)
+  assert set(scene.summary()["spans"]) == {"render", "file_write"}
+  assert tracer.summary()["spans"] == {}
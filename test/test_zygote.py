@@ -0,0 +1,54 @@
+# Copyright 2024 The Kubric Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+
+import numpy as np
+
+import kubric as kb
+from kubric import zygote as zygote_lib
+
+
+def test_zygote_exit_codes(tmp_path):
+  warmed_up = []
+  zygote = zygote_lib.Zygote(preload=("json",), warm_up_fn=lambda: warmed_up.append(1))
+
+  def write(value):
+    # files written in the background are flushed before the worker exits
+    kb.write_json({"value": value}, tmp_path / "out.json")
+    kb.file_io.get_async_writer().submit(kb.write_png, np.zeros((2, 2, 3), np.uint8),
+                                         tmp_path / "out.png")
+
+  assert zygote.wait(zygote.fork(write, 3)) == 0
+  assert kb.file_io.read_json(tmp_path / "out.json") == {"value": 3}
+  assert (tmp_path / "out.png").exists()
+  assert zygote.wait(zygote.fork(lambda: 5)) == 5
+  assert zygote.wait(zygote.fork(sys.exit, 75)) == 75
+  assert zygote.wait(zygote.fork(lambda: 1 / 0)) == 1
+
+  stats = zygote.stats()
+  assert warmed_up == [1] and stats["warm_up_seconds"] is not None
+  assert stats["nr_forks"] == 4 and stats["fork_seconds_max"] >= stats["fork_seconds_mean"]
+
+
+def test_forked_asset_source_uses_own_scratch_dir(tmp_path):
+  with kb.AssetSource("source", tmp_path, {}, scratch_dir=tmp_path) as source:
+    parent_dir = source.local_dir
+
+    def check():
+      return int(source.local_dir == parent_dir or not source.local_dir.exists())
+
+    zygote = zygote_lib.Zygote(preload=())
+    assert zygote.wait(zygote.fork(check)) == 0
+    assert source.local_dir == parent_dir